@@ -55,6 +55,7 @@ from sqlalchemy import text
 from opennem.db import get_read_session, get_write_session
 from opennem.recordreactor.backlog import run_milestone_analysis
 from opennem.recordreactor.schema import MilestonePeriod, MilestoneType
+from opennem.recordreactor.state import invalidate_milestone_state
 from opennem.schema.network import NetworkNEM
 from opennem.utils.dates import get_last_completed_interval_for_network
 
@@ -206,6 +207,9 @@ async def repair_demand_energy_milestones(dry_run: bool = False) -> None:
     await _purge_demand_energy_milestones()
     logger.info(f"Deleted {total} demand energy milestone rows")
 
+    # the state store still holds the deleted records, which the rebuild would compare against
+    await invalidate_milestone_state()
+
     records = await run_milestone_analysis(
         start_date=start_date,
         end_date=end_date,
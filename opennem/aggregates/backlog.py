@@ -0,0 +1,258 @@
+"""
+OpenNEM Aggregate Backlog Runner
+
+Runs a long aggregate backlog (eg. unit_intervals from 1999) as chunks spread across workers.
+
+Chunks never cross a month so they line up with the toYYYYMM(interval) partitions of the
+ClickHouse aggregate tables - concurrent workers write into different partitions rather than
+many small parts into the same one. Each worker holds its own ClickHouse client for the run
+and opens a Postgres session per chunk, and there are never more workers than the database
+pool of the workload has connections. Worker clients are created with use_numpy for columnar
+inserts with insert_frame.
+
+Progress is checkpointed per chunk in aggregate_backlog_checkpoint. Chunks marked done are
+skipped when the same job is run again, so a crashed or cancelled run picks up where it
+stopped. Failed chunks, including those whose checkpoint couldn't be written, are recorded
+with their error where possible and retried on the next run. They don't stop the run.
+
+Throughput (rows/s, chunks remaining and ETA) is logged while the run goes.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from clickhouse_driver import Client
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from opennem import settings
+from opennem.db import get_write_session
+from opennem.db.clickhouse import new_clickhouse_client
+from opennem.db.models.opennem import AggregateBacklogCheckpoint
+from opennem.db.pool import get_db_workload, get_engine_pool_size
+
+logger = logging.getLogger("opennem.aggregates.backlog")
+
+
+@dataclass(frozen=True)
+class BacklogChunk:
+    """A half open [start, end) range of a backlog"""
+
+    start: datetime
+    end: datetime
+
+
+# A chunk processor streams a chunk from Postgres into ClickHouse and yields the number of rows
+# written per batch
+BacklogChunkProcessor = Callable[[AsyncSession, Client, BacklogChunk], AsyncIterator[int]]
+
+
+def partition_chunks(start: datetime, end: datetime, chunk_size: timedelta) -> list[BacklogChunk]:
+    """Split [start, end) into chunks of at most chunk_size that don't cross a month boundary"""
+    chunks = []
+    current = start
+
+    while current < end:
+        next_month = (current.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(current + chunk_size, next_month, end)
+        chunks.append(BacklogChunk(start=current, end=chunk_end))
+        current = chunk_end
+
+    return chunks
+
+
+@dataclass
+class BacklogProgress:
+    job: str
+    total_chunks: int
+    skipped_chunks: int = 0
+    done_chunks: int = 0
+    failed_chunks: int = 0
+    rows: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def remaining_chunks(self) -> int:
+        return self.total_chunks - self.skipped_chunks - self.done_chunks - self.failed_chunks
+
+    @property
+    def eta(self) -> timedelta | None:
+        """Time left at the rate chunks have completed so far in this run"""
+        completed = self.done_chunks + self.failed_chunks
+
+        if not completed:
+            return None
+
+        return timedelta(seconds=round(self.elapsed / completed * self.remaining_chunks))
+
+    def log(self) -> None:
+        logger.info(
+            f"{self.job}: {self.done_chunks + self.skipped_chunks}/{self.total_chunks} chunks done "
+            f"({self.skipped_chunks} from checkpoint, {self.failed_chunks} failed), {self.remaining_chunks} remaining. "
+            f"{self.rows:,} rows at {self.rows_per_second:,.0f} rows/s, ETA {self.eta or 'unknown'}"
+        )
+
+
+async def get_completed_chunks(session: AsyncSession, job: str) -> dict[datetime, datetime]:
+    """Start and end of chunks checkpointed as done for a job"""
+    result = await session.execute(
+        select(AggregateBacklogCheckpoint.chunk_start, AggregateBacklogCheckpoint.chunk_end).where(
+            AggregateBacklogCheckpoint.job == job, AggregateBacklogCheckpoint.status == "done"
+        )
+    )
+
+    return dict(result.tuples().all())
+
+
+async def set_checkpoint(
+    session: AsyncSession, job: str, chunk: BacklogChunk, status: str, records: int = 0, error: str | None = None
+) -> None:
+    """Record the status of a chunk. Starting a chunk (running) counts an attempt"""
+    stmt = insert(AggregateBacklogCheckpoint).values(
+        job=job,
+        chunk_start=chunk.start,
+        chunk_end=chunk.end,
+        status=status,
+        records=records,
+        attempts=1 if status == "running" else 0,
+        error=error,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["job", "chunk_start"],
+        set_={
+            "chunk_end": stmt.excluded.chunk_end,
+            "status": stmt.excluded.status,
+            "records": stmt.excluded.records,
+            "attempts": AggregateBacklogCheckpoint.attempts + stmt.excluded.attempts,
+            "error": stmt.excluded.error,
+            "updated_at": datetime.now().astimezone(),
+        },
+    )
+
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def reset_checkpoints(session: AsyncSession, job: str) -> None:
+    await session.execute(delete(AggregateBacklogCheckpoint).where(AggregateBacklogCheckpoint.job == job))
+    await session.commit()
+
+
+async def run_backlog(
+    job: str,
+    start: datetime,
+    end: datetime,
+    chunk_size: timedelta,
+    process_chunk: BacklogChunkProcessor,
+    workers: int | None = None,
+    restart: bool = False,
+) -> BacklogProgress:
+    """
+    Run process_chunk over [start, end) in partition aligned chunks across workers, resuming
+    from the checkpoints of a previous run of job unless restart is set.
+
+    Returns the progress of the run. Failed chunks are logged and checkpointed rather than
+    stopping the run, callers decide whether progress.failed_chunks is an error.
+    """
+    workers = workers or settings.aggregate_backlog_workers
+
+    # each worker holds a session from the workload's engine while it runs a chunk, workers
+    # past the engine's pool would only wait on it until they time out
+    pool_size, max_overflow = get_engine_pool_size(get_db_workload())
+
+    if workers > pool_size + max_overflow:
+        logger.warning(f"{job}: {workers} workers is more than the database pool allows, running {pool_size + max_overflow}")
+        workers = pool_size + max_overflow
+
+    chunks = partition_chunks(start, end, chunk_size)
+
+    async with get_write_session() as session:
+        if restart:
+            await reset_checkpoints(session, job)
+
+        completed = await get_completed_chunks(session, job)
+
+    # the last chunk of a previous run may have ended before this run's end date
+    pending = [chunk for chunk in chunks if chunk.start not in completed or completed[chunk.start] < chunk.end]
+
+    progress = BacklogProgress(job=job, total_chunks=len(chunks), skipped_chunks=len(chunks) - len(pending))
+
+    logger.info(
+        f"{job}: running {len(pending)} of {len(chunks)} chunks from {start} to {end} across {min(workers, len(pending))} workers"
+    )
+
+    queue: asyncio.Queue[BacklogChunk] = asyncio.Queue()
+
+    for chunk in pending:
+        queue.put_nowait(chunk)
+
+    async def _run_chunk(client: Client, chunk: BacklogChunk) -> None:
+        chunk_start = time.perf_counter()
+        records = 0
+
+        try:
+            async with get_write_session() as session:
+                await set_checkpoint(session, job, chunk, "running")
+
+                async for batch_records in process_chunk(session, client, chunk):
+                    records += batch_records
+                    progress.rows += batch_records
+
+                await set_checkpoint(session, job, chunk, "done", records=records)
+        except Exception as e:
+            logger.error(f"{job}: error processing chunk {chunk.start} to {chunk.end}: {e}")
+            progress.failed_chunks += 1
+
+            try:
+                async with get_write_session() as session:
+                    await set_checkpoint(session, job, chunk, "failed", records=records, error=str(e))
+            except Exception as checkpoint_error:
+                logger.error(f"{job}: could not checkpoint failed chunk {chunk.start} to {chunk.end}: {checkpoint_error}")
+
+            return
+
+        progress.done_chunks += 1
+
+        logger.info(
+            f"{job}: processed {records} records from {chunk.start} to {chunk.end} in {time.perf_counter() - chunk_start:.1f}s"
+        )
+
+    async def _worker() -> None:
+        client = new_clickhouse_client(timeout=60, use_numpy=True)
+
+        try:
+            while not queue.empty():
+                await _run_chunk(client, queue.get_nowait())
+        finally:
+            client.disconnect()
+
+    async def _report() -> None:
+        while True:
+            await asyncio.sleep(settings.aggregate_backlog_progress_interval)
+            progress.log()
+
+    reporter = asyncio.create_task(_report())
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(min(workers, len(pending))):
+                tg.create_task(_worker())
+    finally:
+        reporter.cancel()
+
+    progress.log()
+
+    return progress
@@ -0,0 +1,224 @@
+"""
+Interconnector Intervals aggregation module.
+
+Lands interconnector SCADA from PostgreSQL in the ClickHouse interconnector_intervals table,
+summed per interval and region pair, so the market_summary flow solve reads interconnector
+flows and regional emissions from ClickHouse together (see
+opennem.aggregates.market_summary._compute_flows_for_range).
+
+The live path is incremental with a bounded lookback: each run re-lands from a little before
+the last landed interval, to pick up revised SCADA, and never reaches back further than a
+day. Longer gaps are filled by the market_summary backlog and catchup, which land each chunk
+before computing its flows, or by run_interconnector_intervals_backlog.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime, timedelta
+
+import polars as pl
+from clickhouse_driver import Client
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from opennem.aggregates.backlog import BacklogChunk, run_backlog
+from opennem.db import get_read_session
+from opennem.db.clickhouse import execute_async, get_clickhouse_client, insert_frame, insert_frame_async
+from opennem.db.pool import DBWorkload, with_db_workload
+from opennem.schema.network import NetworkNEM
+from opennem.utils.dates import get_last_completed_interval_for_network
+
+logger = logging.getLogger("opennem.aggregates.interconnector_intervals")
+
+# each incremental run re-lands this far behind the last landed interval, which covers the
+# hour of intervals the live market_summary run recomputes
+_REVISION_OVERLAP = timedelta(hours=1)
+
+# and never further back than this, a longer gap is left to the catchup and backlog
+_MAX_LOOKBACK = timedelta(days=1)
+
+
+async def _get_interconnector_interval_data(session: AsyncSession, start_time: datetime, end_time: datetime) -> list[tuple]:
+    """
+    Get interconnector flows from PostgreSQL for a given time range, inclusive at both ends.
+
+    Returns:
+        Rows of (interval, network_id, interconnector_region_from, interconnector_region_to,
+        generated (MW), energy (MWh))
+    """
+    query = text("""
+        SELECT
+            fs.interval,
+            f.network_id,
+            u.interconnector_region_from,
+            u.interconnector_region_to,
+            sum(fs.generated) as generated,
+            coalesce(sum(fs.generated) / 12, 0) as energy
+        FROM facility_scada fs
+        JOIN units u ON fs.facility_code = u.code
+        JOIN facilities f ON u.station_id = f.id
+        WHERE fs.interval >= :start_time
+            AND fs.interval <= :end_time
+            AND u.interconnector = true
+            AND f.network_id = 'NEM'
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1
+    """)
+
+    result = await session.execute(query, {"start_time": start_time, "end_time": end_time})
+
+    return list(result.fetchall())
+
+
+def _prepare_interconnector_interval_data(records: Sequence[tuple]) -> pl.DataFrame:
+    """
+    Prepare interconnector interval rows for a columnar insert into ClickHouse with insert_frame.
+    """
+    df = pl.DataFrame(
+        records,
+        orient="row",
+        schema={
+            "interval": pl.Datetime,
+            "network_id": pl.String,
+            "interconnector_region_from": pl.String,
+            "interconnector_region_to": pl.String,
+            "generated": pl.Float64,
+            "energy": pl.Float64,
+        },
+    )
+
+    return df.with_columns(
+        pl.col("generated").round(4),
+        pl.col("energy").round(4),
+        pl.lit(int(datetime.now().timestamp())).alias("version"),
+    )
+
+
+async def process_interconnector_intervals(session: AsyncSession, start_time: datetime, end_time: datetime) -> int:
+    """
+    Land the interconnector flows for a time range in ClickHouse.
+
+    Returns:
+        int: Number of records landed
+    """
+    records = await _get_interconnector_interval_data(session, start_time, end_time)
+
+    if not records:
+        logger.debug(f"No interconnector data for {start_time} to {end_time}")
+        return 0
+
+    prepared_data = _prepare_interconnector_interval_data(records)
+
+    return await insert_frame_async("interconnector_intervals", prepared_data)
+
+
+async def _get_last_landed_interval(since: datetime) -> datetime | None:
+    """Latest landed NEM interval at or after since, scanning only the lookback window"""
+    # No FINAL - every version of a row shares its interval so dedup can't change the max.
+    # max() of no rows is the epoch rather than NULL
+    result = await execute_async(
+        get_clickhouse_client(),
+        """
+        SELECT max(interval), count()
+        FROM interconnector_intervals
+        WHERE interval >= %(since)s
+            AND network_id = 'NEM'
+        """,
+        {"since": since},
+    )
+
+    if not result or not result[0][1]:
+        return None
+
+    return result[0][0]
+
+
+async def run_interconnector_intervals_to_now(max_lookback: timedelta = _MAX_LOOKBACK) -> int:
+    """
+    Land the interconnector flows from shortly before the last landed interval to now.
+
+    Latency of the run, and how far the landed data trails the last completed interval
+    before it, are logged per run.
+
+    Args:
+        max_lookback: The furthest back a run will land from
+
+    Returns:
+        int: Number of records landed
+    """
+    started = time.perf_counter()
+
+    date_to = get_last_completed_interval_for_network(network=NetworkNEM)
+    lookback_start = date_to - max_lookback
+
+    last_landed = await _get_last_landed_interval(since=lookback_start)
+
+    if last_landed is None:
+        logger.warning(f"No interconnector intervals landed since {lookback_start}, landing from there")
+        date_from = lookback_start
+    else:
+        date_from = max(last_landed - _REVISION_OVERLAP, lookback_start)
+
+    async with get_read_session() as session:
+        landed = await process_interconnector_intervals(session, date_from, date_to)
+
+    elapsed = time.perf_counter() - started
+    lag = str(date_to - last_landed) if last_landed else f"over {max_lookback}"
+
+    logger.info(
+        f"Landed {landed} interconnector intervals from {date_from} to {date_to} in {elapsed:.2f}s, {lag} behind before the run"
+    )
+
+    # the live path has to land well inside the interval it runs on
+    if elapsed > NetworkNEM.interval_size * 60 / 2:
+        logger.warning(f"Landing interconnector intervals took {elapsed:.1f}s, over half of the interval")
+
+    return landed
+
+
+async def _stream_interconnector_intervals_chunk(
+    session: AsyncSession, client: Client, chunk: BacklogChunk
+) -> AsyncIterator[int]:
+    """
+    Land a backlog chunk, [start, end), through the backlog worker's client and yield the
+    number of records written.
+    """
+    records = await _get_interconnector_interval_data(session, chunk.start, chunk.end - timedelta(minutes=5))
+
+    if records:
+        prepared_data = _prepare_interconnector_interval_data(records)
+        yield await asyncio.to_thread(insert_frame, client, "interconnector_intervals", prepared_data)
+
+
+@with_db_workload(DBWorkload.backfill)
+async def run_interconnector_intervals_backlog(
+    start_date: datetime | None = None,
+    workers: int | None = None,
+    restart: bool = False,
+) -> None:
+    """
+    Land the interconnector flows for the history of the NEM. Checkpointed like the
+    unit_intervals backlog, so running it again resumes. Pass restart to start over.
+    """
+    end_date = get_last_completed_interval_for_network(network=NetworkNEM)
+
+    if not start_date:
+        start_date = NetworkNEM.data_first_seen.replace(tzinfo=None)
+
+    progress = await run_backlog(
+        job="interconnector_intervals:NEM",
+        start=start_date,
+        # include the last completed interval
+        end=end_date + timedelta(minutes=5),
+        chunk_size=timedelta(days=31),
+        process_chunk=_stream_interconnector_intervals_chunk,
+        workers=workers,
+        restart=restart,
+    )
+
+    logger.info(f"Interconnector intervals backlog complete: {progress.rows} total records landed")
+
+    if progress.failed_chunks:
+        raise RuntimeError(f"interconnector_intervals backlog: {progress.failed_chunks} chunks failed")
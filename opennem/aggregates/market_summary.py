@@ -5,6 +5,7 @@ This module handles the aggregation of market summary data from PostgreSQL to Cl
 It calculates energy values from power readings and stores them in MWh in ClickHouse for efficient querying.
 """
 
+import asyncio
 import logging
 from collections.abc import Sequence
 from datetime import datetime, timedelta
@@ -13,8 +14,12 @@ import polars as pl
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from opennem import settings
+from opennem.aggregates.interconnector_intervals import process_interconnector_intervals, run_interconnector_intervals_to_now
 from opennem.db import get_write_session
-from opennem.db.clickhouse import execute_async, get_clickhouse_client, insert_async
+from opennem.db.clickhouse import execute_async, get_clickhouse_client, insert_frame_async
+from opennem.db.clickhouse.data_version import publish_data_version
+from opennem.db.clickhouse.dirty_log import record_dirty_days_async
 from opennem.db.clickhouse.materialized_views import backfill_materialized_views
 from opennem.db.clickhouse.schema import optimize_clickhouse_tables
 from opennem.db.clickhouse.views import (
@@ -376,32 +381,7 @@ async def _prepare_market_summary_data(
             float | None,
         ]
     ],
-) -> list[
-    tuple[
-        datetime,
-        str,
-        str,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-        float | None,
-    ]
-]:
+) -> pl.DataFrame:
     """
     Prepare market summary data for ClickHouse by calculating energy values.
 
@@ -409,11 +389,8 @@ async def _prepare_market_summary_data(
         records: Raw records from PostgreSQL
 
     Returns:
-        List of tuples ready for ClickHouse insertion with energy values in MWh
+        Frame of market_summary columns ready for insert_frame with energy values in MWh
     """
-    if not records:
-        return []
-
     # Convert records to polars DataFrame
     df = pl.DataFrame(
         records,
@@ -658,7 +635,8 @@ async def _prepare_market_summary_data(
     if intervals:
         start = min(intervals) - timedelta(minutes=5)
         end = max(intervals) + timedelta(minutes=5)
-        flow_df = await _compute_flows_for_range(start, end)
+        prices = result_df.filter(pl.col("network_id") == "NEM").select("interval", "network_region", "price")
+        flow_df = await _compute_flows_for_range(start, end, region_price_df=prices)
         if flow_df is not None and not flow_df.is_empty():
             result_df = result_df.join(
                 flow_df,
@@ -707,64 +685,51 @@ async def _prepare_market_summary_data(
         ]
     )
 
-    # Convert back to list of tuples for ClickHouse insertion
-    return result_df.rows()
+    return result_df
 
 
-async def _compute_flows_for_range(start_time: datetime, end_time: datetime) -> pl.DataFrame | None:
+async def _compute_flows_for_range(
+    start_time: datetime, end_time: datetime, region_price_df: pl.DataFrame | None = None
+) -> pl.DataFrame | None:
     """Compute flow columns for an interval range.
 
-    Loads interconnector SCADA from PG (async) and emissions intensity from CH,
-    then runs the v4 flow solver.
+    Loads the interconnector flows landed in CH (see opennem.aggregates.interconnector_intervals)
+    and the regional emissions intensity from CH, then runs the v4 flow solver. Market value
+    is computed at the regional prices in region_price_df, null without them.
 
     Returns DataFrame with: interval, network_region, energy_imports, energy_exports,
     emissions_imports, emissions_exports, market_value_imports, market_value_exports
     """
     from opennem.core.flow_solver_v4 import solve_flows_v4
     from opennem.core.interconnector_topology import get_network_topology
-    from opennem.db import get_read_session
 
     topology = get_network_topology("NEM")
     logger.info(f"Computing flows for {start_time} to {end_time}")
 
-    # 1. Load interconnector SCADA from PG (async)
-    start_str = start_time.strftime("%Y-%m-%d %H:%M:%S") if isinstance(start_time, datetime) else str(start_time)
-    end_str = end_time.strftime("%Y-%m-%d %H:%M:%S") if isinstance(end_time, datetime) else str(end_time)
+    client = get_clickhouse_client()
+    params = {"start_time": start_time, "end_time": end_time}
 
-    ic_query = text(f"""
+    # Both tables are read as of the latest version of each row with argMax(col, version)
+    # rather than FINAL, as the time series queries do (see opennem.api.queries). Filters on
+    # value columns are applied after the dedup so a superseded version can't match.
+
+    # 1. Interconnector flows
+    ic_query = """
         SELECT
-            fs.interval,
-            u.interconnector_region_from,
-            u.interconnector_region_to,
-            coalesce(sum(fs.generated) / 12, 0) as energy
-        FROM facility_scada fs
-        JOIN units u ON fs.facility_code = u.code
-        JOIN facilities f ON u.station_id = f.id
-        WHERE fs.interval >= '{start_str}'
-            AND fs.interval <= '{end_str}'
-            AND u.interconnector = true
-            AND f.network_id = 'NEM'
-        GROUP BY 1, 2, 3
+            interval,
+            interconnector_region_from,
+            interconnector_region_to,
+            argMax(tuple(energy), version).1 as latest_energy
+        FROM interconnector_intervals
+        WHERE interval >= %(start_time)s
+            AND interval <= %(end_time)s
+            AND network_id = 'NEM'
+        GROUP BY interval, network_id, interconnector_region_from, interconnector_region_to
         ORDER BY 1
-    """)
-
-    async with get_read_session() as session:
-        result = await session.execute(ic_query)
-        rows = result.fetchall()
-
-    if not rows:
-        logger.debug(f"No interconnector data for {start_str} to {end_str}")
-        return None
-
-    interconnector_df = pl.DataFrame(
-        rows,
-        schema=["interval", "interconnector_region_from", "interconnector_region_to", "energy"],
-        orient="row",
-    ).with_columns(pl.col("interval").cast(pl.Datetime("us")))
+    """
 
-    # 2. Load emissions intensity from CH
-    client = get_clickhouse_client()
-    em_query = f"""
+    # 2. Emissions intensity
+    em_query = """
         SELECT
             interval,
             network_region,
@@ -775,41 +740,68 @@ async def _compute_flows_for_range(start_time: datetime, end_time: datetime) ->
             SELECT
                 interval,
                 network_region,
-                sum(energy) as total_energy,
-                sum(emissions) as total_emissions
-            FROM unit_intervals FINAL
-            WHERE interval >= toDateTime('{start_str}')
-                AND interval <= toDateTime('{end_str}')
-                AND network_id = 'NEM'
-                AND fueltech_id NOT IN ('battery_charging')
-                AND generated > 0
+                sum(unit_energy) as total_energy,
+                sum(unit_emissions) as total_emissions
+            FROM (
+                SELECT
+                    interval,
+                    network_region,
+                    argMax(tuple(fueltech_id), version).1 as unit_fueltech_id,
+                    argMax(tuple(generated), version).1 as unit_generated,
+                    argMax(tuple(energy), version).1 as unit_energy,
+                    argMax(tuple(emissions), version).1 as unit_emissions
+                FROM unit_intervals
+                WHERE interval >= %(start_time)s
+                    AND interval <= %(end_time)s
+                    AND network_id = 'NEM'
+                GROUP BY interval, network_id, network_region, facility_code, unit_code
+            )
+            WHERE unit_fueltech_id NOT IN ('battery_charging')
+                AND unit_generated > 0
             GROUP BY 1, 2
         )
         ORDER BY 1
     """
-    em_rows = await execute_async(client, em_query)
+
+    rows, em_rows = await asyncio.gather(execute_async(client, ic_query, params), execute_async(client, em_query, params))
+
+    if not rows:
+        logger.debug(f"No interconnector data for {start_time} to {end_time}")
+        return None
 
     if not em_rows:
-        logger.debug(f"No emissions data for {start_str} to {end_str}")
+        logger.debug(f"No emissions data for {start_time} to {end_time}")
         return None
 
+    interconnector_df = pl.DataFrame(
+        rows,
+        schema=["interval", "interconnector_region_from", "interconnector_region_to", "energy"],
+        orient="row",
+    ).with_columns(pl.col("interval").cast(pl.Datetime("us")))
+
     region_df = pl.DataFrame(
         em_rows,
         schema=["interval", "network_region", "energy", "emissions", "emissions_intensity"],
         orient="row",
     ).with_columns(pl.col("interval").cast(pl.Datetime("us")))
 
-    # 3. Solve flows
-    flow_result = solve_flows_v4(topology, interconnector_df, region_df)
+    # 3. Solve flows, with market value at the regional prices
+    flow_result = solve_flows_v4(
+        topology,
+        interconnector_df,
+        region_df,
+        use_consumption_mix=settings.flows_v4_consumption_mix,
+        region_price_df=region_price_df,
+    )
 
     if flow_result.is_empty():
         return None
 
-    # Add market_value columns (placeholder — needs price data)
-    flow_result = flow_result.with_columns(
-        pl.lit(0.0).alias("market_value_imports"),
-        pl.lit(0.0).alias("market_value_exports"),
-    )
+    if region_price_df is None:
+        flow_result = flow_result.with_columns(
+            pl.lit(None).cast(pl.Float64).alias("market_value_imports"),
+            pl.lit(None).cast(pl.Float64).alias("market_value_exports"),
+        )
 
     return flow_result
 
@@ -868,7 +860,6 @@ async def process_market_summary_backlog(
         chunk_size: Size of each processing chunk
     """
     current_start = start_date
-    client = get_clickhouse_client()
     _ensure_clickhouse_schema()
 
     while current_start < end_date:
@@ -877,41 +868,32 @@ async def process_market_summary_backlog(
         # Get data for this chunk, then prepare outside session
         records = await _get_market_summary_data(session, current_start, chunk_end)
         if records:
+            # the flows for the chunk are read from the landed interconnector intervals, which
+            # the live path only lands over a bounded lookback
+            await process_interconnector_intervals(
+                session, current_start - timedelta(minutes=5), chunk_end + timedelta(minutes=5)
+            )
+
             prepared_data = await _prepare_market_summary_data(records)  # noqa: must be outside session ideally but chunk loop requires it
 
             # Batch insert into ClickHouse
-            client.execute(
-                """
-                INSERT INTO market_summary
-                (
-                    interval, network_id, network_region, price, demand, demand_total,
-                    demand_gross, generation_renewable, demand_energy, demand_total_energy,
-                    demand_gross_energy, generation_renewable_energy, demand_market_value,
-                    demand_total_market_value, demand_gross_market_value, curtailment_solar_total,
-                    curtailment_wind_total, curtailment_total, curtailment_energy_solar_total,
-                    curtailment_energy_wind_total, curtailment_energy_total,
-                    generation_renewable_with_storage, generation_renewable_with_storage_energy,
-                    energy_imports, energy_exports, emissions_imports,
-                    emissions_exports, market_value_imports, market_value_exports,
-                    version
-                )
-                VALUES
-                """,
-                prepared_data,
-            )
+            await insert_frame_async("market_summary", prepared_data)
+            await record_dirty_days_async("market_summary", prepared_data)
 
             logger.info(f"Processed {len(prepared_data)} records from {current_start} to {chunk_end}")
 
         current_start = chunk_end
 
+    await publish_data_version("market_summary")
+
 
 async def run_market_summary_aggregate_to_now() -> int:
     """ """
     client = get_clickhouse_client()
 
-    # get the max interval — scope to last 7 days to avoid full-table FINAL scan
-    # falls back to unscoped query if table has a >7 day gap
-    result = client.execute("SELECT MAX(interval) FROM market_summary FINAL WHERE interval > now() - INTERVAL 7 DAY")
+    # get the max interval — scope to last 7 days to avoid a full-table scan. No FINAL, dedup
+    # can't change the max interval. falls back to unscoped query if table has a >7 day gap
+    result = client.execute("SELECT MAX(interval) FROM market_summary WHERE interval > now() - INTERVAL 7 DAY")
     result_rows = list(result)  # type: ignore
 
     if not result_rows or not result_rows[0] or result_rows[0][0] is None:
@@ -942,6 +924,8 @@ async def run_market_summary_aggregate_to_now() -> int:
         )
         return 0
 
+    await run_interconnector_intervals_to_now()
+
     # run market summary from max_interval to now
     async with get_write_session() as session:
         records = await _get_market_summary_data(session, date_from, date_to)
@@ -949,25 +933,9 @@ async def run_market_summary_aggregate_to_now() -> int:
     # compute flows outside the write session to avoid connection pool contention
     prepared_data = await _prepare_market_summary_data(records)
 
-    client.execute(
-        """
-        INSERT INTO market_summary
-        (
-            interval, network_id, network_region, price, demand, demand_total,
-            demand_gross, generation_renewable, demand_energy, demand_total_energy,
-            demand_gross_energy, generation_renewable_energy, demand_market_value,
-            demand_total_market_value, demand_gross_market_value, curtailment_solar_total,
-            curtailment_wind_total, curtailment_total, curtailment_energy_solar_total,
-            curtailment_energy_wind_total, curtailment_energy_total,
-            generation_renewable_with_storage, generation_renewable_with_storage_energy,
-            energy_imports, energy_exports, emissions_imports,
-            emissions_exports, market_value_imports, market_value_exports,
-            version
-        )
-        VALUES
-        """,
-        prepared_data,
-    )
+    await insert_frame_async("market_summary", prepared_data)
+    await record_dirty_days_async("market_summary", prepared_data)
+    await publish_data_version("market_summary")
 
     logger.info(f"Processed {len(prepared_data)} records from {date_from} to {date_to}")
 
@@ -981,30 +949,16 @@ async def run_market_summary_aggregate_for_last_intervals(num_intervals: int) ->
     end_date = get_last_completed_interval_for_network(network=NetworkNEM)
     start_date = end_date - timedelta(minutes=num_intervals * 5)
 
+    await run_interconnector_intervals_to_now()
+
     async with get_write_session() as session:
         records = await _get_market_summary_data(session, start_date, end_date)
 
     prepared_data = await _prepare_market_summary_data(records)
 
-    await insert_async(
-        """
-        INSERT INTO market_summary
-        (
-            interval, network_id, network_region, price, demand, demand_total,
-            demand_gross, generation_renewable, demand_energy, demand_total_energy,
-            demand_gross_energy, generation_renewable_energy, demand_market_value,
-            demand_total_market_value, demand_gross_market_value, curtailment_solar_total,
-            curtailment_wind_total, curtailment_total, curtailment_energy_solar_total,
-            curtailment_energy_wind_total, curtailment_energy_total,
-            generation_renewable_with_storage, generation_renewable_with_storage_energy,
-            energy_imports, energy_exports, emissions_imports,
-            emissions_exports, market_value_imports, market_value_exports,
-            version
-        )
-        VALUES
-        """,
-        prepared_data,
-    )
+    await insert_frame_async("market_summary", prepared_data)
+    await record_dirty_days_async("market_summary", prepared_data)
+    await publish_data_version("market_summary")
 
     logger.info(f"Processed {len(prepared_data)} records from {start_date} to {end_date}")
 
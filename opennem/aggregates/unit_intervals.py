@@ -15,20 +15,25 @@ from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 
 import polars as pl
+from clickhouse_driver import Client
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 if TYPE_CHECKING:
     from opennem.db.clickhouse.materialized_views import MaterializedView
 
+from opennem.aggregates.backlog import BacklogChunk, run_backlog
 from opennem.db import get_write_session
 from opennem.db.clickhouse import (
     create_table_if_not_exists,
     execute_async,
     get_clickhouse_client,
-    insert_async,
+    insert_frame,
+    insert_frame_async,
     table_exists,
 )
+from opennem.db.clickhouse.data_version import publish_data_version
+from opennem.db.clickhouse.dirty_log import record_dirty_days_async
 from opennem.db.clickhouse.materialized_views import (
     backfill_materialized_views,
     ensure_materialized_views_exist,
@@ -41,6 +46,7 @@ from opennem.db.clickhouse.views import (
     RENEWABLE_INTERVALS_VIEW,
     UNIT_INTERVALS_DAILY_VIEW,
 )
+from opennem.db.pool import DBWorkload, with_db_workload
 from opennem.schema.network import NetworkNEM, NetworkSchema
 from opennem.utils.dates import get_last_completed_interval_for_network
 
@@ -620,7 +626,7 @@ async def _stream_unit_interval_data(
     result.close()
 
 
-def _prepare_unit_interval_data(records: Sequence[tuple]) -> list[tuple]:
+def _prepare_unit_interval_data(records: Sequence[tuple]) -> pl.DataFrame:
     """
     Prepare unit interval data for ClickHouse by converting to the correct format.
 
@@ -628,14 +634,12 @@ def _prepare_unit_interval_data(records: Sequence[tuple]) -> list[tuple]:
         records: Raw records from PostgreSQL
 
     Returns:
-        List of tuples ready for ClickHouse insertion
+        Frame with the unit_intervals columns ready for a columnar insert with insert_frame
     """
-    if not records:
-        return []
-
     # Convert records to polars DataFrame
     df = pl.DataFrame(
         records,
+        orient="row",
         schema={
             "interval": pl.Datetime,
             "network_id": pl.String,
@@ -681,7 +685,7 @@ def _prepare_unit_interval_data(records: Sequence[tuple]) -> list[tuple]:
     # )
 
     # Ensure columns are in the exact order matching the table schema
-    result_df = df.select(
+    return df.select(
         [
             "interval",
             "network_id",
@@ -702,9 +706,6 @@ def _prepare_unit_interval_data(records: Sequence[tuple]) -> list[tuple]:
         ]
     )
 
-    # Convert back to list of tuples for ClickHouse insertion
-    return result_df.rows()
-
 
 def _ensure_clickhouse_schema() -> None:
     """
@@ -779,19 +780,11 @@ async def process_unit_intervals_backlog(
             prepared_data = _prepare_unit_interval_data(records)
 
             # Batch insert into ClickHouse (off-loop — see note above)
-            await insert_async(
-                """
-                INSERT INTO unit_intervals
-                (
-                    interval, network_id, network_region, facility_code, unit_code,
-                    status_id, fueltech_id, fueltech_group_id, renewable,
-                    generated, energy, energy_storage, emissions, emission_factor, market_value,
-                    version
-                )
-                VALUES
-                """,
-                prepared_data,
-            )
+            await insert_frame_async("unit_intervals", prepared_data)
+
+            # the daily views are rebuilt below, otherwise the MV refresh picks the days up
+            if not rebuild_daily_views:
+                await record_dirty_days_async("unit_intervals", prepared_data)
 
             logger.info(f"Processed {len(prepared_data)} records from {current_start} to {chunk_end}")
         else:
@@ -838,93 +831,30 @@ async def _rebuild_daily_views(start_date: datetime, end_date: datetime) -> None
     )
 
 
-async def process_unit_intervals_backlog_streaming(
+async def _stream_unit_intervals_chunk(
     session: AsyncSession,
-    start_date: datetime,
-    end_date: datetime,
-    chunk_size: timedelta = timedelta(days=3),
-    batch_size: int = 20000,
+    client: Client,
+    chunk: BacklogChunk,
     network: NetworkSchema | None = None,
-) -> int:
+    batch_size: int = 20000,
+) -> AsyncIterator[int]:
     """
-    Process historical unit interval data in chunks using streaming to reduce memory usage.
-
-    Args:
-        session: Database session
-        start_date: Start date for processing
-        end_date: End date for processing
-        chunk_size: Size of each processing chunk
-        batch_size: Number of records per batch within each chunk
-        network: Optional network filter
-
-    Returns:
-        Total number of records processed
+    Stream a backlog chunk of unit interval data from PostgreSQL into ClickHouse in batches,
+    yielding the number of records written per batch. The client belongs to the backlog worker
+    so inserts go through it in a thread rather than the shared thread-local clients.
     """
-    current_start = start_date
-    client = get_clickhouse_client()
-    _ensure_clickhouse_schema()
-    total_processed = 0
-    failed_chunks: list[tuple[datetime, datetime, str]] = []
-
-    logger.info(
-        f"Processing unit intervals (streaming) from {current_start} to {end_date} "
-        f"for network {network.code if network else 'all'} "
-        f"(chunk_size: {chunk_size}, batch_size: {batch_size})"
-    )
-
-    while current_start <= end_date:
-        # For the last chunk, ensure we include the full end date
-        chunk_end = min(current_start + chunk_size, end_date + timedelta(minutes=5))
-        chunk_processed = 0
-
-        logger.info(f"Processing chunk: {current_start} to {chunk_end}")
-        _monitor_memory_usage()
-
-        # Stream process this chunk in batches
-        try:
-            async for batch in _stream_unit_interval_data(session, current_start, chunk_end, network, batch_size):
-                if batch:
-                    prepared_data = _prepare_unit_interval_data(batch)
-
-                    # Batch insert into ClickHouse
-                    client.execute(
-                        """
-                        INSERT INTO unit_intervals
-                        (
-                            interval, network_id, network_region, facility_code, unit_code,
-                            status_id, fueltech_id, fueltech_group_id, renewable,
-                            generated, energy, energy_storage, emissions, emission_factor, market_value,
-                            version
-                        )
-                        VALUES
-                        """,
-                        prepared_data,
-                    )
-
-                    chunk_processed += len(prepared_data)
-                    logger.debug(f"Processed batch: {len(prepared_data)} records")
-        except Exception as e:
-            logger.error(f"Error processing chunk {current_start} to {chunk_end}: {e}")
-            failed_chunks.append((current_start, chunk_end, str(e)))
-
-        if chunk_processed > 0:
-            logger.info(f"Processed {chunk_processed} records from {current_start} to {chunk_end}")
-            total_processed += chunk_processed
-        else:
-            logger.warning(f"No records found for {current_start} to {chunk_end}")
-
-        current_start = chunk_end
+    async for batch in _stream_unit_interval_data(session, chunk.start, chunk.end, network, batch_size):
+        if not batch:
+            continue
 
-        # Force garbage collection between chunks
-        gc.collect()
+        prepared_data = _prepare_unit_interval_data(batch)
 
-    logger.info(f"Total processed: {total_processed} records")
+        await asyncio.to_thread(insert_frame, client, "unit_intervals", prepared_data)
 
-    if failed_chunks:
-        logger.error(f"Failed {len(failed_chunks)} chunks: {[(str(s), str(e)) for s, e, _ in failed_chunks]}")
-        raise RuntimeError(f"unit_intervals backlog: {len(failed_chunks)} chunks failed")
+        logger.debug(f"Processed batch: {len(prepared_data)} records")
+        yield len(prepared_data)
 
-    return total_processed
+    gc.collect()
 
 
 async def run_unit_intervals_aggregate_to_now() -> int:
@@ -939,11 +869,12 @@ async def run_unit_intervals_aggregate_to_now() -> int:
     # Use NEM's max interval as the baseline — WEM lags ~24h and would block
     # the incremental path if we used MIN across all networks.
     # Off-loop: this runs concurrently (asyncio.gather) with the power exports (#572).
+    # No FINAL - every version of a row shares its interval so dedup can't change the max.
     result = await execute_async(
         client,
         """
         SELECT MAX(interval)
-        FROM unit_intervals FINAL
+        FROM unit_intervals
         WHERE interval > now() - INTERVAL 2 DAY
             AND network_id = 'NEM'
     """,
@@ -966,19 +897,9 @@ async def run_unit_intervals_aggregate_to_now() -> int:
         records = await _get_unit_interval_data(session, date_from, date_to)
         prepared_data = _prepare_unit_interval_data(records)
 
-    await insert_async(
-        """
-        INSERT INTO unit_intervals
-        (
-            interval, network_id, network_region, facility_code, unit_code,
-            status_id, fueltech_id, fueltech_group_id, renewable,
-            generated, energy, energy_storage, emissions, emission_factor, market_value,
-            version
-        )
-        VALUES
-        """,
-        prepared_data,
-    )
+    await insert_frame_async("unit_intervals", prepared_data)
+    await record_dirty_days_async("unit_intervals", prepared_data)
+    await publish_data_version("unit_intervals")
 
     logger.info(f"Processed {len(prepared_data)} records from {date_from} to {date_to}")
 
@@ -1002,21 +923,8 @@ async def run_unit_intervals_aggregate_for_last_intervals(num_intervals: int) ->
         records = await _get_unit_interval_data(session, start_date, end_date)
         prepared_data = _prepare_unit_interval_data(records)
 
-    client = get_clickhouse_client()
-
-    client.execute(
-        """
-        INSERT INTO unit_intervals
-        (
-            interval, network_id, network_region, facility_code, unit_code,
-            status_id, fueltech_id, fueltech_group_id, renewable,
-            generated, energy, energy_storage, emissions, emission_factor, market_value,
-            version
-        )
-        VALUES
-        """,
-        prepared_data,
-    )
+    await insert_frame_async("unit_intervals", prepared_data)
+    await record_dirty_days_async("unit_intervals", prepared_data)
 
     logger.info(f"Processed {len(prepared_data)} records from {start_date} to {end_date}")
 
@@ -1034,9 +942,18 @@ async def run_unit_intervals_aggregate_for_last_days(days: int) -> int:
         await process_unit_intervals_backlog(session=session, start_date=start_date, end_date=end_date)
 
 
-async def run_unit_intervals_backlog(start_date: datetime | None = None, network: NetworkSchema | None = None) -> None:
+@with_db_workload(DBWorkload.backfill)
+async def run_unit_intervals_backlog(
+    start_date: datetime | None = None,
+    network: NetworkSchema | None = None,
+    workers: int | None = None,
+    restart: bool = False,
+) -> None:
     """
     Run the unit intervals aggregation for the history of the market.
+
+    Chunks are spread across workers and checkpointed, so running it again after a crash or
+    cancel resumes from the chunks that hadn't completed. Pass restart to start over.
     """
     # Calculate date range
     end_date = get_last_completed_interval_for_network(network=NetworkNEM)
@@ -1049,18 +966,26 @@ async def run_unit_intervals_backlog(start_date: datetime | None = None, network
 
     # Ensure ClickHouse schema exists
     client = get_clickhouse_client()
+    await asyncio.to_thread(_ensure_clickhouse_schema)
 
-    # Process the data using streaming approach
-    async with get_write_session() as session:
-        total_processed = await process_unit_intervals_backlog_streaming(
-            session=session,
-            start_date=start_date,
-            end_date=end_date,
-            chunk_size=timedelta(days=7),
-            batch_size=200000,
-            network=network,
-        )
-        logger.info(f"Backlog processing complete: {total_processed} total records processed")
+    def _process_chunk(session: AsyncSession, chunk_client: Client, chunk: BacklogChunk) -> AsyncIterator[int]:
+        return _stream_unit_intervals_chunk(session, chunk_client, chunk, network=network, batch_size=200000)
+
+    progress = await run_backlog(
+        job=f"unit_intervals:{network.code if network else 'all'}",
+        start=start_date,
+        # include the last completed interval
+        end=end_date + timedelta(minutes=5),
+        chunk_size=timedelta(days=7),
+        process_chunk=_process_chunk,
+        workers=workers,
+        restart=restart,
+    )
+
+    logger.info(f"Backlog processing complete: {progress.rows} total records processed")
+
+    if progress.failed_chunks:
+        raise RuntimeError(f"unit_intervals backlog: {progress.failed_chunks} chunks failed")
 
     await _rebuild_daily_views(start_date=start_date, end_date=end_date)
 
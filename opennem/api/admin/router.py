@@ -0,0 +1,104 @@
+"""
+Admin API endpoints
+
+ClickHouse query profiles and database pool metrics are held per API worker process, so they
+are those of the worker that serves the request.
+"""
+
+import logging
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, Query
+from fastapi_versionizer import api_version
+from pydantic import BaseModel
+
+from opennem.api.schema import APIV4ResponseSchema
+from opennem.api.security import admin_user
+from opennem.db.clickhouse import get_clickhouse_pool
+from opennem.db.clickhouse.profiling import get_fingerprint_stats, get_query_log_memory_usage, get_slowest_queries
+from opennem.db.pool import get_pool_metrics
+
+logger = logging.getLogger("opennem.api.admin")
+
+router = APIRouter(include_in_schema=False)
+
+
+class ClickHouseQueryProfileSchema(BaseModel):
+    query_id: str
+    fingerprint: str
+    kind: str
+    query: str
+    started_at: datetime
+    elapsed: float
+    rows: int
+    rows_read: int
+    bytes_read: int
+    memory_usage: int | None = None
+    error: str | None = None
+    error_code: int | None = None
+
+
+class ClickHouseQueryFingerprintSchema(BaseModel):
+    fingerprint: str
+    kind: str
+    query: str
+    count: int
+    errors: int
+    memory_limit_errors: int
+    total_elapsed: float
+    avg_elapsed: float
+    max_elapsed: float
+    rows_read: int
+    bytes_read: int
+    last_query_id: str | None = None
+
+
+class ClickHouseQueryProfilesSchema(BaseModel):
+    slowest: list[ClickHouseQueryProfileSchema]
+    fingerprints: list[ClickHouseQueryFingerprintSchema]
+
+
+@api_version(4)
+@router.get(
+    "/clickhouse/queries",
+    response_model=APIV4ResponseSchema[ClickHouseQueryProfilesSchema],
+    description="Slowest ClickHouse queries and the query shapes taking the most time",
+)
+async def clickhouse_query_profiles(
+    user: admin_user,
+    limit: int = Query(20, ge=1, le=1000, description="Queries and query shapes to return"),
+) -> APIV4ResponseSchema[ClickHouseQueryProfilesSchema]:
+    slowest = get_slowest_queries(limit)
+    fingerprints = get_fingerprint_stats(limit)
+
+    try:
+        memory_usage = await get_clickhouse_pool().run(
+            lambda client: get_query_log_memory_usage(client, [profile.query_id for profile in slowest])
+        )
+    except Exception as e:
+        logger.warning(f"Could not read memory usage from system.query_log: {e}")
+        memory_usage = {}
+
+    return APIV4ResponseSchema[ClickHouseQueryProfilesSchema](
+        data=ClickHouseQueryProfilesSchema(
+            slowest=[
+                ClickHouseQueryProfileSchema(**asdict(profile), memory_usage=memory_usage.get(profile.query_id))
+                for profile in slowest
+            ],
+            fingerprints=[
+                ClickHouseQueryFingerprintSchema(**asdict(stats), avg_elapsed=stats.avg_elapsed) for stats in fingerprints
+            ],
+        )
+    )
+
+
+@api_version(4)
+@router.get(
+    "/db/pools",
+    response_model=APIV4ResponseSchema[dict[str, dict[str, Any]]],
+    description="Checked out connections, queue depth and wait times of the database pools",
+)
+async def db_pool_metrics(user: admin_user) -> APIV4ResponseSchema[dict[str, dict[str, Any]]]:
+    return APIV4ResponseSchema[dict[str, dict[str, Any]]](data=get_pool_metrics())
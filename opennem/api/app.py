@@ -23,6 +23,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
 from opennem import settings
+from opennem.api.admin.router import router as admin_router
 from opennem.api.data.router import router as data_router
 from opennem.api.exceptions import OpennemBaseHttpException, OpennemExceptionResponse
 from opennem.api.facilities.router import router as facilities_router
@@ -42,7 +43,10 @@ from opennem.core.metric import METRIC_METADATA
 from opennem.core.time import INTERVALS, PERIODS
 from opennem.core.units import UNITS
 from opennem.db import get_read_session, get_scoped_read_session
+from opennem.db.clickhouse import close_clickhouse_pools
+from opennem.db.clickhouse.pool import ClickHouseQueryCancelled
 from opennem.db.models.opennem import FuelTech, Network, NetworkRegion
+from opennem.db.pool import close_asyncpg_pools
 from opennem.schema.opennem import FueltechSchema, OpennemErrorSchema
 from opennem.schema.time import TimeInterval, TimePeriod
 from opennem.schema.units import UnitDefinition
@@ -76,6 +80,8 @@ async def lifespan(app: FastAPI):
     yield
 
     # Shutdown logic
+    close_clickhouse_pools()
+    await close_asyncpg_pools()
 
 
 app = FastAPI(
@@ -149,6 +155,17 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> Openne
     )
 
 
+@app.exception_handler(ClickHouseQueryCancelled)
+async def clickhouse_query_cancelled_handler(request: Request, exc: ClickHouseQueryCancelled) -> OpennemExceptionResponse:
+    """The client has gone away so nobody reads this, 499 as nginx logs a client closed request"""
+    logger.info(f"{request.url.path}: {exc}")
+
+    return OpennemExceptionResponse(
+        status_code=499,
+        response_class=OpennemErrorSchema(error="Client closed request", success=False),
+    )
+
+
 @app.exception_handler(401)
 @app.exception_handler(403)
 async def http_type_exception_handler(request: Request, exc: HTTPException) -> OpennemExceptionResponse:
@@ -245,6 +262,7 @@ app.include_router(data_router, tags=["Data"], prefix="/data")
 app.include_router(market_router, tags=["Market"], prefix="/market")
 app.include_router(plans_router, tags=["Plans"], prefix="/plans")
 app.include_router(social_router, tags=["Social"], prefix="/social")
+app.include_router(admin_router, tags=["Admin"], prefix="/admin", include_in_schema=False)
 
 # new v4 routes
 try:
@@ -0,0 +1,114 @@
+"""
+Response cache keys for the v4 time series endpoints.
+
+Keyed on the request's parameters and the data version the aggregates publish (see
+opennem.db.clickhouse.data_version) rather than expiring on a fixed TTL:
+
+- a live request, or one whose range runs past the settled data, is keyed on the version so
+  it's served from cache until new intervals land and recomputed as soon as they do
+- a request that ends within the settled data isn't keyed on it, so it stays cached for as
+  long as the cache holds it
+- until a version is published (or if Redis is unavailable) requests are keyed on the
+  current network interval instead
+
+The ClickHouse client and the user are dependencies rather than parameters, so they're left
+out of the key apart from the user's plan, which decides the ranges an endpoint will serve.
+
+Responses are held for api_data_cache_expire but clients are only told to cache them for
+api_data_cache_max_age, as a live response is replaced whenever new data lands.
+"""
+
+import hashlib
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from functools import wraps
+from typing import Any
+
+from fastapi_cache.decorator import cache
+from fastapi_cache.types import KeyBuilder
+from starlette.requests import Request
+from starlette.responses import Response
+
+from opennem import settings
+from opennem.api.intervals import get_settled_interval
+from opennem.api.queries import QueryType
+from opennem.api.utils import get_api_network_from_code
+from opennem.users.schema import OpenNEMUser
+from opennem.utils.dates import get_last_completed_interval_for_network
+
+_UNKEYED_PARAMS = frozenset({"client", "user"})
+
+# the response fastapi-cache injects into the endpoint to set its cache headers on
+_CACHE_RESPONSE_PARAM = "__fastapi_cache_response"
+
+
+def _user_tier(user: OpenNEMUser | None) -> str:
+    if user is None:
+        return "anonymous"
+
+    if user.is_admin:
+        return "admin"
+
+    return user.plan.value
+
+
+def data_version_key_builder(query_type: QueryType) -> KeyBuilder:
+    """Cache key builder for an endpoint serving query_type for the network_code param"""
+
+    async def _key_builder(
+        func: Callable[..., Awaitable[Any]],
+        namespace: str = "",
+        *,
+        request: Request | None = None,
+        response: Response | None = None,
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+    ) -> str:
+        network = get_api_network_from_code(kwargs["network_code"])
+        date_end = kwargs.get("date_end")
+
+        # settled is naive network time, a tz-aware date_end (which the endpoint rejects) would
+        # otherwise raise comparing with it
+        if isinstance(date_end, datetime) and date_end.tzinfo is not None:
+            date_end = date_end.astimezone(network.get_fixed_offset()).replace(tzinfo=None)
+
+        settled = await get_settled_interval(kwargs.get("client"), network, query_type)
+
+        if settled is None:
+            version = get_last_completed_interval_for_network(network=network, tz_aware=False).isoformat()
+        elif date_end is not None and date_end <= settled:
+            version = "settled"
+        else:
+            version = settled.isoformat()
+
+        params = {k: v for k, v in sorted(kwargs.items()) if k not in _UNKEYED_PARAMS}
+        cache_key = hashlib.md5(  # noqa: S324
+            f"{func.__module__}:{func.__name__}:{_user_tier(kwargs.get('user'))}:{params}:{version}".encode()
+        ).hexdigest()
+
+        return f"{namespace}:{cache_key}"
+
+    return _key_builder
+
+
+def data_version_cache[**P, R](query_type: QueryType) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """fastapi-cache's cache decorator keyed on the data version for an endpoint serving query_type"""
+
+    def wrapper(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        cached = cache(expire=settings.api_data_cache_expire, key_builder=data_version_key_builder(query_type))(func)
+
+        @wraps(cached)
+        async def inner(*args: P.args, **kwargs: P.kwargs) -> R:
+            result = await cached(*args, **kwargs)
+            response = kwargs.get(_CACHE_RESPONSE_PARAM)
+
+            if isinstance(response, Response) and "Cache-Control" in response.headers:
+                response.headers["Cache-Control"] = f"max-age={settings.api_data_cache_max_age}"
+
+            return result  # type: ignore[return-value]
+
+        inner.__signature__ = cached.__signature__  # type: ignore[attr-defined]
+
+        return inner
+
+    return wrapper
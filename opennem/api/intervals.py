@@ -22,12 +22,14 @@ from typing import Any
 
 from opennem.api.queries import QUERY_CONFIGS, QueryType
 from opennem.db.clickhouse import execute_async
+from opennem.db.clickhouse.data_version import get_data_version
 from opennem.schema.network import NetworkSchema
 
 logger = logging.getLogger("opennem.api.intervals")
 
 # max(interval) only advances once per interval_size minutes, so a short TTL spares a CH
-# round-trip on every (cache-missed) request without serving a meaningfully stale bound.
+# round-trip on every request (the cache key builder reads it too) until a data version is
+# published, without serving a meaningfully stale bound.
 _CACHE_TTL_SECONDS = 30
 _latest_interval_cache: dict[tuple[str, str], tuple[float, datetime | None]] = {}
 
@@ -35,12 +37,21 @@ _latest_interval_cache: dict[tuple[str, str], tuple[float, datetime | None]] = {
 async def _get_latest_interval(client: Any, network: NetworkSchema, base_table: str) -> datetime | None:
     """Latest interval present in `base_table` for `network`, or None on empty/error.
 
-    Scoped to the last 7 days so the query stays bounded against the (interval-first)
-    primary key while still covering WEM, which publishes ~24h late. `max()` needs no
-    FINAL — dedup is irrelevant to the maximum timestamp. A table with no rows in the
+    Read from the data version the aggregate publishes after each run, which only changes
+    when new intervals land. Until one is published (or if Redis is unavailable) it's read
+    from ClickHouse directly and held for _CACHE_TTL_SECONDS.
+
+    The direct read is scoped to the last 7 days so the query stays bounded against the
+    (interval-first) primary key while still covering WEM, which publishes ~24h late. `max()`
+    needs no FINAL — dedup is irrelevant to the maximum timestamp. A table with no rows in the
     window (a multi-day ingestion outage) returns None and the caller falls back to its
     own date_end; that is harmless because such a table has no bleeding edge to exclude.
     """
+    latest = await get_data_version(base_table, network.get_network_codes())
+
+    if latest is not None:
+        return latest
+
     cache_key = (base_table, network.code)
     monotonic_now = time.monotonic()
     cached = _latest_interval_cache.get(cache_key)
@@ -67,6 +78,11 @@ async def _get_latest_interval(client: Any, network: NetworkSchema, base_table:
     return latest
 
 
+async def get_settled_interval(client: Any, network: NetworkSchema, query_type: QueryType) -> datetime | None:
+    """Exclusive bound of the settled intervals for a query type, None on empty/error"""
+    return await _get_latest_interval(client, network, QUERY_CONFIGS[query_type].base_table)
+
+
 async def cap_date_end_to_settled_interval(
     client: Any,
     network: NetworkSchema,
@@ -82,8 +98,7 @@ async def cap_date_end_to_settled_interval(
     endpoint 404s, which is the correct answer: an empty range beats serving a value we
     know is still settling.
     """
-    base_table = QUERY_CONFIGS[query_type].base_table
-    latest = await _get_latest_interval(client, network, base_table)
+    latest = await get_settled_interval(client, network, query_type)
     if latest is None:
         return date_end
     return min(date_end, latest)
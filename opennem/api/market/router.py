@@ -3,25 +3,26 @@ Market data router for OpenNEM API.
 """
 
 import logging
-import time
 from datetime import datetime
 from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query
-from fastapi_cache.decorator import cache
 from fastapi_versionizer import api_version
 
+from opennem.api.cache import data_version_cache
 from opennem.api.data.utils import validate_date_range
 from opennem.api.intervals import cap_date_end_to_settled_interval
 from opennem.api.queries import QueryType, get_timeseries_query
 from opennem.api.schema import std_error_responses
 from opennem.api.security import optional_user
-from opennem.api.timeseries import build_timeseries_response, format_timeseries_response
+from opennem.api.singleflight import execute_single_flight
+from opennem.api.timeseries import build_timeseries_response, format_timeseries_rows
 from opennem.api.utils import get_api_network_from_code, validate_metrics
 from opennem.core.grouping import PrimaryGrouping
 from opennem.core.metric import Metric
 from opennem.core.time_interval import Interval
-from opennem.db.clickhouse import execute_async, get_clickhouse_dependency
+from opennem.db.clickhouse import get_clickhouse_dependency
+from opennem.db.clickhouse.pool import ClickHouseQueryCancelled
 
 router = APIRouter()
 logger = logging.getLogger("opennem.api.market")
@@ -55,7 +56,7 @@ _SUPPORTED_METRICS = [
 
 @api_version(4)
 @router.get("/network/{network_code}", responses=std_error_responses())
-@cache(expire=60 * 5)
+@data_version_cache(QueryType.MARKET)
 async def get_network_data(
     network_code: Annotated[
         str,
@@ -125,12 +126,11 @@ async def get_network_data(
         network_region=network_region,
     )
 
-    start_time = time.time()
     try:
         logger.debug(query, params)
-        results = await execute_async(client, query, params)
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.debug(f"Query execution time: {elapsed_ms:.2f} ms")
+        results = await execute_single_flight(client, query, params)
+    except ClickHouseQueryCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error executing query: {e}")
         raise HTTPException(status_code=500, detail="Error executing query") from e
@@ -141,15 +141,14 @@ async def get_network_data(
             detail=f"No market data available for network {network_code} in the specified time range",
         )
 
-    result_dicts = [dict(zip(column_names, row, strict=True)) for row in results]
-
-    timeseries_list = format_timeseries_response(
+    timeseries_list = format_timeseries_rows(
         network=network.code,
         metrics=metrics,
         interval=interval,
         primary_grouping=primary_grouping,
         secondary_groupings=None,
-        results=result_dicts,
+        column_names=column_names,
+        rows=results,
     )
 
     return build_timeseries_response(timeseries_list)
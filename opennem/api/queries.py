@@ -20,14 +20,25 @@ The two-stage form separates "collapse the unit dimension at each raw
 interval" from "collapse the time dimension into the bucket", which is the
 only mathematically correct way to compute MW averages over arbitrary
 grouping levels.
+
+Both base tables are ReplacingMergeTree(version) so a key may have several versions of its
+row until a merge collapses them. Rather than reading with FINAL, which merges every part
+overlapping the range at read time, the inner SELECT reads from a `deduped` CTE taking the
+argMax(col, version) of only the columns the query needs per sorting key (wrapped in a tuple
+so a NULL in the latest version isn't skipped for an older value). Filters on sorting
+key columns are pushed into that CTE, filters on other columns (fueltech etc.) are applied
+after dedup so a superseded version can never match. `clickhouse_serving_use_final` (on by
+default until the dedup has been benchmarked against production data) reads with FINAL instead.
 """
 
 import logging
+import re
 from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime
 from enum import StrEnum
 
+from opennem import settings
 from opennem.api.data.schema import DataMetric
 from opennem.api.market.schema import MarketMetric
 from opennem.core.grouping import PrimaryGrouping, SecondaryGrouping
@@ -200,15 +211,87 @@ class QueryConfig:
     query_type: QueryType
     base_table: str
     plans: dict[MetricType, MetricPlan]
-
+    # ReplacingMergeTree sorting key of base_table - rows sharing it are versions of one row
+    key_columns: tuple[str, ...]
+    # the other columns of base_table, read as of the latest version of the row
+    value_columns: tuple[str, ...]
+
+
+UNIT_INTERVALS_KEY_COLUMNS = ("interval", "network_id", "network_region", "facility_code", "unit_code")
+UNIT_INTERVALS_VALUE_COLUMNS = (
+    "status_id",
+    "fueltech_id",
+    "fueltech_group_id",
+    "renewable",
+    "generated",
+    "energy",
+    "energy_storage",
+    "emissions",
+    "emission_factor",
+    "market_value",
+)
+
+MARKET_SUMMARY_KEY_COLUMNS = ("interval", "network_id", "network_region")
+MARKET_SUMMARY_VALUE_COLUMNS = (
+    "price",
+    "demand",
+    "demand_total",
+    "demand_gross",
+    "generation_renewable",
+    "demand_energy",
+    "demand_total_energy",
+    "demand_gross_energy",
+    "generation_renewable_energy",
+    "demand_market_value",
+    "demand_total_market_value",
+    "demand_gross_market_value",
+    "curtailment_solar_total",
+    "curtailment_wind_total",
+    "curtailment_total",
+    "curtailment_energy_solar_total",
+    "curtailment_energy_wind_total",
+    "curtailment_energy_total",
+    "generation_renewable_with_storage",
+    "generation_renewable_with_storage_energy",
+    "energy_imports",
+    "energy_exports",
+    "emissions_imports",
+    "emissions_exports",
+    "market_value_imports",
+    "market_value_exports",
+)
 
 QUERY_CONFIGS: dict[QueryType, QueryConfig] = {
-    QueryType.MARKET: QueryConfig(QueryType.MARKET, "market_summary", MARKET_METRIC_PLANS),  # type: ignore[arg-type]
-    QueryType.DATA: QueryConfig(QueryType.DATA, "unit_intervals", DATA_METRIC_PLANS),  # type: ignore[arg-type]
-    QueryType.FACILITY: QueryConfig(QueryType.FACILITY, "unit_intervals", DATA_METRIC_PLANS),  # type: ignore[arg-type]
+    QueryType.MARKET: QueryConfig(
+        QueryType.MARKET,
+        "market_summary",
+        MARKET_METRIC_PLANS,  # type: ignore[arg-type]
+        MARKET_SUMMARY_KEY_COLUMNS,
+        MARKET_SUMMARY_VALUE_COLUMNS,
+    ),
+    QueryType.DATA: QueryConfig(
+        QueryType.DATA,
+        "unit_intervals",
+        DATA_METRIC_PLANS,  # type: ignore[arg-type]
+        UNIT_INTERVALS_KEY_COLUMNS,
+        UNIT_INTERVALS_VALUE_COLUMNS,
+    ),
+    QueryType.FACILITY: QueryConfig(
+        QueryType.FACILITY,
+        "unit_intervals",
+        DATA_METRIC_PLANS,  # type: ignore[arg-type]
+        UNIT_INTERVALS_KEY_COLUMNS,
+        UNIT_INTERVALS_VALUE_COLUMNS,
+    ),
 }
 
 
+def _referenced_columns(columns: Sequence[str], expressions: Sequence[str]) -> list[str]:
+    """Columns (in table order) that appear as identifiers in any of the SQL expressions"""
+    text = " ".join(expressions)
+    return [col for col in columns if re.search(rf"\b{col}\b", text)]
+
+
 def get_timeseries_query(
     query_type: QueryType,
     network: NetworkSchema,
@@ -224,13 +307,18 @@ def get_timeseries_query(
     network_region: str | None = None,
     fueltech: list[str] | None = None,
     fueltech_group: list[str] | None = None,
+    use_final: bool | None = None,
 ) -> tuple[str, dict, list[str]]:
     """Build a CTE-based time-series query for the given parameters.
 
-    See module docstring for the structural design.
+    See module docstring for the structural design. use_final reads the base table with
+    FINAL rather than the argMax dedup, defaulting to settings.clickhouse_serving_use_final.
     """
     config = QUERY_CONFIGS[query_type]
 
+    if use_final is None:
+        use_final = settings.clickhouse_serving_use_final
+
     # ---- collect required inner columns (dedup by alias) ----
     inner_aliases: dict[str, str] = {}
     for m in metrics:
@@ -290,25 +378,29 @@ def get_timeseries_query(
         "date_end": date_end.replace(tzinfo=None) if isinstance(date_end, datetime) else date_end,
     }
 
-    where_inner: list[str] = [
+    # filters on the sorting key, which every version of a row shares
+    where_key: list[str] = [
         "network_id in %(network)s",
         f"{time_col} >= %(date_start)s",
         f"{time_col} < %(date_end)s",
     ]
     if facility_code:
-        where_inner.append("facility_code in %(facility_code)s")
+        where_key.append("facility_code in %(facility_code)s")
         params["facility_code"] = tuple(facility_code)
     if unit_code:
-        where_inner.append("unit_code in %(unit_code)s")
+        where_key.append("unit_code in %(unit_code)s")
         params["unit_code"] = tuple(unit_code)
     if network_region:
-        where_inner.append("network_region = %(network_region)s")
+        where_key.append("network_region = %(network_region)s")
         params["network_region"] = network_region
+
+    # filters on values, which can differ between versions of a row
+    where_value: list[str] = []
     if fueltech:
-        where_inner.append("fueltech_id in %(fueltech)s")
+        where_value.append("fueltech_id in %(fueltech)s")
         params["fueltech"] = tuple(fueltech)
     if fueltech_group:
-        where_inner.append("fueltech_group_id in %(fueltech_group)s")
+        where_value.append("fueltech_group_id in %(fueltech_group)s")
         params["fueltech_group"] = tuple(fueltech_group)
 
     # ---- SQL assembly ----
@@ -340,12 +432,32 @@ def get_timeseries_query(
     outer_group_by = ["interval", *outer_extra_groups] if outer_extra_groups else ["interval"]
     order_by_extra = [", " + ", ".join(outer_extra_groups)] if outer_extra_groups else [""]
 
+    if use_final:
+        source_cte = ""
+        inner_from = f"{config.base_table} FINAL"
+        where_inner = [*where_key, *where_value]
+    else:
+        dedup_columns = _referenced_columns(config.value_columns, [*inner_extra_groups, *inner_aliases.values(), *where_value])
+        dedup_select_lines = [*config.key_columns, *(f"argMax(tuple({col}), version).1 AS {col}" for col in dedup_columns)]
+        source_cte = f"""deduped AS (
+        SELECT
+            {", ".join(dedup_select_lines)}
+        FROM {config.base_table}
+        WHERE {" AND ".join(where_key)}
+        GROUP BY {", ".join(config.key_columns)}
+    ),
+    """
+        inner_from = "deduped"
+        where_inner = where_value
+
+    where_inner_sql = f"WHERE {' AND '.join(where_inner)}" if where_inner else ""
+
     sql = f"""
-    WITH inner_agg AS (
+    WITH {source_cte}inner_agg AS (
         SELECT
             {", ".join(inner_select_lines)}
-        FROM {config.base_table} FINAL
-        WHERE {" AND ".join(where_inner)}
+        FROM {inner_from}
+        {where_inner_sql}
         GROUP BY {", ".join(inner_group_by)}
     )
     SELECT
@@ -0,0 +1,190 @@
+"""
+Single-flight execution of API time series queries.
+
+When the 5 minute interval rolls over many clients ask for the same live series at once,
+before any response has been cached. Identical queries (the normalised SQL from
+get_timeseries_query and its params) are coalesced so one of them runs on ClickHouse and the
+rest await its rows:
+
+- within a process, concurrent callers share one in-flight execution
+- across API workers, the first to take a short Redis lock on the query runs it and writes
+  the rows to Redis for the others, which poll for them. Followers run the query themselves
+  if the lock goes away without a result (the query failed) or outlives the wait
+
+Redis errors fall back to in-process coalescing for a while. The shared execution isn't tied
+to any one request, so it isn't cancelled when the client that started it disconnects.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from contextlib import suppress
+from datetime import date, datetime
+from typing import Any
+
+import orjson
+from redis import asyncio as aioredis
+
+from opennem import settings
+from opennem.clients.redis import get_redis
+from opennem.db.clickhouse import execute_async, get_clickhouse_pool
+from opennem.db.clickhouse.pool import ClickHouseRequestClient
+
+logger = logging.getLogger("opennem.api.singleflight")
+
+_KEY_PREFIX = "opennem:singleflight:"
+
+# followers poll redis for the leader's rows this often
+_POLL_SECONDS = 0.05
+
+# rows only need to outlive the followers polling for them
+_RESULT_TTL_MS = 10_000
+
+# after a redis error only coalesce in process for this long
+_REDIS_RETRY_SECONDS = 30.0
+
+_in_flight: dict[str, asyncio.Future] = {}
+_redis_retry_at = 0.0
+
+
+def query_key(query: str, params: dict | None) -> str:
+    """Key of a query on its SQL with whitespace collapsed and its params"""
+    payload = orjson.dumps([" ".join(query.split()), params or {}], default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    return str(value)
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__date__" in value:
+            return date.fromisoformat(value["__date__"])
+    return value
+
+
+def encode_rows(rows: list) -> bytes:
+    return orjson.dumps(rows, default=_encode_value, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def decode_rows(data: bytes) -> list[tuple]:
+    return [tuple(_decode_value(value) for value in row) for row in orjson.loads(data)]
+
+
+def _get_redis() -> aioredis.Redis | None:
+    """Redis client, None when disabled or backing off after an error"""
+    if not settings.api_single_flight_redis or time.monotonic() < _redis_retry_at:
+        return None
+
+    return get_redis()
+
+
+def _redis_failed(e: Exception) -> None:
+    global _redis_retry_at
+
+    logger.warning(f"Single flight redis unavailable, coalescing in process only: {e}")
+    _redis_retry_at = time.monotonic() + _REDIS_RETRY_SECONDS
+
+
+async def _execute(query: str, params: dict | None) -> list:
+    return await execute_async(ClickHouseRequestClient(pool=get_clickhouse_pool()), query, params)
+
+
+async def _wait_for_result(redis: aioredis.Redis, lock_key: str, result_key: str) -> list | None:
+    """The leader's rows, or None if its lock goes away without them"""
+    deadline = time.monotonic() + settings.api_single_flight_lock_ttl
+
+    while time.monotonic() < deadline:
+        result = await redis.get(result_key)
+
+        if result is not None:
+            return decode_rows(result)
+
+        if not await redis.exists(lock_key):
+            # the leader writes its rows before releasing the lock
+            result = await redis.get(result_key)
+            return decode_rows(result) if result is not None else None
+
+        await asyncio.sleep(_POLL_SECONDS)
+
+    return None
+
+
+async def _execute_shared(key: str, query: str, params: dict | None) -> list:
+    """Run the query, or wait on another API worker running it"""
+    redis = _get_redis()
+
+    if redis is None:
+        return await _execute(query, params)
+
+    lock_key = f"{_KEY_PREFIX}lock:{key}"
+    result_key = f"{_KEY_PREFIX}result:{key}"
+    token = str(uuid.uuid4())
+
+    try:
+        leader = await redis.set(lock_key, token, nx=True, px=int(settings.api_single_flight_lock_ttl * 1000))
+
+        if not leader:
+            rows = await _wait_for_result(redis, lock_key, result_key)
+
+            if rows is not None:
+                logger.debug(f"Coalesced query {key[:12]} onto another worker")
+                return rows
+
+            return await _execute(query, params)
+    except Exception as e:
+        _redis_failed(e)
+        return await _execute(query, params)
+
+    try:
+        rows = await _execute(query, params)
+
+        try:
+            await redis.set(result_key, encode_rows(rows), px=_RESULT_TTL_MS)
+        except Exception as e:
+            _redis_failed(e)
+
+        return rows
+    finally:
+        with suppress(Exception):
+            if await redis.get(lock_key) in (token, token.encode()):
+                await redis.delete(lock_key)
+
+
+def _forget(key: str, future: asyncio.Future) -> None:
+    if _in_flight.get(key) is future:
+        del _in_flight[key]
+
+    # every caller may have gone away, don't leave the error unretrieved
+    if not future.cancelled():
+        future.exception()
+
+
+async def execute_single_flight(client: Any, query: str, params: dict | None = None) -> list:
+    """
+    execute_async for a time series query, coalesced with identical queries running at the
+    same time. client is only used when single flight is disabled.
+    """
+    if not settings.api_single_flight:
+        return await execute_async(client, query, params)
+
+    key = query_key(query, params)
+    future = _in_flight.get(key)
+
+    if future is None:
+        future = asyncio.ensure_future(_execute_shared(key, query, params))
+        _in_flight[key] = future
+        future.add_done_callback(lambda f: _forget(key, f))
+    else:
+        logger.debug(f"Coalesced query {key[:12]} onto an in-flight execution")
+
+    return await asyncio.shield(future)
@@ -2,14 +2,16 @@
 Time series schemas and response formatting for OpenNEM API.
 
 This module contains unified schemas and response formatting logic for
-time series data across both market and data endpoints.
+time series data across both market and data endpoints. Query results are formatted
+column-wise with Polars, only dropping to Python to build the output lists.
 """
 
 import logging
 from collections.abc import Sequence
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Any
 
+import polars as pl
 from pydantic import ConfigDict, Field, computed_field, model_validator
 
 from opennem.api.utils import get_api_network_from_code
@@ -172,163 +174,188 @@ def _build_label_key_and_labels(
     return ("|".join(parts) if parts else "total"), labels
 
 
-# Intervals with a constant width, where the next bucket is a pure offset from the last.
-_FIXED_INTERVAL_STEP = {
-    Interval.INTERVAL: timedelta(minutes=5),
-    Interval.HOUR: timedelta(hours=1),
-    Interval.DAY: timedelta(days=1),
-    Interval.WEEK: timedelta(days=7),
+# Polars duration of each interval's buckets. Calendar intervals have no constant width, but
+# every bucket start is month-aligned, so the next one is a whole number of months on from the last.
+_INTERVAL_DURATION = {
+    Interval.INTERVAL: "5m",
+    Interval.HOUR: "1h",
+    Interval.DAY: "1d",
+    Interval.WEEK: "1w",
+    Interval.MONTH: "1mo",
+    Interval.QUARTER: "3mo",
+    Interval.SEASON: "3mo",
+    Interval.YEAR: "12mo",
+    Interval.FINANCIAL_YEAR: "12mo",
 }
 
-# Calendar intervals have no constant width, but every bucket start is month-aligned, so the
-# next one is a whole number of months on from the last.
-_CALENDAR_INTERVAL_MONTHS = {
-    Interval.MONTH: 1,
-    Interval.QUARTER: 3,
-    Interval.SEASON: 3,
-    Interval.YEAR: 12,
-    Interval.FINANCIAL_YEAR: 12,
-}
+# index of a row's series within the response, in order of first appearance
+_GROUP_COL = "__group"
+
+# marks the rows that came from the query rather than gap filling
+_PRESENT_COL = "__present"
+
 
+def _group_columns(
+    primary_grouping: PrimaryGrouping,
+    secondary_groupings: Sequence[SecondaryGrouping] | None,
+    facility_code: str | list[str] | None,
+) -> list[str]:
+    """Result columns that split the rows into series."""
+    if facility_code:
+        return ["unit_code"]
 
-def _add_months(ts: datetime, months: int) -> datetime:
-    """Advance a month-aligned bucket start by whole months."""
-    month_index = ts.month - 1 + months
-    return ts.replace(year=ts.year + month_index // 12, month=month_index % 12 + 1)
+    columns = ["network_region"] if primary_grouping == PrimaryGrouping.NETWORK_REGION else []
 
+    return columns + [_GROUPING_COL[g] for g in secondary_groupings or []]
 
-def _expected_buckets(interval: Interval, first: datetime, last: datetime) -> list[datetime]:
-    """Every bucket that should sit between `first` and `last` inclusive."""
-    step = _FIXED_INTERVAL_STEP.get(interval)
-    months = _CALENDAR_INTERVAL_MONTHS.get(interval)
 
-    if step is None and months is None:
-        return []
+def _assign_groups(
+    frame: pl.DataFrame,
+    primary_grouping: PrimaryGrouping,
+    secondary_groupings: Sequence[SecondaryGrouping] | None,
+    facility_code: str | list[str] | None,
+) -> tuple[pl.DataFrame, list[tuple[str, dict[str, Any]]]]:
+    """Tag each row with its series, returning the label key and labels of each series.
+
+    Label keys are built in Python from the distinct grouping values only, so they match the
+    `str()` of each value, and values with the same key share a series.
+    """
+    group_columns = _group_columns(primary_grouping, secondary_groupings, facility_code)
+
+    if not group_columns:
+        return frame.with_columns(pl.lit(0, dtype=pl.UInt32).alias(_GROUP_COL)), [("total", {})]
+
+    distinct = frame.select(group_columns).unique(maintain_order=True)
+    groups: list[tuple[str, dict[str, Any]]] = []
+    group_index: dict[str, int] = {}
+    group_ids: list[int] = []
 
-    buckets: list[datetime] = []
-    ts = first
+    for values in distinct.iter_rows():
+        label_key, labels = _build_label_key_and_labels(
+            dict(zip(group_columns, values, strict=True)), primary_grouping, secondary_groupings, facility_code
+        )
+
+        if label_key not in group_index:
+            group_index[label_key] = len(groups)
+            groups.append((label_key, labels))
+
+        group_ids.append(group_index[label_key])
 
-    while ts <= last:
-        buckets.append(ts)
-        ts = ts + step if step is not None else _add_months(ts, months)  # type: ignore[arg-type]
+    distinct = distinct.with_columns(pl.Series(_GROUP_COL, group_ids, dtype=pl.UInt32))
+    frame = frame.join(distinct, on=group_columns, how="left", nulls_equal=True, maintain_order="left")
 
-    return buckets
+    return frame, groups
 
 
-def _fill_interior_gaps(grouped: dict[str, dict[str, Any]], interval: Interval) -> None:
-    """Insert explicit `(bucket, None)` points for interior buckets a series is missing.
+def _fill_interior_gaps(frame: pl.DataFrame, interval: Interval) -> pl.DataFrame:
+    """Add rows with null metrics for interior buckets a series is missing.
 
     A series that carries no row for a bucket inside its own lifetime is reporting "no data",
     which is a different fact from "ran and generated nothing" (an explicit 0). Omitting the
     point leaves a consumer unable to tell the two apart, or to tell either from
     not-yet-commissioned. Only the interior is filled — nothing is invented before a unit's
     first reading or after its last, so commissioning and retirement edges stay untouched (#615).
+
+    Takes and returns a frame sorted by series and interval. Upsampling drops rows that aren't
+    on their series' bucket grid, so if any are the missing buckets are joined in instead.
     """
-    for g in grouped.values():
-        data = g["data"]
+    duration = _INTERVAL_DURATION.get(interval)
+
+    if duration is None or frame.is_empty():
+        return frame
 
-        if len(data) < 2:
-            continue
+    filled = frame.with_columns(pl.lit(True).alias(_PRESENT_COL)).upsample(
+        "interval", every=duration, group_by=_GROUP_COL, maintain_order=True
+    )
 
-        expected = _expected_buckets(interval, data[0][0], data[-1][0])
+    if filled.get_column(_PRESENT_COL).count() == frame.height:
+        return filled.drop(_PRESENT_COL)
 
-        if len(expected) == len(data):
-            continue
+    expected = (
+        frame.group_by(_GROUP_COL)
+        .agg(pl.col("interval").min().alias("first"), pl.col("interval").max().alias("last"))
+        .select(_GROUP_COL, pl.datetime_ranges("first", "last", duration).alias("interval"))
+        .explode("interval")
+    )
+    missing = expected.join(frame.select(_GROUP_COL, "interval"), on=[_GROUP_COL, "interval"], how="anti")
 
-        present = {ts for ts, _ in data}
-        data.extend((ts, None) for ts in expected if ts not in present)
-        data.sort(key=lambda x: x[0])
+    return pl.concat([frame, missing], how="diagonal_relaxed").sort([_GROUP_COL, "interval"], maintain_order=True)
 
 
-def format_timeseries_response(
+def _format_timeseries_frame(
     network: str,
     metrics: Sequence[MetricType],
     interval: Interval,
     primary_grouping: PrimaryGrouping,
     secondary_groupings: Sequence[SecondaryGrouping] | None,
-    results: Sequence[dict[str, Any]],
+    frame: pl.DataFrame,
     facility_code: str | list[str] | None = None,
 ) -> list[dict[str, Any]]:
-    """
-    Format time series query results into plain dicts ready for orjson serialization.
+    """Format a frame of query results, grouping, sorting and gap filling it once for all metrics."""
+    if frame.is_empty():
+        for metric in metrics:
+            logger.warning(f"No grouped results for metric {metric.value.lower()}")
+
+        return []
 
-    Returns list of TimeSeries-shaped dicts, one per metric.
-    """
     network_obj = get_api_network_from_code(network)
     tz_offset = network_obj.get_fixed_offset()
     tz_offset_str = network_obj.get_offset_string()
+    # the offset as datetime.isoformat() renders it
+    tz_suffix = datetime(2000, 1, 1, tzinfo=tz_offset).isoformat()[19:]
 
-    # Pre-convert all interval values to tz-aware datetimes once
-    for row in results:
-        iv = row["interval"]
-        if isinstance(iv, datetime):
-            row["interval"] = iv.replace(tzinfo=tz_offset)
-        else:
-            row["interval"] = datetime.combine(iv, datetime.min.time(), tzinfo=tz_offset)
-
-    timeseries_list: list[dict[str, Any]] = []
-
-    for metric in metrics:
-        metric_name = metric.value.lower()
-        meta = get_metric_metadata(metric)
-
-        # --- group rows ---
-        grouped: dict[str, dict[str, Any]] = {}
+    # intervals are in network time. dates are buckets starting at midnight
+    interval_col = pl.col("interval")
+    interval_dtype = frame.schema["interval"]
 
-        for row in results:
-            label_key, labels = _build_label_key_and_labels(row, primary_grouping, secondary_groupings, facility_code)
-
-            if label_key not in grouped:
-                grouped[label_key] = {
-                    "name": f"{metric_name}_{label_key}",
-                    "columns": labels,
-                    "data": [],
-                }
+    if isinstance(interval_dtype, pl.Datetime) and interval_dtype.time_zone:
+        interval_col = interval_col.dt.replace_time_zone(None)
 
-            value = None
-            if metric_name in row and row[metric_name] is not None:
-                value = float(row[metric_name])
-            elif metric_name not in row:
-                logger.warning(f"Metric '{metric_name}' not in row. Keys: {list(row.keys())}")
+    frame = frame.with_columns(interval_col.cast(pl.Datetime("us")))
 
-            grouped[label_key]["data"].append((row["interval"], value))
+    frame, groups = _assign_groups(frame, primary_grouping, secondary_groupings, facility_code)
+    frame = _fill_interior_gaps(frame.sort([_GROUP_COL, "interval"], maintain_order=True), interval)
 
-        # sort + filter empty
-        for g in grouped.values():
-            g["data"].sort(key=lambda x: x[0])
+    # series mostly share their intervals, so only format each distinct one
+    distinct_intervals = frame.get_column("interval").unique().sort()
+    interval_strings = (distinct_intervals.dt.strftime("%Y-%m-%dT%H:%M:%S") + tz_suffix).to_list()
+    interval_index = frame.select(pl.col("interval").rank("dense").cast(pl.Int64) - 1).to_series().to_list()
+    timestamps = [interval_strings[i] for i in interval_index]
+    group_sizes = frame.get_column(_GROUP_COL).rle().struct.field("len").to_list()
 
-        grouped = {k: v for k, v in grouped.items() if v["data"]}
+    date_start = frame.get_column("interval").min().replace(tzinfo=tz_offset).isoformat()  # type: ignore[union-attr]
+    date_end = frame.get_column("interval").max().replace(tzinfo=tz_offset).isoformat()  # type: ignore[union-attr]
 
-        if not grouped:
-            logger.warning(f"No grouped results for metric {metric_name}")
-            continue
+    groupings: list[str] = []
+    if secondary_groupings:
+        groupings = [primary_grouping.value] + [g.value.lower() for g in secondary_groupings]
 
-        _fill_interior_gaps(grouped, interval)
+    timeseries_list: list[dict[str, Any]] = []
 
-        # date range from actual data
-        all_ts = [ts for g in grouped.values() for ts, _ in g["data"]]
-        date_start = min(all_ts)
-        date_end = max(all_ts)
+    for metric in metrics:
+        metric_name = metric.value.lower()
+        meta = get_metric_metadata(metric)
 
-        # build groupings list
-        groupings: list[str] = []
-        if secondary_groupings:
-            groupings = [primary_grouping.value] + [g.value.lower() for g in secondary_groupings]
+        if metric_name in frame.columns:
+            values = frame.get_column(metric_name).cast(pl.Float64).to_list()
+        else:
+            logger.warning(f"Metric '{metric_name}' not in results. Columns: {[c for c in frame.columns if c != _GROUP_COL]}")
+            values = [None] * frame.height
 
-        # build result dicts (no Pydantic)
         result_dicts = []
-        for g in grouped.values():
-            # convert (datetime, value) tuples to [iso_string, value] for JSON
-            data_out = [[ts.isoformat(), v] for ts, v in g["data"]]
+        offset = 0
+
+        for (label_key, labels), size in zip(groups, group_sizes, strict=True):
             result_dicts.append(
                 {
-                    "name": g["name"],
-                    "date_start": date_start.isoformat(),
-                    "date_end": date_end.isoformat(),
-                    "columns": g["columns"],
-                    "data": data_out,
+                    "name": f"{metric_name}_{label_key}",
+                    "date_start": date_start,
+                    "date_end": date_end,
+                    "columns": dict(labels),
+                    "data": list(map(list, zip(timestamps[offset : offset + size], values[offset : offset + size], strict=True))),
                 }
             )
+            offset += size
 
         timeseries_list.append(
             {
@@ -336,8 +363,8 @@ def format_timeseries_response(
                 "metric": metric_name,
                 "unit": meta.unit,
                 "interval": interval.value,
-                "date_start": date_start.isoformat(),
-                "date_end": date_end.isoformat(),
+                "date_start": date_start,
+                "date_end": date_end,
                 "groupings": groupings,
                 "results": result_dicts,
                 "network_timezone_offset": tz_offset_str,
@@ -347,6 +374,46 @@ def format_timeseries_response(
     return timeseries_list
 
 
+def format_timeseries_rows(
+    network: str,
+    metrics: Sequence[MetricType],
+    interval: Interval,
+    primary_grouping: PrimaryGrouping,
+    secondary_groupings: Sequence[SecondaryGrouping] | None,
+    column_names: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    facility_code: str | list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Format the rows of a time series query, as returned by ClickHouse with the column names
+    from get_timeseries_query, into plain dicts ready for orjson serialization.
+
+    Returns list of TimeSeries-shaped dicts, one per metric.
+    """
+    frame = pl.DataFrame(list(rows), schema=list(column_names), orient="row", infer_schema_length=None, strict=False)
+
+    return _format_timeseries_frame(network, metrics, interval, primary_grouping, secondary_groupings, frame, facility_code)
+
+
+def format_timeseries_response(
+    network: str,
+    metrics: Sequence[MetricType],
+    interval: Interval,
+    primary_grouping: PrimaryGrouping,
+    secondary_groupings: Sequence[SecondaryGrouping] | None,
+    results: Sequence[dict[str, Any]],
+    facility_code: str | list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Format time series query results into plain dicts ready for orjson serialization.
+
+    Returns list of TimeSeries-shaped dicts, one per metric.
+    """
+    frame = pl.DataFrame(list(results), infer_schema_length=None, strict=False)
+
+    return _format_timeseries_frame(network, metrics, interval, primary_grouping, secondary_groupings, frame, facility_code)
+
+
 def build_timeseries_response(timeseries_list: list[dict[str, Any]]) -> dict[str, Any]:
     """
     Build a plain dict payload for the API response.
@@ -15,6 +15,7 @@ import typer
 from rich.console import Console
 
 from opennem import settings
+from opennem.core.archive_cache import get_archive_cache
 from opennem.core.crawlers.cli import crawl_app
 from opennem.db.clickhouse.migrations.cli import ch_app
 from opennem.db.load_fixtures import load_bom_stations_json, load_fixtures, load_fueltechs
@@ -29,6 +30,7 @@ db_app = typer.Typer(help="Database management commands")
 import_app = typer.Typer(help="Data import commands")
 export_app = typer.Typer(help="Data export commands")
 task_app = typer.Typer(help="Task management commands")
+cache_app = typer.Typer(help="NEMWeb archive cache commands")
 
 # Add sub-applications
 app.add_typer(db_app, name="db")
@@ -37,6 +39,7 @@ app.add_typer(export_app, name="export")
 app.add_typer(task_app, name="task")
 app.add_typer(crawl_app, name="crawl")
 app.add_typer(ch_app, name="ch")
+app.add_typer(cache_app, name="cache")
 
 # Setup logging
 logger = logging.getLogger("opennem.cli")
@@ -290,6 +293,84 @@ async def inspect_command(url: str) -> None:
         raise typer.Exit(1) from e
 
 
+# Task commands
+@task_app.command("unit-intervals-backlog")
+@async_to_sync
+async def unit_intervals_backlog_command(
+    start: str | None = typer.Option(None, help="Start date (YYYY-MM-DD), defaults to when network data was first seen"),
+    network: str | None = typer.Option(None, help="Network code, defaults to all networks"),
+    workers: int | None = typer.Option(None, help="Number of workers, defaults to settings.aggregate_backlog_workers"),
+    restart: bool = typer.Option(False, help="Discard checkpoints from previous runs and start over"),
+) -> None:
+    """Backfill unit_intervals in ClickHouse. Resumes from where a previous run stopped."""
+    from datetime import datetime
+
+    from opennem.aggregates.unit_intervals import run_unit_intervals_backlog
+    from opennem.core.networks import network_from_network_code
+
+    try:
+        await run_unit_intervals_backlog(
+            start_date=datetime.fromisoformat(start) if start else None,
+            network=network_from_network_code(network) if network else None,
+            workers=workers,
+            restart=restart,
+        )
+    except Exception as e:
+        logger.error(f"Failed to run unit intervals backlog: {e}")
+        raise typer.Exit(1) from e
+
+
+@task_app.command("interconnector-intervals-backlog")
+@async_to_sync
+async def interconnector_intervals_backlog_command(
+    start: str | None = typer.Option(None, help="Start date (YYYY-MM-DD), defaults to when NEM data was first seen"),
+    workers: int | None = typer.Option(None, help="Number of workers, defaults to settings.aggregate_backlog_workers"),
+    restart: bool = typer.Option(False, help="Discard checkpoints from previous runs and start over"),
+) -> None:
+    """Backfill interconnector_intervals in ClickHouse. Resumes from where a previous run stopped."""
+    from datetime import datetime
+
+    from opennem.aggregates.interconnector_intervals import run_interconnector_intervals_backlog
+
+    try:
+        await run_interconnector_intervals_backlog(
+            start_date=datetime.fromisoformat(start) if start else None,
+            workers=workers,
+            restart=restart,
+        )
+    except Exception as e:
+        logger.error(f"Failed to run interconnector intervals backlog: {e}")
+        raise typer.Exit(1) from e
+
+
+# Archive cache commands
+@cache_app.command("info")
+def cache_info_command() -> None:
+    """Show the location and size of the NEMWeb archive cache."""
+    cache = get_archive_cache()
+    files, size = cache.usage()
+
+    console.print(f"Archive cache at {cache.cache_dir}")
+    console.print(f"{files} files, {size / 1024 / 1024:,.1f}MB of {cache.max_bytes / 1024 / 1024:,.0f}MB")
+
+
+@cache_app.command("prune")
+def cache_prune_command(
+    max_size: int | None = typer.Option(None, help="Prune down to this many MB, defaults to settings.archive_cache_max_bytes"),
+) -> None:
+    """Evict least recently used files from the NEMWeb archive cache."""
+    cache = get_archive_cache()
+    max_bytes = max_size * 1024 * 1024 if max_size is not None else None
+
+    try:
+        removed_files, removed_bytes = cache.prune(max_bytes=max_bytes)
+    except Exception as e:
+        logger.error(f"Failed to prune archive cache: {e}")
+        raise typer.Exit(1) from e
+
+    console.print(f"[green]Removed {removed_files} files ({removed_bytes / 1024 / 1024:,.1f}MB)[/green]")
+
+
 # Add the crawl command from core.crawlers.cli
 # app.command(name="crawl")(cmd_crawl_cli)
 
@@ -0,0 +1,36 @@
+"""
+Async Redis client for the request path and aggregate writers.
+
+Unlike opennem.tasks.broker.get_redis_pool, which opens an arq pool per call, this keeps one
+client per event loop with short timeouts so an unreachable Redis fails fast for callers that
+fall back to working without it.
+"""
+
+import asyncio
+
+from redis import asyncio as aioredis
+
+from opennem import settings
+
+_REDIS_TIMEOUT_SECONDS = 1
+
+_redis: tuple[asyncio.AbstractEventLoop, aioredis.Redis] | None = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Redis client for the running event loop"""
+    global _redis
+
+    loop = asyncio.get_running_loop()
+
+    if _redis is None or _redis[0] is not loop:
+        _redis = (
+            loop,
+            aioredis.from_url(
+                str(settings.redis_url),
+                socket_connect_timeout=_REDIS_TIMEOUT_SECONDS,
+                socket_timeout=_REDIS_TIMEOUT_SECONDS,
+            ),
+        )
+
+    return _redis[1]
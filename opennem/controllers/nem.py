@@ -8,11 +8,12 @@ from collections.abc import Hashable
 from datetime import timedelta
 from typing import Any
 
-import pandas as pd
+import polars as pl
 from sqlalchemy.dialects.postgresql import insert
 
 from opennem.controllers.schema import ControllerReturn
-from opennem.core.battery import HISTORIC_UNIT_ALIASES, get_battery_unit_map
+from opennem.core.battery import HISTORIC_UNIT_ALIASES, BatteryUnitMap, get_battery_unit_map
+from opennem.core.energy_engine import calculate_interval_energy
 from opennem.core.networks import NetworkNEM
 from opennem.core.normalizers import clean_float
 from opennem.core.parsers.aemo.mms import AEMOTableSchema, AEMOTableSet
@@ -41,131 +42,131 @@ FACILITY_SCADA_COLUMN_NAMES = [
 # Helpers
 
 
-async def generate_facility_scada(
-    records: list[dict[str, Any]],
+def _battery_unit_map_frame(battery_unit_map: dict[str, BatteryUnitMap]) -> pl.DataFrame:
+    """Mapping frame of bidirectional battery codes to their charge and discharge units"""
+    return pl.DataFrame(
+        {
+            "facility_code": list(battery_unit_map.keys()),
+            "charge_unit": [m.charge_unit for m in battery_unit_map.values()],
+            "discharge_unit": [m.discharge_unit for m in battery_unit_map.values()],
+        },
+        schema={"facility_code": pl.String, "charge_unit": pl.String, "discharge_unit": pl.String},
+    )
+
+
+_HISTORIC_UNIT_ALIAS_FRAME = pl.DataFrame(
+    {"facility_code": list(HISTORIC_UNIT_ALIASES.keys()), "alias_code": list(HISTORIC_UNIT_ALIASES.values())},
+    schema={"facility_code": pl.String, "alias_code": pl.String},
+)
+
+
+async def generate_facility_scada_frame(
+    records: list[dict[str, Any]] | pl.DataFrame,
     network: NetworkSchema = NetworkNEM,
     interval_field: str = "settlementdate",
     facility_code_field: str = "duid",
     power_field: str = "scadavalue",
-    energy_field: str | None = None,
     energy_storage_field: str | None = None,
     is_forecast: bool = False,
-) -> list[dict[Hashable, Any]]:
-    """Optimized facility scada generator"""
-
-    df = pd.DataFrame().from_records(records)
-
-    column_renames = {
-        interval_field: "interval",
-        power_field: "generated",
-        facility_code_field: "facility_code",
-    }
-
-    if energy_field:
-        column_renames[energy_field] = "energy"
-    else:
-        df["energy"] = None
-
-    if energy_storage_field:
-        column_renames[energy_storage_field] = "energy_storage"
-    else:
-        df["energy_storage"] = None
-
-    df = df.rename(columns=column_renames)
-
-    df["network_id"] = network.code
-    df["is_forecast"] = is_forecast
-    df["eoi_quantity"] = None
-    df["energy_quality_flag"] = 0
+) -> pl.DataFrame:
+    """Optimized facility scada generator
+
+    Takes either records or the columnar frame of an MMS table and returns a frame with
+    FACILITY_SCADA_COLUMN_NAMES. Battery splitting and historic alias expansion are done as
+    joins against small mapping frames rather than per row.
+    """
+    df = records if isinstance(records, pl.DataFrame) else pl.from_dicts(records, infer_schema_length=None)
+
+    if df.is_empty():
+        return pl.DataFrame(schema=FACILITY_SCADA_COLUMN_NAMES)
+
+    columns = [
+        pl.col(interval_field).alias("interval"),
+        pl.col(facility_code_field).cast(pl.String).alias("facility_code"),
+        pl.col(power_field).alias("generated"),
+        pl.col(energy_storage_field).alias("energy_storage") if energy_storage_field else pl.lit(None).alias("energy_storage"),
+    ]
+
+    df = df.select(columns).with_columns(
+        pl.lit(network.code).alias("network_id"),
+        pl.lit(is_forecast).alias("is_forecast"),
+        pl.lit(None).alias("eoi_quantity"),
+        pl.lit(0).alias("energy_quality_flag"),
+        pl.col("generated").cast(pl.Float64, strict=False).fill_null(0).fill_nan(0),
+    )
 
     # cast dates
-    df.interval = pd.to_datetime(df.interval)
-
-    df.generated = pd.to_numeric(df.generated)
-    df["generated"] = df["generated"].fillna(0)
-
-    df = df[FACILITY_SCADA_COLUMN_NAMES]
+    if df.schema["interval"] == pl.String:
+        df = df.with_columns(pl.col("interval").str.to_datetime(time_unit="us"))
 
     # Get battery unit mappings
     battery_unit_map = await get_battery_unit_map()
+    battery_map_frame = _battery_unit_map_frame(battery_unit_map)
+    charge_units = battery_map_frame.get_column("charge_unit")
+
+    # Create copies of battery records split into charge and discharge units. The original
+    # bidirectional records are kept
+    battery_copies = (
+        df.join(battery_map_frame, on="facility_code", how="inner", maintain_order="left")
+        .with_columns(
+            pl.when(pl.col("generated") < 0)
+            .then(pl.col("charge_unit"))
+            .otherwise(pl.col("discharge_unit"))
+            .alias("facility_code")
+        )
+        .with_columns(
+            pl.when(pl.col("facility_code").is_in(charge_units.implode()))
+            .then(pl.col("generated").abs())
+            .otherwise(pl.col("generated"))
+        )
+        .drop("charge_unit", "discharge_unit")
+    )
 
-    def is_battery_unit(row) -> bool:
-        facility_code = row["facility_code"]
-        return facility_code in battery_unit_map
-
-    # Create copies of battery records for splitting
-    battery_mask = df.apply(is_battery_unit, axis=1)
-    battery_copies = df.loc[battery_mask].copy()
-    battery_copies["battery_copy"] = True
-
-    # Add battery_copy field to original data (False for all)
-    df["battery_copy"] = False
-
-    # Combine original data with battery copies
-    if len(battery_copies) > 0:
-        df = pd.concat([df, battery_copies], ignore_index=True)
-
-    # Define the original mapping functions
-    def map_battery_code(row):
-        facility_code = row["facility_code"]
-        generated = row["generated"]
-
-        if facility_code in battery_unit_map:
-            battery_map = battery_unit_map[facility_code]
-            if generated < 0:
-                return battery_map.charge_unit
-            else:
-                return battery_map.discharge_unit
-        return facility_code
-
-    def map_battery_generation(row):
-        facility_code = row["facility_code"]
-        generated = row["generated"]
-
-        for _, battery_map in battery_unit_map.items():
-            if facility_code == battery_map.charge_unit:
-                return abs(generated)
-
-        return generated
-
-    # Apply the mapping functions only to the battery copies
-    battery_copy_mask = df["battery_copy"]
-    df.loc[battery_copy_mask, "facility_code"] = df.loc[battery_copy_mask].apply(map_battery_code, axis=1)
-    df.loc[battery_copy_mask, "generated"] = df.loc[battery_copy_mask].apply(map_battery_generation, axis=1)
-
-    # Drop the battery_copy field
-    df = df.drop(columns=["battery_copy"])
+    df = pl.concat([df, battery_copies])
 
     # Retired single-direction duids are carried forward under the paired gen/load codes
     # we model as units. Emit a copy rather than renaming, so the original aemo code stays
     # in facility_scada and a re-crawl of pre-2026-02 data heals the derived series (#603).
-    def is_alias_unit(row) -> bool:
-        return row["facility_code"] in HISTORIC_UNIT_ALIASES
-
-    def map_alias_code(row) -> str:
-        return HISTORIC_UNIT_ALIASES[row["facility_code"]]
-
-    alias_copies = df.loc[df.apply(is_alias_unit, axis=1)].copy()
+    alias_copies = (
+        df.join(_HISTORIC_UNIT_ALIAS_FRAME, on="facility_code", how="inner", maintain_order="left")
+        .with_columns(pl.col("alias_code").alias("facility_code"))
+        .drop("alias_code")
+    )
 
-    if len(alias_copies) > 0:
-        alias_copies["facility_code"] = alias_copies.apply(map_alias_code, axis=1)
-        df = pd.concat([df, alias_copies], ignore_index=True)
+    df = pl.concat([df, alias_copies])
 
     # fill in energies
-    df["energy"] = df.generated / (60 / network.interval_size)
+    df = df.with_columns((pl.col("generated") / (60 / network.interval_size)).alias("energy"))
 
-    # set the index
-    df.set_index(["interval", "network_id", "facility_code", "is_forecast"], inplace=True)
-
-    # @NOTE optimized way to drop duplicates
-    df_deduped: pd.DataFrame = df[~df.index.duplicated(keep="last")]  # type: ignore
+    # drop duplicates keeping the last record for each primary key
+    df = df.unique(subset=["interval", "network_id", "facility_code", "is_forecast"], keep="last", maintain_order=True)
 
     # reorder columns
-    df_reset = df_deduped.reset_index(inplace=False)  # type: ignore
-    df_final = df_reset[FACILITY_SCADA_COLUMN_NAMES]  # type: ignore
-    clean_records = df_final.to_dict("records")  # type: ignore
+    return df.select(FACILITY_SCADA_COLUMN_NAMES)
 
-    return clean_records
+
+async def generate_facility_scada(
+    records: list[dict[str, Any]] | pl.DataFrame,
+    network: NetworkSchema = NetworkNEM,
+    interval_field: str = "settlementdate",
+    facility_code_field: str = "duid",
+    power_field: str = "scadavalue",
+    energy_field: str | None = None,
+    energy_storage_field: str | None = None,
+    is_forecast: bool = False,
+) -> list[dict[Hashable, Any]]:
+    """Facility scada generator returning records. See generate_facility_scada_frame"""
+    df = await generate_facility_scada_frame(
+        records,
+        network=network,
+        interval_field=interval_field,
+        facility_code_field=facility_code_field,
+        power_field=power_field,
+        energy_storage_field=energy_storage_field,
+        is_forecast=is_forecast,
+    )
+
+    return df.to_dicts()
 
 
 # Processors
@@ -485,64 +486,69 @@ async def process_trading_regionsum(table: AEMOTableSchema) -> ControllerReturn:
 
 
 async def process_unit_scada_optimized(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
+    cr = ControllerReturn(total_records=table.num_records)
 
-    records = await generate_facility_scada(
-        table.records,  # type:ignore
+    records = await generate_facility_scada_frame(
+        table.to_frame(),
         interval_field="settlementdate",
         facility_code_field="duid",
         power_field="scadavalue",
     )
+    records = await calculate_interval_energy(records, network=NetworkNEM)
 
     cr.processed_records = len(records)
-    cr.inserted_records = await bulkinsert_mms_items(FacilityScada, records, ["generated", "energy"])  # type: ignore
-    cr.server_latest = max([i["interval"] for i in records if i["interval"]])
+    cr.inserted_records = await bulkinsert_mms_items(  # type: ignore
+        FacilityScada, records, ["generated", "energy", "energy_quality_flag"]
+    )
+    cr.server_latest = records.get_column("interval").max()  # type: ignore
 
     return cr
 
 
 async def process_unit_solution(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
+    cr = ControllerReturn(total_records=table.num_records)
 
-    records = await generate_facility_scada(
-        table.records,  # type: ignore
+    records = await generate_facility_scada_frame(
+        table.to_frame(),
         interval_field="settlementdate",
         facility_code_field="duid",
         power_field="initialmw",
         energy_storage_field="energy_storage",
     )
+    records = await calculate_interval_energy(records, network=NetworkNEM)
 
     cr.processed_records = len(records)
     cr.inserted_records = await bulkinsert_mms_items(
         FacilityScada, records, ["generated", "energy", "energy_storage", "energy_quality_flag"]
     )
-    cr.server_latest = max([i["interval"] for i in records if i["interval"]])
+    cr.server_latest = records.get_column("interval").max()  # type: ignore
 
     return cr
 
 
 async def process_meter_data_gen_duid(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
+    cr = ControllerReturn(total_records=table.num_records)
 
-    records = await generate_facility_scada(
-        table.records,  # type: ignore
+    records = await generate_facility_scada_frame(
+        table.to_frame(),
         interval_field="interval_datetime",
         facility_code_field="duid",
         power_field="mwh_reading",
     )
+    records = await calculate_interval_energy(records, network=NetworkNEM)
 
     cr.processed_records = len(records)
-    cr.inserted_records = await bulkinsert_mms_items(FacilityScada, records, ["generated", "energy"])
-    cr.server_latest = max([i["interval"] for i in records])
+    cr.inserted_records = await bulkinsert_mms_items(FacilityScada, records, ["generated", "energy", "energy_quality_flag"])
+    cr.server_latest = records.get_column("interval").max()  # type: ignore
 
     return cr
 
 
 async def process_rooftop_actual(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
+    cr = ControllerReturn(total_records=table.num_records)
 
     records = await generate_facility_scada(
-        table.records,  # type: ignore
+        table.to_frame(),
         interval_field="interval_datetime",
         facility_code_field="regionid",
         power_field="power",
@@ -560,10 +566,10 @@ async def process_rooftop_actual(table: AEMOTableSchema) -> ControllerReturn:
 
 
 async def process_rooftop_forecast(table: AEMOTableSchema) -> ControllerReturn:
-    cr = ControllerReturn(total_records=len(table.records))
+    cr = ControllerReturn(total_records=table.num_records)
 
     records = await generate_facility_scada(
-        table.records,  # type: ignore
+        table.to_frame(),
         interval_field="interval_datetime",
         facility_code_field="regionid",
         power_field="powermean",
@@ -611,7 +617,7 @@ async def store_aemo_tableset(tableset: AEMOTableSet) -> ControllerReturn:
             logger.info("Invalid processing function %s", process_meth)
             continue
 
-        logger.info(f"processing table {table.full_name} with {len(table.records)} records")
+        logger.info(f"processing table {table.full_name} with {table.num_records} records")
 
         record_item = None
 
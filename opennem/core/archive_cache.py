@@ -0,0 +1,214 @@
+"""
+OpenNEM NEMWeb Archive Cache
+
+Persistent on disk cache of downloaded NEMWeb archives. Only the ARCHIVE/ directories are cached:
+their files don't change once listed, where the Current/ directories are rolled over constantly
+and would serve stale data and push the archives the backfills re-read out of the cache. A
+download is keyed by its url and the modified date and size from its directory listing entry.
+If AEMO ever republishes a file the listing changes and so does the key.
+
+The cache is bounded to settings.archive_cache_max_bytes and evicts the least recently used
+files first. Reads touch the file mtime so it doubles as the LRU clock. Writes go to a temporary
+file that is renamed into place so concurrent workers never read a partial file. The async
+paths run the disk reads, writes and evictions in a thread so they don't stall the crawl.
+
+Prune from the command line with:
+
+    $ opennem cache prune
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlparse
+
+from opennem import settings
+from opennem.core.parsers.dirlisting import DirlistingEntry
+
+logger = logging.getLogger("opennem.core.archive_cache")
+
+
+def is_archive_url(url: str) -> bool:
+    """NEMWeb ARCHIVE/ urls, whose files are immutable once listed"""
+    return "/ARCHIVE/" in urlparse(url).path
+
+
+@dataclass
+class ArchiveCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ArchiveCache:
+    """Size bounded LRU cache of downloaded files on disk"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = ArchiveCacheStats()
+        # running total of the cache size, scanned from disk on first write
+        self._size: int | None = None
+
+    @staticmethod
+    def key_for_entry(entry: DirlistingEntry) -> str:
+        modified_date = entry.modified_date.isoformat() if entry.modified_date else ""
+        key = f"{entry.link}|{modified_date}|{entry.file_size or ''}"
+
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _files(self) -> list[tuple[Path, os.stat_result]]:
+        if not self.cache_dir.is_dir():
+            return []
+
+        files = []
+
+        for path in self.cache_dir.glob("*/*"):
+            # skip in progress writes
+            if path.name.startswith("."):
+                continue
+
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+
+        return files
+
+    def usage(self) -> tuple[int, int]:
+        """Number of files and bytes in the cache"""
+        files = self._files()
+
+        return len(files), sum(stat.st_size for _, stat in files)
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        self.stats.hits += 1
+        self.stats.bytes_read += len(content)
+
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".")
+
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(content)
+
+            os.replace(tmp_path, path)
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        self.stats.bytes_written += len(content)
+
+        if self._size is None:
+            self._size = self.usage()[1]
+        else:
+            self._size += len(content)
+
+        if self._size > self.max_bytes:
+            self.prune()
+
+    def prune(self, max_bytes: int | None = None) -> tuple[int, int]:
+        """Evict least recently used files until the cache is under max_bytes. Returns the
+        number of files and bytes removed"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        files = sorted(self._files(), key=lambda f: f[1].st_mtime)
+        size = sum(stat.st_size for _, stat in files)
+        removed_files = removed_bytes = 0
+
+        for path, stat in files:
+            if size <= max_bytes:
+                break
+
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+            removed_files += 1
+            removed_bytes += stat.st_size
+
+        self._size = size
+        self.stats.evictions += removed_files
+
+        if removed_files:
+            logger.info(f"Pruned {removed_files} files ({removed_bytes / 1024 / 1024:.1f}MB) from archive cache")
+
+        return removed_files, removed_bytes
+
+    async def get_or_fetch(self, entry: DirlistingEntry, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the cached content for a listing entry or fetch and cache it"""
+        key = self.key_for_entry(entry)
+        content = await asyncio.to_thread(self.get, key)
+
+        if content is not None:
+            logger.debug(f"Archive cache HIT {entry.link}")
+            return content
+
+        logger.debug(f"Archive cache MISS {entry.link}")
+
+        content = await fetch()
+
+        try:
+            await asyncio.to_thread(self.put, key, content)
+        except OSError as e:
+            logger.warning(f"Could not write {entry.link} to archive cache: {e}")
+
+        return content
+
+
+_archive_cache: ArchiveCache | None = None
+
+
+def get_archive_cache() -> ArchiveCache:
+    global _archive_cache
+
+    if _archive_cache is None:
+        _archive_cache = ArchiveCache(
+            cache_dir=Path(settings.archive_cache_dir).expanduser(), max_bytes=settings.archive_cache_max_bytes
+        )
+
+    return _archive_cache
+
+
+async def cached_download(url: str, fetch: Callable[[], Awaitable[bytes]], entry: DirlistingEntry | None = None) -> bytes:
+    """Fetch through the archive cache when it's an ARCHIVE/ url with a listing entry to key on"""
+    if not entry or not settings.archive_cache_enabled or not is_archive_url(url):
+        return await fetch()
+
+    if entry.link != url:
+        raise Exception(f"Listing entry {entry.link} does not match download url {url}")
+
+    return await get_archive_cache().get_or_fetch(entry, fetch)
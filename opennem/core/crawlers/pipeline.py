@@ -0,0 +1,147 @@
+"""
+OpenNEM Crawl Pipeline
+
+Runs items through a chain of async stages (eg. download -> parse -> persist), each with its
+own number of workers. Stages are connected by bounded queues so a fast stage blocks when the
+stage after it falls behind rather than buffering everything in memory (backpressure), and a
+slow item only holds up the worker it is on.
+
+A stage function returns the item for the next stage, or None to drop it (the stage is expected
+to have logged why). Exceptions raised by a stage are logged, counted and the item is dropped.
+
+Per stage timings are collected: time spent working, time starved waiting for input and time
+blocked waiting on the next stage.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger("opennem.core.crawlers.pipeline")
+
+# marks the end of a stage's input
+_STAGE_DONE = object()
+
+
+@dataclass
+class PipelineStage:
+    """A named pipeline stage with a worker count"""
+
+    name: str
+    func: Callable[[Any], Awaitable[Any]]
+    concurrency: int = 1
+
+
+@dataclass
+class PipelineStageStats:
+    """Timings for a pipeline stage. Times are summed across the stage workers"""
+
+    name: str
+    concurrency: int
+    processed: int = 0
+    dropped: int = 0
+    errors: int = 0
+    busy_time: float = 0.0
+    starved_time: float = 0.0
+    blocked_time: float = 0.0
+
+    @property
+    def mean_time(self) -> float:
+        return self.busy_time / self.processed if self.processed else 0.0
+
+
+@dataclass
+class PipelineResult:
+    """Items out of the last stage and the per stage timings"""
+
+    results: list[Any] = field(default_factory=list)
+    stages: list[PipelineStageStats] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def log_summary(self, name: str = "pipeline") -> None:
+        logger.info(f"{name}: {len(self.results)} results in {self.elapsed:.2f}s")
+
+        for stage in self.stages:
+            logger.info(
+                f"{name} {stage.name} x{stage.concurrency}: {stage.processed} processed, {stage.dropped} dropped, "
+                f"{stage.errors} errors, busy {stage.busy_time:.2f}s (mean {stage.mean_time:.2f}s), "
+                f"starved {stage.starved_time:.2f}s, blocked {stage.blocked_time:.2f}s"
+            )
+
+
+async def run_pipeline(items: Iterable[Any], stages: list[PipelineStage], queue_size: int | None = None) -> PipelineResult:
+    """Run items through stages. Each stage reads from a queue bounded to queue_size (defaults to
+    twice the stage concurrency). Results of the last stage are returned in completion order"""
+    if not stages:
+        raise Exception("Pipeline requires at least one stage")
+
+    queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size or stage.concurrency * 2) for stage in stages]
+    stats = [PipelineStageStats(name=stage.name, concurrency=stage.concurrency) for stage in stages]
+    workers_finished = [0] * len(stages)
+    result = PipelineResult(stages=stats)
+    pipeline_start = time.perf_counter()
+
+    async def _feed() -> None:
+        for item in items:
+            await queues[0].put(item)
+
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(_STAGE_DONE)
+
+    async def _worker(stage_index: int) -> None:
+        stage = stages[stage_index]
+        stage_stats = stats[stage_index]
+        next_queue = queues[stage_index + 1] if stage_index + 1 < len(stages) else None
+
+        while True:
+            wait_start = time.perf_counter()
+            item = await queues[stage_index].get()
+            stage_stats.starved_time += time.perf_counter() - wait_start
+
+            if item is _STAGE_DONE:
+                break
+
+            stage_start = time.perf_counter()
+
+            try:
+                output = await stage.func(item)
+            except Exception as e:
+                logger.error(f"Pipeline stage {stage.name} error: {e}")
+                stage_stats.errors += 1
+                output = None
+
+            stage_stats.busy_time += time.perf_counter() - stage_start
+            stage_stats.processed += 1
+
+            if output is None:
+                stage_stats.dropped += 1
+                continue
+
+            if next_queue is None:
+                result.results.append(output)
+                continue
+
+            put_start = time.perf_counter()
+            await next_queue.put(output)
+            stage_stats.blocked_time += time.perf_counter() - put_start
+
+        workers_finished[stage_index] += 1
+
+        # last worker out tells every worker of the next stage there is no more input
+        if next_queue is not None and workers_finished[stage_index] == stage.concurrency:
+            for _ in range(stages[stage_index + 1].concurrency):
+                await next_queue.put(_STAGE_DONE)
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_feed())
+
+        for stage_index, stage in enumerate(stages):
+            for _ in range(stage.concurrency):
+                tg.create_task(_worker(stage_index))
+
+    result.elapsed = time.perf_counter() - pipeline_start
+
+    return result
@@ -3,6 +3,8 @@ from io import BytesIO
 from pathlib import Path
 from zipfile import ZipFile
 
+from opennem.core.archive_cache import cached_download
+from opennem.core.parsers.dirlisting import DirlistingEntry
 from opennem.utils.archive import _handle_zip, chain_streams
 from opennem.utils.http import http_factory
 from opennem.utils.mime import mime_from_content, mime_from_url
@@ -10,18 +12,28 @@ from opennem.utils.mime import mime_from_content, mime_from_url
 logger = logging.getLogger("opennem.downloader")
 
 
-async def url_downloader(url: str, use_proxy: bool = True) -> bytes:
-    """Downloads a URL and returns content, handling embedded zips and other MIME's"""
+async def url_fetch(url: str, use_proxy: bool = True, entry: DirlistingEntry | None = None) -> bytes:
+    """Downloads a URL and returns the raw response content without unpacking it. Downloads
+    of a directory listing entry go through the archive cache"""
+
+    async def _fetch() -> bytes:
+        logger.debug(f"Downloading: {url}")
+
+        http = http_factory(proxy=use_proxy)
 
-    logger.debug(f"Downloading: {url}")
+        response = await http.get(url)
 
-    http = http_factory(proxy=use_proxy)
+        response.raise_for_status()
 
-    response = await http.get(url)
+        return response.content
 
-    response.raise_for_status()
+    return await cached_download(url, _fetch, entry=entry)
+
+
+async def url_downloader(url: str, use_proxy: bool = True, entry: DirlistingEntry | None = None) -> bytes:
+    """Downloads a URL and returns content, handling embedded zips and other MIME's"""
 
-    content = BytesIO(response.content)
+    content = BytesIO(await url_fetch(url, use_proxy=use_proxy, entry=entry))
 
     file_mime = mime_from_content(content)
 
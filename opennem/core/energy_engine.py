@@ -0,0 +1,215 @@
+"""
+OpenNEM Interval Energy Engine
+
+Derives interval energy from power using the trapezoidal rule:
+
+    energy = (generated + previous generated) / 2 / intervals per hour
+
+At ingest the previous interval for each (network_id, facility_code) is kept in memory, so a
+new interval of scada gets its trapezoidal energy before it is written instead of being
+rewritten afterwards by an UPDATE over facility_scada. On a cold cache the previous interval is
+read from the database once.
+
+Rows without the directly preceding interval (the first interval seen for a facility, or after
+a gap) keep the point estimate (generated / intervals per hour) with energy_quality_flag 0 and
+are picked up by the recompute in opennem.workers.energy, which uses the same calculation.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import polars as pl
+from sqlalchemy import bindparam, text
+
+from opennem.db import get_read_session
+from opennem.schema.network import NetworkSchema
+
+logger = logging.getLogger("opennem.core.energy_engine")
+
+# energy_quality_flag for trapezoidal energy calculated from the previous interval
+ENERGY_QUALITY_FLAG_TRAPEZOIDAL = 2
+
+ENERGY_PARTITION_KEYS = ["network_id", "facility_code"]
+
+_PREVIOUS_INTERVAL_SCHEMA = {
+    "network_id": pl.String,
+    "facility_code": pl.String,
+    "interval": pl.Datetime("us"),
+    "generated": pl.Float64,
+}
+
+
+def calculate_trapezoidal_energy(
+    frame: pl.DataFrame,
+    interval_size: int,
+    previous: pl.DataFrame | None = None,
+    partition_keys: list[str] | None = None,
+) -> pl.DataFrame:
+    """
+    Calculate trapezoidal energy for a frame of facility scada. Rows are returned in the order
+    they came in.
+
+    previous holds rows that precede the frame (eg. the last cached interval per facility) and is
+    only used to look back from the first interval of each facility in the frame. Rows with a
+    previous interval exactly interval_size before them get trapezoidal energy and
+    energy_quality_flag 2, other rows are left as they are.
+    """
+    if frame.is_empty():
+        return frame
+
+    partition_keys = partition_keys or ENERGY_PARTITION_KEYS
+    intervals_per_hour = 60 / interval_size
+    columns = [*partition_keys, "interval", "generated"]
+
+    lag_source = frame.select(columns).with_columns(pl.lit(True).alias("_current"))
+
+    if previous is not None and not previous.is_empty():
+        lag_source = pl.concat(
+            [
+                lag_source,
+                previous.select(columns).cast(lag_source.select(columns).schema).with_columns(pl.lit(False).alias("_current")),
+            ]
+        )
+
+    # ordering within the window rather than sorting the frame by its string keys
+    lagged = lag_source.with_columns(
+        pl.col("generated").shift(1).over(partition_keys, order_by="interval").alias("_prev_generated"),
+        pl.col("interval").shift(1).over(partition_keys, order_by="interval").alias("_prev_interval"),
+    ).filter(pl.col("_current"))
+
+    has_previous = pl.col("_prev_generated").is_not_null() & (
+        (pl.col("interval") - pl.col("_prev_interval")) == timedelta(minutes=interval_size)
+    )
+
+    energy = lagged.select(
+        pl.when(has_previous).then((pl.col("generated") + pl.col("_prev_generated")) / 2 / intervals_per_hour).alias("_energy")
+    ).get_column("_energy")
+
+    energy_columns = [
+        pl.when(energy.is_not_null()).then(energy).otherwise(pl.col("energy")).alias("energy")
+        if "energy" in frame.columns
+        else energy.alias("energy"),
+    ]
+
+    if "energy_quality_flag" in frame.columns:
+        energy_columns.append(
+            pl.when(energy.is_not_null())
+            .then(pl.lit(ENERGY_QUALITY_FLAG_TRAPEZOIDAL))
+            .otherwise(pl.col("energy_quality_flag"))
+            .cast(frame.schema["energy_quality_flag"])
+            .alias("energy_quality_flag")
+        )
+
+    return frame.with_columns(energy_columns)
+
+
+class PreviousIntervalCache:
+    """The last interval of generation seen per (network_id, facility_code)"""
+
+    def __init__(self) -> None:
+        self._intervals: dict[tuple[str, str], tuple[datetime, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def clear(self) -> None:
+        self._intervals = {}
+
+    def get_frame(self, keys: list[tuple[str, str]]) -> pl.DataFrame:
+        rows = [(*key, *self._intervals[key]) for key in keys if key in self._intervals]
+
+        return pl.DataFrame(rows, schema=_PREVIOUS_INTERVAL_SCHEMA, orient="row")
+
+    def missing(self, first_intervals: dict[tuple[str, str], datetime], interval_size: int) -> dict[tuple[str, str], datetime]:
+        """Keys whose cached interval isn't the one directly before their first interval, with
+        the previous interval that is needed"""
+        size = timedelta(minutes=interval_size)
+        missing = {}
+
+        for key, first_interval in first_intervals.items():
+            cached = self._intervals.get(key)
+
+            if not cached or cached[0] != first_interval - size:
+                missing[key] = first_interval - size
+
+        return missing
+
+    def update(self, frame: pl.DataFrame) -> None:
+        """Store the latest interval per key, ignoring anything older than what is cached"""
+        if frame.is_empty():
+            return
+
+        latest = frame.sort("interval").group_by(ENERGY_PARTITION_KEYS).last()
+
+        for network_id, facility_code, interval, generated in latest.select(_PREVIOUS_INTERVAL_SCHEMA.keys()).iter_rows():
+            key = (network_id, facility_code)
+            cached = self._intervals.get(key)
+
+            if generated is None or (cached and cached[0] > interval):
+                continue
+
+            self._intervals[key] = (interval, generated)
+
+
+_previous_interval_cache = PreviousIntervalCache()
+
+
+def get_previous_interval_cache() -> PreviousIntervalCache:
+    return _previous_interval_cache
+
+
+async def _fetch_previous_intervals(network_id: str, facility_codes: list[str], intervals: list[datetime]) -> pl.DataFrame:
+    """Read the generation for facilities at the given intervals to prime a cold cache"""
+    query = text(
+        """
+        SELECT network_id, facility_code, interval, generated
+        FROM facility_scada
+        WHERE
+            network_id = :network_id
+            AND interval IN :intervals
+            AND facility_code IN :facility_codes
+            AND is_forecast IS FALSE
+        """
+    ).bindparams(bindparam("intervals", expanding=True), bindparam("facility_codes", expanding=True))
+
+    async with get_read_session() as session:
+        result = await session.execute(
+            query, {"network_id": network_id, "intervals": intervals, "facility_codes": facility_codes}
+        )
+        rows = [(r[0], r[1], r[2], float(r[3]) if r[3] is not None else None) for r in result.fetchall()]
+
+    return pl.DataFrame(rows, schema=_PREVIOUS_INTERVAL_SCHEMA, orient="row")
+
+
+async def calculate_interval_energy(frame: pl.DataFrame, network: NetworkSchema) -> pl.DataFrame:
+    """
+    Ingest stage - calculate trapezoidal energy for a frame of facility scada from
+    generate_facility_scada_frame using the previous interval cache, then update the cache.
+    """
+    if frame.is_empty() or not network.interval_size:
+        return frame
+
+    cache = get_previous_interval_cache()
+
+    first_intervals = {
+        (network_id, facility_code): interval
+        for network_id, facility_code, interval in frame.group_by(ENERGY_PARTITION_KEYS).agg(pl.col("interval").min()).iter_rows()
+    }
+
+    missing = cache.missing(first_intervals, network.interval_size)
+
+    if missing:
+        try:
+            primed = await _fetch_previous_intervals(
+                network_id=network.code,
+                facility_codes=sorted({facility_code for _, facility_code in missing}),
+                intervals=sorted(set(missing.values())),
+            )
+            cache.update(primed)
+        except Exception as e:
+            logger.warning(f"Could not prime previous interval cache for {len(missing)} facilities: {e}")
+
+    frame = calculate_trapezoidal_energy(frame, network.interval_size, previous=cache.get_frame(list(first_intervals)))
+    cache.update(frame)
+
+    return frame
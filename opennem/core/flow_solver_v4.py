@@ -8,6 +8,9 @@ Two modes:
   This matches v3 behaviour and is suitable for tree topologies.
 - consumption_mix: solves a linear system accounting for transit flows through
   intermediate regions. Required for accurate accounting with loops (e.g. PEC).
+  Solved for all intervals at once, see solve_flow_emissions_consumption_mix.
+
+Given regional prices, the market value of imports and exports is added too.
 """
 
 import logging
@@ -173,6 +176,63 @@ def solve_flow_emissions_simple(
     return result.sort(["interval", "network_region"])
 
 
+def _normalize_flows(interconnector_df: pl.DataFrame) -> pl.DataFrame:
+    """Flip negative flows so every flow is a non-negative energy in its direction of travel."""
+    flipped = (
+        interconnector_df.filter(pl.col("energy") < 0)
+        .with_columns(
+            pl.col("interconnector_region_from").alias("_to"),
+            pl.col("interconnector_region_to").alias("_from"),
+            (pl.col("energy").abs()).alias("energy"),
+        )
+        .select(
+            pl.col("interval"),
+            pl.col("_from").alias("interconnector_region_from"),
+            pl.col("_to").alias("interconnector_region_to"),
+            pl.col("energy"),
+        )
+    )
+    positive = interconnector_df.filter(pl.col("energy") >= 0).select(
+        "interval", "interconnector_region_from", "interconnector_region_to", "energy"
+    )
+
+    return pl.concat([positive, flipped])
+
+
+def _solve_intensities(a_matrices: np.ndarray, b_vectors: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+    """Solve the stacked systems a_matrices[t] @ x[t] = b_vectors[t] for every interval at once.
+
+    Non-singular systems are solved directly. Singular ones (a region with no supply, say) get
+    the minimum-norm least squares solution, as np.linalg.lstsq gives, and if that doesn't
+    converge they take the fallback intensities.
+    """
+    try:
+        solved = np.linalg.solve(a_matrices, b_vectors[..., None])[..., 0]
+        singular = ~np.isfinite(solved).all(axis=1)
+    except np.linalg.LinAlgError:
+        # one singular system fails the whole batch, so find them and solve the rest
+        solved = np.zeros_like(b_vectors)
+        singular = np.linalg.matrix_rank(a_matrices) < a_matrices.shape[-1]
+        regular = ~singular
+
+        if regular.any():
+            solved[regular] = np.linalg.solve(a_matrices[regular], b_vectors[regular][..., None])[..., 0]
+
+    if not singular.any():
+        return solved
+
+    n = a_matrices.shape[-1]
+
+    try:
+        pseudo_inverse = np.linalg.pinv(a_matrices[singular], rcond=np.finfo(float).eps * n)
+        solved[singular] = np.einsum("tij,tj->ti", pseudo_inverse, b_vectors[singular])
+    except np.linalg.LinAlgError:
+        logger.warning(f"lstsq failed for {singular.sum()} intervals, falling back to simple intensity")
+        solved[singular] = fallback[singular]
+
+    return solved
+
+
 def solve_flow_emissions_consumption_mix(
     topology: NetworkTopology,
     interconnector_df: pl.DataFrame,
@@ -186,105 +246,119 @@ def solve_flow_emissions_consumption_mix(
 
     where total_supply(r) = local_energy(r) + sum(flow(x->r))
 
-    Uses numpy.linalg.lstsq for loop-safe solving.
+    The data is pivoted once into (intervals, regions) vectors and an (intervals, regions,
+    regions) flow tensor and every interval's system is solved in one stacked call, falling
+    back to least squares for singular intervals so loops are handled.
 
     Returns same schema as solve_flow_emissions_simple.
     """
     if interconnector_df.is_empty():
         return _empty_result()
 
-    # Normalize flows
-    df = interconnector_df.clone()
-    flipped = (
-        df.filter(pl.col("energy") < 0)
-        .with_columns(
-            pl.col("interconnector_region_from").alias("_to"),
-            pl.col("interconnector_region_to").alias("_from"),
-            (pl.col("energy").abs()).alias("energy"),
-        )
-        .select(
-            pl.col("interval"),
-            pl.col("_from").alias("interconnector_region_from"),
-            pl.col("_to").alias("interconnector_region_to"),
-            pl.col("energy"),
+    regions = list(topology.regions)
+    n = len(regions)
+    region_codes = pl.DataFrame({"_region": regions, "_r": np.arange(n)})
+
+    intervals = region_emissions_df.select(pl.col("interval").unique().sort())
+    num_intervals = intervals.height
+    normalized = _normalize_flows(interconnector_df).with_columns(pl.col("interval").cast(intervals.schema["interval"]))
+    interval_index = intervals.with_columns(pl.int_range(pl.len()).alias("_t"))
+
+    # local generation and emissions, (intervals, regions)
+    local = (
+        region_emissions_df.join(interval_index, on="interval")
+        .join(region_codes, left_on="network_region", right_on="_region")
+        .select("_t", "_r", pl.col("energy").fill_null(0.0), pl.col("emissions").fill_null(0.0))
+    )
+    t_idx, r_idx = local["_t"].to_numpy(), local["_r"].to_numpy()
+    local_energy = np.zeros((num_intervals, n))
+    local_emissions = np.zeros((num_intervals, n))
+    local_energy[t_idx, r_idx] = local["energy"].to_numpy()
+    local_emissions[t_idx, r_idx] = local["emissions"].to_numpy()
+
+    # flows[t, i, j] = energy flowing from region i to region j
+    flow_rows = (
+        normalized.join(interval_index, on="interval")
+        .join(region_codes.rename({"_r": "_from"}), left_on="interconnector_region_from", right_on="_region")
+        .join(region_codes.rename({"_r": "_to"}), left_on="interconnector_region_to", right_on="_region")
+        .select("_t", "_from", "_to", pl.col("energy").fill_null(0.0))
+    )
+    flows = np.zeros((num_intervals, n, n))
+    np.add.at(
+        flows,
+        (flow_rows["_t"].to_numpy(), flow_rows["_from"].to_numpy(), flow_rows["_to"].to_numpy()),
+        flow_rows["energy"].to_numpy(),
+    )
+
+    total_imports = flows.sum(axis=1)
+    total_exports = flows.sum(axis=2)
+    total_supply = local_energy + total_imports
+
+    # For each region r: total_supply[r] * intensity[r] - sum(flow[x->r] * intensity[x]) = local_emissions[r]
+    a_matrices = total_supply[:, :, None] * np.eye(n) - flows.transpose(0, 2, 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        generation_intensity = np.where(local_energy > 0, local_emissions / local_energy, 0.0)
+
+    intensities = np.maximum(_solve_intensities(a_matrices, local_emissions, generation_intensity), 0.0)
+
+    # imports carry the consumption-mix intensity of the region they come from, exports that of
+    # the region they leave
+    emissions_imports = np.einsum("txr,tx->tr", flows, intensities)
+    emissions_exports = total_exports * intensities
+
+    return pl.DataFrame(
+        {
+            "interval": intervals["interval"].gather(np.repeat(np.arange(num_intervals), n)),
+            "network_region": np.tile(regions, num_intervals),
+            "energy_imports": total_imports.ravel(),
+            "energy_exports": total_exports.ravel(),
+            "emissions_imports": emissions_imports.ravel(),
+            "emissions_exports": emissions_exports.ravel(),
+        }
+    ).sort(["interval", "network_region"])
+
+
+def compute_flow_market_value(flow_df: pl.DataFrame, region_price_df: pl.DataFrame) -> pl.DataFrame:
+    """Add the market value of each region's imports and exports at the regional price.
+
+    Imports are valued at the price of the region they arrive in and exports at the price of the
+    region they leave, so each is energy * that row's regional price. Prices are carried forward
+    up to 30 minutes so half-hourly trading prices cover their 5 minute intervals, as the
+    market_summary price does. Intervals with no price get a null market value.
+
+    Args:
+        flow_df: solver output, which is sorted by interval
+        region_price_df: columns: interval, network_region, price ($/MWh)
+
+    Returns:
+        flow_df with market_value_imports and market_value_exports
+    """
+    prices = (
+        region_price_df.select(
+            pl.col("interval").cast(flow_df.schema["interval"]),
+            pl.col("network_region"),
+            pl.col("price").cast(pl.Float64),
         )
+        .drop_nulls()
+        .sort("interval")
     )
-    positive = df.filter(pl.col("energy") >= 0)
-    normalized = pl.concat([positive, flipped])
 
-    intervals = sorted(region_emissions_df["interval"].unique().to_list())
-    regions = list(topology.regions)
-    n = len(regions)
-    region_idx = {r: i for i, r in enumerate(regions)}
-
-    all_results: list[dict] = []
-
-    for interval in intervals:
-        # Get regional data for this interval
-        region_data = region_emissions_df.filter(pl.col("interval") == interval)
-        flow_data = normalized.filter(pl.col("interval") == interval)
-
-        # Build local emissions and energy vectors
-        local_emissions = np.zeros(n)
-        local_energy = np.zeros(n)
-        for row in region_data.iter_rows(named=True):
-            idx = region_idx.get(row["network_region"])
-            if idx is not None:
-                local_energy[idx] = row.get("energy", 0.0) or 0.0
-                local_emissions[idx] = row.get("emissions", 0.0) or 0.0
-
-        # Build flow matrix: flow_matrix[i][j] = energy flowing from region i to region j
-        flow_matrix = np.zeros((n, n))
-        for row in flow_data.iter_rows(named=True):
-            fi = region_idx.get(row["interconnector_region_from"])
-            ti = region_idx.get(row["interconnector_region_to"])
-            if fi is not None and ti is not None:
-                flow_matrix[fi][ti] += row["energy"] or 0.0
-
-        # Total supply per region = local generation + imports
-        total_imports = flow_matrix.sum(axis=0)  # sum of column = imports into region
-        total_supply = local_energy + total_imports
-
-        # Build linear system: A * intensity = b
-        # For each region r: total_supply[r] * intensity[r] - sum(flow[x->r] * intensity[x]) = local_emissions[r]
-        a_matrix = np.diag(total_supply) - flow_matrix.T  # flow_matrix.T[r][x] = flow from x to r
-        b_vector = local_emissions
-
-        # Solve
-        try:
-            intensities, _, _, _ = np.linalg.lstsq(a_matrix, b_vector, rcond=None)
-        except np.linalg.LinAlgError:
-            logger.warning(f"lstsq failed for interval {interval}, falling back to simple intensity")
-            intensities = np.where(local_energy > 0, local_emissions / local_energy, 0.0)
-
-        # Clamp negative intensities to 0
-        intensities = np.maximum(intensities, 0.0)
-
-        # Compute per-region imports/exports/emissions using consumption-mix intensities
-        total_exports = flow_matrix.sum(axis=1)  # sum of row = exports from region
-
-        for i, region in enumerate(regions):
-            import_energy = total_imports[i]
-            export_energy = total_exports[i]
-
-            # Import emissions: sum of flow(x->r) * intensity(x)
-            import_emissions = sum(flow_matrix[x][i] * intensities[x] for x in range(n))
-
-            # Export emissions: exports from r carry r's consumption-mix intensity
-            export_emissions = export_energy * intensities[i]
-
-            all_results.append(
-                {
-                    "interval": interval,
-                    "network_region": region,
-                    "energy_imports": float(import_energy),
-                    "energy_exports": float(export_energy),
-                    "emissions_imports": float(import_emissions),
-                    "emissions_exports": float(export_emissions),
-                }
-            )
-
-    return pl.DataFrame(all_results).sort(["interval", "network_region"])
+    return (
+        flow_df.join_asof(
+            prices,
+            on="interval",
+            by="network_region",
+            strategy="backward",
+            tolerance="30m",
+            check_sortedness=False,
+        )
+        .with_columns(
+            (pl.col("energy_imports") * pl.col("price")).alias("market_value_imports"),
+            (pl.col("energy_exports") * pl.col("price")).alias("market_value_exports"),
+        )
+        .drop("price")
+    )
 
 
 def solve_flows_v4(
@@ -292,6 +366,7 @@ def solve_flows_v4(
     interconnector_df: pl.DataFrame,
     region_emissions_df: pl.DataFrame,
     use_consumption_mix: bool = False,
+    region_price_df: pl.DataFrame | None = None,
 ) -> pl.DataFrame:
     """Main entry point for v4 flow solver.
 
@@ -300,14 +375,22 @@ def solve_flows_v4(
         interconnector_df: columns: interval, interconnector_region_from, interconnector_region_to, energy (MWh)
         region_emissions_df: columns: interval, network_region, energy, emissions, emissions_intensity
         use_consumption_mix: if True, use consumption-mix method (loop-aware)
+        region_price_df: columns: interval, network_region, price. If given, market value is added
 
     Returns:
         DataFrame: interval, network_region, energy_imports, energy_exports,
                    emissions_imports, emissions_exports
+                   and market_value_imports, market_value_exports if prices are given
     """
     if use_consumption_mix:
-        return solve_flow_emissions_consumption_mix(topology, interconnector_df, region_emissions_df)
-    return solve_flow_emissions_simple(topology, interconnector_df, region_emissions_df)
+        result = solve_flow_emissions_consumption_mix(topology, interconnector_df, region_emissions_df)
+    else:
+        result = solve_flow_emissions_simple(topology, interconnector_df, region_emissions_df)
+
+    if region_price_df is not None:
+        result = compute_flow_market_value(result, region_price_df)
+
+    return result
 
 
 def _empty_result() -> pl.DataFrame:
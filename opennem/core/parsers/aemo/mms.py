@@ -1,30 +1,62 @@
 """
 Parse AEMO MMS CSV format which can have multiple tables and definitions per CSV files.
 
+The parser streams the CSV line by line and hands each `D` section to polars in fixed size
+batches so that a table is held as a list of columnar chunks rather than a dict per row.
+Record dicts are only materialised when a consumer asks for `AEMOTableSchema.records`.
+
 """
 
 import csv
+import io
 import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
+from zipfile import ZipFile, is_zipfile
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+import polars as pl
+from pydantic import BaseModel, ConfigDict, PrivateAttr, field_validator
 
 from opennem.core.downloader import url_downloader
 from opennem.core.normalizers import normalize_duid
+from opennem.core.parsers.dirlisting import DirlistingEntry
 from opennem.schema.core import BaseConfig
+from opennem.utils.archive import iter_zip_member_streams, open_zip
 from opennem.utils.version import get_version
 
 logger = logging.getLogger(__name__)
 
+# number of D rows handed to polars at a time
+MMS_BATCH_SIZE = 100_000
+
+# bytes read from the source at a time
+MMS_READ_BLOCK_SIZE = 32 * 1024 * 1024
+
+# the record type, namespace, table name and version lead every MMS row
+MMS_ROW_PREFIX_FIELDS = ["_record_type", "_namespace", "_table_name", "_table_version"]
+
+
+@dataclass(frozen=True)
+class AEMOTableBuffer:
+    """A parsed table as an Arrow IPC buffer. This is what parse workers hand back to the
+    parent process instead of pickled rows"""
+
+    name: str
+    namespace: str
+    fieldnames: list[str]
+    url_source: str | None
+    values_only: bool
+    ipc: bytes
+
 
 # pylint: disable=no-self-argument
 class AEMOTableSchema(BaseConfig):
     name: str
     namespace: str
     fieldnames: list[str]
-    records: list[dict[str, Any]] = Field(default_factory=list)
 
     # the url this table was taken from if any
     url_source: str | None = None
@@ -33,6 +65,13 @@ class AEMOTableSchema(BaseConfig):
     # @NOTE does this make sense .. (it doesnt because it can be super large)
     content_source: str | None = None
 
+    # columnar record storage - all values are kept as strings as they appear in the csv
+    _chunks: list[pl.DataFrame] = PrivateAttr(default_factory=list)
+    # rows added one at a time through add_record, flushed into a chunk on read
+    _pending_rows: list[dict[str, Any]] = PrivateAttr(default_factory=list)
+    _records: list[Any] | None = PrivateAttr(default=None)
+    _values_only: bool = PrivateAttr(default=False)
+
     @property
     def full_name(self) -> str:
         return f"{self.namespace}_{self.name}"
@@ -61,25 +100,104 @@ class AEMOTableSchema(BaseConfig):
 
         return _fieldnames
 
-    def add_record(self, record: dict, values_only: bool = False) -> bool:
-        if values_only and isinstance(record, dict):
-            self.records.append(list(record.values()))
-        elif values_only and isinstance(record, list):
-            self.records.append(record)
-        else:
-            self.records.append(record)
+    @property
+    def frame_schema(self) -> dict[str, pl.DataType]:
+        return {f: pl.String() for f in self.fieldnames}
+
+    @property
+    def num_records(self) -> int:
+        return sum(c.height for c in self._chunks) + len(self._pending_rows)
+
+    @property
+    def records(self) -> list[Any]:
+        """Row view of the table for the controllers. Materialised once and cached until
+        the table is added to"""
+        if self._records is None:
+            frame = self.to_frame()
+            self._records = [list(r) for r in frame.iter_rows()] if self._values_only else frame.to_dicts()
+
+        return self._records
+
+    def add_chunk(self, chunk: pl.DataFrame) -> None:
+        """Append a columnar batch of records to the table"""
+        if chunk.is_empty():
+            return
+
+        self._flush_pending_rows()
+        self._chunks.append(chunk)
+        self._records = None
+
+    def extend(self, table: "AEMOTableSchema", values_only: bool = False) -> None:
+        """Merge the records of a repeated section into this table by chunk"""
+        table._flush_pending_rows()
+
+        for field in table.fieldnames:
+            if field not in self.fieldnames:
+                self.fieldnames = [*self.fieldnames, field]
+
+        for chunk in table._chunks:
+            self.add_chunk(chunk)
+
+        if values_only:
+            self._values_only = True
+
+    def add_record(self, record: dict | list, values_only: bool = False) -> bool:
+        if isinstance(record, list):
+            record = dict(zip(self.fieldnames, record, strict=False))
+
+        if values_only:
+            self._values_only = True
+
+        self._pending_rows.append(record)
+        self._records = None
 
         return True
 
-    def to_csv(self, filename: str) -> None:
-        logger.info(f"Writing table {self.full_name} with {len(self.records)} records")
+    def _flush_pending_rows(self) -> None:
+        if not self._pending_rows:
+            return
+
+        self._chunks.append(pl.DataFrame(self._pending_rows, schema=self.frame_schema, strict=False))
+        self._pending_rows = []
+
+    def to_frame(self) -> pl.DataFrame:
+        """Return all records in the table as a single polars frame"""
+        self._flush_pending_rows()
+
+        if not self._chunks:
+            return pl.DataFrame(schema=self.frame_schema)
+
+        if len(self._chunks) > 1:
+            self._chunks = [pl.concat(self._chunks, how="diagonal_relaxed", rechunk=True)]
+
+        return self._chunks[0]
+
+    def to_buffer(self) -> "AEMOTableBuffer":
+        """Serialise the table to a compressed Arrow IPC buffer to send it between processes"""
+        buffer = io.BytesIO()
+        self.to_frame().write_ipc(buffer, compression="lz4")
+
+        return AEMOTableBuffer(
+            name=self.name,
+            namespace=self.namespace,
+            fieldnames=self.fieldnames,
+            url_source=self.url_source,
+            values_only=self._values_only,
+            ipc=buffer.getvalue(),
+        )
 
-        with open(filename, "w") as fh:
-            csvwriter = csv.DictWriter(fh, fieldnames=self.fieldnames)
-            csvwriter.writeheader()
+    @classmethod
+    def from_buffer(cls, buffer: "AEMOTableBuffer") -> "AEMOTableSchema":
+        table = cls(name=buffer.name, namespace=buffer.namespace, fieldnames=buffer.fieldnames, url_source=buffer.url_source)
+        table.add_chunk(pl.read_ipc(io.BytesIO(buffer.ipc)))
+        table._values_only = buffer.values_only
+
+        return table
 
-            for record in self.records:
-                csvwriter.writerow(dict(zip(self.fieldnames, record, strict=True)))
+    def to_csv(self, filename: str) -> None:
+        logger.info(f"Writing table {self.full_name} with {self.num_records} records")
+
+        self.to_frame().write_csv(filename)
 
         logger.info(f"Wrote records to {self.full_name}")
 
@@ -91,6 +209,13 @@ class AEMOTableSet(BaseModel):
     generated: datetime = datetime.now()
     tables: list[AEMOTableSchema] = []
 
+    # lookup indexes on full name and short name. short names map to the last table added
+    # with that name which matches the previous list scan
+    _tables_by_full_name: dict[str, AEMOTableSchema] = PrivateAttr(default_factory=dict)
+    _tables_by_name: dict[str, AEMOTableSchema] = PrivateAttr(default_factory=dict)
+    # the tables the indexes were built from, compared by identity to catch direct changes
+    _indexed_tables: list[AEMOTableSchema] = PrivateAttr(default_factory=list)
+
     @property
     def table_names(self) -> list[str]:
         _names: list[str] = []
@@ -100,53 +225,68 @@ class AEMOTableSet(BaseModel):
 
         return _names
 
-    def has_table(self, table_name: str) -> bool:
-        found_table: bool = False
-
-        if not self.tables:
-            return False
+    def _index_table(self, table: AEMOTableSchema) -> None:
+        self._tables_by_full_name[table.full_name] = table
+        self._tables_by_name[table.name] = table
 
-        if len(self.tables) < 1:
-            return False
+    def _check_index(self) -> None:
+        """Rebuild the lookup indexes if tables has been assigned or changed directly"""
+        if len(self._indexed_tables) == len(self.tables) and all(
+            indexed is table for indexed, table in zip(self._indexed_tables, self.tables, strict=True)
+        ):
+            return
 
-        table_lookup = list(filter(lambda t: t.full_name == table_name, self.tables))
-
-        if len(table_lookup) > 0:
-            return True
+        self._tables_by_full_name = {}
+        self._tables_by_name = {}
 
-        # if not found search by name only
-        # @NOTE this might lead to bugs
-        table_lookup = list(filter(lambda t: t.name == table_name, self.tables))
+        for table in self.tables:
+            self._index_table(table)
 
-        if len(table_lookup) > 0:
-            return True
+        self._indexed_tables = list(self.tables)
 
-        return found_table
+    def has_table(self, table_name: str) -> bool:
+        return self.get_table(table_name) is not None
 
     def add_table(self, table: AEMOTableSchema, values_only: bool = False) -> bool:
         _existing_table = self.get_table(table.full_name)
 
+        if _existing_table is table:
+            return True
+
         if _existing_table:
-            for r in table.records:
-                _existing_table.add_record(r, values_only=values_only)
+            _existing_table.extend(table, values_only=values_only)
         else:
             self.tables.append(table)
+            self._index_table(table)
+            self._indexed_tables.append(table)
 
         return True
 
-    def get_table(self, table_name: str) -> AEMOTableSchema | None:
-        if not self.has_table(table_name):
-            return None
+    def to_buffers(self) -> list[AEMOTableBuffer]:
+        return [table.to_buffer() for table in self.tables]
 
-        table_lookup = list(filter(lambda t: t.full_name == table_name, self.tables))
+    def add_buffers(self, buffers: list[AEMOTableBuffer]) -> None:
+        """Merge tables parsed in another process into this set"""
+        for buffer in buffers:
+            self.add_table(AEMOTableSchema.from_buffer(buffer), values_only=buffer.values_only)
 
-        if table_lookup:
-            return table_lookup.pop()
+    @classmethod
+    def from_buffers(cls, buffers: list[AEMOTableBuffer]) -> "AEMOTableSet":
+        table_set = cls()
+        table_set.add_buffers(buffers)
 
-        table_lookup = list(filter(lambda t: t.name == table_name, self.tables))
+        return table_set
 
-        if table_lookup:
-            return table_lookup.pop()
+    def get_table(self, table_name: str) -> AEMOTableSchema | None:
+        self._check_index()
+
+        if table_name in self._tables_by_full_name:
+            return self._tables_by_full_name[table_name]
+
+        # if not found search by name only
+        # @NOTE this might lead to bugs
+        if table_name in self._tables_by_name:
+            return self._tables_by_name[table_name]
 
         logger.debug("Looking up table: {} amongst ({})".format(table_name, ", ".join([i.name for i in self.tables])))
 
@@ -161,133 +301,280 @@ AEMO_ROW_HEADER_TYPES = ["C", "I", "D"]
 
 MMS_DUID_FIELDS = ["duid"]
 
+MMSSource = str | IO[str] | IO[bytes]
 
-def parse_aemo_mms_csv(
-    content: str,
-    table_set: AEMOTableSet | None = None,
+
+def _iter_source_blocks(source: MMSSource, block_size: int = MMS_READ_BLOCK_SIZE) -> Iterator[bytes]:
+    """Read an MMS csv from a string, text or binary stream in blocks of whole lines without
+    reading the whole thing into memory"""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+
+    remainder = b""
+
+    while block := source.read(block_size):
+        if isinstance(block, str):
+            block = block.encode("utf-8")
+
+        block = remainder + block
+        split_at = block.rfind(b"\n") + 1
+
+        remainder = block[split_at:]
+
+        if split_at:
+            yield block[:split_at]
+
+    if remainder.strip():
+        yield remainder + b"\n"
+
+
+def _normalize_duid_columns(frame: pl.DataFrame) -> pl.DataFrame:
+    """Normalize duid columns. There are only a few hundred distinct duids in a file so
+    normalize each unique value once and map it back over the column"""
+    for field in MMS_DUID_FIELDS:
+        if field not in frame.columns:
+            continue
+
+        duids = frame.get_column(field).unique().to_list()
+        frame = frame.with_columns(
+            pl.col(field).replace_strict(duids, [normalize_duid(d) for d in duids], return_dtype=pl.String)
+        )
+
+    return frame
+
+
+def _read_mms_records(lines: pl.Series, fieldnames: list[str]) -> pl.DataFrame:
+    """Parse a run of raw `D` lines into a frame of string columns. Rows with a field count
+    that doesn't match the table definition are dropped"""
+    columns = MMS_ROW_PREFIX_FIELDS + fieldnames
+
+    # cheap separator count - only fully parse a line if a quoted field contains a separator
+    mismatched = lines.str.count_matches(",", literal=True) != len(columns) - 1
+
+    if mismatched.any():
+        keep = [
+            not is_mismatched or len(next(csv.reader([line]))) == len(columns)
+            for line, is_mismatched in zip(lines, mismatched, strict=True)
+        ]
+
+        if not all(keep):
+            logger.error(f"Malformed AEMO csv - length mismatch between records and fields on {keep.count(False)} rows")
+            lines = lines.filter(pl.Series(keep))
+
+    if lines.is_empty():
+        return pl.DataFrame(schema=dict.fromkeys(fieldnames, pl.String))
+
+    frame = pl.read_csv(
+        lines.str.join("\n").item().encode("utf-8"),
+        has_header=False,
+        schema=dict.fromkeys(columns, pl.String),
+        missing_utf8_is_empty_string=True,
+    )
+
+    return _normalize_duid_columns(frame.select(fieldnames))
+
+
+def iter_aemo_mms_batches(
+    source: MMSSource,
     namespace_filter: list[str] | None = None,
     skip_records: bool = False,
     url: str | None = None,
-    values_only: bool = False,
-) -> AEMOTableSet:
+    batch_size: int = MMS_BATCH_SIZE,
+    block_size: int = MMS_READ_BLOCK_SIZE,
+) -> Iterator[tuple[AEMOTableSchema, pl.DataFrame]]:
     """
-    Parse AEMO CSV's into schemas and return a table set
+    Stream an AEMO MMS CSV and yield (table, batch) pairs.
 
-    Exception raised on error and logs malformed CSVs
+    The source is read in blocks of `block_size` bytes. Each `I` section produces a new table and
+    at least one batch (empty if the section has no records). Batches are at most `batch_size`
+    rows with every value kept as a string.
     """
+    table_current: AEMOTableSchema | None = None
+    table_has_batches = False
 
-    if not table_set:
-        table_set = AEMOTableSet()
+    def _end_table() -> Iterator[tuple[AEMOTableSchema, pl.DataFrame]]:
+        if table_current and not table_has_batches:
+            yield table_current, pl.DataFrame(schema=table_current.frame_schema)
 
-    content_split = content.splitlines()
+    for block in _iter_source_blocks(source, block_size):
+        # split the block into lines with a separator that never appears in MMS files
+        lines = pl.read_csv(
+            block, has_header=False, separator="\x1f", quote_char=None, new_columns=["line"], infer_schema=False
+        ).get_column("line")
+        lines = lines.filter(lines.str.strip_chars().str.len_bytes() > 0)
 
-    # @NOTE more efficient csv parsing
-    datacsv = csv.reader(content_split)
+        record_types = lines.str.extract(r"^([^,]*)", 1).str.strip_chars(' "').str.to_uppercase()
 
-    # init all the parser vars
-    table_current = None
+        # C and I rows (and anything invalid) split the block into runs of D rows
+        header_rows = (record_types != "D").arg_true().to_list()
+        position = 0
 
-    for row in datacsv:
-        if not row or type(row) is not list or len(row) < 1:
-            continue
+        for boundary in [*header_rows, lines.len()]:
+            if boundary > position and not skip_records:
+                if not table_current:
+                    logger.error("Have a record but not currently in a table")
+                else:
+                    for offset in range(position, boundary, batch_size):
+                        batch_lines = lines.slice(offset, min(batch_size, boundary - offset))
+                        yield table_current, _read_mms_records(batch_lines, table_current.fieldnames)
+                        table_has_batches = True
 
-        record_type = row[0].strip().upper()
+            position = boundary + 1
 
-        if record_type not in AEMO_ROW_HEADER_TYPES:
-            logger.info(f"Skipping row, invalid type: {record_type}")
-            continue
+            if boundary >= lines.len():
+                continue
 
-        # new table set
-        # @TODO switch to match
-        match record_type:
-            case "C":
-                # @TODO csv meta stored in table
-                if table_current:
-                    table_set.add_table(table_current, values_only=values_only)
-
-            # new table
-            case "I":
-                if table_current:
-                    table_set.add_table(table_current, values_only=values_only)
-
-                table_namespace = row[1]
-                table_name = row[2]
-                table_fields = [i.lower() for i in row[4:]]
-
-                if namespace_filter and table_namespace.lower() not in namespace_filter:
-                    table_current = None
-                    continue
-
-                table_current = AEMOTableSchema(
-                    name=table_name,
-                    namespace=table_namespace,
-                    fields=table_fields,
-                    fieldnames=table_fields,
-                    url_source=url,
-                )
-
-            # new record
-            case "D":
-                if skip_records:
-                    continue
+            record_type = record_types[boundary]
 
-                if not table_current:
-                    logger.error("Have a record but not currently in a table")
-                    continue
+            if record_type not in AEMO_ROW_HEADER_TYPES:
+                logger.info(f"Skipping row, invalid type: {record_type}")
+                continue
+
+            # new table set or new table
+            yield from _end_table()
+            table_current = None
+
+            if record_type != "I":
+                continue
+
+            row = next(csv.reader([lines[boundary]]))
+            table_namespace = row[1]
+            table_name = row[2]
+            table_fields = [i.lower() for i in row[4:]]
+
+            if namespace_filter and table_namespace.lower() not in namespace_filter:
+                continue
+
+            table_current = AEMOTableSchema(
+                name=table_name,
+                namespace=table_namespace,
+                fieldnames=table_fields,
+                url_source=url,
+            )
+            table_has_batches = False
+
+    yield from _end_table()
+
+
+def parse_aemo_mms_csv(
+    content: MMSSource,
+    table_set: AEMOTableSet | None = None,
+    namespace_filter: list[str] | None = None,
+    skip_records: bool = False,
+    url: str | None = None,
+    values_only: bool = False,
+    batch_size: int = MMS_BATCH_SIZE,
+    block_size: int = MMS_READ_BLOCK_SIZE,
+) -> AEMOTableSet:
+    """
+    Parse AEMO CSV's into schemas and return a table set
+
+    Content can be the csv as a string or an open text or binary stream (ie. a zip member)
+    which is read incrementally.
+
+    Exception raised on error and logs malformed CSVs
+    """
 
-                values = row[4:]
+    if not table_set:
+        table_set = AEMOTableSet()
 
-                if len(values) != len(table_current.fieldnames):
-                    logger.error("Malformed AEMO csv - length mismatch between records and fields")
-                    continue
+    table_current: AEMOTableSchema | None = None
 
-                record = dict(zip(table_current.fieldnames, values, strict=True))
+    for table, batch in iter_aemo_mms_batches(
+        content,
+        namespace_filter=namespace_filter,
+        skip_records=skip_records,
+        url=url,
+        batch_size=batch_size,
+        block_size=block_size,
+    ):
+        if table is not table_current:
+            if table_current:
+                table_set.add_table(table_current, values_only=values_only)
 
-                for field, fieldvalue in record.items():
-                    if field in MMS_DUID_FIELDS:
-                        fieldvalue_parsed = normalize_duid(fieldvalue)
-                        record[field] = fieldvalue_parsed
+            table_current = table
+            table_current._values_only = values_only
 
-                table_current.add_record(record, values_only=values_only)
+        table_current.add_chunk(batch)
 
-            case _:
-                logger.error(f"Invalid AEMO record type: {record_type}")
+    if table_current:
+        table_set.add_table(table_current, values_only=values_only)
 
     return table_set
 
 
 async def parse_aemo_url(
-    url: str, table_set: AEMOTableSet | None = None, skip_records: bool = False, values_only: bool = False
+    url: str,
+    table_set: AEMOTableSet | None = None,
+    skip_records: bool = False,
+    values_only: bool = False,
+    entry: DirlistingEntry | None = None,
 ) -> AEMOTableSet:
-    """Parse a single AEMO URL into an AEMOTableSet"""
+    """Parse a single AEMO URL into an AEMOTableSet. Pass the directory listing entry for the url
+    to download through the archive cache"""
 
     if not table_set:
         table_set = AEMOTableSet()
 
     try:
-        csv_content = await url_downloader(url)
+        csv_content = await url_downloader(url, entry=entry)
     except Exception as e:
         raise Exception(f"Could not fetch AEMO url {url}: {e}") from None
 
     if not csv_content:
         raise Exception(f"Could not parse URL: {url}")
 
-    csv_content_decoded = csv_content.decode("utf-8")
-    table_set = parse_aemo_mms_csv(csv_content_decoded, table_set, skip_records=skip_records, url=url, values_only=values_only)
+    table_set = parse_aemo_mms_csv(
+        io.BytesIO(csv_content), table_set, skip_records=skip_records, url=url, values_only=values_only
+    )
 
     # Count number of records
     total_records = 0
 
     for table in table_set.tables:
-        total_records += len(table.records)
+        total_records += table.num_records
 
     logger.info(f"Parsed {total_records} records")
 
     return table_set
 
 
+def _parse_aemo_zip(
+    zf: ZipFile, table_set: AEMOTableSet, url: str | None = None, values_only: bool = False, nested: bool = True
+) -> AEMOTableSet:
+    """Parses the csv members of a zip, and of any zips inside it, streamed straight from the archive"""
+    for _, fh in iter_zip_member_streams(zf, nested=nested):
+        table_set = parse_aemo_mms_csv(fh, table_set=table_set, url=url, values_only=values_only)
+
+    return table_set
+
+
+def parse_aemo_content(
+    content: bytes,
+    url: str | None = None,
+    table_set: AEMOTableSet | None = None,
+    values_only: bool = False,
+    nested: bool = True,
+) -> AEMOTableSet:
+    """Parses downloaded AEMO content, either a csv or a zip of csvs (or of zips). Module level and
+    synchronous so it can be run in a process pool. With nested False, zips inside a zip are skipped"""
+    if not table_set:
+        table_set = AEMOTableSet()
+
+    buffer = io.BytesIO(content)
+
+    if is_zipfile(buffer):
+        buffer.seek(0)
+
+        return _parse_aemo_zip(open_zip(buffer), table_set=table_set, url=url, values_only=values_only, nested=nested)
+
+    buffer.seek(0)
+
+    return parse_aemo_mms_csv(buffer, table_set=table_set, url=url, values_only=values_only)
+
+
 def parse_aemo_file(file: str, table_set: AEMOTableSet | None = None, values_only: bool = False) -> AEMOTableSet:
-    """Parses a local AEMO file"""
+    """Parses a local AEMO file. Zip files are parsed member by member straight from the archive"""
     if not table_set:
         table_set = AEMOTableSet()
 
@@ -296,15 +583,26 @@ def parse_aemo_file(file: str, table_set: AEMOTableSet | None = None, values_onl
     if not file_path.is_file():
         raise Exception(f"Not a file {file_path}")
 
+    if file_path.suffix.lower() == ".zip":
+        with ZipFile(file_path) as zf:
+            return _parse_aemo_zip(zf, table_set=table_set, values_only=values_only)
+
     if file_path.suffix.lower() != ".csv":
         raise Exception(f"Not a CSV file {file_path}")
 
-    with file_path.open() as fh:
-        table_set = parse_aemo_mms_csv(fh.read(), table_set=table_set, values_only=values_only)
+    with file_path.open(newline="") as fh:
+        table_set = parse_aemo_mms_csv(fh, table_set=table_set, values_only=values_only)
 
     return table_set
 
 
+def parse_aemo_content_buffers(
+    content: bytes, url: str | None = None, values_only: bool = False, nested: bool = True
+) -> list[AEMOTableBuffer]:
+    """Process pool entry point for parse_aemo_content returning columnar table buffers"""
+    return parse_aemo_content(content, url=url, values_only=values_only, nested=nested).to_buffers()
+
+
 # debug entry point
 if __name__ == "__main__":
     # @TODO parse into MMS schema
@@ -1,14 +1,18 @@
 """NEMWeb optimized parsers"""
 
+import asyncio
 import logging
-from shutil import rmtree
+from collections.abc import AsyncIterator
 
 from rnet.exceptions import TimeoutError as RnetTimeoutError
 
+from opennem import settings
 from opennem.controllers.nem import store_aemo_tableset
 from opennem.controllers.schema import ControllerReturn
-from opennem.core.parsers.aemo.mms import AEMOTableSet, parse_aemo_file
-from opennem.utils.archive import download_and_unzip
+from opennem.core.parsers.aemo.mms import AEMOTableBuffer, AEMOTableSet, parse_aemo_content_buffers
+from opennem.core.parsers.dirlisting import DirlistingEntry
+from opennem.utils.archive import download_zip, open_zip
+from opennem.utils.process_pool import run_in_process
 
 logger = logging.getLogger("opennem.core.parsers.aemo.nemweb")
 
@@ -21,98 +25,114 @@ def _log_download_error(url: str, error: Exception) -> None:
         logger.error(f"Error downloading and unzipping {url}: {error}")
 
 
+async def _parse_archive_in_process(
+    content: bytes, url: str, values_only: bool = False
+) -> AsyncIterator[tuple[str, AEMOTableSet]]:
+    """Parses a downloaded archive across the shared process pool, yielding each part's table set
+    as it completes. Nested zips are sent to the workers still compressed and csvs at the top level
+    of the archive are streamed out of it by a single worker - nothing is extracted to disk.
+
+    At most settings.parse_process_workers parts are in flight at once, from reading a nested zip
+    out of the archive until its table set has been consumed, so memory is bounded by the pool
+    rather than the size of the archive"""
+    in_flight = asyncio.Semaphore(settings.parse_process_workers)
+
+    with open_zip(content) as zf:
+
+        async def _parse(name: str, nested: bool) -> tuple[str, list[AEMOTableBuffer]]:
+            await in_flight.acquire()
+            part = zf.read(name) if nested else content
+
+            return name, await run_in_process(parse_aemo_content_buffers, part, url, values_only, nested)
+
+        members = zf.namelist()
+        tasks = [asyncio.ensure_future(_parse(member, True)) for member in members if member.lower().endswith(".zip")]
+
+        if any(member.lower().endswith(".csv") for member in members):
+            tasks.append(asyncio.ensure_future(_parse(url, False)))
+
+        logger.debug(f"Parsing {len(tasks)} parts of {url}")
+
+        try:
+            for completed in asyncio.as_completed(tasks):
+                name, buffers = await completed
+
+                try:
+                    yield name, AEMOTableSet.from_buffers(buffers)
+                finally:
+                    in_flight.release()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _merge_controller_return(cr: ControllerReturn, controller_returns: ControllerReturn) -> None:
+    cr.inserted_records += controller_returns.inserted_records
+
+    if controller_returns.last_modified and (not cr.last_modified or cr.last_modified < controller_returns.last_modified):
+        cr.last_modified = controller_returns.last_modified
+
+
 async def parse_aemo_url_optimized(
-    url: str, table_set: AEMOTableSet | None = None, persist_to_db: bool = True, values_only: bool = False
+    url: str,
+    table_set: AEMOTableSet | None = None,
+    persist_to_db: bool = True,
+    values_only: bool = False,
+    entry: DirlistingEntry | None = None,
 ) -> ControllerReturn | AEMOTableSet:
-    """Optimized version of aemo url parser that stores the files locally in tmp
-    and parses them individually to resolve memory pressure"""
+    """Optimized version of aemo url parser that streams the archive members into the parser
+    across the process pool. Each part is persisted as soon as it is parsed"""
     cr = ControllerReturn()
 
     try:
-        download_path = await download_and_unzip(url)
+        content = await download_zip(url, entry=entry)
     except Exception as e:
         _log_download_error(url, e)
         return cr
 
-    download_path_files = [f for f in download_path.iterdir() if f.is_file()]
-
-    logger.debug(f"Got {len(download_path_files)} files")
-
     if not table_set:
         table_set = AEMOTableSet()
 
-    for csv_file_to_process in download_path_files:
-        logger.info(f"parse_aemo_url_optimized parsing {csv_file_to_process}")
-
-        if csv_file_to_process.suffix.lower() != ".csv":
-            continue
-
-        table_set = parse_aemo_file(str(csv_file_to_process), table_set=table_set, values_only=values_only)
+    async for part_name, part_table_set in _parse_archive_in_process(content, url, values_only):
+        logger.info(f"parse_aemo_url_optimized parsed {part_name}")
 
         if persist_to_db:
-            controller_returns = await store_aemo_tableset(table_set)
-            cr.inserted_records += controller_returns.inserted_records
-
-            if cr.last_modified and controller_returns.last_modified and cr.last_modified < controller_returns.last_modified:
-                cr.last_modified = controller_returns.last_modified
-
-        try:
-            csv_file_to_process.unlink()
-        except Exception as e:
-            logger.error(f"Error removing file {csv_file_to_process}: {e}")
+            _merge_controller_return(cr, await store_aemo_tableset(part_table_set))
+        else:
+            for table in part_table_set.tables:
+                table_set.add_table(table, values_only=values_only)
 
     if not persist_to_db:
         return table_set
 
-    try:
-        rmtree(download_path)
-        logger.info(f"Removed {download_path}")
-    except Exception as e:
-        logger.error(f"Error removing download path: {e}")
-
     return cr
 
 
 async def parse_aemo_url_optimized_bulk(
-    url: str, table_set: AEMOTableSet | None = None, persist_to_db: bool = True
+    url: str, table_set: AEMOTableSet | None = None, persist_to_db: bool = True, entry: DirlistingEntry | None = None
 ) -> ControllerReturn | AEMOTableSet:
-    """Optimized version of aemo url parser that stores the files locally in tmp
-    and parses them individually to resolve memory pressure"""
+    """Optimized version of aemo url parser that streams the archive members into the parser
+    across the process pool and persists them in one go"""
     cr = ControllerReturn()
 
     try:
-        download_path = await download_and_unzip(url)
+        content = await download_zip(url, entry=entry)
     except Exception as e:
         _log_download_error(url, e)
         return cr
 
-    download_path_files = [f for f in download_path.iterdir() if f.is_file()]
-    logger.debug(f"Got {len(download_path_files)} files")
+    ts = table_set or AEMOTableSet()
 
-    ts = AEMOTableSet()
+    async for part_name, part_table_set in _parse_archive_in_process(content, url):
+        logger.info(f"parse_aemo_url_optimized_bulk parsed {part_name}")
 
-    for f in download_path_files:
-        logger.info(f"parse_aemo_url_optimized_bulk parsing {f}")
+        for table in part_table_set.tables:
+            ts.add_table(table)
 
-        if f.suffix.lower() != ".csv":
-            continue
-
-        ts = parse_aemo_file(str(f), table_set=ts)
-
-        if not persist_to_db:
-            return ts
-
-    controller_returns = await store_aemo_tableset(ts)
-    cr.inserted_records += controller_returns.inserted_records
-
-    if cr.last_modified and controller_returns.last_modified and cr.last_modified < controller_returns.last_modified:
-        cr.last_modified = controller_returns.last_modified
+    if not persist_to_db:
+        return ts
 
-    try:
-        rmtree(download_path)
-        logger.info(f"Removed {download_path}")
-    except Exception as e:
-        logger.error(f"Error removing download path: {e}")
+    _merge_controller_return(cr, await store_aemo_tableset(ts))
 
     return cr
 
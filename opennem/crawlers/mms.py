@@ -118,11 +118,11 @@ async def process_mms_url(crawler: CrawlerDefinition) -> ControllerReturn | None
             # to disk and parse rather than in-memory. 100,000kb
 
             if crawler.bulk_insert:
-                controller_returns = await parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True)
+                controller_returns = await parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True, entry=entry)
             elif entry.file_size and entry.file_size > 100_000:
-                controller_returns = await parse_aemo_url_optimized(entry.link)
+                controller_returns = await parse_aemo_url_optimized(entry.link, entry=entry)
             else:
-                ts = parse_aemo_url(entry.link)
+                ts = await parse_aemo_url(entry.link, entry=entry)
                 controller_returns = await store_aemo_tableset(ts)
 
             if not controller_returns:
@@ -1,19 +1,25 @@
 """Nemweb crawlers"""
 
 import asyncio
+import functools
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from opennem import settings
 from opennem.controllers.nem import ControllerReturn, store_aemo_tableset
+from opennem.core.archive_cache import get_archive_cache
 from opennem.core.crawlers.history import CrawlHistoryEntry, get_crawler_missing_intervals, set_crawler_history
+from opennem.core.crawlers.pipeline import PipelineResult, PipelineStage, run_pipeline
 from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerPriority, CrawlerSchedule
+from opennem.core.downloader import url_fetch
 from opennem.core.parsers.aemo.filenames import AEMODataBucketSize
-from opennem.core.parsers.aemo.mms import parse_aemo_url
-from opennem.core.parsers.aemo.nemweb import parse_aemo_url_optimized, parse_aemo_url_optimized_bulk
+from opennem.core.parsers.aemo.mms import AEMOTableSet, parse_aemo_content, parse_aemo_content_buffers
 from opennem.core.parsers.dirlisting import DirlistingEntry, get_dirlisting
 from opennem.crawlers.utils import get_time_interval_for_crawler
 from opennem.schema.date_range import CrawlDateRange
 from opennem.schema.network import NetworkAEMORooftop, NetworkNEM
+from opennem.utils.process_pool import run_in_process
 
 logger = logging.getLogger("opennem.crawler.nemweb")
 
@@ -45,37 +51,72 @@ async def _handle_fetch_error(crawler: CrawlerDefinition, entry: DirlistingEntry
         logger.error(f"Error recording age-out history for {entry.link}: {e}")
 
 
-async def process_nemweb_entry(crawler: CrawlerDefinition, entry: DirlistingEntry, max_date: datetime) -> ControllerReturn:
-    controller_return: ControllerReturn | None = None
+@dataclass
+class NemwebCrawlItem:
+    """An entry moving through the nemweb crawl pipeline"""
+
+    entry: DirlistingEntry
+    content: bytes | None = None
+    table_set: AEMOTableSet | None = None
+
+
+async def _download_nemweb_entry(crawler: CrawlerDefinition, item: NemwebCrawlItem) -> NemwebCrawlItem | None:
+    """Download stage - fetches the raw archive, parsing happens in the next stage"""
+    try:
+        item.content = await url_fetch(item.entry.link, entry=item.entry)
+    except Exception as e:
+        await _handle_fetch_error(crawler=crawler, entry=item.entry, error=e)
+        return None
+
+    if not item.content:
+        logger.warning(f"No content for {item.entry.link}")
+        return None
+
+    return item
+
+
+async def _parse_nemweb_entry(item: NemwebCrawlItem) -> NemwebCrawlItem | None:
+    """Parse stage - large archives are parsed in the process pool so they don't hold the
+    event loop, small files are parsed in a thread"""
+    if not item.content:
+        return None
 
     try:
-        # @NOTE optimization - if we're dealing with a large file unzip
-        # to disk and parse rather than in-memory. 100,000kb
-        if crawler.bulk_insert:
-            controller_return = await parse_aemo_url_optimized_bulk(entry.link, persist_to_db=True)  # type: ignore
-        elif entry.file_size and entry.file_size > 100_000:
-            controller_return = await parse_aemo_url_optimized(entry.link)  # type: ignore
+        if len(item.content) >= settings.nemweb_crawl_process_parse_min_bytes:
+            buffers = await run_in_process(parse_aemo_content_buffers, item.content, item.entry.link)
+            item.table_set = AEMOTableSet.from_buffers(buffers)
         else:
-            try:
-                ts = await parse_aemo_url(entry.link)
-                controller_return = await store_aemo_tableset(ts)
-            except Exception as e:
-                await _handle_fetch_error(crawler=crawler, entry=entry, error=e)
-                return None
+            item.table_set = await asyncio.to_thread(parse_aemo_content, item.content, item.entry.link)
     except Exception as e:
-        logger.error(f"Processing error: {e}")
-        raise e
+        logger.error(f"Error parsing {item.entry.link}: {e}")
+        return None
+    finally:
+        item.content = None
+
+    return item
+
+
+async def _persist_nemweb_entry(crawler: CrawlerDefinition, item: NemwebCrawlItem, max_date: datetime) -> ControllerReturn | None:
+    """Persist stage - stores the table set and records the crawl history for the entry"""
+    if not item.table_set:
+        return None
+
+    controller_return = await store_aemo_tableset(item.table_set)
+    item.table_set = None
+
     if not isinstance(controller_return, ControllerReturn):
         raise Exception("Controller returns not a ControllerReturn")
 
     # don't update crawl time if it fails
     if not controller_return.inserted_records:
-        logger.warning(f"No records inserted for {entry.link}")
+        logger.warning(f"No records inserted for {item.entry.link}")
         return controller_return
 
     if not controller_return.last_modified or max_date > controller_return.last_modified:
         controller_return.last_modified = max_date
 
+    entry = item.entry
+
     if controller_return.processed_records and entry.aemo_interval_date and entry.aemo_interval_date.date:
         ch = CrawlHistoryEntry(interval=entry.aemo_interval_date.date, records=controller_return.processed_records)
 
@@ -87,6 +128,30 @@ async def process_nemweb_entry(crawler: CrawlerDefinition, entry: DirlistingEntr
     return controller_return
 
 
+async def process_nemweb_entries(
+    crawler: CrawlerDefinition, entries: list[DirlistingEntry], max_date: datetime
+) -> PipelineResult:
+    """Runs entries through the download -> parse -> persist pipeline. Each stage has its own
+    concurrency so a slow download doesn't hold up parsing or writes of the other entries"""
+    stages = [
+        PipelineStage(
+            name="download",
+            func=functools.partial(_download_nemweb_entry, crawler),
+            concurrency=settings.nemweb_crawl_download_concurrency,
+        ),
+        PipelineStage(name="parse", func=_parse_nemweb_entry, concurrency=settings.nemweb_crawl_parse_concurrency),
+        PipelineStage(
+            name="persist",
+            func=functools.partial(_persist_nemweb_entry, crawler, max_date=max_date),
+            concurrency=settings.nemweb_crawl_persist_concurrency,
+        ),
+    ]
+
+    return await run_pipeline(
+        (NemwebCrawlItem(entry=entry) for entry in entries), stages=stages, queue_size=settings.nemweb_crawl_queue_size
+    )
+
+
 async def run_nemweb_aemo_crawl(
     crawler: CrawlerDefinition,
     run_fill: bool = True,
@@ -172,31 +237,23 @@ async def run_nemweb_aemo_crawl(
 
     max_date = max([i.modified_date for i in entries_to_fetch if i.modified_date])
 
-    tasks = []
-    for entry in entries_to_fetch:
-        tasks.append(process_nemweb_entry(crawler=crawler, entry=entry, max_date=max_date))
-
-        if len(tasks) >= 3:
-            task_results = await asyncio.gather(*tasks)
-
-            for task_result in task_results:
-                if task_result:
-                    controller_return.inserted_records += task_result.inserted_records
-                    controller_return.processed_records += task_result.processed_records
-                    controller_return.total_records += task_result.total_records
-                # None means process_nemweb_entry already logged the parse error with correct URL
+    pipeline_result = await process_nemweb_entries(crawler=crawler, entries=entries_to_fetch, max_date=max_date)
+    pipeline_result.log_summary(name=crawler.name)
 
-            tasks = []
+    if settings.archive_cache_enabled:
+        cache_stats = get_archive_cache().stats
+        logger.info(
+            f"Archive cache totals: {cache_stats.hits} hits, {cache_stats.misses} misses "
+            f"({cache_stats.hit_ratio:.0%}), {cache_stats.bytes_read / 1024 / 1024:.1f}MB read from cache"
+        )
 
-    # complete any remaining tasks
-    if tasks:
-        task_results = await asyncio.gather(*tasks)
+    for task_result in pipeline_result.results:
+        controller_return.inserted_records += task_result.inserted_records
+        controller_return.processed_records += task_result.processed_records
+        controller_return.total_records += task_result.total_records
 
-        for task_result in task_results:
-            if task_result:
-                controller_return.inserted_records += task_result.inserted_records
-                controller_return.processed_records += task_result.processed_records
-                controller_return.total_records += task_result.total_records
+    # entries that failed to fetch or parse have already been logged with their url
+    controller_return.errors += sum(stage.errors for stage in pipeline_result.stages)
 
     if controller_return:
         controller_return.crawls_run = len(entries_to_fetch)
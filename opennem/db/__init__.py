@@ -21,6 +21,7 @@ from sqlalchemy.pool import NullPool
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from opennem import settings
+from opennem.db.pool import DBWorkload, get_db_workload, get_engine_pool_size
 from opennem.utils.version import get_version
 
 DeclarativeBase = declarative_base()
@@ -62,17 +63,34 @@ retry_on_deadlock = retry(
 _engine = None
 _engine_sync = None
 _engine_no_transaction = None
+_workload_engines: dict[DBWorkload, AsyncEngine] = {}
 
 
-def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int = 30) -> AsyncEngine:
+def _create_workload_engine(db_conn_str: str, workload: DBWorkload, timeout: int | None = None) -> AsyncEngine:
+    pool_size, max_overflow = get_engine_pool_size(workload)
+
+    return create_async_engine(
+        db_conn_str,
+        query_cache_size=1200,
+        echo=settings.db_debug,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=timeout or settings.db_pool_timeout,
+        pool_pre_ping=True,
+    )
+
+
+def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int | None = None) -> AsyncEngine:
     """
     Performs database connection using database settings from settings.py.
 
-    Returns sqlalchemy engine instance
+    Returns sqlalchemy engine instance for the live workload
 
     :param db_conn_str: Database connection string
     :param debug: Debug mode will render queries and info to terminal
-    :param timeout: Database connection timeout
+    :param timeout: Database connection timeout, defaults to settings.db_pool_timeout
     """
     global _engine
 
@@ -83,17 +101,8 @@ def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int
         db_conn_str = str(settings.db_url)
 
     try:
-        _engine = create_async_engine(
-            db_conn_str,
-            query_cache_size=1200,
-            echo=settings.db_debug,
-            future=True,
-            pool_size=5,
-            max_overflow=10,
-            pool_recycle=1800,
-            pool_timeout=timeout,
-            pool_pre_ping=True,
-        )
+        _engine = _create_workload_engine(db_conn_str, DBWorkload.live, timeout=timeout)
+        _workload_engines[DBWorkload.live] = _engine
 
         return _engine
     except Exception as exc:
@@ -101,6 +110,31 @@ def db_connect(db_conn_str: str | None = None, debug: bool = False, timeout: int
         raise exc
 
 
+def get_workload_engine(workload: DBWorkload | None = None) -> AsyncEngine:
+    """
+    Gets the engine for a workload (defaults to the workload of the current context).
+    Backfill gets its own smaller pool so it can't take the connections the live crawl needs.
+    """
+    workload = workload or get_db_workload()
+
+    if workload == DBWorkload.live:
+        return db_connect()
+
+    if workload not in _workload_engines:
+        try:
+            _workload_engines[workload] = _create_workload_engine(str(settings.db_url), workload)
+        except Exception as exc:
+            logger.error("Could not connect to database: %s", exc)
+            raise exc
+
+    return _workload_engines[workload]
+
+
+def get_workload_engines() -> dict[DBWorkload, AsyncEngine]:
+    """The engines that have been created, by workload"""
+    return dict(_workload_engines)
+
+
 def get_no_transaction_engine(db_conn_str: str | None = None) -> AsyncEngine:
     """
     Creates a separate engine specifically for operations that cannot run in transactions.
@@ -178,9 +212,19 @@ SessionNoTransaction = async_sessionmaker(
 )
 
 
+def _workload_session_kwargs() -> dict[str, AsyncEngine]:
+    """Binds sessions to the workload engine when the current context isn't the live workload"""
+    workload = get_db_workload()
+
+    if workload == DBWorkload.live:
+        return {}
+
+    return {"bind": get_workload_engine(workload)}
+
+
 @asynccontextmanager
 async def get_read_session() -> AsyncGenerator[AsyncSession]:
-    async with SessionLocal() as session:
+    async with SessionLocal(**_workload_session_kwargs()) as session:
         try:
             yield session
         finally:
@@ -189,7 +233,7 @@ async def get_read_session() -> AsyncGenerator[AsyncSession]:
 
 @asynccontextmanager
 async def get_write_session() -> AsyncGenerator[AsyncSession]:
-    async with SessionLocalAsync() as session:
+    async with SessionLocalAsync(**_workload_session_kwargs()) as session:
         try:
             yield session
         except Exception:
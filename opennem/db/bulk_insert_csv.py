@@ -2,7 +2,9 @@
 """
 OpenNEM Bulk Insert Pipeline
 
-Bulk inserts records using temporary tables and CSV imports with copy_from
+Bulk inserts records using temporary tables and binary COPY. Records can be passed as a list
+of dicts or as a polars frame. Frames are cast to the table column types in one vectorised
+pass and streamed to Postgres in bounded chunks.
 
 """
 
@@ -15,18 +17,16 @@ from io import StringIO
 from typing import Any, TypeVar
 
 import asyncpg
-from asyncpg.pool import Pool
+import polars as pl
 from sqlalchemy.sql.schema import Column, Table
 
-from opennem import settings
 from opennem.db.models.opennem import BalancingSummary, FacilityScada
+from opennem.db.pool import acquire_connection
 
 logger = logging.getLogger("opennem.db.bulk_insert_csv")
 
 ORMTableType = TypeVar("ORMTableType", bound=Table)
 
-# At the module level, create a connection pool
-pool: Pool | None = None
 
 _BULK_INSERT_QUERY = """
     CREATE TEMP TABLE __tmp_{table_name}_{tmp_table_name}
@@ -115,66 +115,146 @@ def build_insert_query(
     return f"__tmp_{table.__table__.name}_{tmp_table_name}", query.split(";")
 
 
-async def get_pool() -> Pool:
-    global pool
-    if pool is None:
-        pool = await asyncpg.create_pool(
-            dsn=settings.db_url.replace("+asyncpg", ""),
-            min_size=1,
-            max_size=3,
+# rows per COPY transaction
+BULK_INSERT_CHUNK_SIZE = 50_000
+
+# column name -> postgres data type per table. Table definitions only change with a migration
+# and a deploy so this is cached for the life of the process
+_TABLE_COLUMN_TYPES: dict[str, dict[str, str]] = {}
+
+_TIMESTAMP_TYPES = ("timestamp without time zone", "timestamp with time zone")
+_FLOAT_TYPES = ("numeric", "double precision", "real")
+_INTEGER_TYPES = ("integer", "bigint", "smallint")
+_BOOLEAN_TRUE_VALUES = ["true", "t", "yes", "y", "1"]
+
+
+def _get_table_schema_name(table: Table) -> str | None:
+    table_args = getattr(table, "__table_args__", None)
+
+    if isinstance(table_args, dict):
+        return table_args.get("schema")
+
+    if isinstance(table_args, tuple):
+        for i in table_args:
+            if isinstance(i, dict) and "schema" in i:
+                return i["schema"]
+
+    return None
+
+
+async def get_table_column_types(conn: asyncpg.Connection, table: Table) -> dict[str, str]:
+    """Get the column names and postgres data types for a table, cached per table"""
+    table_name = table.__table__.name
+    table_schema = _get_table_schema_name(table)
+    cache_key = f"{table_schema}.{table_name}" if table_schema else table_name
+
+    if cache_key not in _TABLE_COLUMN_TYPES:
+        table_info = await conn.fetch(
+            """
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_name = $1 AND table_schema = coalesce($2, current_schema())
+            ORDER BY ordinal_position
+            """,
+            table_name,
+            table_schema,
         )
-    return pool
+
+        if not table_info:
+            raise Exception(f"No columns found for table {cache_key}")
+
+        _TABLE_COLUMN_TYPES[cache_key] = {col["column_name"]: col["data_type"] for col in table_info}
+
+    return _TABLE_COLUMN_TYPES[cache_key]
+
+
+def _cast_column_expr(name: str, dtype: pl.DataType, data_type: str) -> pl.Expr:
+    """Vectorised equivalent of the per value record conversion for a single column"""
+    col = pl.col(name)
+
+    if dtype == pl.Null:
+        return col
+
+    if data_type in _TIMESTAMP_TYPES:
+        if isinstance(dtype, pl.Datetime):
+            return col.dt.replace_time_zone(None) if dtype.time_zone else col
+        if dtype == pl.Date:
+            return col.cast(pl.Datetime)
+        return col.cast(pl.String).str.to_datetime(time_unit="us")
+
+    if data_type in _FLOAT_TYPES:
+        if dtype == pl.String:
+            col = pl.when(col == "").then(None).otherwise(col)
+        return col.cast(pl.Float64)
+
+    if data_type == "boolean":
+        if dtype == pl.Boolean:
+            return col
+        return col.cast(pl.String).str.to_lowercase().is_in(_BOOLEAN_TRUE_VALUES)
+
+    if data_type in _INTEGER_TYPES:
+        return col.cast(pl.Int64)
+
+    return col.cast(pl.String)
+
+
+def cast_frame_to_table_types(frame: pl.DataFrame, column_types: dict[str, str]) -> pl.DataFrame:
+    """Cast a frame to the table column types and order, filling missing columns with nulls"""
+    return frame.select(
+        [
+            _cast_column_expr(name, frame.schema[name], data_type).alias(name)
+            if name in frame.columns
+            else pl.lit(None).alias(name)
+            for name, data_type in column_types.items()
+        ]
+    )
+
+
+def _cast_record_value(value: Any, data_type: str) -> Any:
+    if value is None:
+        return None
+    if data_type in _TIMESTAMP_TYPES:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if data_type in _FLOAT_TYPES:
+        return float(value) if value != "" else None
+    if data_type == "boolean":
+        return str(value).lower() in _BOOLEAN_TRUE_VALUES
+    if data_type in _INTEGER_TYPES:
+        return int(value)
+    return str(value)
+
+
+def cast_records_to_table_types(records: list[dict], column_types: dict[str, str]) -> list[tuple]:
+    """Cast a list of dict records to tuples in table column order"""
+    return [
+        tuple(_cast_record_value(record.get(name), data_type) for name, data_type in column_types.items()) for record in records
+    ]
 
 
 async def _bulkinsert_mms_items_inner[ORMTableType: Table](
     table: type[ORMTableType],
-    records: list[dict],
+    records: list[dict] | pl.DataFrame,
     update_fields: list[str | Column[Any]] | None = None,
 ) -> int:
-    """Execute bulk insert in a single transaction. Caller handles retries."""
+    """Execute bulk insert of a single chunk in a single transaction. Caller handles retries."""
     tmp_table_name, sql_queries = build_insert_query(table=table, update_cols=update_fields)
 
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    async with acquire_connection() as conn:
+        column_types = await get_table_column_types(conn, table)
+
+        if isinstance(records, pl.DataFrame):
+            records_to_insert = cast_frame_to_table_types(records, column_types).iter_rows()
+        else:
+            records_to_insert = cast_records_to_table_types(records, column_types)
+
         async with conn.transaction():
             # Execute CREATE TEMP TABLE
             await conn.execute(sql_queries[0])
 
-            # Get column names and types from the temporary table
-            table_info = await conn.fetch(f"""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = '{tmp_table_name.split(".")[-1]}'
-            """)
-
-            # Prepare records
-            columns = [col["column_name"] for col in table_info]
-            column_types = {col["column_name"]: col["data_type"] for col in table_info}
-
-            records_to_insert = []
-            for record in records:
-                record_values = []
-                for col in columns:
-                    value = record.get(col)
-                    if value is None:
-                        record_values.append(None)
-                    elif column_types[col] == "timestamp without time zone":
-                        record_values.append(value if isinstance(value, datetime) else datetime.fromisoformat(str(value)))
-                    elif column_types[col] == "numeric":
-                        record_values.append(float(value) if value is not None and value != "" else None)
-                    elif column_types[col] == "boolean":
-                        value = str(value).lower()
-                        record_values.append(value in ("true", "t", "yes", "y", "1"))
-                    elif column_types[col] in ("integer", "bigint", "smallint"):
-                        record_values.append(int(value) if value is not None else None)
-                    else:
-                        record_values.append(str(value))
-                records_to_insert.append(record_values)
-
             await conn.copy_records_to_table(
                 tmp_table_name.split(".")[-1],
                 records=records_to_insert,
-                columns=columns,
+                columns=list(column_types.keys()),
             )
 
             insert_result = await conn.execute(sql_queries[2])
@@ -188,14 +268,11 @@ async def _bulkinsert_mms_items_inner[ORMTableType: Table](
 _DEADLOCK_MAX_RETRIES = 3
 
 
-async def bulkinsert_mms_items[ORMTableType: Table](
+async def _bulkinsert_chunk_with_retry[ORMTableType: Table](
     table: type[ORMTableType],
-    records: list[dict],
+    records: list[dict] | pl.DataFrame,
     update_fields: list[str | Column[Any]] | None = None,
 ) -> int:
-    if not records:
-        return 0
-
     table_name = table.__table__.name
 
     for attempt in range(_DEADLOCK_MAX_RETRIES):
@@ -215,6 +292,28 @@ async def bulkinsert_mms_items[ORMTableType: Table](
     return 0
 
 
+async def bulkinsert_mms_items[ORMTableType: Table](
+    table: type[ORMTableType],
+    records: list[dict] | pl.DataFrame,
+    update_fields: list[str | Column[Any]] | None = None,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+) -> int:
+    """Bulk insert records or a frame into a table, upserting update_fields on conflict.
+
+    Large inputs are split into chunks of chunk_size rows, each copied and merged in its own
+    transaction so memory and lock time stay bounded."""
+    if records is None or len(records) == 0:
+        return 0
+
+    num_records = 0
+
+    for offset in range(0, len(records), chunk_size):
+        chunk = records.slice(offset, chunk_size) if isinstance(records, pl.DataFrame) else records[offset : offset + chunk_size]
+        num_records += await _bulkinsert_chunk_with_retry(table, chunk, update_fields)
+
+    return num_records
+
+
 def generate_csv_from_records(
     table: Table | FacilityScada | BalancingSummary,
     records: list[dict],
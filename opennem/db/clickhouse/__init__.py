@@ -5,23 +5,35 @@ Re-exports from client module for backwards compatibility.
 """
 
 from opennem.db.clickhouse.client import (
+    close_clickhouse_pools,
     create_table_if_not_exists,
     drop_table_if_exists,
     execute_async,
     get_clickhouse_client,
     get_clickhouse_context,
     get_clickhouse_dependency,
+    get_clickhouse_insert_client,
+    get_clickhouse_pool,
     insert_async,
+    insert_frame,
+    insert_frame_async,
+    new_clickhouse_client,
     table_exists,
 )
 
 __all__ = [
+    "close_clickhouse_pools",
     "create_table_if_not_exists",
     "drop_table_if_exists",
     "execute_async",
     "get_clickhouse_client",
     "get_clickhouse_context",
     "get_clickhouse_dependency",
+    "get_clickhouse_insert_client",
+    "get_clickhouse_pool",
     "insert_async",
+    "insert_frame",
+    "insert_frame_async",
+    "new_clickhouse_client",
     "table_exists",
 ]
@@ -1,25 +1,32 @@
 """
 ClickHouse database connection and utilities module.
 
-This module provides thread-local ClickHouse clients and common utilities for working with ClickHouse.
+This module provides thread-local ClickHouse clients for sync code, the pools async code runs
+its queries and inserts on, and common utilities for working with ClickHouse.
 """
 
 import asyncio
 import logging
 import threading
+import uuid
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Any
 
+import numpy as np
+import polars as pl
 from clickhouse_driver import Client
+from starlette.requests import Request
 
 from opennem import settings
+from opennem.db.clickhouse.pool import ClickHousePool, ClickHousePoolKind, ClickHouseRequestClient
+from opennem.db.clickhouse.profiling import profile_query, result_rows
 
 logger = logging.getLogger("opennem.db.clickhouse")
 
-# Thread-local storage — one Client per thread.  asyncio.to_thread dispatches
-# queries to a thread pool, so each thread needs its own connection to avoid
-# "Simultaneous queries on single connection" errors.
+# Thread-local storage — one Client per thread for sync code, so concurrent threads
+# don't hit "Simultaneous queries on single connection" errors. Async code runs on
+# the pools (get_clickhouse_pool) instead.
 _local = threading.local()
 
 
@@ -44,14 +51,14 @@ def _serving_query_settings() -> dict[str, int]:
     return out
 
 
-def _make_client(timeout: int = 10) -> Client:
+def _make_client(timeout: int = 10, use_numpy: bool = False) -> Client:
     return Client(
         host=settings.clickhouse_url.host,
         port=settings.clickhouse_url.port,
         user=settings.clickhouse_url.username,
         password=settings.clickhouse_url.password,
         database=settings.clickhouse_url.path.lstrip("/") if settings.clickhouse_url.path else "",
-        settings={"connect_timeout": timeout},
+        settings={"connect_timeout": timeout, "use_numpy": use_numpy},
     )
 
 
@@ -68,60 +75,197 @@ def get_clickhouse_client(timeout: int = 10) -> Client:
     return client
 
 
-async def execute_async(client: Client, query: str, params: dict | None = None, **kwargs: Any) -> Any:
+def get_clickhouse_insert_client(timeout: int = 10) -> Client:
     """
-    Run a blocking clickhouse-driver execute() in a thread so the
-    asyncio event loop is not blocked.  Each thread in the pool gets
-    its own Client via thread-local storage.
+    Get (or create) a thread-local ClickHouse client for columnar inserts with insert_frame.
+
+    It's kept apart from get_clickhouse_client since use_numpy also makes the client return
+    query results as numpy arrays.
+    """
+    client = getattr(_local, "insert_client", None)
+    if client is None:
+        client = _make_client(timeout, use_numpy=True)
+        _local.insert_client = client
+    return client
+
+
+def new_clickhouse_client(timeout: int = 10, use_numpy: bool = False) -> Client:
+    """
+    Create a ClickHouse client that isn't shared through thread-local storage, for long
+    running workers that hold their own connection. The caller is responsible for calling
+    disconnect() and for not using it from more than one thread at a time.
+    """
+    return _make_client(timeout, use_numpy=use_numpy)
+
+
+def _frame_column_to_numpy(series: pl.Series) -> np.ndarray:
+    """
+    Column of a frame as the numpy array the driver writes. The driver's numpy float columns
+    only take None as NULL (NaN is a value), so floats with nulls go over as objects.
+    """
+    values = series.to_numpy()
+
+    if series.dtype.is_float() and series.null_count():
+        values = values.astype(object)
+        values[series.is_null().to_numpy()] = None
+
+    return values
+
+
+def insert_frame(client: Client, table: str, frame: pl.DataFrame) -> int:
+    """
+    Insert a polars frame into a table as columns. Each column goes to the driver as a numpy
+    array and is written straight into the native protocol block rather than going through a
+    python tuple per row. Frame columns are matched to table columns by name.
+
+    The client must be created with use_numpy (see get_clickhouse_insert_client).
+    """
+    if frame.is_empty():
+        return 0
+
+    query = f"INSERT INTO {table} ({', '.join(frame.columns)}) VALUES"
+
+    return client.execute(query, [_frame_column_to_numpy(series) for series in frame.get_columns()], columnar=True)
+
+
+def _kill_query(query_id: str) -> None:
+    """Kill a running query by query_id, on a connection of its own"""
+    client = _make_client()
+
+    try:
+        client.execute("KILL QUERY WHERE query_id = %(query_id)s ASYNC", {"query_id": query_id})
+    finally:
+        client.disconnect()
+
+
+_pools: dict[ClickHousePoolKind, ClickHousePool] = {}
+
+
+def get_clickhouse_pool(kind: ClickHousePoolKind = ClickHousePoolKind.query) -> ClickHousePool:
+    """
+    Get the ClickHouse pool of a kind for the running event loop, creating it on first use.
+    A pool left over from a loop that has gone away (eg. a previous asyncio.run) is closed
+    and replaced.
+    """
+    pool = _pools.get(kind)
+    loop = asyncio.get_running_loop()
+
+    if pool is not None and not pool.closed and pool.loop is loop:
+        return pool
+
+    if pool is not None:
+        pool.close()
+
+    max_size = settings.clickhouse_pool_max_size if kind == ClickHousePoolKind.query else settings.clickhouse_pool_insert_max_size
+
+    pool = ClickHousePool(
+        kind=kind,
+        connect=lambda: _make_client(use_numpy=kind == ClickHousePoolKind.insert_columnar),
+        max_size=max_size,
+        idle_timeout=settings.clickhouse_pool_idle_timeout,
+        health_check_interval=settings.clickhouse_pool_health_check_interval,
+        kill_query=_kill_query,
+    )
+    _pools[kind] = pool
+
+    logger.info(f"Created ClickHouse {kind.value} pool (max {max_size} connections)")
+
+    return pool
+
+
+def close_clickhouse_pools() -> None:
+    """Close all ClickHouse pools"""
+    for kind in list(_pools.keys()):
+        _pools.pop(kind).close()
+
+
+def get_clickhouse_pool_metrics() -> dict[str, dict[str, Any]]:
+    """Size, idle connections and queue depth of the ClickHouse pools"""
+    return {f"clickhouse_{kind.value}": pool.metrics() for kind, pool in _pools.items() if not pool.closed}
+
+
+async def insert_frame_async(table: str, frame: pl.DataFrame) -> int:
+    """Columnar counterpart to insert_async, on the insert_columnar pool. See insert_frame"""
+    query_id = str(uuid.uuid4())
+
+    def _run(client: Client) -> int:
+        with profile_query(client, f"INSERT INTO {table} ({', '.join(frame.columns)}) VALUES", "insert", query_id) as profile:
+            result = insert_frame(client, table, frame)
+            profile.rows = result_rows(result)
+
+        return result
+
+    return await get_clickhouse_pool(ClickHousePoolKind.insert_columnar).run(_run, query_id=query_id)
+
+
+async def execute_async(client: Any, query: str, params: dict | None = None, **kwargs: Any) -> Any:
+    """
+    Run a blocking clickhouse-driver execute() on a connection from the query pool so the
+    asyncio event loop is not blocked (see ``opennem.db.clickhouse.pool``).
+
+    client is what get_clickhouse_dependency yields, whose queries are cancelled and killed
+    on the server when the HTTP client disconnects. Any other client (eg. from
+    get_clickhouse_client) just selects the query pool.
 
     Conservative per-query resource limits (see ``_serving_query_settings``) are applied
     by default so one expensive serving query cannot OOM the shared server. Callers can
     override individual limits by passing ``settings={...}`` (caller keys win per-key).
+
+    Every query is profiled (see ``opennem.db.clickhouse.profiling``).
     """
     merged_settings = {**_serving_query_settings(), **(kwargs.pop("settings", None) or {})}
+    query_id = kwargs.pop("query_id", None) or str(uuid.uuid4())
 
-    def _run() -> Any:
-        tl_client = get_clickhouse_client()
-        return tl_client.execute(query, params, settings=merged_settings, **kwargs)
+    def _run(pooled_client: Client) -> Any:
+        with profile_query(pooled_client, query, "select", query_id=query_id) as profile:
+            result = pooled_client.execute(query, params, settings=merged_settings, query_id=query_id, **kwargs)
+            profile.rows = result_rows(result)
 
-    return await asyncio.to_thread(_run)
+        return result
 
+    runner = client if isinstance(client, ClickHouseRequestClient) else get_clickhouse_pool(ClickHousePoolKind.query)
 
-async def insert_async(query: str, data: Any = None, timeout: int = 10) -> Any:
-    """Run a blocking clickhouse-driver write (INSERT / DDL) in a thread so the
-    asyncio event loop keeps servicing async connections.
+    return await runner.run(_run, query_id=query_id)
+
+
+async def insert_async(query: str, data: Any = None) -> Any:
+    """Run a blocking clickhouse-driver write (INSERT / DDL) on a connection from the insert
+    pool so the asyncio event loop keeps servicing async connections.
 
     This is the aggregation/write-path counterpart to ``execute_async``. It does NOT
     apply the serving-path resource limits (see ``_serving_query_settings``) — those cap
     read queries that share the server with API traffic, and would wrongly bound bulk
-    inserts. Uses a thread-local Client so concurrent writes are thread-safe.
+    inserts. Writes have their own pool so they can't take the connections API queries need.
 
     Blocking these calls on the event loop starves asyncpg connections that are checked
     out from the pool, which drops them mid-transaction and leaks the session (issue #572).
     """
+    query_id = str(uuid.uuid4())
+
+    def _run(client: Client) -> Any:
+        with profile_query(client, query, "insert", query_id=query_id) as profile:
+            result = client.execute(query, data, query_id=query_id)
+            profile.rows = result_rows(result)
 
-    def _run() -> Any:
-        tl_client = get_clickhouse_client(timeout)
-        return tl_client.execute(query, data)
+        return result
 
-    return await asyncio.to_thread(_run)
+    return await get_clickhouse_pool(ClickHousePoolKind.insert).run(_run, query_id=query_id)
 
 
 @asynccontextmanager
-async def get_clickhouse_context() -> AsyncGenerator[Client, None]:
+async def get_clickhouse_context() -> AsyncGenerator[ClickHouseRequestClient, None]:
     """
-    Async context manager for ClickHouse client connections.
-    Yields a thread-local client.
+    Async context manager for running queries with execute_async on the query pool.
     """
-    yield get_clickhouse_client()
+    yield ClickHouseRequestClient(pool=get_clickhouse_pool(ClickHousePoolKind.query))
 
 
-async def get_clickhouse_dependency() -> AsyncGenerator[Client, None]:
+async def get_clickhouse_dependency(request: Request) -> AsyncGenerator[ClickHouseRequestClient, None]:
     """
-    FastAPI dependency for injecting ClickHouse client into route handlers.
+    FastAPI dependency for route handlers running queries with execute_async. Queries are
+    cancelled and killed on the server if the HTTP client disconnects before they finish.
     """
-    async with get_clickhouse_context() as client:
-        yield client
+    yield ClickHouseRequestClient(pool=get_clickhouse_pool(ClickHousePoolKind.query), is_disconnected=request.is_disconnected)
 
 
 def create_table_if_not_exists(client: Client, table_name: str, schema: str) -> None:
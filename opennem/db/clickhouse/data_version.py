@@ -0,0 +1,78 @@
+"""
+Aggregate data versions.
+
+After each run the aggregate writers (run_unit_intervals_aggregate_to_now, the market_summary
+scheduled, catchup and backlog runs) publish the latest interval of their table per network to
+a Redis hash. That interval is the table's "data version" for the network: the API treats it as
+the exclusive bound of settled data (see opennem.api.intervals) and keys its response cache on
+it, so cached live responses are replaced exactly when new intervals land rather than on a TTL.
+
+The latest interval is read back from the table rather than the frame just written so networks
+filled by other writers (the WEM catchup) advance too.
+"""
+
+import logging
+from collections.abc import Sequence
+from datetime import datetime
+
+from opennem.clients.redis import get_redis
+from opennem.db.clickhouse.client import execute_async
+
+logger = logging.getLogger("opennem.db.clickhouse.data_version")
+
+DATA_VERSION_KEY_PREFIX = "opennem:data_version:"
+
+
+def _data_version_key(table: str) -> str:
+    return f"{DATA_VERSION_KEY_PREFIX}{table}"
+
+
+async def publish_data_version(table: str) -> dict[str, datetime]:
+    """
+    Publish the latest interval per network in table. Failures are logged rather than raised
+    since the aggregate itself has already been written.
+    """
+    # bounded like the API's own max(interval) probe, no FINAL as dedup can't change the max
+    query = (
+        f"SELECT network_id, max(interval) FROM {table} "  # noqa: S608 — table is an internal constant
+        "WHERE interval > now() - INTERVAL 7 DAY GROUP BY network_id"
+    )
+
+    try:
+        rows = await execute_async(None, query)
+    except Exception as e:
+        logger.error(f"Could not read the latest {table} intervals to publish: {e}")
+        return {}
+
+    versions = {network_id: latest.replace(tzinfo=None) for network_id, latest in rows if latest is not None}
+
+    if not versions:
+        return {}
+
+    try:
+        await get_redis().hset(
+            _data_version_key(table), mapping={network_id: latest.isoformat() for network_id, latest in versions.items()}
+        )
+    except Exception as e:
+        logger.error(f"Could not publish {table} data version: {e}")
+        return {}
+
+    logger.info(f"Published {table} data version: {', '.join(f'{k}={v}' for k, v in sorted(versions.items()))}")
+
+    return versions
+
+
+async def get_data_version(table: str, network_codes: Sequence[str]) -> datetime | None:
+    """
+    Data version of table for a network made up of network_codes, the latest interval across
+    them. None if none of them have been published or Redis is unavailable.
+    """
+    try:
+        values = await get_redis().hmget(_data_version_key(table), list(network_codes))
+    except Exception as e:
+        logger.warning(f"Could not read {table} data version: {e}")
+        return None
+
+    versions = [datetime.fromisoformat(value.decode() if isinstance(value, bytes) else value) for value in values if value]
+
+    return max(versions) if versions else None
@@ -0,0 +1,125 @@
+"""
+ClickHouse dirty day log.
+
+Writers of the aggregate tables (unit_intervals, market_summary) record the (network, day)
+they wrote into aggregate_dirty_days. Consumers such as the materialized view refresh read the
+days marked since their last run (a watermark on marked_at kept per consumer) and only
+recompute those, so the refresh cost follows the volume of writes rather than a fixed window
+and late revisions of old days are picked up.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import polars as pl
+from clickhouse_driver import Client
+
+from opennem.db.clickhouse.client import get_clickhouse_pool, insert_frame
+from opennem.db.clickhouse.pool import ClickHousePoolKind
+
+logger = logging.getLogger("opennem.db.clickhouse.dirty_log")
+
+DIRTY_DAYS_TABLE_SCHEMA = """CREATE TABLE IF NOT EXISTS aggregate_dirty_days (
+    source_table LowCardinality(String),
+    network_id LowCardinality(String),
+    date Date,
+    marked_at DateTime64(3) DEFAULT now64(3)
+) ENGINE = MergeTree()
+ORDER BY (marked_at, source_table)
+TTL toDateTime(marked_at) + INTERVAL 30 DAY"""
+
+DIRTY_DAYS_WATERMARK_TABLE_SCHEMA = """CREATE TABLE IF NOT EXISTS aggregate_dirty_days_watermark (
+    consumer String,
+    refreshed_to DateTime64(3)
+) ENGINE = ReplacingMergeTree(refreshed_to)
+ORDER BY consumer"""
+
+# consumers re-read marks this far behind their watermark, for inserts that were in flight
+# when the previous run read the log
+DIRTY_DAYS_WATERMARK_OVERLAP = timedelta(minutes=1)
+
+
+def dirty_days_from_frame(frame: pl.DataFrame, table: str) -> pl.DataFrame:
+    """Distinct (source_table, network_id, date) of a frame of aggregate intervals"""
+    return (
+        frame.select(pl.lit(table).alias("source_table"), "network_id", pl.col("interval").dt.date().alias("date"))
+        .unique()
+        .sort("network_id", "date")
+    )
+
+
+def record_dirty_days(client: Client, table: str, frame: pl.DataFrame) -> int:
+    """
+    Record the days written to by a frame inserted into table. Failures are logged rather
+    than raised since the write itself has already gone in.
+    """
+    if frame.is_empty():
+        return 0
+
+    dirty_days = dirty_days_from_frame(frame, table)
+
+    try:
+        insert_frame(client, "aggregate_dirty_days", dirty_days)
+    except Exception as e:
+        logger.error(f"Could not record {len(dirty_days)} dirty days for {table}: {e}")
+        return 0
+
+    return len(dirty_days)
+
+
+async def record_dirty_days_async(table: str, frame: pl.DataFrame) -> int:
+    """Off-loop record_dirty_days on the insert_columnar pool"""
+    pool = get_clickhouse_pool(ClickHousePoolKind.insert_columnar)
+    return await pool.run(lambda client: record_dirty_days(client, table, frame))
+
+
+def get_dirty_days_watermark(client: Client, consumer: str) -> datetime | None:
+    result = client.execute(
+        "SELECT refreshed_to FROM aggregate_dirty_days_watermark FINAL WHERE consumer = %(consumer)s",
+        {"consumer": consumer},
+    )
+    return result[0][0] if result else None
+
+
+def set_dirty_days_watermark(client: Client, consumer: str, refreshed_to: datetime) -> None:
+    client.execute(
+        "INSERT INTO aggregate_dirty_days_watermark (consumer, refreshed_to) VALUES",
+        [{"consumer": consumer, "refreshed_to": refreshed_to}],
+    )
+
+
+def get_dirty_days(
+    client: Client, since: datetime | None, until: datetime, network_ids: list[str] | None = None
+) -> dict[str, set[date]]:
+    """
+    Days marked dirty per source table in (since - overlap, until], of the given networks if
+    network_ids is set. All of the log if since is None
+    """
+    params: dict = {"until": until}
+    since_clause = ""
+    network_clause = ""
+
+    if since is not None:
+        params["since"] = since - DIRTY_DAYS_WATERMARK_OVERLAP
+        since_clause = "AND marked_at > %(since)s"
+
+    if network_ids is not None:
+        params["network_ids"] = tuple(network_ids)
+        network_clause = "AND network_id IN %(network_ids)s"
+
+    result = client.execute(
+        f"""
+        SELECT DISTINCT source_table, date
+        FROM aggregate_dirty_days
+        WHERE marked_at <= %(until)s {since_clause} {network_clause}
+        """,
+        params,
+    )
+
+    dirty_days: dict[str, set[date]] = defaultdict(set)
+
+    for source_table, day in result:
+        dirty_days[source_table].add(day)
+
+    return dict(dirty_days)
@@ -6,9 +6,15 @@ materialized views in ClickHouse.
 """
 
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
+from uuid import uuid4
 
+from clickhouse_driver import Client
+
+from opennem import settings
 from opennem.db.clickhouse.client import get_clickhouse_client, table_exists
+from opennem.db.clickhouse.dirty_log import get_dirty_days, get_dirty_days_watermark, set_dirty_days_watermark
 from opennem.db.clickhouse.views import (
     CLICKHOUSE_MATERIALIZED_VIEWS,
     MaterializedView,
@@ -16,6 +22,9 @@ from opennem.db.clickhouse.views import (
 
 logger = logging.getLogger("opennem.db.clickhouse.materialized_views")
 
+# consumer name of the view refresh in the dirty days log
+DIRTY_DAYS_CONSUMER = "materialized_views"
+
 
 def ensure_materialized_views_exist(views: list[MaterializedView] | None = None) -> None:
     """Ensure MVs exist. Drops and recreates if the engine type changed
@@ -85,8 +94,128 @@ def refresh_materialized_views(views: list[MaterializedView | str] | None = None
             logger.info(f"Created materialized view: {view.name}")
 
 
+def _delete_and_insert_range(
+    client: Client, view: MaterializedView, range_start: date, range_end: date, insert_start: datetime, insert_end: datetime
+) -> None:
+    """Refresh a range of a view by deleting it with a mutation then re-inserting it"""
+    # DELETE existing data for this date range to prevent double-counting
+    # This is required for SummingMergeTree which adds values during merges
+    delete_query = f"""
+        ALTER TABLE {view.name} DELETE
+        WHERE {view.timestamp_column} >= %(start)s
+        AND {view.timestamp_column} <= %(end)s
+    """
+    client.execute(delete_query, {"start": range_start, "end": range_end})
+    logger.debug(f"Deleted existing data from {view.name} for {range_start} to {range_end}")
+
+    # INSERT new data
+    client.execute(view.backfill_query, {"start": insert_start, "end": insert_end})
+
+
+def _get_partition_key(client: Client, table: str) -> str:
+    result = client.execute(
+        "SELECT partition_key FROM system.tables WHERE database = currentDatabase() AND name = %(name)s",
+        {"name": table},
+    )
+    return result[0][0] if result else ""
+
+
+def _get_source_max_timestamp(client: Client, view: MaterializedView, start: datetime, end: datetime) -> datetime | None:
+    source_table = _get_source_table_from_view(view)
+    source_ts_col = view.effective_source_timestamp_column
+
+    result = client.execute(
+        f"SELECT max({source_ts_col}) FROM {source_table} WHERE {source_ts_col} >= %(start)s AND {source_ts_col} <= %(end)s",
+        {"start": start, "end": end},
+    )
+    max_timestamp = result[0][0] if result else None
+
+    # max() of no rows is the epoch rather than NULL
+    if not isinstance(max_timestamp, datetime) or max_timestamp.year < 2000:
+        return None
+
+    return max_timestamp
+
+
+def _truncate_to_view_period(view: MaterializedView, timestamp: datetime) -> datetime:
+    """Start of the daily or monthly bucket a source timestamp is aggregated into"""
+    if view.timestamp_column == "month":
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if view.timestamp_column == "date":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp
+
+
+def _replace_partitions_for_range(
+    client: Client, view: MaterializedView, range_start: date, range_end: date, insert_start: datetime, insert_end: datetime
+) -> bool:
+    """
+    Refresh a range of a view without a mutation. The partitions holding the range are built
+    in a staging table - the range re-aggregated from source plus the rows of the partitions
+    outside the range copied across - and swapped in with REPLACE PARTITION.
+
+    Rows the view's trigger wrote while staging was built are swapped out with the old
+    partitions, so the latest intervals of source written in the meantime are re-aggregated
+    into the view afterwards. Older rows revised in that window are picked up by the next
+    refresh.
+
+    Returns False without touching the view if its storage isn't partitioned (migration 0004
+    not applied), in which case the caller falls back to delete and insert.
+    """
+    staging = f"{view.name}_staging_{uuid4().hex[:8]}"
+
+    client.execute(f"CREATE TABLE {staging} AS {view.name}")
+
+    try:
+        if not _get_partition_key(client, staging):
+            logger.warning(f"{view.name} is not partitioned, refreshing with ALTER DELETE. Run `opennem ch up`")
+            return False
+
+        source_max = _get_source_max_timestamp(client, view, insert_start, insert_end)
+
+        client.execute(
+            view.backfill_query.replace(f"INSERT INTO {view.name}", f"INSERT INTO {staging}", 1),
+            {"start": insert_start, "end": insert_end},
+        )
+
+        partitions = tuple(row[0] for row in client.execute(f"SELECT DISTINCT _partition_id FROM {staging}"))
+
+        if not partitions:
+            return True
+
+        client.execute(
+            f"""
+            INSERT INTO {staging}
+            SELECT * FROM {view.name} FINAL
+            WHERE _partition_id IN %(partitions)s
+            AND NOT ({view.timestamp_column} >= %(start)s AND {view.timestamp_column} <= %(end)s)
+            """,
+            {"partitions": partitions, "start": range_start, "end": range_end},
+        )
+
+        for partition in partitions:
+            client.execute(f"ALTER TABLE {view.name} REPLACE PARTITION ID %(partition)s FROM {staging}", {"partition": partition})
+
+        logger.debug(f"Replaced partitions {', '.join(partitions)} of {view.name} for {range_start} to {range_end}")
+    finally:
+        client.execute(f"DROP TABLE IF EXISTS {staging}")
+
+    latest = _get_source_max_timestamp(client, view, insert_start, insert_end)
+
+    if latest and (not source_max or latest > source_max):
+        catch_up_start = max(_truncate_to_view_period(view, source_max), insert_start) if source_max else insert_start
+        client.execute(view.backfill_query, {"start": catch_up_start, "end": insert_end})
+        logger.debug(f"Caught up {view.name} from {catch_up_start} after source moved to {latest}")
+
+    return True
+
+
 def backfill_materialized_view(
-    view: MaterializedView, start_date: datetime | None = None, end_date: datetime | None = None, chunk_size_days: int = 30
+    view: MaterializedView,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    chunk_size_days: int = 30,
+    raise_errors: bool = False,
 ) -> int:
     """
     Backfill a single materialized view for a given date range.
@@ -96,11 +225,13 @@ def backfill_materialized_view(
         start_date: Start date for backfill. If None, uses min date from source table.
         end_date: End date for backfill. If None, uses max date from source table.
         chunk_size_days: Number of days to process at once for chunked backfills.
+        raise_errors: Raise when a chunk fails rather than logging it and moving on.
 
     Returns:
         int: Total number of records processed
     """
     client = get_clickhouse_client(timeout=300)
+    started = time.perf_counter()
 
     # Normalize dates to capture full days (start at 00:00:00, end at 23:59:59)
     # This prevents partial day captures when the job runs mid-day
@@ -155,11 +286,11 @@ def backfill_materialized_view(
 
             try:
                 # For monthly views, align date ranges to month boundaries since
-                # timestamp_column stores toStartOfMonth() values. Both the DELETE
-                # and the re-aggregation window must start at the month boundary:
+                # timestamp_column stores toStartOfMonth() values. Both the refreshed
+                # range and the re-aggregation window must start at the month boundary:
                 # the backfill_query does toStartOfMonth(interval), so a narrow
                 # (eg 7-day) window would re-insert a partial month over the full
-                # one the DELETE just removed — the market_summary_monthly_mv rot
+                # one the refresh just removed — the market_summary_monthly_mv rot
                 # behind the demand/price all-vs-1y mismatch.
                 if view.timestamp_column == "month":
                     month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -170,21 +301,11 @@ def backfill_materialized_view(
                     insert_start = current_date
                 range_end = chunk_end.date()
 
-                # DELETE existing data for this date range to prevent double-counting
-                # This is required for SummingMergeTree which adds values during merges
-                delete_query = f"""
-                    ALTER TABLE {view.name} DELETE
-                    WHERE {view.timestamp_column} >= %(start)s
-                    AND {view.timestamp_column} <= %(end)s
-                """
-                client.execute(delete_query, {"start": range_start, "end": range_end})
-                logger.debug(f"Deleted existing data from {view.name} for {range_start} to {range_end}")
-
-                # INSERT new data
-                client.execute(
-                    view.backfill_query,
-                    {"start": insert_start, "end": chunk_end},
-                )
+                if not (
+                    settings.clickhouse_mv_refresh_replace_partitions
+                    and _replace_partitions_for_range(client, view, range_start, range_end, insert_start, chunk_end)
+                ):
+                    _delete_and_insert_range(client, view, range_start, range_end, insert_start, chunk_end)
 
                 # Verify data was inserted — silent failures here cause data gaps
                 verify = client.execute(
@@ -201,6 +322,8 @@ def backfill_materialized_view(
                     logger.info(f"Backfill {view.name}: {row_count} rows for {range_start} to {range_end}")
             except Exception as e:
                 logger.error(f"Failed to backfill {view.name} for period {current_date} to {chunk_end}: {e}")
+                if raise_errors:
+                    raise
                 # Continue with next chunk instead of failing completely
                 logger.warning("Skipping chunk and continuing with next period")
 
@@ -218,7 +341,7 @@ def backfill_materialized_view(
     result = client.execute(f"SELECT count() FROM {view.name}")
     total_records = result[0][0] if result else 0
 
-    logger.info(f"Backfill complete for {view.name}. Total records: {total_records}")
+    logger.info(f"Backfill complete for {view.name}. Total records: {total_records} in {time.perf_counter() - started:.2f}s")
     return total_records
 
 
@@ -263,7 +386,9 @@ def backfill_materialized_views(
 
     # Backfill each view
     results = {}
+    latencies = {}
     for view in views_to_process:
+        view_started = time.perf_counter()
         try:
             record_count = backfill_materialized_view(view=view, start_date=start_date, end_date=end_date)
             results[view.name] = record_count
@@ -271,6 +396,81 @@ def backfill_materialized_views(
             logger.error(f"Failed to backfill view {view.name}: {e}")
             results[view.name] = 0
             # Continue processing other views instead of failing completely
+        latencies[view.name] = time.perf_counter() - view_started
+
+    logger.info(
+        f"Backfilled {len(latencies)} views in {sum(latencies.values()):.2f}s: "
+        + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in latencies.items())
+    )
+
+    return results
+
+
+def _dirty_day_ranges(view: MaterializedView, days: set[date]) -> list[tuple[datetime, datetime]]:
+    """
+    Contiguous runs of dirty days to refresh a view over. Monthly views refresh whole months,
+    a partial month would replace the full one.
+    """
+    if view.timestamp_column == "month":
+        periods = [
+            (month, (month + timedelta(days=32)).replace(day=1) - timedelta(days=1))
+            for month in sorted({day.replace(day=1) for day in days})
+        ]
+    else:
+        periods = [(day, day) for day in sorted(days)]
+
+    ranges: list[tuple[date, date]] = []
+
+    for start, end in periods:
+        if ranges and ranges[-1][1] + timedelta(days=1) == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+
+    return [(datetime(start.year, start.month, start.day), datetime(end.year, end.month, end.day)) for start, end in ranges]
+
+
+def refresh_dirty_materialized_views() -> dict[str, int]:
+    """
+    Refresh the materialized views over the days their source tables were written to since
+    the last refresh, read from the aggregate_dirty_days log (see
+    opennem.db.clickhouse.dirty_log). Views whose source wasn't written to are skipped.
+
+    The watermark only moves once every view has been refreshed, so a failed run is retried
+    in full on the next one.
+
+    Returns:
+        dict: Mapping of refreshed view names to record counts
+    """
+    client = get_clickhouse_client(timeout=300)
+
+    refreshed_to = client.execute("SELECT now64(3)")[0][0]
+    watermark = get_dirty_days_watermark(client, DIRTY_DAYS_CONSUMER)
+    dirty_days = get_dirty_days(client, since=watermark, until=refreshed_to)
+
+    results = {}
+    latencies = {}
+
+    for view in CLICKHOUSE_MATERIALIZED_VIEWS.values():
+        days = dirty_days.get(_get_source_table_from_view(view))
+
+        if not days:
+            continue
+
+        view_started = time.perf_counter()
+
+        for start, end in _dirty_day_ranges(view, days):
+            results[view.name] = backfill_materialized_view(view=view, start_date=start, end_date=end, raise_errors=True)
+
+        latencies[view.name] = time.perf_counter() - view_started
+        logger.info(f"Refreshed {len(days)} dirty days of {view.name} in {latencies[view.name]:.2f}s")
+
+    set_dirty_days_watermark(client, DIRTY_DAYS_CONSUMER, refreshed_to)
+
+    logger.info(
+        f"Refreshed dirty days of {len(latencies)} views in {sum(latencies.values()):.2f}s "
+        f"({sum(len(days) for days in dirty_days.values())} dirty source days since {watermark})"
+    )
 
     return results
 
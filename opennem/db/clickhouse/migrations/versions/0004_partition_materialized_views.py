@@ -0,0 +1,48 @@
+"""
+Partition the materialized views by month (year for market_summary_monthly_mv).
+
+Refreshes rebuild the affected partitions in a staging table and swap them in with
+REPLACE PARTITION rather than running an ALTER DELETE mutation per chunk, which needs a
+partition key on the view storage. MV storage can't be repartitioned in place, so each view
+is renamed aside, recreated with the partitioned schema and the existing rows copied across.
+Anything inserted between the rename and the recreate is picked up by the next MV refresh.
+"""
+
+import re
+
+from clickhouse_driver import Client
+
+REQUIRES_BACKFILL: list[str] = []
+
+
+def _recreate_with_schema(client: Client, name: str, schema: str) -> None:
+    old_name = f"{name}_0004_old"
+
+    client.execute(f"DROP TABLE IF EXISTS {old_name}")
+    client.execute(f"RENAME TABLE {name} TO {old_name}")
+    client.execute(schema)
+    client.execute(f"INSERT INTO {name} SELECT * FROM {old_name}")
+    client.execute(f"DROP TABLE {old_name}")
+
+
+def up(client: Client) -> None:
+    from opennem.db.clickhouse.client import table_exists
+    from opennem.db.clickhouse.views import CLICKHOUSE_MATERIALIZED_VIEWS
+
+    for view in CLICKHOUSE_MATERIALIZED_VIEWS.values():
+        if not table_exists(client, view.name):
+            client.execute(view.schema)
+            continue
+
+        _recreate_with_schema(client, view.name, view.schema)
+
+
+def down(client: Client) -> None:
+    from opennem.db.clickhouse.client import table_exists
+    from opennem.db.clickhouse.views import CLICKHOUSE_MATERIALIZED_VIEWS
+
+    for view in CLICKHOUSE_MATERIALIZED_VIEWS.values():
+        if not table_exists(client, view.name):
+            continue
+
+        _recreate_with_schema(client, view.name, re.sub(r"\n\s*PARTITION BY [^\n]+", "", view.schema))
@@ -0,0 +1,22 @@
+"""
+Add the aggregate_dirty_days log and its consumer watermark table.
+
+Writers of unit_intervals and market_summary record the days they wrote, and the
+materialized view refresh recomputes only those days. See opennem.db.clickhouse.dirty_log.
+"""
+
+from clickhouse_driver import Client
+
+REQUIRES_BACKFILL: list[str] = []
+
+
+def up(client: Client) -> None:
+    from opennem.db.clickhouse.dirty_log import DIRTY_DAYS_TABLE_SCHEMA, DIRTY_DAYS_WATERMARK_TABLE_SCHEMA
+
+    client.execute(DIRTY_DAYS_TABLE_SCHEMA)
+    client.execute(DIRTY_DAYS_WATERMARK_TABLE_SCHEMA)
+
+
+def down(client: Client) -> None:
+    client.execute("DROP TABLE IF EXISTS aggregate_dirty_days_watermark")
+    client.execute("DROP TABLE IF EXISTS aggregate_dirty_days")
@@ -0,0 +1,21 @@
+"""
+Add the interconnector_intervals table.
+
+Interconnector flows are landed here alongside unit_intervals so the market_summary flow solve
+runs against ClickHouse only. Fill history with
+opennem.aggregates.interconnector_intervals.run_interconnector_intervals_backlog.
+"""
+
+from clickhouse_driver import Client
+
+REQUIRES_BACKFILL: list[str] = []
+
+
+def up(client: Client) -> None:
+    from opennem.db.clickhouse.schema import INTERCONNECTOR_INTERVALS_TABLE_SCHEMA
+
+    client.execute(INTERCONNECTOR_INTERVALS_TABLE_SCHEMA)
+
+
+def down(client: Client) -> None:
+    client.execute("DROP TABLE IF EXISTS interconnector_intervals")
@@ -0,0 +1,55 @@
+"""
+Partition the 5 minute materialized views (fueltech_intervals_mv, renewable_intervals_mv) by day.
+
+Under the monthly partitions of 0004 a dirty days refresh copied the rest of the month through
+staging to swap in one changed day. As in 0004 the views are renamed aside, recreated with
+the new schema and the existing rows copied across - a month at a time, so an insert spans
+at most 31 of the new partitions. Anything inserted between the rename and the recreate is
+picked up by the next MV refresh.
+"""
+
+from clickhouse_driver import Client
+
+REQUIRES_BACKFILL: list[str] = []
+
+_VIEWS = ("fueltech_intervals_mv", "renewable_intervals_mv")
+
+
+def _recreate_with_schema(client: Client, name: str, schema: str) -> None:
+    old_name = f"{name}_0007_old"
+
+    client.execute(f"DROP TABLE IF EXISTS {old_name}")
+    client.execute(f"RENAME TABLE {name} TO {old_name}")
+    client.execute(schema)
+
+    for (month,) in client.execute(f"SELECT DISTINCT toYYYYMM(interval) AS month FROM {old_name} ORDER BY month"):
+        client.execute(f"INSERT INTO {name} SELECT * FROM {old_name} WHERE toYYYYMM(interval) = %(month)s", {"month": month})
+
+    client.execute(f"DROP TABLE {old_name}")
+
+
+def up(client: Client) -> None:
+    from opennem.db.clickhouse.client import table_exists
+    from opennem.db.clickhouse.views import CLICKHOUSE_MATERIALIZED_VIEWS
+
+    for name in _VIEWS:
+        view = CLICKHOUSE_MATERIALIZED_VIEWS[name]
+
+        if not table_exists(client, view.name):
+            client.execute(view.schema)
+            continue
+
+        _recreate_with_schema(client, view.name, view.schema)
+
+
+def down(client: Client) -> None:
+    from opennem.db.clickhouse.client import table_exists
+    from opennem.db.clickhouse.views import CLICKHOUSE_MATERIALIZED_VIEWS
+
+    for name in _VIEWS:
+        view = CLICKHOUSE_MATERIALIZED_VIEWS[name]
+
+        if not table_exists(client, view.name):
+            continue
+
+        _recreate_with_schema(client, view.name, view.schema.replace("toYYYYMMDD(interval)", "toYYYYMM(interval)"))
@@ -0,0 +1,289 @@
+"""
+ClickHouse Connection Pools
+
+Async pools of clickhouse_driver connections for the serving path (execute_async and the FastAPI
+dependency) and the aggregate writers (insert_async, insert_frame_async), in place of a client
+held per thread of the default executor.
+
+clickhouse_driver is a blocking client, so each pool runs its queries on its own executor of
+max_size threads and checks a connection out per query:
+
+- at most max_size connections are open, callers queue for one past that
+- connections idle for longer than idle_timeout are closed, and idle connections are pinged
+  every health_check_interval and dropped if the server has gone away
+- a query cancelled while it runs (request timeout, the HTTP client going away) is killed on
+  the server with KILL QUERY by its query_id, and its connection is only returned to the pool
+  once the driver call has finished
+
+The pools themselves are created per event loop in opennem.db.clickhouse.client.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Any
+
+from clickhouse_driver import Client
+
+logger = logging.getLogger("opennem.db.clickhouse.pool")
+
+# waits longer than this are logged as the pool being saturated
+_SLOW_ACQUIRE_SECONDS = 1.0
+
+# how long a killed query gets to return its connection before the connection is dropped
+_CANCEL_TIMEOUT_SECONDS = 5.0
+
+# how often a request client checks whether the HTTP client has gone away
+_DISCONNECT_POLL_SECONDS = 0.5
+
+
+class ClickHousePoolKind(StrEnum):
+    """Pools kept apart so bulk writes can't take the connections API queries need"""
+
+    query = "query"
+    insert = "insert"
+    # use_numpy clients for columnar inserts with insert_frame
+    insert_columnar = "insert_columnar"
+
+
+class ClickHouseQueryCancelled(Exception):
+    """A query was killed because the HTTP client that asked for it went away"""
+
+
+@dataclass
+class _PooledConnection:
+    client: Client
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+    # still in use by a driver call that didn't stop when cancelled
+    broken: bool = False
+
+
+def _ping(client: Client) -> bool:
+    """True unless the connection is open and the server doesn't answer. Clients connect lazily"""
+    try:
+        return client.connection.ping() is not False
+    except Exception:
+        return False
+
+
+class ClickHousePool:
+    def __init__(
+        self,
+        kind: ClickHousePoolKind,
+        connect: Callable[[], Client],
+        max_size: int,
+        idle_timeout: float,
+        health_check_interval: float,
+        kill_query: Callable[[str], Any] | None = None,
+    ) -> None:
+        self.kind = kind
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+        self.waiting = 0
+        self._connect = connect
+        self._kill_query = kill_query
+        # most recently used last, so the connections not needed under the current load age out
+        self._idle: list[_PooledConnection] = []
+        self._open = 0
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix=f"clickhouse-{kind.value}")
+        self._maintenance: asyncio.Task | None = None
+
+    @property
+    def size(self) -> int:
+        """Open connections, checked out or idle"""
+        return self._open
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def metrics(self) -> dict[str, Any]:
+        return {"kind": self.kind.value, "size": self.size, "idle": self.idle, "max_size": self.max_size, "waiting": self.waiting}
+
+    def _discard(self, conn: _PooledConnection) -> None:
+        self._open -= 1
+
+        # a broken connection is disconnected once the call still using it finishes
+        if not conn.broken:
+            conn.client.disconnect()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[_PooledConnection]:
+        """Check out a connection, opening one if none are idle and the pool isn't full"""
+        if self.closed:
+            raise Exception(f"ClickHouse {self.kind.value} pool is closed")
+
+        self.waiting += 1
+        wait_start = time.perf_counter()
+
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        wait_time = time.perf_counter() - wait_start
+
+        if wait_time > _SLOW_ACQUIRE_SECONDS:
+            logger.warning(
+                f"Waited {wait_time:.2f}s for a ClickHouse {self.kind.value} connection ({self.waiting} still waiting)"
+            )
+
+        if self._maintenance is None:
+            self._maintenance = self.loop.create_task(self._maintain())
+
+        if self._idle:
+            conn = self._idle.pop()
+        else:
+            conn = _PooledConnection(client=self._connect())
+            self._open += 1
+
+        try:
+            yield conn
+        finally:
+            if conn.broken or self.closed:
+                self._discard(conn)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+
+            self._semaphore.release()
+
+    async def run[T](self, fn: Callable[[Client], T], query_id: str | None = None) -> T:
+        """
+        Run fn with a pooled client on the pool's executor. If the caller is cancelled the query
+        with query_id is killed on the server.
+        """
+        async with self.acquire() as conn:
+            future = self.loop.run_in_executor(self._executor, fn, conn.client)
+
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                await self._cancel(conn, future, query_id)
+                raise
+
+    async def _cancel(self, conn: _PooledConnection, future: asyncio.Future, query_id: str | None) -> None:
+        if query_id and self._kill_query:
+            try:
+                await asyncio.to_thread(self._kill_query, query_id)
+                logger.info(f"Killed cancelled ClickHouse query {query_id}")
+            except Exception as e:
+                logger.warning(f"Could not kill cancelled ClickHouse query {query_id}: {e}")
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), _CANCEL_TIMEOUT_SECONDS)
+        except TimeoutError:
+            conn.broken = True
+            future.add_done_callback(lambda _: conn.client.disconnect())
+        except Exception:
+            # the killed query fails
+            pass
+
+    async def prune(self) -> None:
+        """Close connections idle past idle_timeout and drop idle connections that fail a ping"""
+        now = time.monotonic()
+
+        for conn in [conn for conn in self._idle if now - conn.last_used > self.idle_timeout]:
+            self._idle.remove(conn)
+            self._discard(conn)
+
+        stale = [conn for conn in self._idle if now - conn.last_checked > self.health_check_interval]
+
+        if not stale:
+            return
+
+        # out of the idle list while they're checked so they aren't handed out
+        for conn in stale:
+            self._idle.remove(conn)
+
+        healthy = await asyncio.gather(*(self.loop.run_in_executor(self._executor, _ping, conn.client) for conn in stale))
+
+        for conn, ok in zip(stale, healthy, strict=True):
+            if ok and not self.closed:
+                conn.last_checked = time.monotonic()
+                self._idle.append(conn)
+            else:
+                if not ok:
+                    logger.warning(f"Dropping dead ClickHouse {self.kind.value} connection")
+                self._discard(conn)
+
+    async def _maintain(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(min(self.idle_timeout, self.health_check_interval))
+
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Error pruning ClickHouse {self.kind.value} pool: {e}")
+
+    def close(self) -> None:
+        """Close idle connections. Checked out connections are closed as they're returned"""
+        self.closed = True
+
+        if self._maintenance is not None and not self._maintenance.done() and not self.loop.is_closed():
+            self._maintenance.cancel()
+
+        for conn in self._idle:
+            self._discard(conn)
+
+        self._idle.clear()
+        self._executor.shutdown(wait=False)
+
+
+@dataclass
+class ClickHouseRequestClient:
+    """
+    Yielded by the FastAPI dependency in place of a client. Queries run through it on the pool
+    are cancelled, and killed on the server, when the HTTP client disconnects.
+    """
+
+    pool: ClickHousePool
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None
+
+    @staticmethod
+    async def _wait_disconnected(is_disconnected: Callable[[], Awaitable[bool]]) -> None:
+        while not await is_disconnected():
+            await asyncio.sleep(_DISCONNECT_POLL_SECONDS)
+
+    async def run[T](self, fn: Callable[[Client], T], query_id: str | None = None) -> T:
+        if self.is_disconnected is None:
+            return await self.pool.run(fn, query_id=query_id)
+
+        query = asyncio.ensure_future(self.pool.run(fn, query_id=query_id))
+        disconnected = asyncio.ensure_future(self._wait_disconnected(self.is_disconnected))
+
+        try:
+            await asyncio.wait({query, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            query.cancel()
+            disconnected.cancel()
+
+            with suppress(BaseException):
+                await query
+
+            raise
+
+        if query.done():
+            disconnected.cancel()
+            return query.result()
+
+        if disconnected.exception() is not None:
+            logger.warning(f"Could not check for a client disconnect: {disconnected.exception()}")
+            return await query
+
+        query.cancel()
+
+        with suppress(BaseException):
+            await query
+
+        raise ClickHouseQueryCancelled(f"Client disconnected, cancelled query {query_id}")
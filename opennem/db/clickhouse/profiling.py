@@ -0,0 +1,255 @@
+"""
+ClickHouse query profiling.
+
+execute_async and insert_async run every query under profile_query, which gives it a
+query_id and records a QueryProfile: a fingerprint of the query shape, elapsed time, rows
+returned or written and rows/bytes read (from the driver's progress packets). Each profile is
+logged with the fields as structured extra data, at warning level once it is slower than
+settings.clickhouse_slow_query_seconds.
+
+The slowest queries and per fingerprint totals are held in process and served by the admin
+endpoint (opennem.api.admin), which fills in memory usage from system.query_log by
+query_id. Failed queries are counted per fingerprint, with MEMORY_LIMIT_EXCEEDED counted
+apart so shapes running into clickhouse_query_max_memory_usage stand out.
+"""
+
+import hashlib
+import heapq
+import logging
+import re
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from clickhouse_driver import Client
+
+from opennem import settings
+
+logger = logging.getLogger("opennem.db.clickhouse.profiling")
+
+# clickhouse error code for a query over max_memory_usage
+MEMORY_LIMIT_EXCEEDED = 241
+
+# fingerprints tracked at most, the one with the least total time is dropped for a new one
+MAX_FINGERPRINTS = 1000
+
+_QUERY_TEXT_LENGTH = 2000
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Query with literals replaced by ? and whitespace collapsed, so queries of one shape match"""
+    normalized = _STRING_LITERAL.sub("?", query)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _VALUE_LIST.sub("(?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def query_fingerprint(query: str) -> str:
+    return hashlib.md5(normalize_query(query).encode()).hexdigest()[:16]
+
+
+@dataclass
+class QueryProfile:
+    query_id: str
+    fingerprint: str
+    kind: str
+    query: str
+    started_at: datetime
+    elapsed: float = 0.0
+    rows: int = 0
+    rows_read: int = 0
+    bytes_read: int = 0
+    error: str | None = None
+    error_code: int | None = None
+
+
+@dataclass
+class FingerprintStats:
+    fingerprint: str
+    kind: str
+    query: str
+    count: int = 0
+    errors: int = 0
+    memory_limit_errors: int = 0
+    total_elapsed: float = 0.0
+    max_elapsed: float = 0.0
+    rows_read: int = 0
+    bytes_read: int = 0
+    last_query_id: str | None = None
+
+    @property
+    def avg_elapsed(self) -> float:
+        return self.total_elapsed / self.count if self.count else 0.0
+
+
+@dataclass
+class _ProfileStore:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # min-heap of (elapsed, sequence, profile) holding the slowest queries
+    slowest: list[tuple[float, int, QueryProfile]] = field(default_factory=list)
+    fingerprints: dict[str, FingerprintStats] = field(default_factory=dict)
+    sequence: int = 0
+
+
+_store = _ProfileStore()
+
+
+def record_query_profile(profile: QueryProfile) -> None:
+    """Add a profile to the slowest queries and its fingerprint totals, and log it"""
+    with _store.lock:
+        _store.sequence += 1
+        entry = (profile.elapsed, _store.sequence, profile)
+
+        if len(_store.slowest) < settings.clickhouse_profile_slowest_size:
+            heapq.heappush(_store.slowest, entry)
+        elif _store.slowest and profile.elapsed > _store.slowest[0][0]:
+            heapq.heapreplace(_store.slowest, entry)
+
+        stats = _store.fingerprints.get(profile.fingerprint)
+
+        if stats is None:
+            if len(_store.fingerprints) >= MAX_FINGERPRINTS:
+                least = min(_store.fingerprints.values(), key=lambda s: s.total_elapsed)
+                del _store.fingerprints[least.fingerprint]
+
+            stats = FingerprintStats(fingerprint=profile.fingerprint, kind=profile.kind, query=profile.query)
+            _store.fingerprints[profile.fingerprint] = stats
+
+        stats.count += 1
+        stats.total_elapsed += profile.elapsed
+        stats.max_elapsed = max(stats.max_elapsed, profile.elapsed)
+        stats.rows_read += profile.rows_read
+        stats.bytes_read += profile.bytes_read
+        stats.last_query_id = profile.query_id
+
+        if profile.error:
+            stats.errors += 1
+
+            if profile.error_code == MEMORY_LIMIT_EXCEEDED:
+                stats.memory_limit_errors += 1
+
+    log_fields = {
+        "clickhouse_query_id": profile.query_id,
+        "clickhouse_fingerprint": profile.fingerprint,
+        "clickhouse_kind": profile.kind,
+        "clickhouse_elapsed": round(profile.elapsed, 4),
+        "clickhouse_rows": profile.rows,
+        "clickhouse_rows_read": profile.rows_read,
+        "clickhouse_bytes_read": profile.bytes_read,
+        "clickhouse_error_code": profile.error_code,
+    }
+    message = (
+        f"clickhouse {profile.kind} {profile.fingerprint} took {profile.elapsed:.3f}s, "
+        f"{profile.rows} rows, read {profile.rows_read} rows / {profile.bytes_read} bytes"
+    )
+
+    if profile.error:
+        logger.warning(f"{message}, failed: {profile.error}", extra=log_fields)
+    elif profile.elapsed >= settings.clickhouse_slow_query_seconds:
+        logger.warning(f"slow {message}", extra=log_fields)
+    else:
+        logger.debug(message, extra=log_fields)
+
+
+@contextmanager
+def profile_query(client: Client, query: str, kind: str, query_id: str | None = None) -> Iterator[QueryProfile]:
+    """
+    Profile a query run on client inside the block. Yields the profile, whose query_id is to
+    be passed to execute(). Set profile.rows from the result, the rest is filled in from the
+    client on exit. No-op (aside from the query_id) when settings.clickhouse_profile_queries is off.
+    """
+    profile = QueryProfile(
+        query_id=query_id or str(uuid.uuid4()),
+        fingerprint=query_fingerprint(query),
+        kind=kind,
+        query=query.strip()[:_QUERY_TEXT_LENGTH],
+        started_at=datetime.now(),
+    )
+
+    if not settings.clickhouse_profile_queries:
+        yield profile
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield profile
+    except Exception as e:
+        profile.error = str(e).splitlines()[0] if str(e) else e.__class__.__name__
+        profile.error_code = getattr(e, "code", None)
+        raise
+    finally:
+        profile.elapsed = time.perf_counter() - start
+        last_query = getattr(client, "last_query", None)
+
+        if last_query is not None and last_query.progress is not None:
+            profile.rows_read = last_query.progress.rows
+            profile.bytes_read = last_query.progress.bytes
+
+        record_query_profile(profile)
+
+
+def result_rows(result: Any) -> int:
+    """Rows in the result of execute(): a row count for inserts, otherwise a list of rows"""
+    if isinstance(result, int):
+        return result
+
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def get_slowest_queries(limit: int | None = None) -> list[QueryProfile]:
+    """Slowest profiled queries, slowest first"""
+    with _store.lock:
+        profiles = [profile for _, _, profile in sorted(_store.slowest, reverse=True)]
+
+    return profiles[:limit] if limit else profiles
+
+
+def get_fingerprint_stats(limit: int | None = None) -> list[FingerprintStats]:
+    """Totals per query shape, by total time spent"""
+    with _store.lock:
+        stats = sorted(_store.fingerprints.values(), key=lambda s: s.total_elapsed, reverse=True)
+
+    return stats[:limit] if limit else stats
+
+
+def reset_query_profiles() -> None:
+    with _store.lock:
+        _store.slowest.clear()
+        _store.fingerprints.clear()
+
+
+def get_query_log_memory_usage(client: Client, query_ids: list[str]) -> dict[str, int]:
+    """
+    Peak memory usage per query_id from system.query_log. Queries finished in the last few
+    seconds may be missing until the log is flushed.
+    """
+    if not query_ids:
+        return {}
+
+    result = client.execute(
+        """
+        SELECT query_id, max(memory_usage)
+        FROM system.query_log
+        WHERE event_date >= yesterday()
+            AND type IN ('QueryFinish', 'ExceptionWhileProcessing')
+            AND query_id IN %(query_ids)s
+        GROUP BY query_id
+        """,
+        {"query_ids": tuple(query_ids)},
+    )
+
+    return dict(result)
@@ -73,15 +73,32 @@ PARTITION BY toYYYYMM(interval)
 SETTINGS index_granularity = 8192, allow_experimental_replacing_merge_with_cleanup=1"""
 
 
+# Interconnector flows, per interval and region pair, landed alongside unit_intervals so the
+# market_summary flow solve reads from ClickHouse only
+INTERCONNECTOR_INTERVALS_TABLE_SCHEMA = """CREATE TABLE IF NOT EXISTS interconnector_intervals (
+    interval DateTime64(3),
+    network_id String,
+    interconnector_region_from String,
+    interconnector_region_to String,
+    generated Nullable(Float64),
+    energy Float64,
+    version UInt64
+) ENGINE = ReplacingMergeTree(version)
+PRIMARY KEY (interval, network_id, interconnector_region_from, interconnector_region_to)
+ORDER BY (interval, network_id, interconnector_region_from, interconnector_region_to)
+PARTITION BY toYYYYMM(interval)
+SETTINGS index_granularity = 8192, allow_experimental_replacing_merge_with_cleanup=1"""
+
+
 async def optimize_clickhouse_tables(table_names: list[str] | None = None) -> None:
     """
-    Optimize the unit_intervals and market_summary tables to force merges and deduplication.
+    Optimize the unit_intervals, interconnector_intervals and market_summary tables to force merges and deduplication.
     This should be run periodically (e.g., daily) during low-traffic periods.
     """
     client = get_clickhouse_client(timeout=1000)
 
     if table_names is None:
-        table_names = ["unit_intervals", "market_summary"]
+        table_names = ["unit_intervals", "interconnector_intervals", "market_summary"]
 
     for _table_name in table_names:
         client.execute(f"OPTIMIZE TABLE {_table_name} FINAL")
@@ -0,0 +1,36 @@
+"""add aggregate_backlog_checkpoint table
+
+Revision ID: 5b7c1e2d9a40
+Revises: 09fd3c32d33b
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+
+revision = "5b7c1e2d9a40"
+down_revision = "09fd3c32d33b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "aggregate_backlog_checkpoint",
+        sa.Column("job", sa.Text(), nullable=False),
+        sa.Column("chunk_start", TIMESTAMP(timezone=False), nullable=False),
+        sa.Column("chunk_end", TIMESTAMP(timezone=False), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("records", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("updated_at", TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("job", "chunk_start"),
+    )
+    op.create_index("idx_aggregate_backlog_checkpoint_job_status", "aggregate_backlog_checkpoint", ["job", "status"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_aggregate_backlog_checkpoint_job_status", table_name="aggregate_backlog_checkpoint")
+    op.drop_table("aggregate_backlog_checkpoint")
@@ -575,3 +575,20 @@ class SocialPostPlatform(Base):
     post = relationship("SocialPost", back_populates="platforms")
 
     __table_args__ = (UniqueConstraint("post_id", "platform", name="uq_social_post_platform"),)
+
+
+class AggregateBacklogCheckpoint(Base):
+    """Progress of a chunked aggregate backlog run so it can resume after a crash or cancel"""
+
+    __tablename__ = "aggregate_backlog_checkpoint"
+
+    job: Mapped[str] = mapped_column(Text, primary_key=True)
+    chunk_start: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False), primary_key=True)
+    chunk_end: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False), nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False)  # running, done, failed
+    records: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("idx_aggregate_backlog_checkpoint_job_status", "job", "status"),)
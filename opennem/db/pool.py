@@ -0,0 +1,221 @@
+"""
+OpenNEM Database Connection Pools
+
+Settings driven connection pools for the asyncpg bulk COPY path and the SQLAlchemy engines,
+split by workload so that a backfill can't take the connections the live crawl needs.
+
+The workload is carried in a context variable, so code that runs a backfill wraps itself in
+`db_workload(DBWorkload.backfill)` (or the `with_db_workload` decorator) and every session and
+bulk insert underneath it uses the backfill pools without threading a parameter through.
+
+Pool metrics (checked out connections, queue depth and acquire wait times) are available from
+`get_pool_metrics()`, along with those of the ClickHouse pools (opennem.db.clickhouse.pool).
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from typing import Any
+
+import asyncpg
+from asyncpg.pool import Pool
+
+from opennem import settings
+
+logger = logging.getLogger("opennem.db.pool")
+
+
+class DBWorkload(StrEnum):
+    """Workloads that get their own connection pools"""
+
+    live = "live"
+    backfill = "backfill"
+
+
+_current_workload: ContextVar[DBWorkload] = ContextVar("opennem_db_workload", default=DBWorkload.live)
+
+
+def get_db_workload() -> DBWorkload:
+    """The workload of the current context"""
+    return _current_workload.get()
+
+
+@contextmanager
+def db_workload(workload: DBWorkload) -> Iterator[None]:
+    """Run the enclosed block (and any tasks it spawns) against the pools for workload"""
+    token = _current_workload.set(workload)
+
+    try:
+        yield
+    finally:
+        _current_workload.reset(token)
+
+
+def with_db_workload[**P, R](workload: DBWorkload) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Decorator that runs an async function under a database workload"""
+
+    def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with db_workload(workload):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@dataclass
+class PoolMetrics:
+    """Acquire metrics for an asyncpg pool"""
+
+    workload: str
+    acquired: int = 0
+    checked_out: int = 0
+    waiting: int = 0
+    max_waiting: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    @property
+    def wait_time_avg(self) -> float:
+        return self.wait_time_total / self.acquired if self.acquired else 0.0
+
+    def record_wait(self, wait_time: float) -> None:
+        self.acquired += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+_asyncpg_pools: dict[DBWorkload, Pool] = {}
+_asyncpg_pool_locks: dict[DBWorkload, asyncio.Lock] = {}
+_asyncpg_pool_metrics: dict[DBWorkload, PoolMetrics] = {}
+
+# waits longer than this are logged as the pool being saturated
+_SLOW_ACQUIRE_SECONDS = 1.0
+
+
+def get_asyncpg_pool_size(workload: DBWorkload) -> tuple[int, int]:
+    """Min and max size of the asyncpg pool for a workload"""
+    if workload == DBWorkload.backfill:
+        return settings.db_bulk_pool_min_size, settings.db_bulk_pool_backfill_max_size
+
+    return settings.db_bulk_pool_min_size, settings.db_bulk_pool_max_size
+
+
+def get_engine_pool_size(workload: DBWorkload) -> tuple[int, int]:
+    """Pool size and max overflow of the SQLAlchemy engine for a workload"""
+    if workload == DBWorkload.backfill:
+        return settings.db_backfill_pool_size, settings.db_backfill_pool_max_overflow
+
+    return settings.db_pool_size, settings.db_pool_max_overflow
+
+
+async def get_asyncpg_pool(workload: DBWorkload | None = None) -> Pool:
+    """Get the asyncpg pool for a workload, creating it on first use. Pools start at min size
+    and grow to max size under load, idle connections are closed after
+    db_pool_max_inactive_lifetime seconds"""
+    workload = workload or get_db_workload()
+
+    if workload in _asyncpg_pools:
+        return _asyncpg_pools[workload]
+
+    lock = _asyncpg_pool_locks.setdefault(workload, asyncio.Lock())
+
+    async with lock:
+        if workload not in _asyncpg_pools:
+            min_size, max_size = get_asyncpg_pool_size(workload)
+
+            _asyncpg_pools[workload] = await asyncpg.create_pool(
+                dsn=settings.db_url.replace("+asyncpg", ""),
+                min_size=min_size,
+                max_size=max_size,
+                max_inactive_connection_lifetime=settings.db_pool_max_inactive_lifetime,
+            )
+            _asyncpg_pool_metrics[workload] = PoolMetrics(workload=workload.value)
+
+            logger.info(f"Created {workload.value} asyncpg pool ({min_size}-{max_size} connections)")
+
+    return _asyncpg_pools[workload]
+
+
+@asynccontextmanager
+async def acquire_connection(workload: DBWorkload | None = None) -> AsyncIterator[asyncpg.Connection]:
+    """Acquire a connection from the workload pool, recording queue depth and wait time"""
+    workload = workload or get_db_workload()
+    pool = await get_asyncpg_pool(workload)
+    metrics = _asyncpg_pool_metrics[workload]
+
+    metrics.waiting += 1
+    metrics.max_waiting = max(metrics.max_waiting, metrics.waiting)
+    wait_start = time.perf_counter()
+
+    try:
+        conn = await pool.acquire(timeout=settings.db_pool_timeout)
+    finally:
+        metrics.waiting -= 1
+
+    wait_time = time.perf_counter() - wait_start
+    metrics.record_wait(wait_time)
+
+    if wait_time > _SLOW_ACQUIRE_SECONDS:
+        logger.warning(f"Waited {wait_time:.2f}s for a {workload.value} connection ({metrics.waiting} still waiting)")
+
+    metrics.checked_out += 1
+
+    try:
+        yield conn
+    finally:
+        metrics.checked_out -= 1
+        await pool.release(conn)
+
+
+async def close_asyncpg_pools() -> None:
+    """Close all asyncpg pools"""
+    for workload in list(_asyncpg_pools.keys()):
+        pool = _asyncpg_pools.pop(workload)
+        await pool.close()
+
+
+def get_pool_metrics() -> dict[str, Any]:
+    """Current metrics for the asyncpg and SQLAlchemy pools, keyed by pool"""
+    from opennem.db import get_workload_engines
+    from opennem.db.clickhouse.client import get_clickhouse_pool_metrics
+
+    metrics: dict[str, Any] = {}
+
+    for workload, pool in _asyncpg_pools.items():
+        pool_metrics = _asyncpg_pool_metrics[workload]
+        metrics[f"asyncpg_{workload.value}"] = {
+            **asdict(pool_metrics),
+            "wait_time_avg": pool_metrics.wait_time_avg,
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "max_size": pool.get_max_size(),
+        }
+
+    for workload, engine in get_workload_engines().items():
+        engine_pool = engine.pool
+        metrics[f"sqlalchemy_{workload.value}"] = {
+            "workload": workload.value,
+            "checked_out": getattr(engine_pool, "checkedout", lambda: None)(),
+            "overflow": getattr(engine_pool, "overflow", lambda: None)(),
+            "size": getattr(engine_pool, "size", lambda: None)(),
+            "status": engine_pool.status(),
+        }
+
+    metrics.update(get_clickhouse_pool_metrics())
+
+    return metrics
+
+
+def log_pool_metrics() -> None:
+    """Log pool metrics as structured extra data"""
+    for pool_name, pool_metrics in get_pool_metrics().items():
+        logger.info(f"db pool {pool_name}: {pool_metrics}", extra={"db_pool": pool_name, **pool_metrics})
@@ -7,8 +7,10 @@ across different metrics, networks, periods and grouping configurations.
 
 import logging
 import uuid
+from collections.abc import Iterator
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
 from textwrap import dedent
 from typing import Any
 
@@ -18,7 +20,7 @@ from sqlalchemy import func, select, text
 from opennem import settings
 from opennem.clients.slack import slack_message
 from opennem.db import get_read_session, get_write_session
-from opennem.db.clickhouse import get_clickhouse_client
+from opennem.db.clickhouse import new_clickhouse_client
 from opennem.db.models.opennem import Milestones
 from opennem.queries.utils import list_to_case
 from opennem.recordreactor.persistence import check_and_persist_milestones_chunked
@@ -30,12 +32,16 @@ from opennem.recordreactor.schema import (
     MilestoneRecordSchema,
     MilestoneType,
 )
+from opennem.recordreactor.state import invalidate_milestone_state
 from opennem.recordreactor.unit import get_milestone_unit
 from opennem.schema.network import NetworkNEM, NetworkSchema, NetworkWEM
 from opennem.utils.dates import get_last_completed_interval_for_network
 
 logger = logging.getLogger("opennem.recordreactor.backlog")
 
+# records streamed from ClickHouse and persisted per batch
+_STREAM_BATCH_SIZE = 10_000
+
 
 @dataclass
 class IntervalThresholds:
@@ -173,16 +179,29 @@ def _trim_end_date(time_col: str, end_date: datetime, period: MilestonePeriod) -
         return f"{time_col} < {end_date_dt}"
 
 
+def _get_grouping_key_fields(groupings: list[GroupingConfig]) -> list[str]:
+    """The union of the groupings' fields, in the order of the grouping configurations"""
+    fields = {f for g in groupings for f in g.group_by_fields or []}
+    ordered = dict.fromkeys(f for g in [*_GROUPING_CONFIGS, *groupings] for f in g.group_by_fields or [])
+
+    return [f for f in ordered if f in fields]
+
+
+def _get_grouping_id(grouping: GroupingConfig, key_fields: list[str]) -> int:
+    """The grouping() bitmask of a grouping's set: a bit for each key not in the set, the first key highest"""
+    return sum(1 << (len(key_fields) - 1 - i) for i, f in enumerate(key_fields) if f not in (grouping.group_by_fields or []))
+
+
 def _analyze_milestone_records(
     client: Client,
     network: NetworkSchema,
     period: MilestonePeriod,
     milestone_type: MilestoneType,
-    grouping: GroupingConfig,
+    groupings: list[GroupingConfig],
     start_date: datetime | None = None,
     end_date: datetime | None = None,
     debug: bool = False,
-) -> list[dict[str, Any]]:
+) -> Iterator[list[dict[str, Any]]]:
     """
     Analyze historical records to find milestone records.
 
@@ -190,49 +209,53 @@ def _analyze_milestone_records(
     For generation records (power, energy, emissions) it uses SUM aggregation.
     For market records (price, demand) it uses AVG aggregation.
 
+    Every grouping is aggregated in a single scan of the source table with GROUPING SETS, and
+    the running max/min windows are partitioned by grouping set. The groupings must share a
+    source table (see _get_source_table_and_interval_name).
+
+    Records are streamed from ClickHouse in interval order and yielded in batches.
+
     Args:
         client: ClickHouse client
         network: Network to analyze
         period: Period bucket to analyze
         milestone_type: Type of milestone to find
-        grouping: How to group the records
+        groupings: How to group the records
         start_date: Optional start date to limit analysis
         end_date: Optional end date to limit analysis
 
-    Returns:
-        list[dict[str, Any]]: List of milestone records
+    Yields:
+        list[dict[str, Any]]: Batches of milestone records, each with its grouping's fields
     """
 
     # skip WEM region queries
-    if (network == NetworkWEM) and ("network_region" in grouping.group_by_fields if grouping.group_by_fields else False):
-        return []
+    if network == NetworkWEM:
+        groupings = [g for g in groupings if "network_region" not in (g.group_by_fields or [])]
 
-    source_table, time_col = _get_source_table_and_interval_name(milestone_type, period, grouping)
-    time_bucket_sql = get_time_bucket_sql(period, source_table, time_col)
-    # interval_threshold = INTERVAL_THRESHOLDS.get_for_period(period)
+    if not groupings:
+        return
 
-    # Build the GROUP BY clause from the configuration
-    group_by_fields = []
+    source_tables = {_get_source_table_and_interval_name(milestone_type, period, g) for g in groupings}
 
-    if grouping.group_by_fields:
-        group_by_fields.extend(grouping.group_by_fields)
+    if len(source_tables) > 1:
+        raise ValueError(f"Groupings {[g.name for g in groupings]} don't share a source table: {source_tables}")
+
+    source_table, time_col = source_tables.pop()
+    time_bucket_sql = get_time_bucket_sql(period, source_table, time_col)
+    # interval_threshold = INTERVAL_THRESHOLDS.get_for_period(period)
 
-    # Build partition fields for window functions
-    partition_fields = []
+    # every grouping's fields, rows outside a field's grouping sets hold its default value
+    key_fields = _get_grouping_key_fields(groupings)
+    groupings_by_id = {_get_grouping_id(g, key_fields): g for g in groupings}
 
-    if grouping.group_by_fields:
-        partition_fields = [f for f in grouping.group_by_fields if f != "network_id"]
+    grouping_id_select = f"grouping({', '.join(key_fields)})" if key_fields else "0"
+    grouping_sets = ", ".join(f"({', '.join(['time_bucket', *(g.group_by_fields or [])])})" for g in groupings)
 
-    partition_clause = ", ".join(partition_fields) if partition_fields else "1"
+    # Partition the window functions by grouping set and its fields
+    partition_clause = ", ".join(["grouping_id", *key_fields])
 
     # Handle group by fields in SELECT statements
-    group_by_select = ""
-    if grouping.group_by_fields:
-        # Special handling for renewable grouping
-        mapped_fields = []
-        for field in grouping.group_by_fields:
-            mapped_fields.append(field)
-        group_by_select = f", {', '.join(mapped_fields)}"
+    group_by_select = f", {', '.join(['grouping_id', *key_fields])}"
 
     # convert the metric to the column name and determine aggregation
     metric_column = ""
@@ -337,7 +360,8 @@ def _analyze_milestone_records(
     base_query = f"""
     WITH base_stats AS (
       SELECT
-        {time_bucket_sql} as time_bucket{group_by_select},
+        {time_bucket_sql} as time_bucket,
+        {grouping_id_select} as grouping_id{"".join(f", {f}" for f in key_fields)},
         {interval_count} as interval_count,
         {total_value_query} as total_value
       FROM {source_table} FINAL
@@ -345,8 +369,7 @@ def _analyze_milestone_records(
         network_id in ('{network.code.upper()}', {list_to_case([i.code for i in network.subnetworks])})
         {date_clause}
         {date_cutoffs}
-      GROUP BY
-        {time_bucket_sql}{group_by_select}
+      GROUP BY GROUPING SETS ({grouping_sets})
       ORDER BY 1 asc, 2
     ),
 
@@ -465,31 +488,45 @@ def _analyze_milestone_records(
         total_value = running_min
         AND (prev_min IS NULL OR total_value < prev_min AND interval_count >= {interval_threshold})
     )
-    ORDER BY interval"""
+    ORDER BY interval
+    SETTINGS force_grouping_standard_compatibility = 1"""
+
+    field_names = [
+        "interval",
+        "grouping_id",
+        *key_fields,
+        "total_value",
+        "interval_count",
+        "pct_change",
+        "record_type",
+        "period",
+        "instance_id",
+        "prev_instance_id",
+    ]
+
+    def _to_record(row: tuple) -> dict[str, Any]:
+        record = dict(zip(field_names, row, strict=False))
+        grouping = groupings_by_id[record.pop("grouping_id")]
+
+        # drop the fields outside the record's grouping, which hold defaults
+        for field in key_fields:
+            if field not in (grouping.group_by_fields or []):
+                del record[field]
+
+        return record
 
     try:
-        logger.info(f"running query for {network.code} {milestone_type.value} {period.value} {grouping.name}")
+        logger.info(
+            f"running query for {network.code} {milestone_type.value} {period.value} {', '.join(g.name for g in groupings)}"
+        )
 
         if debug:
             print(dedent(base_query))
 
-        records = client.execute(base_query)
-        # Convert to list of dicts for easier processing
-        field_names = [
-            "interval",
-            *(list(grouping.group_by_fields) if grouping.group_by_fields else []),
-            "total_value",
-            "interval_count",
-            "pct_change",
-            "record_type",
-            "period",
-            "instance_id",
-            "prev_instance_id",
-        ]
-
-        records = [dict(zip(field_names, record, strict=False)) for record in records]
+        rows = client.execute_iter(base_query, settings={"max_block_size": _STREAM_BATCH_SIZE})
 
-        return records
+        while batch := list(islice(rows, _STREAM_BATCH_SIZE)):
+            yield [_to_record(row) for row in batch]
 
     except Exception as e:
         logger.error(f"Error during milestone analysis: {str(e)}")
@@ -501,7 +538,6 @@ def _analyzed_record_to_milestone_schema(
     network: NetworkSchema,
     period: MilestonePeriod,
     milestone_type: MilestoneType,
-    grouping: GroupingConfig,
 ) -> list[MilestoneRecordSchema]:
     """
     Convert analyzed records to milestone record schemas.
@@ -590,6 +626,7 @@ def _analyzed_record_to_milestone_schema(
     # The ClickHouse lagInFrame(instance_id) links to the previous bucket's UUID,
     # not the previous *record's* UUID, because filtering happens after the window function.
     # Group by record_id (computed field) and link each record to the previous one.
+    # Chains start afresh each streamed batch, persistence links a batch's first record to the state.
     chain: dict[str, uuid.UUID] = {}  # record_id -> last instance_id
     for record in milestone_records:
         rid = record.record_id
@@ -626,6 +663,44 @@ _DEFAULT_NETWORKS = [
 ]
 
 
+def _get_source_groupings(
+    metric: MilestoneType, period: MilestonePeriod, groupings: list[GroupingConfig]
+) -> list[list[GroupingConfig]]:
+    """
+    The groupings to analyze for a metric and period, split by the source table they're read
+    from so each table is scanned once. Empty if the metric doesn't apply to the period.
+    """
+    # filter out the metrics that don't make sense for the period
+    if metric in [MilestoneType.power, MilestoneType.energy, MilestoneType.emissions]:
+        if period == MilestonePeriod.interval and metric not in [MilestoneType.power]:
+            return []
+
+        if period != MilestonePeriod.interval and metric == MilestoneType.power:
+            return []
+
+    if metric in [MilestoneType.price]:
+        if period != MilestonePeriod.interval:
+            return []
+
+    groupings_by_source: dict[tuple[str, str], list[GroupingConfig]] = {}
+
+    for grouping in groupings:
+        if metric in [MilestoneType.demand, MilestoneType.price, MilestoneType.proportion]:
+            # Skip fueltech-related groupings for market summary records
+            if grouping.name in [
+                "fueltech",
+                "region_fueltech",
+                "renewable",
+                "region_renewable",
+            ]:
+                continue
+
+        source = _get_source_table_and_interval_name(metric, period, grouping)
+        groupings_by_source.setdefault(source, []).append(grouping)
+
+    return list(groupings_by_source.values())
+
+
 async def run_milestone_analysis(
     start_date: datetime | None = None,
     end_date: datetime | None = None,
@@ -647,58 +722,40 @@ async def run_milestone_analysis(
         groupings: Optional list of grouping configurations to analyze
         debug: Optional flag to enable debug mode
     """
-    client = get_clickhouse_client()
+    # its own connection, as records are streamed from it while they're persisted
+    client = new_clickhouse_client()
     milestone_schema_records: list[MilestoneRecordOutputSchema] = []
 
-    # Iterate through all periods and grouping configurations
-    for metric in metrics or _DEFAULT_METRICS:
-        for network in networks or _DEFAULT_NETWORKS:
-            for period in periods or _DEFAULT_PERIODS:
-                milestone_records: list[MilestoneRecordSchema] = []
-
-                for grouping in groupings or _GROUPING_CONFIGS:
-                    # filter out the metrics that don't make sense for the period
-
-                    if metric in [MilestoneType.power, MilestoneType.energy, MilestoneType.emissions]:
-                        if period == MilestonePeriod.interval and metric not in [MilestoneType.power]:
-                            continue
-
-                        if period != MilestonePeriod.interval and metric == MilestoneType.power:
-                            continue
-
-                    if metric in [MilestoneType.price]:
-                        if period != MilestonePeriod.interval:
-                            continue
-
-                    if metric in [MilestoneType.demand, MilestoneType.price, MilestoneType.proportion]:
-                        # Skip fueltech-related groupings for market summary records
-                        if grouping.name in [
-                            "fueltech",
-                            "region_fueltech",
-                            "renewable",
-                            "region_renewable",
-                        ]:
-                            continue
-
-                    records = _analyze_milestone_records(
-                        client=client,
-                        network=network,
-                        milestone_type=metric,
-                        period=period,
-                        grouping=grouping,
-                        start_date=start_date,
-                        end_date=end_date,
-                        debug=debug,
-                    )
-
-                    milestone_records.extend(_analyzed_record_to_milestone_schema(records, network, period, metric, grouping))
-
-                if milestone_records:
-                    logger.info(
-                        f"Found {len(milestone_records)} milestone records for {network.code} {metric.value} {period.value}"
-                    )
-
-                    milestone_schema_records.extend(await check_and_persist_milestones_chunked(milestone_records))
+    try:
+        # Iterate through all periods, and the groupings of each source table in one query
+        for metric in metrics or _DEFAULT_METRICS:
+            for network in networks or _DEFAULT_NETWORKS:
+                for period in periods or _DEFAULT_PERIODS:
+                    for source_groupings in _get_source_groupings(metric, period, groupings or _GROUPING_CONFIGS):
+                        # persist each batch as it streams in, rather than holding every record
+                        for records in _analyze_milestone_records(
+                            client=client,
+                            network=network,
+                            milestone_type=metric,
+                            period=period,
+                            groupings=source_groupings,
+                            start_date=start_date,
+                            end_date=end_date,
+                            debug=debug,
+                        ):
+                            milestone_records = _analyzed_record_to_milestone_schema(records, network, period, metric)
+
+                            if not milestone_records:
+                                continue
+
+                            logger.info(
+                                f"Found {len(milestone_records)} milestone records for "
+                                f"{network.code} {metric.value} {period.value}"
+                            )
+
+                            milestone_schema_records.extend(await check_and_persist_milestones_chunked(milestone_records))
+    finally:
+        client.disconnect()
 
     logger.info("Milestone analysis complete")
     return milestone_schema_records
@@ -732,6 +789,7 @@ async def run_milestone_analysis_backlog(
             await session.execute(text("delete from milestones"))
             await session.commit()
         logger.warning("Milestones table deleted (refresh=True, confirm_delete=True)")
+        await invalidate_milestone_state()
 
     milestone_records = await run_milestone_analysis(start_date=start_date, end_date=end_date, debug=debug)
 
@@ -5,15 +5,29 @@ Loads current state (latest high/low per record_id), queries only the latest com
 periods from ClickHouse, compares against current records, and INSERTs only new records.
 
 Replaces the full-regeneration approach in backlog.py for scheduled runs.
+
+A run is built to finish well inside the interval it runs on. The state comes from the
+shared state store (see opennem.recordreactor.state) and is only reloaded when it has
+changed, each period is a GROUPING SETS query per source table rather than one per metric
+and grouping, and the rows are compared against the state in one vectorised pass so only
+the few that can break a record are built into records. Periods above the interval are
+no longer queried once checked, until the dirty days log shows one of their days was written
+again and the materialized view refresh has taken the write in, so late data still breaks
+records.
 """
 
 import logging
+import time
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+import polars as pl
 
 from opennem import settings
 from opennem.clients.slack import slack_message
-from opennem.db.clickhouse import get_clickhouse_client
+from opennem.db.clickhouse.client import get_clickhouse_pool
+from opennem.db.clickhouse.dirty_log import get_dirty_days, get_dirty_days_watermark
+from opennem.db.clickhouse.materialized_views import DIRTY_DAYS_CONSUMER
 from opennem.recordreactor.buckets import get_period_start_end
 from opennem.recordreactor.metric_registry import (
     GroupingConfig,
@@ -21,7 +35,7 @@ from opennem.recordreactor.metric_registry import (
     get_metric_definitions_for_period,
 )
 from opennem.recordreactor.persistence import check_and_persist_milestones_chunked
-from opennem.recordreactor.queries_incremental import query_all_groupings_for_period
+from opennem.recordreactor.queries_incremental import query_period_grouping_sets
 from opennem.recordreactor.schema import (
     MilestoneAggregate,
     MilestoneFueltechGrouping,
@@ -30,7 +44,7 @@ from opennem.recordreactor.schema import (
     MilestoneRecordSchema,
     MilestoneType,
 )
-from opennem.recordreactor.state import refresh_current_milestone_state, update_milestone_state
+from opennem.recordreactor.state import get_current_milestone_state, get_current_milestone_state_frame
 from opennem.recordreactor.unit import get_milestone_unit
 from opennem.recordreactor.utils import check_milestone_is_new
 from opennem.schema.network import NetworkNEM, NetworkSchema, NetworkWEM
@@ -52,6 +66,14 @@ _DEFAULT_PERIODS = [
     MilestonePeriod.year,
 ]
 
+# (network, period) -> start of the completed period last checked and the materialized view
+# refresh watermark it was checked at. It isn't checked again until a write to one of its days
+# marked after that watermark has been refreshed into the views
+_SETTLED_PERIODS: dict[tuple[str, MilestonePeriod], tuple[datetime, datetime]] = {}
+
+# a steady state run should finish well under this
+_RUN_LATENCY_TARGET_SECONDS = 1.0
+
 
 def _get_last_completed_quarter(dt: datetime) -> tuple[datetime, datetime]:
     """Return (start, end) of the last fully completed quarter.
@@ -214,22 +236,200 @@ def _map_row_to_records(
     return records
 
 
-async def _backfill_gap_if_needed() -> None:
+def _with_record_ids(rows: pl.DataFrame, network: NetworkSchema, period: MilestonePeriod) -> pl.DataFrame:
+    """Expand a period's aggregated rows into a high and a low each, with their record_id and
+    the metric's record constraints (min_value, allow_negative, threshold)."""
+    metric_defs = {m.metric.value: m for m in get_metric_definitions_for_period(period)}
+    fueltechs = {k: v.value for k, v in MilestoneFueltechGrouping.__members__.items()}
+
+    metric = pl.col("metric")
+    is_demand = metric == MilestoneType.demand.value
+
+    # record_id components, as get_milestone_record_id builds them
+    fueltech = (
+        pl.when(is_demand)
+        .then(pl.lit(MilestoneFueltechGrouping.demand.value))
+        .when(pl.col("fueltech_group_id").is_not_null())
+        .then(pl.col("fueltech_group_id").replace_strict(fueltechs, default=None))
+        .when(pl.col("renewable").is_not_null())
+        .then(
+            pl.when(pl.col("renewable"))
+            .then(pl.lit(MilestoneFueltechGrouping.renewables.value))
+            .otherwise(pl.lit(MilestoneFueltechGrouping.fossils.value))
+        )
+    )
+    metric_out = (
+        pl.when(is_demand)
+        .then(pl.lit((MilestoneType.power if period == MilestonePeriod.interval else MilestoneType.energy).value))
+        .when(metric == MilestoneType.proportion.value)
+        .then(pl.lit("renewables.proportion"))
+        .otherwise(metric)
+    )
+
+    return (
+        rows.filter(
+            pl.col("value").is_not_null()
+            # skip unknown fueltechs (e.g., bidirectional battery)
+            & (pl.col("fueltech_group_id").is_null() | pl.col("fueltech_group_id").is_in(list(fueltechs)))
+        )
+        .with_columns(
+            fueltech.alias("fueltech"),
+            metric_out.alias("metric_out"),
+            metric.replace_strict({k: m.min_value for k, m in metric_defs.items()}, return_dtype=pl.Float64).alias("min_value"),
+            metric.replace_strict({k: m.allow_negative for k, m in metric_defs.items()}, return_dtype=pl.Boolean).alias(
+                "allow_negative"
+            ),
+            metric.replace_strict(
+                {k: m.interval_thresholds.get(period, 1) for k, m in metric_defs.items()}, return_dtype=pl.Int64
+            ).alias("threshold"),
+        )
+        .join(
+            pl.DataFrame({"aggregate": [MilestoneAggregate.high.value, MilestoneAggregate.low.value]}),
+            how="cross",
+        )
+        .with_columns(
+            pl.concat_str(
+                pl.lit(network.country),
+                pl.lit(network.parent_network or network.code),
+                pl.col("network_region"),
+                pl.col("fueltech"),
+                pl.col("metric_out"),
+                pl.lit(period.value),
+                pl.col("aggregate"),
+                separator=".",
+                ignore_nulls=True,
+            )
+            .str.to_lowercase()
+            .alias("record_id")
+        )
+    )
+
+
+def _filter_candidate_rows(
+    rows: pl.DataFrame,
+    network: NetworkSchema,
+    period: MilestonePeriod,
+    state_frame: pl.DataFrame,
+) -> pl.DataFrame:
+    """Compare a period's aggregated rows against the state in one pass and keep the rows
+    that could be a new high or low.
+
+    This is a superset of what _map_row_to_records keeps: values are compared a unit either
+    side of the previous record so rounding can't drop a record, and the exact checks
+    (rounding, fueltech cutoffs, debounce) are left to _map_row_to_records.
+    """
+    if rows.is_empty():
+        return rows
+
+    candidates = _with_record_ids(rows, network, period).join(state_frame, on="record_id", how="left")
+
+    value = pl.col("value")
+    prev_value = pl.col("prev_value")
+
+    is_new_high = (value > pl.col("min_value") - 1) & (prev_value.is_null() | (value > prev_value - 1))
+    is_new_low = (
+        (pl.col("allow_negative") | (value > 0))
+        & (pl.col("interval_count") >= pl.col("threshold"))
+        & (prev_value.is_null() | (value < prev_value + 1))
+    )
+
+    return (
+        candidates.filter(
+            (pl.col("prev_interval").is_null() | (pl.col("time_bucket") > pl.col("prev_interval")))
+            & pl.when(pl.col("aggregate") == MilestoneAggregate.high.value).then(is_new_high).otherwise(is_new_low)
+        )
+        .select(rows.columns)
+        .unique(maintain_order=True)
+    )
+
+
+async def _detect_period_records(
+    network: NetworkSchema,
+    period: MilestonePeriod,
+    period_start: datetime,
+    period_end: datetime,
+    current_state: dict[str, MilestoneRecordOutputSchema],
+) -> tuple[list[MilestoneRecordSchema], bool]:
+    """Find the new records in one completed period.
+
+    Returns the new records and whether the period was fully checked.
+    """
+    rows, complete = await query_period_grouping_sets(network, period, period_start, period_end)
+
+    candidates = _filter_candidate_rows(rows, network, period, get_current_milestone_state_frame())
+
+    if candidates.is_empty():
+        return [], complete
+
+    metric_defs = {m.metric.value: m for m in get_metric_definitions_for_period(period)}
+    groupings = {g.name: g for m in metric_defs.values() for g in m.groupings}
+
+    new_records: list[MilestoneRecordSchema] = []
+
+    for row in candidates.iter_rows(named=True):
+        new_records.extend(
+            _map_row_to_records(
+                row=row,
+                metric_def=metric_defs[row["metric"]],
+                grouping=groupings[row["grouping"]],
+                period=period,
+                network=network,
+                current_state=current_state,
+            )
+        )
+
+    return new_records, complete
+
+
+async def _get_views_refreshed_to() -> datetime | None:
+    """Watermark of the materialized view refresh, writes to the aggregates marked before it are
+    in the views. None if it can't be read, in which case no period settles"""
+    try:
+        return await get_clickhouse_pool().run(lambda client: get_dirty_days_watermark(client, DIRTY_DAYS_CONSUMER))
+    except Exception as e:
+        logger.warning(f"Could not read the materialized view refresh watermark, checking every period: {e}")
+        return None
+
+
+async def _get_refreshed_dirty_days(network: NetworkSchema, since: datetime, until: datetime) -> set[date] | None:
+    """Days of a network written after since and refreshed into the views by until. None if the
+    dirty days log can't be read"""
+    try:
+        dirty_days = await get_clickhouse_pool().run(
+            lambda client: get_dirty_days(client, since=since, until=until, network_ids=network.get_network_codes())
+        )
+    except Exception as e:
+        logger.warning(f"Could not read the dirty days of {network.code}, checking every period: {e}")
+        return None
+
+    return set().union(*dirty_days.values())
+
+
+def _is_period_settled(
+    network: NetworkSchema, period: MilestonePeriod, period_start: datetime, period_end: datetime, dirty_days: set[date] | None
+) -> bool:
+    """Whether a completed period was checked and none of its days have been written since"""
+    settled = _SETTLED_PERIODS.get((network.code, period))
+
+    if not settled or settled[0] != period_start or dirty_days is None:
+        return False
+
+    return not any(period_start.date() <= day < period_end.date() for day in dirty_days)
+
+
+async def _backfill_gap_if_needed(current_state: dict[str, MilestoneRecordOutputSchema]) -> None:
     """Check if there's a gap between last milestone and now. If > 1 day, run backlog to fill it.
 
     This handles scenarios where the system was down for days — the incremental checker
     only looks at the latest period, so it would miss records from the gap. The backlog
     uses window functions and correctly detects every record-breaking day in the range.
-    """
-    from sqlalchemy import func, select
 
-    from opennem.db import get_read_session
-    from opennem.db.models.opennem import Milestones
+    The state holds the latest milestone of every record_id, so the last milestone is read
+    from it rather than the database.
+    """
     from opennem.recordreactor.backlog import run_milestone_analysis
 
-    async with get_read_session() as session:
-        result = await session.execute(select(func.max(Milestones.interval)))
-        last_milestone = result.scalar()
+    last_milestone = max((r.interval.replace(tzinfo=None) for r in current_state.values()), default=None)
 
     if not last_milestone:
         logger.warning("No milestones found — run full backlog first")
@@ -253,21 +453,26 @@ async def run_incremental_milestone_check(
 ) -> list[MilestoneRecordOutputSchema]:
     """Run incremental milestone detection.
 
-    1. Check for gaps > 1 day and backfill if needed
-    2. Load current state (latest high/low per record_id)
-    3. Determine which periods have just completed
-    4. Query ClickHouse for aggregated values
+    1. Load current state (latest high/low per record_id) from the state store
+    2. Check for gaps > 1 day and backfill if needed
+    3. Determine which periods have just completed and haven't settled, or were written to
+       since they were checked
+    4. Query ClickHouse for aggregated values, a query per source table
     5. Compare against current records
     6. INSERT new records
     7. Alert on significance >= 9
     """
+    started = time.perf_counter()
+
+    current_state = await get_current_milestone_state()
+
     # Fill any gap from downtime before doing the incremental check
-    await _backfill_gap_if_needed()
+    await _backfill_gap_if_needed(current_state)
 
-    client = get_clickhouse_client()
-    # Always reload state from DB to avoid stale reads after reconciliation/admin writes
-    current_state = await refresh_current_milestone_state()
     all_new_records: list[MilestoneRecordOutputSchema] = []
+    periods_checked = 0
+
+    views_refreshed_to = await _get_views_refreshed_to()
 
     for network in networks or _DEFAULT_NETWORKS:
         # get_last_completed_interval_for_network returns the start of the current interval
@@ -275,50 +480,42 @@ async def run_incremental_milestone_check(
         now = get_last_completed_interval_for_network(network) - timedelta(minutes=network.interval_size)
         completed_periods = get_completed_periods(now, network)
 
-        logger.info(f"Checking {network.code}: {len(completed_periods)} periods at {now}")
+        logger.debug(f"Checking {network.code}: {len(completed_periods)} periods at {now}")
+
+        # days written since the earliest check of a settled period that the views have taken in
+        checked_at = [settled[1] for (code, _), settled in _SETTLED_PERIODS.items() if code == network.code]
+        dirty_days: set[date] | None = None
+
+        if views_refreshed_to and checked_at:
+            if min(checked_at) < views_refreshed_to:
+                dirty_days = await _get_refreshed_dirty_days(network, min(checked_at), views_refreshed_to)
+            else:
+                dirty_days = set()
 
         for period, period_start, period_end in completed_periods:
-            # Get all metric definitions valid for this period
-            metric_defs = get_metric_definitions_for_period(period)
-
-            for metric_def in metric_defs:
-                # Query all groupings for this metric + period
-                grouping_results = query_all_groupings_for_period(
-                    client=client,
-                    metric_def=metric_def,
-                    network=network,
-                    period=period,
-                    period_start=period_start,
-                    period_end=period_end,
-                )
+            if _is_period_settled(network, period, period_start, period_end, dirty_days) and views_refreshed_to:
+                # nothing of the period was written up to the watermark, move its check up to it
+                _SETTLED_PERIODS[(network.code, period)] = (period_start, views_refreshed_to)
+                continue
 
-                # Collect new records from all groupings
-                new_records: list[MilestoneRecordSchema] = []
-
-                for grouping, rows in grouping_results:
-                    for row in rows:
-                        records = _map_row_to_records(
-                            row=row,
-                            metric_def=metric_def,
-                            grouping=grouping,
-                            period=period,
-                            network=network,
-                            current_state=current_state,
-                        )
-                        new_records.extend(records)
+            new_records, complete = await _detect_period_records(network, period, period_start, period_end, current_state)
+            periods_checked += 1
 
-                if new_records:
-                    logger.info(
-                        f"Found {len(new_records)} new records for {network.code} {metric_def.metric.value} {period.value}"
-                    )
+            if complete and period != MilestonePeriod.interval and views_refreshed_to:
+                _SETTLED_PERIODS[(network.code, period)] = (period_start, views_refreshed_to)
+
+            if new_records:
+                logger.info(f"Found {len(new_records)} new records for {network.code} {period.value}")
+
+                # Persist new records, which publishes them to the state for subsequent comparisons
+                all_new_records.extend(await check_and_persist_milestones_chunked(new_records))
+
+    elapsed = time.perf_counter() - started
 
-                    # Persist new records
-                    persisted = await check_and_persist_milestones_chunked(new_records)
-                    all_new_records.extend(persisted)
+    logger.info(f"Checked {periods_checked} periods for milestones in {elapsed:.2f}s")
 
-                    # Update in-memory state for subsequent comparisons
-                    for record in persisted:
-                        update_milestone_state(record.record_id, record)
+    if elapsed > _RUN_LATENCY_TARGET_SECONDS:
+        logger.warning(f"Incremental milestone check took {elapsed:.1f}s, over the {_RUN_LATENCY_TARGET_SECONDS}s target")
 
     # Alert on high-significance records
     significant_records = [r for r in all_new_records if r.significance >= 9]
@@ -13,7 +13,7 @@ from opennem.db import get_write_session
 from opennem.db.models.opennem import Milestones
 from opennem.recordreactor.schema import MilestoneRecordOutputSchema, MilestoneRecordSchema
 from opennem.recordreactor.significance import calculate_milestone_significance
-from opennem.recordreactor.state import get_current_milestone_state
+from opennem.recordreactor.state import get_current_milestone_state, publish_milestone_state
 from opennem.recordreactor.utils import check_milestone_is_new, get_record_description
 
 logger = logging.getLogger("opennem.recordreactor.persistence")
@@ -150,7 +150,11 @@ async def check_and_persist_milestones_chunked(milestones: list[MilestoneRecordS
 
         await session.commit()
         logger.info(f"Successfully inserted {total_inserted} records")
-        return milestone_schema_records
+
+    # keep the shared state current so the next check compares against these
+    await publish_milestone_state(milestone_schema_records)
+
+    return milestone_schema_records
 
 
 async def check_and_persist_milestones(
@@ -3,21 +3,30 @@ Simple ClickHouse aggregation queries for incremental milestone detection.
 
 No window functions — each query aggregates a single completed period and returns
 one value per grouping key. Python handles comparison against current state.
+
+Every metric and grouping read from the same source table is aggregated in one scan with
+GROUPING SETS, so a period is a query per source table rather than one per metric and
+grouping.
 """
 
+import asyncio
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any
 
+import polars as pl
+
+from opennem.db.clickhouse import execute_async, get_clickhouse_client
 from opennem.queries.utils import list_to_case
 from opennem.recordreactor.metric_registry import (
     GroupingConfig,
     MetricDefinition,
+    get_metric_definitions_for_period,
     get_source_table_for_metric_grouping,
     get_value_expression,
 )
 from opennem.recordreactor.schema import MilestonePeriod
-from opennem.schema.network import NetworkSchema
+from opennem.schema.network import NetworkSchema, NetworkWEM
 
 logger = logging.getLogger("opennem.recordreactor.queries_incremental")
 
@@ -54,140 +63,209 @@ def _build_network_filter(network: NetworkSchema, time_col: str) -> str:
     return f"network_id IN ({list_to_case(network_codes)})"
 
 
-def build_period_aggregation_query(
-    metric_def: MetricDefinition,
+# every grouping key across the source tables and its type
+_GROUPING_KEY_FIELDS: dict[str, type[pl.DataType]] = {
+    "network_region": pl.String,
+    "fueltech_group_id": pl.String,
+    "renewable": pl.Boolean,
+}
+
+
+@dataclass
+class GroupingSetsQuery:
+    """The metrics and groupings aggregated from one source table in a single scan"""
+
+    source_table: str
+    time_col: str
+    pairs: list[tuple[MetricDefinition, GroupingConfig]] = field(default_factory=list)
+
+    @property
+    def metric_defs(self) -> list[MetricDefinition]:
+        return list({m.metric: m for m, _ in self.pairs}.values())
+
+    @property
+    def groupings(self) -> list[GroupingConfig]:
+        return list({g.name: g for _, g in self.pairs}.values())
+
+    @property
+    def key_fields(self) -> list[str]:
+        return [f for f in _GROUPING_KEY_FIELDS if any(f in g.group_by_fields for g in self.groupings)]
+
+    @property
+    def columns(self) -> list[str]:
+        return [
+            "time_bucket",
+            "grouping_id",
+            *self.key_fields,
+            "interval_count",
+            *(_value_alias(m) for m in self.metric_defs),
+        ]
+
+
+def _value_alias(metric_def: MetricDefinition) -> str:
+    # not the metric itself, that can shadow a source column (demand, energy)
+    return f"value_{metric_def.metric.value}"
+
+
+def get_grouping_id(grouping: GroupingConfig, key_fields: list[str]) -> int:
+    """The grouping() bitmask of a grouping set: a bit for each key not in the set, the first key highest"""
+    return sum(1 << (len(key_fields) - 1 - i) for i, f in enumerate(key_fields) if f not in grouping.group_by_fields)
+
+
+def get_grouping_sets_queries(
     network: NetworkSchema,
-    grouping: GroupingConfig,
     period: MilestonePeriod,
-    period_start: datetime,
-    period_end: datetime,
-) -> str:
-    """Build a simple aggregation query for one completed period.
+    metric_defs: list[MetricDefinition] | None = None,
+) -> list[GroupingSetsQuery]:
+    """Plan one query per source table covering every metric and grouping for a period.
 
-    Returns a ClickHouse SQL query that aggregates metrics over the period
-    grouped by the specified fields.
+    Skips WEM region groupings (WEM has no sub-regions).
     """
-    source_table = get_source_table_for_metric_grouping(metric_def, grouping)
-    time_col = metric_def.time_col
-    value_col, agg_func = get_value_expression(metric_def, period)
+    queries: dict[str, GroupingSetsQuery] = {}
 
-    # Build SELECT fields
-    time_bucket = _get_time_bucket_sql(period, time_col)
-    select_fields = [f"{time_bucket} as time_bucket"]
-    group_by_fields = [time_bucket]
+    for metric_def in metric_defs if metric_defs is not None else get_metric_definitions_for_period(period):
+        for grouping in metric_def.groupings:
+            if network == NetworkWEM and "network_region" in grouping.group_by_fields:
+                continue
 
-    if grouping.group_by_fields:
-        select_fields.extend(grouping.group_by_fields)
-        group_by_fields.extend(grouping.group_by_fields)
+            source_table = get_source_table_for_metric_grouping(metric_def, grouping)
 
-    # Build value expression
-    if agg_func:
-        select_fields.append(f"{agg_func}({value_col}) as value")
-    else:
-        # Pre-computed expression (e.g., proportion)
-        select_fields.append(f"{value_col} as value")
+            if source_table not in queries:
+                queries[source_table] = GroupingSetsQuery(source_table=source_table, time_col=metric_def.time_col)
 
-    # Add interval count for LOW record validation
-    if period != MilestonePeriod.interval:
-        select_fields.append(f"count(distinct {time_col}) as interval_count")
-    else:
-        select_fields.append("1 as interval_count")
-
-    select_clause = ", ".join(select_fields)
-    group_by_clause = ", ".join(group_by_fields)
-
-    # Build WHERE clause
-    network_filter = _build_network_filter(network, time_col)
-    start_str = period_start.strftime("%Y-%m-%d %H:%M:%S")
-    end_str = period_end.strftime("%Y-%m-%d %H:%M:%S")
-
-    # Date cutoff for the metric
-    date_cutoff_clause = ""
-    if metric_def.date_cutoff:
-        cutoff_str = metric_def.date_cutoff.strftime("%Y-%m-%d %H:%M:%S")
-        date_cutoff_clause = f"AND {time_col} >= toDateTime('{cutoff_str}')"
-
-    query = f"""
-    SELECT {select_clause}
-    FROM {source_table} FINAL
-    WHERE {network_filter}
-      AND {time_col} >= toDateTime('{start_str}')
-      AND {time_col} < toDateTime('{end_str}')
-      {date_cutoff_clause}
-    GROUP BY {group_by_clause}
-    """
+            queries[source_table].pairs.append((metric_def, grouping))
 
-    return query
+    return list(queries.values())
 
 
-def query_period_aggregates(
-    client: Any,
-    metric_def: MetricDefinition,
+def build_grouping_sets_query(
+    query: GroupingSetsQuery,
     network: NetworkSchema,
-    grouping: GroupingConfig,
     period: MilestonePeriod,
-    period_start: datetime,
-    period_end: datetime,
-) -> list[dict[str, Any]]:
-    """Execute a period aggregation query and return results as dicts.
+    date_start: datetime | None = None,
+    date_end: datetime | None = None,
+) -> str:
+    """Build the aggregation of every metric and grouping in query over [date_start, date_end).
 
-    Returns list of dicts with keys: time_bucket, value, interval_count,
-    plus any grouping fields (network_region, fueltech_group_id, renewable).
+    Each row is one time bucket of one grouping set, which grouping_id identifies (see
+    get_grouping_id). Keys outside a row's grouping set hold their type's default value.
+    A metric's date_cutoff nulls its value in buckets before the cutoff.
     """
-    query = build_period_aggregation_query(
-        metric_def=metric_def,
-        network=network,
-        grouping=grouping,
-        period=period,
-        period_start=period_start,
-        period_end=period_end,
+    time_col = query.time_col
+    time_bucket = _get_time_bucket_sql(period, time_col)
+    key_fields = query.key_fields
+
+    select_fields = [
+        # day+ buckets are dates, normalised so every period's buckets are datetimes
+        f"toDateTime({time_bucket}) as time_bucket",
+        f"grouping({', '.join(key_fields)}) as grouping_id" if key_fields else "0 as grouping_id",
+        *key_fields,
+        f"count(distinct {time_col}) as interval_count" if period != MilestonePeriod.interval else "1 as interval_count",
+    ]
+
+    for metric_def in query.metric_defs:
+        value_col, agg_func = get_value_expression(metric_def, period)
+        value_expression = f"{agg_func}({value_col})" if agg_func else value_col
+
+        if metric_def.date_cutoff:
+            cutoff_str = metric_def.date_cutoff.strftime("%Y-%m-%d %H:%M:%S")
+            value_expression = f"if(time_bucket >= toDateTime('{cutoff_str}'), {value_expression}, NULL)"
+
+        select_fields.append(f"{value_expression} as {_value_alias(metric_def)}")
+
+    grouping_sets = ", ".join(f"({', '.join(['time_bucket', *g.group_by_fields])})" for g in query.groupings)
+
+    date_filters = ""
+
+    if date_start:
+        date_filters += f"AND {time_col} >= toDateTime('{date_start.strftime('%Y-%m-%d %H:%M:%S')}')"
+
+    if date_end:
+        date_filters += f" AND {time_col} < toDateTime('{date_end.strftime('%Y-%m-%d %H:%M:%S')}')"
+
+    return f"""
+    SELECT {", ".join(select_fields)}
+    FROM {query.source_table} FINAL
+    WHERE {_build_network_filter(network, time_col)}
+      {date_filters}
+    GROUP BY GROUPING SETS ({grouping_sets})
+    SETTINGS force_grouping_standard_compatibility = 1
+    """
+
+
+def grouping_sets_rows_to_frame(query: GroupingSetsQuery, rows: list[tuple]) -> pl.DataFrame:
+    """Convert grouping sets rows into a frame with one row per time bucket, grouping and metric.
+
+    Columns are time_bucket, grouping, network_region, fueltech_group_id, renewable,
+    interval_count, metric and value. Keys outside the row's grouping are null, and
+    metric/grouping pairs that weren't asked for are dropped.
+    """
+    schema: dict[str, type[pl.DataType] | pl.DataType] = {
+        "time_bucket": pl.Datetime("us"),
+        "grouping_id": pl.Int64,
+        **{f: _GROUPING_KEY_FIELDS[f] for f in query.key_fields},
+        "interval_count": pl.Int64,
+        **{_value_alias(m): pl.Float64 for m in query.metric_defs},
+    }
+
+    df = pl.DataFrame(rows, schema=schema, orient="row")
+
+    grouping_names = {get_grouping_id(g, query.key_fields): g.name for g in query.groupings}
+    groupings_with_key = {f: [g.name for g in query.groupings if f in g.group_by_fields] for f in _GROUPING_KEY_FIELDS}
+
+    df = df.with_columns(pl.col("grouping_id").replace_strict(grouping_names, return_dtype=pl.String).alias("grouping"))
+    df = df.with_columns(
+        pl.when(pl.col("grouping").is_in(groupings_with_key[f])).then(pl.col(f)).otherwise(None).alias(f)
+        if f in query.key_fields
+        else pl.lit(None, dtype=dtype).alias(f)
+        for f, dtype in _GROUPING_KEY_FIELDS.items()
     )
 
-    try:
-        rows = client.execute(query)
-    except Exception as e:
-        logger.error(f"ClickHouse query failed for {metric_def.metric.value} {period.value} {grouping.name}: {e}")
-        return []
+    index = ["time_bucket", "grouping", *_GROUPING_KEY_FIELDS, "interval_count"]
 
-    # Map rows to dicts
-    field_names = ["time_bucket", *grouping.group_by_fields, "value", "interval_count"]
-    return [dict(zip(field_names, row, strict=False)) for row in rows]
+    long = df.unpivot(
+        index=index, on=[_value_alias(m) for m in query.metric_defs], variable_name="metric", value_name="value"
+    ).with_columns(pl.col("metric").str.strip_prefix("value_"))
 
+    asked = pl.DataFrame(
+        {"metric": [m.metric.value for m, _ in query.pairs], "grouping": [g.name for _, g in query.pairs]},
+        schema={"metric": pl.String, "grouping": pl.String},
+    )
 
-def query_all_groupings_for_period(
-    client: Any,
-    metric_def: MetricDefinition,
+    return long.join(asked, on=["metric", "grouping"], how="semi").select(*index, "metric", "value")
+
+
+async def query_period_grouping_sets(
     network: NetworkSchema,
     period: MilestonePeriod,
     period_start: datetime,
     period_end: datetime,
-) -> list[tuple[GroupingConfig, list[dict[str, Any]]]]:
-    """Query all valid groupings for a metric + period combination.
-
-    Skips WEM region queries (WEM has no sub-regions).
+) -> tuple[pl.DataFrame, bool]:
+    """Aggregate every metric and grouping for one completed period, a query per source table
+    run concurrently.
 
-    Returns list of (grouping, results) tuples.
+    Returns the rows (see grouping_sets_rows_to_frame) and whether every query succeeded.
     """
-    from opennem.schema.network import NetworkWEM
+    queries = get_grouping_sets_queries(network, period)
+    client = get_clickhouse_client()
+
+    results = await asyncio.gather(
+        *(execute_async(client, build_grouping_sets_query(q, network, period, period_start, period_end)) for q in queries),
+        return_exceptions=True,
+    )
 
-    results: list[tuple[GroupingConfig, list[dict[str, Any]]]] = []
+    frames: list[pl.DataFrame] = []
+    complete = True
 
-    for grouping in metric_def.groupings:
-        # Skip WEM region queries — WEM has no sub-regions
-        if network == NetworkWEM and "network_region" in grouping.group_by_fields:
+    for query, rows in zip(queries, results, strict=True):
+        if isinstance(rows, BaseException):
+            logger.error(f"ClickHouse query failed for {network.code} {period.value} {query.source_table}: {rows}")
+            complete = False
             continue
 
-        rows = query_period_aggregates(
-            client=client,
-            metric_def=metric_def,
-            network=network,
-            grouping=grouping,
-            period=period,
-            period_start=period_start,
-            period_end=period_end,
-        )
+        frames.append(grouping_sets_rows_to_frame(query, rows))
 
-        if rows:
-            results.append((grouping, rows))
+    if not frames:
+        return pl.DataFrame(), complete
 
-    return results
+    return pl.concat(frames, how="vertical"), complete
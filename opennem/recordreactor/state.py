@@ -1,19 +1,50 @@
 """
 Methods for current Record Rector state
 
+The current state is the latest milestone per record_id, the running high or low each new
+value is compared against. It is kept in a Redis hash of record_id to a compact form of the
+record (the state store) with a version that is bumped on every write, so each process holds
+a copy it only reloads when another process has written. The store expires after
+settings.milestone_state_ttl and is then reseeded from the database, so a milestone written
+without going through the store is only missed until then.
+
 """
 
-import asyncio
 import logging
+import time
 
+import orjson
+import polars as pl
 from sqlalchemy import text
 
+from opennem import settings
+from opennem.clients.redis import get_redis
 from opennem.db import get_read_session
 from opennem.recordreactor.schema import MilestoneRecordOutputSchema
 
 logger = logging.getLogger("opennem.recordreactor.state")
 
+MILESTONE_STATE_KEY = "opennem:milestones:state"
+MILESTONE_STATE_VERSION_KEY = "opennem:milestones:state_version"
+
+_STATE_RECORD_FIELDS = {
+    "record_id",
+    "interval",
+    "instance_id",
+    "aggregate",
+    "metric",
+    "period",
+    "significance",
+    "value",
+    "value_unit",
+    "network_id",
+    "network_region",
+    "fueltech_id",
+}
+
 _CURRENT_MILESTONE_STATE: dict[str, MilestoneRecordOutputSchema] | None = None
+_CURRENT_MILESTONE_STATE_VERSION: int | None = None
+_CURRENT_MILESTONE_STATE_FRAME: pl.DataFrame | None = None
 
 
 async def get_current_milestone_state_from_database() -> dict[str, MilestoneRecordOutputSchema]:
@@ -75,35 +106,132 @@ async def get_current_milestone_state_from_database() -> dict[str, MilestoneReco
     return result_dict
 
 
+def _encode_state_record(record: MilestoneRecordOutputSchema) -> bytes:
+    """The compact form of a record the state store keeps, just what a comparison needs"""
+    return orjson.dumps(record.model_dump(mode="json", include=_STATE_RECORD_FIELDS))
+
+
+def _decode_state_record(raw: bytes) -> MilestoneRecordOutputSchema:
+    return MilestoneRecordOutputSchema.model_validate_json(raw)
+
+
+def _set_local_state(state: dict[str, MilestoneRecordOutputSchema] | None, version: int | None) -> None:
+    global _CURRENT_MILESTONE_STATE, _CURRENT_MILESTONE_STATE_VERSION, _CURRENT_MILESTONE_STATE_FRAME
+
+    _CURRENT_MILESTONE_STATE = state
+    _CURRENT_MILESTONE_STATE_VERSION = version
+    _CURRENT_MILESTONE_STATE_FRAME = None
+
+
+async def _seed_state_store(state: dict[str, MilestoneRecordOutputSchema]) -> int:
+    """
+    Replace the state in the store with state and return its new version.
+
+    A seeded version is unique rather than incremented, so a process holding a copy from
+    before the store was flushed can't mistake the reseeded state for its own. Both keys
+    expire together after settings.milestone_state_ttl, publishing doesn't extend them.
+    """
+    version = time.time_ns()
+
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(MILESTONE_STATE_KEY)
+
+        if state:
+            pipe.hset(MILESTONE_STATE_KEY, mapping={k: _encode_state_record(v) for k, v in state.items()})
+            pipe.expire(MILESTONE_STATE_KEY, settings.milestone_state_ttl)
+
+        pipe.set(MILESTONE_STATE_VERSION_KEY, version, ex=settings.milestone_state_ttl)
+        await pipe.execute()
+
+    return version
+
+
 async def get_current_milestone_state() -> dict[str, MilestoneRecordOutputSchema]:
     """
     Gets the current milestone mapping
 
+    The state is shared between processes through the state store. The local copy is used
+    for as long as the store's version matches it, so a steady state read is a single Redis
+    GET. A changed version reloads the state from the store, and an empty or expired store is
+    seeded from the database. If Redis is unavailable the state is loaded from the database.
+
     Returns:
         dict[str, MilestoneRecord]: A dictionary of milestone records keyed by record_id
 
     """
-    global _CURRENT_MILESTONE_STATE
+    try:
+        version = await get_redis().get(MILESTONE_STATE_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Milestone state store unavailable, using the database: {e}")
+
+        if _CURRENT_MILESTONE_STATE_VERSION is not None or not _CURRENT_MILESTONE_STATE:
+            _set_local_state(await get_current_milestone_state_from_database(), None)
+
+        return _CURRENT_MILESTONE_STATE or {}
 
-    if not _CURRENT_MILESTONE_STATE:
-        _CURRENT_MILESTONE_STATE = await get_current_milestone_state_from_database()
+    if version is None:
+        return await refresh_current_milestone_state()
 
-    return _CURRENT_MILESTONE_STATE
+    version = int(version)
+
+    if _CURRENT_MILESTONE_STATE is not None and version == _CURRENT_MILESTONE_STATE_VERSION:
+        return _CURRENT_MILESTONE_STATE
+
+    raw_state = await get_redis().hgetall(MILESTONE_STATE_KEY)
+
+    # the hash expired a moment before its version
+    if not raw_state:
+        return await refresh_current_milestone_state()
+
+    state = {(k.decode() if isinstance(k, bytes) else k): _decode_state_record(v) for k, v in raw_state.items()}
+
+    _set_local_state(state, version)
+    logger.info(f"Loaded {len(state)} milestone states from the state store at version {version}")
+
+    return state
 
 
 async def refresh_current_milestone_state() -> dict[str, MilestoneRecordOutputSchema]:
     """
-    Refreshes the current milestone mapping
+    Reloads the current milestone mapping from the database and reseeds the state store with it
 
     Returns:
         dict[str, MilestoneRecord]: A dictionary of milestone records keyed by record_id
     """
-    global _CURRENT_MILESTONE_STATE
-    _CURRENT_MILESTONE_STATE = None
+    state = await get_current_milestone_state_from_database()
+
+    try:
+        version: int | None = await _seed_state_store(state)
+    except Exception as e:
+        logger.warning(f"Could not seed the milestone state store: {e}")
+        version = None
+
+    _set_local_state(state, version)
+    logger.info(f"Loaded {len(state)} milestone states from the database")
+
+    return state
+
+
+def get_current_milestone_state_frame() -> pl.DataFrame:
+    """
+    The loaded state as a frame of record_id, prev_value and prev_interval, for comparing a
+    batch of candidate records in one pass. Built once per state version.
+    """
+    global _CURRENT_MILESTONE_STATE_FRAME
+
+    if _CURRENT_MILESTONE_STATE_FRAME is None:
+        state = _CURRENT_MILESTONE_STATE or {}
 
-    _CURRENT_MILESTONE_STATE = await get_current_milestone_state()
+        _CURRENT_MILESTONE_STATE_FRAME = pl.DataFrame(
+            {
+                "record_id": list(state.keys()),
+                "prev_value": [float(r.value) for r in state.values()],
+                "prev_interval": [r.interval.replace(tzinfo=None) for r in state.values()],
+            },
+            schema={"record_id": pl.String, "prev_value": pl.Float64, "prev_interval": pl.Datetime("us")},
+        )
 
-    return _CURRENT_MILESTONE_STATE
+    return _CURRENT_MILESTONE_STATE_FRAME
 
 
 def update_milestone_state(record_id: str, milestone: MilestoneRecordOutputSchema) -> None:
@@ -111,19 +239,75 @@ def update_milestone_state(record_id: str, milestone: MilestoneRecordOutputSchem
 
     This avoids a full DB reload after each new record is inserted.
     """
-    global _CURRENT_MILESTONE_STATE
+    global _CURRENT_MILESTONE_STATE_FRAME
 
     if _CURRENT_MILESTONE_STATE is None:
         logger.warning("Cannot update state — cache not initialized")
         return
 
     _CURRENT_MILESTONE_STATE[record_id] = milestone
+    _CURRENT_MILESTONE_STATE_FRAME = None
+
+
+async def publish_milestone_state(milestones: list[MilestoneRecordOutputSchema]) -> None:
+    """
+    Publish persisted milestones to the local state and the state store. Only the latest
+    milestone per record_id is kept, so older records filled in by a reconciliation don't
+    replace newer state. Failures are logged rather than raised since the milestones have
+    already been persisted.
+    """
+    global _CURRENT_MILESTONE_STATE_VERSION
+
+    if _CURRENT_MILESTONE_STATE is None or not milestones:
+        return
+
+    updated: dict[str, MilestoneRecordOutputSchema] = {}
+
+    for milestone in milestones:
+        current = updated.get(milestone.record_id) or _CURRENT_MILESTONE_STATE.get(milestone.record_id)
+
+        if current is None or milestone.interval > current.interval:
+            updated[milestone.record_id] = milestone
+
+    if not updated:
+        return
+
+    for record_id, milestone in updated.items():
+        update_milestone_state(record_id, milestone)
+
+    if _CURRENT_MILESTONE_STATE_VERSION is None:
+        return
+
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(MILESTONE_STATE_KEY, mapping={k: _encode_state_record(v) for k, v in updated.items()})
+            pipe.incr(MILESTONE_STATE_VERSION_KEY)
+            _, version = await pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not publish {len(updated)} milestone states: {e}")
+        return
+
+    # the store expired before this write, which left a partial hash with no expiry and a
+    # fresh version. Drop it so the next read reseeds the whole state from the database
+    if version == 1:
+        await invalidate_milestone_state()
+        return
+
+    # if nothing else wrote in between the local copy is this version, otherwise leave it
+    # behind so the next read reloads it from the store
+    if version == _CURRENT_MILESTONE_STATE_VERSION + 1:
+        _CURRENT_MILESTONE_STATE_VERSION = version
+
+
+async def invalidate_milestone_state() -> None:
+    """Clear the cached state and the state store, forcing a full DB reload on next access."""
+    _set_local_state(None, None)
 
+    try:
+        await get_redis().delete(MILESTONE_STATE_KEY, MILESTONE_STATE_VERSION_KEY)
+    except Exception as e:
+        logger.error(f"Could not clear the milestone state store: {e}")
 
-def invalidate_milestone_state() -> None:
-    """Clear the cached state, forcing a full DB reload on next access."""
-    global _CURRENT_MILESTONE_STATE
-    _CURRENT_MILESTONE_STATE = None
     logger.info("Milestone state cache invalidated")
 
 
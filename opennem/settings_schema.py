@@ -55,6 +55,46 @@ class OpennemSettings(BaseSettings):
         description="ClickHouse max_execution_time (seconds) for serving-path queries. 0 = unset.",
     )
 
+    # refresh materialized views by building the affected partitions in a staging table and
+    # swapping them in with REPLACE PARTITION instead of an ALTER DELETE mutation per chunk.
+    # see opennem.db.clickhouse.materialized_views
+    clickhouse_mv_refresh_replace_partitions: bool = True
+
+    # serve time series queries off FROM ... FINAL instead of the argMax(col, version)
+    # dedup of the rows read. stays on until tests/benchmark_clickhouse_serving_queries.py
+    # shows the dedup is faster against production data. see opennem.api.queries
+    clickhouse_serving_use_final: bool = True
+
+    # profile every query run through execute_async / insert_async. queries slower than
+    # clickhouse_slow_query_seconds are logged as warnings and the slowest
+    # clickhouse_profile_slowest_size are kept for the admin endpoint.
+    # see opennem.db.clickhouse.profiling
+    clickhouse_profile_queries: bool = True
+    clickhouse_slow_query_seconds: float = 1.0
+    clickhouse_profile_slowest_size: int = 50
+
+    # pools of clickhouse connections async code queries (execute_async) and inserts
+    # (insert_async, insert_frame_async) on. idle connections are closed after
+    # clickhouse_pool_idle_timeout seconds and pinged every clickhouse_pool_health_check_interval
+    # seconds. see opennem.db.clickhouse.pool
+    clickhouse_pool_max_size: int = 8
+    clickhouse_pool_insert_max_size: int = 4
+    clickhouse_pool_idle_timeout: float = 300.0
+    clickhouse_pool_health_check_interval: float = 30.0
+
+    # coalesce identical time series queries running at the same time in an api worker, and
+    # across workers through a redis lock held for at most api_single_flight_lock_ttl seconds.
+    # see opennem.api.singleflight
+    api_single_flight: bool = True
+    api_single_flight_redis: bool = True
+    api_single_flight_lock_ttl: float = 30.0
+
+    # expiry of cached v4 data and market responses. cache keys include the published data version
+    # so live responses are replaced when new intervals land, this only bounds settled ones
+    api_data_cache_expire: int = 60 * 60 * 24
+    # max-age clients are told to cache v4 data and market responses for
+    api_data_cache_max_age: int = 60 * 5
+
     redis_url: RedisDsn = Field(
         RedisDsn("redis://127.0.0.1"),
         validation_alias=AliasChoices("REDIS_HOST_URL", "cache_url"),
@@ -130,6 +170,47 @@ class OpennemSettings(BaseSettings):
     # show database debug
     db_debug: bool = False
 
+    # sqlalchemy engine pool for the live workload (api, 5 minute crawls)
+    db_pool_size: int = 5
+    db_pool_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+
+    # sqlalchemy engine pool for backfills and catchups so they can't starve the live crawl
+    db_backfill_pool_size: int = 2
+    db_backfill_pool_max_overflow: int = 2
+
+    # asyncpg pools used by the bulk COPY inserter. pools grow from min to max under load
+    # and idle connections are closed after db_pool_max_inactive_lifetime seconds
+    db_bulk_pool_min_size: int = 1
+    db_bulk_pool_max_size: int = 6
+    db_bulk_pool_backfill_max_size: int = 2
+    db_pool_max_inactive_lifetime: float = 300.0
+
+    # worker processes for cpu bound parsing. see opennem.utils.process_pool
+    parse_process_workers: int = 2
+
+    # nemweb crawl pipeline - downloads, parses and persists run as separate stages with
+    # their own concurrency and bounded queues between them. see opennem.crawlers.nemweb
+    nemweb_crawl_download_concurrency: int = 4
+    nemweb_crawl_parse_concurrency: int = 2
+    nemweb_crawl_persist_concurrency: int = 2
+    nemweb_crawl_queue_size: int = 4
+
+    # files smaller than this are parsed in a thread rather than shipped to the process pool
+    nemweb_crawl_process_parse_min_bytes: int = 1_000_000
+
+    # on disk LRU cache of downloaded nemweb files keyed by url and listing modified date and size
+    # see opennem.core.archive_cache
+    archive_cache_enabled: bool = True
+    archive_cache_dir: str = "~/.cache/opennem/archives"
+    archive_cache_max_bytes: int = 10 * 1024 * 1024 * 1024
+
+    # aggregate backlogs split into chunks within clickhouse partitions run across workers,
+    # checkpointed so a run resumes where it stopped. see opennem.aggregates.backlog
+    aggregate_backlog_workers: int = 4
+    aggregate_backlog_progress_interval: float = 30.0
+
     # timeout on http requests
     # see opennem.utils.http
     http_timeout: int = 20
@@ -186,11 +267,16 @@ class OpennemSettings(BaseSettings):
     # this many intervals later. 0 disables. Day+ periods are spaced far enough apart to
     # never trip this. See opennem.recordreactor.utils.check_milestone_is_new
     milestone_interval_debounce_intervals: int = 10
+    # seconds the milestone state store lives before it is reseeded from the database, which
+    # bounds how long a write that skipped the store can leave a stale running high/low
+    milestone_state_ttl: int = 60 * 60
     run_crawlers: bool = True  # do we enable the crawlers
     redirect_api_static: bool = True  # redirect api endpoints to statics where applicable
     show_emissions_in_power_outputs: bool = True  # show emissions in power outputs
     show_emission_factors_in_power_outputs: bool = True  # show emissions in power outputs
     flows_v4: bool = True  # v4 flow solver — always on, no feature flag needed
+    # market_summary flows use the loop-aware consumption-mix method, set False for the simple method
+    flows_v4_consumption_mix: bool = True
     # clerk API key
     clerk_secret_key: str | None = None
     api_jwks_url: str = "https://clerk.dev/.well-known/jwks.json"
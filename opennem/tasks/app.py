@@ -12,7 +12,7 @@ processed, and updated in a timely manner.
 
 Functions:
     startup(ctx): Initializes the HTTP client for the task scheduler and flushes the Redis queue.
-    shutdown(ctx): Closes the HTTP client for the task scheduler.
+    shutdown(ctx): Closes the database connection pools.
 
 Classes:
     WorkerSettings: Configuration class for the arq worker, including queue name and cron jobs.
@@ -32,6 +32,8 @@ from arq.worker import create_worker
 
 from opennem import ENV, settings
 from opennem.api.maintenance_app import run_maintenance_app
+from opennem.db.clickhouse import close_clickhouse_pools
+from opennem.db.pool import close_asyncpg_pools
 from opennem.tasks.broker import REDIS_SETTINGS, get_redis_pool
 from opennem.tasks.tasks import (
     task_apvi_crawl,
@@ -49,6 +51,7 @@ from opennem.tasks.tasks import (
     task_export_facility_geojson,
     task_export_flows,
     task_facility_first_seen_check,
+    task_log_pool_metrics,
     task_milestone_reconciliation,
     task_nem_interval_check,
     task_nem_per_day_check,
@@ -106,9 +109,22 @@ async def startup(ctx: dict) -> None:
         logger.warning(f"Could not check CH migrations: {e}")
 
 
+async def shutdown(ctx: dict) -> None:
+    """Close the database connection pools when the worker shuts down.
+
+    Args:
+        ctx (dict): The worker context
+    """
+    close_clickhouse_pools()
+    await close_asyncpg_pools()
+
+    logger.info("Closed database pools on shutdown")
+
+
 class WorkerSettings:
     # queue_name = "opennem"
     on_startup = startup
+    on_shutdown = shutdown
     cron_jobs = [
         # NEM Interval Check — fires early, polls AEMO with backoff until data arrives
         cron(
@@ -306,6 +322,14 @@ class WorkerSettings:
             minute=0,
             second=0,
         ),
+        # database pool metrics
+        cron(
+            task_log_pool_metrics,
+            minute=set(range(0, 60, 5)),
+            second=45,
+            timeout=None,
+            unique=True,
+        ),
         # clean tmp dir
         cron(
             task_clean_tmp_dir,
@@ -2,6 +2,7 @@
 
 import asyncio
 import logging
+import time
 from datetime import timedelta
 
 from arq import Retry
@@ -31,6 +32,7 @@ from opennem.crawlers.nemweb import (
 from opennem.crawlers.wemde import AEMOWEMDEDispatch, run_all_wem_crawlers, run_wemde_crawl
 from opennem.db import get_write_session
 from opennem.db.clickhouse.schema import optimize_clickhouse_tables
+from opennem.db.pool import log_pool_metrics
 from opennem.exporter.facilities import export_facilities_static
 
 # from opennem.exporter.historic import export_historic_intervals
@@ -270,6 +272,11 @@ async def task_clean_tmp_dir(ctx) -> None:
     clean_tmp_dir()
 
 
+async def task_log_pool_metrics(ctx) -> None:
+    """Log the worker's database pool metrics (checked out connections, queue depth, wait times)"""
+    log_pool_metrics()
+
+
 async def task_run_market_notice_update(ctx):
     await run_market_notice_update()
 
@@ -384,10 +391,18 @@ async def task_optimize_clickhouse_tables(ctx: dict) -> None:
 
 
 async def task_refresh_clickhouse_mv_fast(ctx: dict) -> None:
-    """2-day backfill every 5 min — keeps current day accurate."""
-    from opennem.db.clickhouse.materialized_views import refresh_all_materialized_views
+    """Refresh the days written to since the last run every 5 min — keeps current day accurate
+    and picks up late revisions however old they are."""
+    from opennem.db.clickhouse.materialized_views import refresh_dirty_materialized_views
+
+    started = time.perf_counter()
+
+    await asyncio.to_thread(refresh_dirty_materialized_views)
 
-    await asyncio.to_thread(refresh_all_materialized_views, days=2, optimize=False)
+    # the refresh has to finish well inside the 5 minute interval it runs on
+    elapsed = time.perf_counter() - started
+    if elapsed > NetworkNEM.interval_size * 60 / 2:
+        logger.warning(f"ClickHouse MV fast refresh took {elapsed:.1f}s, over half of the refresh interval")
 
 
 async def task_refresh_clickhouse_mv_full(ctx: dict) -> None:
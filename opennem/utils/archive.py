@@ -9,14 +9,20 @@ import logging
 import os
 import shutil
 import zipfile
+from collections.abc import Iterator
 from io import BytesIO
 from pathlib import Path
 from tempfile import mkdtemp
 from typing import IO, Any
 from zipfile import ZipFile
 
+import deprecation
+
+from opennem.core.archive_cache import cached_download
+from opennem.core.parsers.dirlisting import DirlistingEntry
 from opennem.utils.http import http_factory
 from opennem.utils.url import get_filename_from_url
+from opennem.utils.version import get_version
 
 logger = logging.getLogger("opennem.archive.utils")
 
@@ -147,31 +153,86 @@ def fix_central_directory_file(zip_file_path: Path) -> Path:
     return zip_file_path
 
 
-async def download_and_unzip(url: str) -> Path:
-    """Download and unzip a multi-zip file into a temporary directory"""
+def open_zip(source: bytes | IO[bytes]) -> ZipFile:
+    """Opens a zip from bytes or a stream, repairing the central directory of bad zip files"""
+    buffer = BytesIO(source) if isinstance(source, bytes) else source
 
-    dest_dir = Path(mkdtemp(prefix="opennem_"))
+    try:
+        return ZipFile(buffer)
+    except zipfile.BadZipFile as e:
+        if not isinstance(buffer, BytesIO):
+            raise
 
-    logger.info(f"Saving to {dest_dir}")
+        logger.error(e)
+        buffer.seek(0)
 
-    filename = get_filename_from_url(url)
+        return ZipFile(fix_central_directory(buffer))
+
+
+def iter_zip_member_streams(
+    source: bytes | IO[bytes] | ZipFile, suffixes: tuple[str, ...] = (".csv",), nested: bool = True
+) -> Iterator[tuple[str, IO[bytes]]]:
+    """
+    Yields (member name, stream) for each member of a zip ending in one of suffixes, descending
+    into nested zips unless nested is False. Streams decompress as they are read and nothing is
+    written to disk. Only one nested zip is held in memory at a time (still compressed) and each
+    stream is closed once the consumer moves on to the next member.
+    """
+    zf = source if isinstance(source, ZipFile) else open_zip(source)
+
+    with zf:
+        for member in zf.namelist():
+            if member.lower().endswith(".zip"):
+                if nested:
+                    yield from iter_zip_member_streams(zf.read(member), suffixes=suffixes)
+            elif member.lower().endswith(suffixes):
+                with zf.open(member) as fh:
+                    yield member, fh
+
+
+async def download_zip(url: str, entry: DirlistingEntry | None = None) -> bytes:
+    """Download a zip archive into memory. Downloads of a directory listing entry go through
+    the archive cache"""
+
+    async def _fetch() -> bytes:
+        http = http_factory(proxy=True)
 
-    http = http_factory(proxy=True)
+        response = await http.get(url)
+
+        if not response.is_success:
+            raise Exception(f"Failed to download file: Status code {response.status_code}")
+
+        content_type = response.headers.get("content-type", None)
+
+        if not content_type or "zip" not in content_type.lower():
+            raise Exception(f"Invalid content type: {content_type}")
+
+        return response.content
 
-    response = await http.get(url)
+    return await cached_download(url, _fetch, entry=entry)
 
-    if not response.is_success:
-        raise Exception(f"Failed to download file: Status code {response.status_code}")
 
-    content_type = response.headers.get("content-type", None)
+@deprecation.deprecated(
+    deprecated_in="4.5",
+    removed_in="4.6",
+    current_version=get_version(dev_tag=False),
+    details="Use download_zip and iter_zip_member_streams to stream members without extracting to disk",
+)
+async def download_and_unzip(url: str, entry: DirlistingEntry | None = None) -> Path:
+    """Download and unzip a multi-zip file into a temporary directory"""
+
+    dest_dir = Path(mkdtemp(prefix="opennem_"))
+
+    logger.info(f"Saving to {dest_dir}")
+
+    filename = get_filename_from_url(url)
 
-    if not content_type or "zip" not in content_type.lower():
-        raise Exception(f"Invalid content type: {content_type}")
+    content = await download_zip(url, entry=entry)
 
     save_path = Path(dest_dir) / filename
 
     with save_path.open("wb+") as fh:
-        fh.write(response.content)
+        fh.write(content)
 
     logger.info(f"Wrote file to {save_path}")
 
@@ -0,0 +1,49 @@
+"""
+Shared process pool for CPU bound work (csv parsing) so it doesn't block the event loop.
+
+The pool is created on first use and shared for the life of the process. Workers are
+spawned rather than forked so they don't inherit the parent's event loop and open sockets.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+from opennem import settings
+
+logger = logging.getLogger("opennem.utils.process_pool")
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool, sized from settings.parse_process_workers"""
+    global _process_pool
+
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.parse_process_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started process pool with {settings.parse_process_workers} workers")
+
+    return _process_pool
+
+
+async def run_in_process[**P, R](func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Run a module level function in the shared process pool and await the result. Arguments
+    and the return value are pickled across the process boundary"""
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(get_process_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the shared process pool"""
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
@@ -36,6 +36,7 @@ from opennem.crawlers.nemweb import (
 )
 from opennem.crawlers.wemde import ALL_WEM_CRAWLERS, run_all_wem_crawlers
 from opennem.db import get_read_session
+from opennem.db.pool import DBWorkload, with_db_workload
 from opennem.schema.network import NetworkNEM, NetworkSchema, NetworkWEM
 from opennem.workers.energy import (
     _process_date_range,
@@ -231,6 +232,7 @@ def _get_limit_for_crawler(crawler: CrawlerDefinition, days: int) -> int:
             return days * 12 * 24
 
 
+@with_db_workload(DBWorkload.backfill)
 async def catchup_last_days(days: int = 1, network: NetworkSchema | None = None, latest: bool = True):
     """Run a gap-aware catchup for the last N days.
 
@@ -329,6 +331,7 @@ async def catchup_last_days(days: int = 1, network: NetworkSchema | None = None,
     )
 
 
+@with_db_workload(DBWorkload.backfill)
 async def catchup_date(target_date: datetime) -> None:
     """Re-crawl, recalculate energy, and re-aggregate for a specific date.
 
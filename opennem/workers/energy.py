@@ -1,72 +1,199 @@
+"""
+OpenNEM Energy Worker
+
+Recomputes trapezoidal interval energy in facility_scada. Energy is calculated at ingest by
+opennem.core.energy_engine from the previous interval, so this only has to fix up rows that
+were ingested without their previous interval (cold cache, gaps, out of order crawls) and
+backlogs.
+
+A date range is split into chunks that are recomputed in parallel. Each chunk is read out with
+COPY, calculated in memory with the same engine used at ingest and only rows whose energy
+changed are copied into a staging table and merged back in a single UPDATE.
+
+We exclude WEM, WEMDE and AEMO_ROOFTOP_BACKFILL since they have their own energy calculations
+"""
+
 import asyncio
+import io
 import logging
 import multiprocessing
+import time
 from datetime import datetime, timedelta
 
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncpg
+import polars as pl
 
 from opennem import settings
-from opennem.db import get_write_session
+from opennem.core.energy_engine import ENERGY_QUALITY_FLAG_TRAPEZOIDAL, calculate_trapezoidal_energy
+from opennem.db.pool import DBWorkload, acquire_connection, with_db_workload
 from opennem.schema.network import NetworkNEM
 from opennem.utils.dates import get_last_completed_interval_for_network
 
 logger = logging.getLogger("opennem.workers.energy")
 
+ENERGY_EXCLUDED_NETWORKS = ["WEM", "WEMDE", "AEMO_ROOFTOP_BACKFILL"]
 
-async def _calculate_energy_for_interval(session: AsyncSession, start_time: datetime, end_time: datetime) -> int:
-    """
-    Calculate energy for a an interval range and update the energy column in the facility_scada table.
+# energy differences below this are numeric(20, 6) rounding and are not written back
+ENERGY_CHANGE_TOLERANCE = 1e-6
 
-    The energy calculation requires both the current and previous interval's generated values
-    to compute the average power over the interval. We explicitly exclude the first interval
-    in each facility's range since we won't have access to its previous value.
+_SCADA_CHUNK_SCHEMA = {
+    "network_id": pl.String,
+    "facility_code": pl.String,
+    "interval": pl.String,
+    "is_forecast": pl.Boolean,
+    "generated": pl.Float64,
+    "energy": pl.Float64,
+    "energy_quality_flag": pl.Int16,
+}
 
-    We also exclude WEM, WEMDE and AEMO_ROOFTOP_BACKFILL since they have their own energy calculations
-    """
+_ENERGY_UPDATE_SCHEMA = {
+    "network_id": pl.String,
+    "facility_code": pl.String,
+    "interval": pl.Datetime("us"),
+    "is_forecast": pl.Boolean,
+    "energy": pl.Float64,
+}
+
+_STAGING_TABLE = "facility_scada_energy_staging"
+
+
+async def _get_network_interval_sizes(conn: asyncpg.Connection) -> dict[str, int]:
+    rows = await conn.fetch("SELECT code, interval_size FROM network WHERE code <> ALL($1::text[])", ENERGY_EXCLUDED_NETWORKS)
 
-    query = text("""
-    WITH
-    network_data AS (
-        SELECT
-            code,
-            interval_size,
-            (60 / interval_size) as intervals_per_hour
-        FROM network
-    ),
-    ranked_scada AS (
-        SELECT
-            network_id,
-            facility_code,
-            interval,
-            generated,
-            LAG(generated, 1) OVER (
-                PARTITION BY network_id, facility_code
-                ORDER BY interval
-            ) AS prev_generated
+    return {row["code"]: row["interval_size"] for row in rows}
+
+
+async def _copy_scada_chunk(conn: asyncpg.Connection, lag_start: datetime, end_time: datetime) -> pl.DataFrame:
+    """COPY facility scada for a chunk out into a frame"""
+    buffer = io.BytesIO()
+
+    await conn.copy_from_query(
+        """
+        SELECT network_id, facility_code, interval, is_forecast, generated, energy, energy_quality_flag
         FROM facility_scada
         WHERE
-            interval BETWEEN :lag_start AND :end_time
-            AND network_id not in ('WEM', 'WEMDE', 'AEMO_ROOFTOP_BACKFILL')
+            interval BETWEEN $1 AND $2
+            AND network_id <> ALL($3::text[])
+        """,
+        lag_start,
+        end_time,
+        ENERGY_EXCLUDED_NETWORKS,
+        output=buffer,
+        format="csv",
+        header=True,
+    )
+
+    buffer.seek(0)
+
+    if not buffer.getbuffer().nbytes:
+        return pl.DataFrame(schema=_SCADA_CHUNK_SCHEMA)
+
+    return pl.read_csv(buffer, schema=_SCADA_CHUNK_SCHEMA, true_values=["t"], false_values=["f"]).with_columns(
+        pl.col("interval").str.to_datetime(time_unit="us")
+    )
+
+
+def calculate_energy_updates(
+    scada: pl.DataFrame, interval_sizes: dict[str, int], start_time: datetime, end_time: datetime
+) -> pl.DataFrame:
+    """
+    Calculate trapezoidal energy for a chunk of facility scada and return the rows between
+    start_time and end_time that need updating - rows not yet flagged as trapezoidal or whose
+    stored energy differs from the calculated energy.
+    """
+    updates = []
+
+    for (network_id,), network_scada in scada.group_by("network_id"):
+        interval_size = interval_sizes.get(network_id)  # type: ignore
+
+        if not interval_size:
+            continue
+
+        calculated = calculate_trapezoidal_energy(
+            network_scada.with_columns(
+                pl.col("energy").alias("stored_energy"),
+                pl.col("energy_quality_flag").alias("stored_energy_quality_flag"),
+                pl.lit(None, dtype=pl.Float64).alias("energy"),
+            ),
+            interval_size=interval_size,
+            partition_keys=["network_id", "facility_code", "is_forecast"],
+        )
+
+        updates.append(
+            calculated.filter(
+                pl.col("interval").is_between(start_time, end_time)
+                & pl.col("energy").is_not_null()
+                & (
+                    (pl.col("stored_energy_quality_flag") < ENERGY_QUALITY_FLAG_TRAPEZOIDAL)
+                    | pl.col("stored_energy").is_null()
+                    | ((pl.col("energy") - pl.col("stored_energy")).abs() > ENERGY_CHANGE_TOLERANCE)
+                )
+            ).select(_ENERGY_UPDATE_SCHEMA.keys())
         )
-    UPDATE facility_scada fs
-    SET
-        energy = (rs.generated + rs.prev_generated) / 2 / nd.intervals_per_hour,
-        energy_quality_flag = 2
-    FROM ranked_scada rs
-    JOIN network_data nd ON nd.code = rs.network_id
-    WHERE fs.network_id = rs.network_id
-      AND fs.facility_code = rs.facility_code
-      AND fs.interval = rs.interval
-      AND fs.interval BETWEEN :start_time AND :end_time
-      AND fs.energy_quality_flag < 2
-      AND rs.prev_generated IS NOT NULL
-    """)
-
-    lag_start = start_time - timedelta(minutes=5)
-    result = await session.execute(query, {"start_time": start_time, "end_time": end_time, "lag_start": lag_start})
-    await session.commit()
-    return result.rowcount  # type: ignore
+
+    if not updates:
+        return pl.DataFrame(schema=_ENERGY_UPDATE_SCHEMA)
+
+    return pl.concat(updates)
+
+
+async def _calculate_energy_for_interval(start_time: datetime, end_time: datetime) -> int:
+    """
+    Recompute energy for an interval range and write changed rows back to facility_scada.
+
+    Each facility's first interval in the range is calculated from the interval before the
+    range, so the range is read from one interval (of the largest network interval size) earlier.
+    Returns the number of rows updated.
+    """
+    async with acquire_connection() as conn:
+        interval_sizes = await _get_network_interval_sizes(conn)
+        lag_start = start_time - timedelta(minutes=max(interval_sizes.values(), default=5))
+
+        scada = await _copy_scada_chunk(conn, lag_start=lag_start, end_time=end_time)
+
+        if scada.is_empty():
+            return 0
+
+        updates = await asyncio.to_thread(calculate_energy_updates, scada, interval_sizes, start_time, end_time)
+
+        if updates.is_empty():
+            return 0
+
+        async with conn.transaction():
+            await conn.execute(
+                f"""
+                CREATE TEMP TABLE {_STAGING_TABLE} (
+                    network_id text,
+                    facility_code text,
+                    interval timestamp,
+                    is_forecast boolean,
+                    energy numeric(20, 6)
+                ) ON COMMIT DROP
+                """
+            )
+
+            await conn.copy_records_to_table(_STAGING_TABLE, records=updates.iter_rows(), columns=updates.columns)
+
+            result = await conn.execute(
+                f"""
+                UPDATE facility_scada fs
+                SET
+                    energy = s.energy,
+                    energy_quality_flag = {ENERGY_QUALITY_FLAG_TRAPEZOIDAL}
+                FROM {_STAGING_TABLE} s
+                WHERE
+                    fs.interval = s.interval
+                    AND fs.network_id = s.network_id
+                    AND fs.facility_code = s.facility_code
+                    AND fs.is_forecast = s.is_forecast
+                    AND fs.interval BETWEEN $1 AND $2
+                """,
+                start_time,
+                end_time,
+            )
+
+    # asyncpg returns the command tag ie. "UPDATE 123"
+    return int(result.split()[-1])
 
 
 async def run_energy_calculation_for_interval(interval: datetime) -> int:
@@ -74,15 +201,14 @@ async def run_energy_calculation_for_interval(interval: datetime) -> int:
     Run energy calculation for a single interval.
     This method is intended to be called by a cron job every 5 minutes.
     """
-    async with get_write_session() as session:
-        start_time = interval - timedelta(minutes=5)
-        end_time = interval + timedelta(minutes=5)
+    start_time = interval - timedelta(minutes=5)
+    end_time = interval + timedelta(minutes=5)
 
-        if settings.dry_run:
-            logger.debug(f"Dry run: Skipping calculation for {start_time} to {end_time}")
-            return 0
+    if settings.dry_run:
+        logger.debug(f"Dry run: Skipping calculation for {start_time} to {end_time}")
+        return 0
 
-        return await _calculate_energy_for_interval(session, start_time, end_time)
+    return await _calculate_energy_for_interval(start_time, end_time)
 
 
 async def process_energy_last_intervals(num_intervals: int = 6) -> None:
@@ -103,8 +229,8 @@ async def process_energy_last_intervals(num_intervals: int = 6) -> None:
 
     logger.info(f"Processing energy calculations from {start_time} to {end_time}")
 
-    async with get_write_session() as session:
-        await _calculate_energy_for_interval(session=session, start_time=start_time, end_time=end_time)
+    rows_updated = await _calculate_energy_for_interval(start_time=start_time, end_time=end_time)
+    logger.info(f"Processed energy from {start_time} to {end_time}. Rows updated: {rows_updated}")
 
 
 async def process_energy_last_days(days: int = 1):
@@ -130,9 +256,10 @@ def _chunk_date_range(start_date: datetime, end_date: datetime, chunk_size: time
 
 async def _process_date_range(
     date_start: datetime, date_end: datetime, chunk_size: timedelta = timedelta(days=7), max_workers: int | None = None
-):
+) -> int:
     """
-    Process a date range in chunks.
+    Process a date range in chunks, up to max_workers chunks at a time. Returns the number of
+    rows updated.
     """
     if max_workers is None:
         max_workers = min(4, multiprocessing.cpu_count())
@@ -141,21 +268,27 @@ async def _process_date_range(
 
     semaphore = asyncio.Semaphore(max_workers)
 
-    async def process_chunk(chunk: tuple[datetime, datetime]):
+    async def process_chunk(chunk: tuple[datetime, datetime]) -> int:
         async with semaphore:
             start, end = chunk
-            async with get_write_session() as session:
-                if settings.dry_run:
-                    logger.debug(f"Dry run: Skipping calculation for {start} to {end}")
-                    return
 
-                rows_updated = await _calculate_energy_for_interval(session, start, end)
-                logger.info(f"Processed chunk {start} to {end}. Rows updated: {rows_updated}")
+            if settings.dry_run:
+                logger.debug(f"Dry run: Skipping calculation for {start} to {end}")
+                return 0
+
+            chunk_start = time.perf_counter()
+            rows_updated = await _calculate_energy_for_interval(start, end)
+            logger.info(
+                f"Processed chunk {start} to {end}. Rows updated: {rows_updated} in {time.perf_counter() - chunk_start:.2f}s"
+            )
+
+            return rows_updated
 
     tasks = [process_chunk(chunk) for chunk in chunks]
-    await asyncio.gather(*tasks)
+    return sum(await asyncio.gather(*tasks))
 
 
+@with_db_workload(DBWorkload.backfill)
 async def run_energy_backlog(date_start: datetime, date_end: datetime) -> None:
     """
     Run energy calculation for all historical data that hasn't been processed yet.
@@ -163,7 +296,13 @@ async def run_energy_backlog(date_start: datetime, date_end: datetime) -> None:
 
     logger.info(f"Processing backlog from {date_start} to {date_end}")
 
-    await _process_date_range(date_start=date_start, date_end=date_end, chunk_size=timedelta(days=10), max_workers=4)
+    backlog_start = time.perf_counter()
+    rows_updated = await _process_date_range(
+        date_start=date_start, date_end=date_end, chunk_size=timedelta(days=10), max_workers=4
+    )
+
+    elapsed = time.perf_counter() - backlog_start
+    logger.info(f"Processed backlog from {date_start} to {date_end}. Rows updated: {rows_updated} in {elapsed:.2f}s")
 
 
 # Example usage
@@ -0,0 +1,166 @@
+"""Tests for the checkpointed, partition aligned aggregate backlog runner."""
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.aggregates import backlog
+from opennem.aggregates.backlog import BacklogChunk, BacklogProgress, partition_chunks, run_backlog
+
+
+def test_partition_chunks_do_not_cross_months() -> None:
+    chunks = partition_chunks(datetime(2024, 1, 20), datetime(2024, 3, 5), chunk_size=timedelta(days=7))
+
+    assert [(c.start.date().isoformat(), c.end.date().isoformat()) for c in chunks] == [
+        ("2024-01-20", "2024-01-27"),
+        ("2024-01-27", "2024-02-01"),
+        ("2024-02-01", "2024-02-08"),
+        ("2024-02-08", "2024-02-15"),
+        ("2024-02-15", "2024-02-22"),
+        ("2024-02-22", "2024-02-29"),
+        ("2024-02-29", "2024-03-01"),
+        ("2024-03-01", "2024-03-05"),
+    ]
+
+
+def test_backlog_progress_eta() -> None:
+    progress = BacklogProgress(job="test", total_chunks=10, skipped_chunks=2, done_chunks=2, rows=1000)
+    progress.started -= 20
+
+    assert progress.remaining_chunks == 6
+    assert progress.eta is not None
+    assert timedelta(seconds=59) <= progress.eta <= timedelta(seconds=61)
+    assert progress.rows_per_second == pytest.approx(50, rel=0.05)
+
+
+class _FakeSession:
+    async def rollback(self) -> None:
+        pass
+
+
+class _FakeClient:
+    def __init__(self) -> None:
+        self.disconnected = False
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+
+
+@pytest.fixture
+def checkpoints(monkeypatch: pytest.MonkeyPatch) -> dict[tuple[str, datetime], tuple[datetime, str, int]]:
+    """Checkpoint table held in a dict of (job, chunk_start) -> (chunk_end, status, records)"""
+    table: dict[tuple[str, datetime], tuple[datetime, str, int]] = {}
+
+    @asynccontextmanager
+    async def _get_write_session() -> AsyncIterator[_FakeSession]:
+        yield _FakeSession()
+
+    async def _get_completed_chunks(session: _FakeSession, job: str) -> dict[datetime, datetime]:
+        return {start: end for (j, start), (end, status, _) in table.items() if j == job and status == "done"}
+
+    async def _set_checkpoint(
+        session: _FakeSession, job: str, chunk: BacklogChunk, status: str, records: int = 0, error: str | None = None
+    ) -> None:
+        table[(job, chunk.start)] = (chunk.end, status, records)
+
+    async def _reset_checkpoints(session: _FakeSession, job: str) -> None:
+        for key in [key for key in table if key[0] == job]:
+            del table[key]
+
+    monkeypatch.setattr(backlog, "get_write_session", _get_write_session)
+    monkeypatch.setattr(backlog, "get_completed_chunks", _get_completed_chunks)
+    monkeypatch.setattr(backlog, "set_checkpoint", _set_checkpoint)
+    monkeypatch.setattr(backlog, "reset_checkpoints", _reset_checkpoints)
+    monkeypatch.setattr(backlog, "new_clickhouse_client", lambda timeout=10, use_numpy=False: _FakeClient())
+
+    return table
+
+
+@pytest.mark.asyncio
+async def test_run_backlog_resumes_from_checkpoints(checkpoints: dict) -> None:
+    processed: list[datetime] = []
+    fail = {datetime(2024, 1, 15)}
+
+    async def _process_chunk(session: _FakeSession, client: _FakeClient, chunk: BacklogChunk) -> AsyncIterator[int]:
+        processed.append(chunk.start)
+        yield 10
+
+        if chunk.start in fail:
+            raise Exception("clickhouse went away")
+
+        yield 5
+
+    start, end = datetime(2024, 1, 1), datetime(2024, 2, 10)
+
+    progress = await run_backlog("test", start, end, timedelta(days=7), _process_chunk, workers=3)
+
+    assert len(processed) == 7
+    assert progress.done_chunks == 6
+    assert progress.failed_chunks == 1
+    assert progress.rows == 6 * 15 + 10
+    assert checkpoints[("test", datetime(2024, 1, 15))] == (datetime(2024, 1, 22), "failed", 10)
+
+    # a second run only retries the failed chunk and the chunk extended by a later end date
+    processed.clear()
+    fail.clear()
+
+    progress = await run_backlog("test", start, end + timedelta(days=1), timedelta(days=7), _process_chunk, workers=3)
+
+    assert sorted(processed) == [datetime(2024, 1, 15), datetime(2024, 2, 8)]
+    assert progress.skipped_chunks == 5
+    assert progress.remaining_chunks == 0
+
+    # restart discards the checkpoints
+    processed.clear()
+
+    await run_backlog("test", start, end, timedelta(days=7), _process_chunk, workers=3, restart=True)
+
+    assert len(processed) == 7
+
+
+@pytest.mark.asyncio
+async def test_run_backlog_continues_past_a_failed_checkpoint(checkpoints: dict, monkeypatch: pytest.MonkeyPatch) -> None:
+    set_checkpoint = backlog.set_checkpoint
+
+    async def _set_checkpoint(session: _FakeSession, job: str, chunk: BacklogChunk, status: str, **kwargs) -> None:
+        # the pool timed out when the chunk started
+        if chunk.start == datetime(2024, 1, 8) and status == "running":
+            raise TimeoutError("QueuePool limit reached")
+
+        await set_checkpoint(session, job, chunk, status, **kwargs)
+
+    async def _process_chunk(session: _FakeSession, client: _FakeClient, chunk: BacklogChunk) -> AsyncIterator[int]:
+        yield 10
+
+    monkeypatch.setattr(backlog, "set_checkpoint", _set_checkpoint)
+
+    progress = await run_backlog(
+        "test", datetime(2024, 1, 1), datetime(2024, 1, 29), timedelta(days=7), _process_chunk, workers=2
+    )
+
+    assert progress.done_chunks == 3
+    assert progress.failed_chunks == 1
+    assert checkpoints[("test", datetime(2024, 1, 8))][1] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_run_backlog_workers_fit_the_database_pool(checkpoints: dict, monkeypatch: pytest.MonkeyPatch) -> None:
+    clients: list[_FakeClient] = []
+
+    def _new_client(timeout: int = 10, use_numpy: bool = False) -> _FakeClient:
+        clients.append(_FakeClient())
+        return clients[-1]
+
+    async def _process_chunk(session: _FakeSession, client: _FakeClient, chunk: BacklogChunk) -> AsyncIterator[int]:
+        yield 10
+
+    monkeypatch.setattr(backlog, "new_clickhouse_client", _new_client)
+    monkeypatch.setattr(backlog, "get_engine_pool_size", lambda workload: (2, 1))
+
+    progress = await run_backlog("test", datetime(2024, 1, 1), datetime(2024, 3, 1), timedelta(days=7), _process_chunk, workers=8)
+
+    assert len(clients) == 3
+    assert all(client.disconnected for client in clients)
+    assert progress.done_chunks == progress.total_chunks
@@ -0,0 +1,139 @@
+"""Tests for landing interconnector flows in ClickHouse and the market_summary flows read from them."""
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from opennem.aggregates import interconnector_intervals, market_summary
+from opennem.aggregates.interconnector_intervals import (
+    _prepare_interconnector_interval_data,
+    run_interconnector_intervals_to_now,
+)
+from opennem.core import interconnector_topology
+from opennem.core.interconnector_topology import NEM_DEFAULT_TOPOLOGY
+
+NOW = datetime(2026, 6, 22, 10, 0)
+
+
+def test_prepare_interconnector_interval_data() -> None:
+    frame = _prepare_interconnector_interval_data(
+        [
+            (datetime(2026, 6, 22, 9, 55), "NEM", "VIC1", "SA1", 264.123456, 22.010288),
+            (datetime(2026, 6, 22, 9, 55), "NEM", "NSW1", "QLD1", None, 0.0),
+        ]
+    )
+
+    assert frame.columns == [
+        "interval",
+        "network_id",
+        "interconnector_region_from",
+        "interconnector_region_to",
+        "generated",
+        "energy",
+        "version",
+    ]
+    assert frame["generated"].to_list() == [264.1235, None]
+    assert frame["energy"].to_list() == [22.0103, 0.0]
+    assert frame["version"].n_unique() == 1
+
+
+@pytest.fixture
+def landed(monkeypatch: pytest.MonkeyPatch) -> dict:
+    """The last landed interval, and the windows runs land"""
+    state: dict = {"last_landed": None, "windows": []}
+
+    async def _last_landed(since: datetime) -> datetime | None:
+        return state["last_landed"] if state["last_landed"] and state["last_landed"] >= since else None
+
+    async def _process(session, start_time: datetime, end_time: datetime) -> int:  # noqa: ANN001
+        state["windows"].append((start_time, end_time))
+        return 1
+
+    @asynccontextmanager
+    async def _session():  # noqa: ANN202
+        yield None
+
+    monkeypatch.setattr(interconnector_intervals, "get_last_completed_interval_for_network", lambda network: NOW)
+    monkeypatch.setattr(interconnector_intervals, "_get_last_landed_interval", _last_landed)
+    monkeypatch.setattr(interconnector_intervals, "process_interconnector_intervals", _process)
+    monkeypatch.setattr(interconnector_intervals, "get_read_session", _session)
+
+    return state
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_relands_the_revision_overlap(landed: dict) -> None:
+    landed["last_landed"] = NOW - timedelta(minutes=5)
+
+    assert await run_interconnector_intervals_to_now() == 1
+    assert landed["windows"] == [(NOW - timedelta(minutes=65), NOW)]
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_lookback_is_bounded(landed: dict) -> None:
+    # landed 20 minutes ago, but the run only reaches back 30 minutes
+    landed["last_landed"] = NOW - timedelta(minutes=20)
+    await run_interconnector_intervals_to_now(max_lookback=timedelta(minutes=30))
+
+    # nothing landed inside the lookback at all
+    landed["last_landed"] = NOW - timedelta(days=3)
+    await run_interconnector_intervals_to_now()
+
+    assert landed["windows"] == [(NOW - timedelta(minutes=30), NOW), (NOW - timedelta(days=1), NOW)]
+
+
+@pytest.fixture
+def topology(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The topology is loaded from postgres once and cached"""
+    monkeypatch.setattr(interconnector_topology, "get_network_topology", lambda network_code: NEM_DEFAULT_TOPOLOGY)
+
+
+@pytest.mark.asyncio
+async def test_flows_are_computed_from_clickhouse_only(monkeypatch: pytest.MonkeyPatch, topology: None) -> None:
+    interval = datetime(2026, 6, 22, 9, 55)
+    queries: list[tuple[str, dict]] = []
+
+    async def _execute(client, query: str, params=None):  # noqa: ANN001, ANN202
+        queries.append((query, params))
+
+        if "interconnector_intervals" in query:
+            return [(interval, "VIC1", "SA1", 22.0), (interval, "NSW1", "QLD1", -55.0)]
+
+        return [(interval, region, 500.0, 250.0, 0.5) for region in ("NSW1", "QLD1", "SA1", "TAS1", "VIC1")]
+
+    monkeypatch.setattr(market_summary, "execute_async", _execute)
+
+    prices = pl.DataFrame({"interval": [interval, interval], "network_region": ["SA1", "NSW1"], "price": [150.0, 120.0]})
+
+    result = await market_summary._compute_flows_for_range(interval - timedelta(minutes=5), interval, region_price_df=prices)
+
+    assert result is not None
+    assert len(queries) == 2
+    assert all(params == {"start_time": interval - timedelta(minutes=5), "end_time": interval} for _, params in queries)
+
+    sa = result.filter(pl.col("network_region") == "SA1")
+    assert sa["energy_imports"][0] == pytest.approx(22.0)
+    assert sa["market_value_imports"][0] == pytest.approx(22.0 * 150.0)
+
+    # no price for VIC1
+    vic = result.filter(pl.col("network_region") == "VIC1")
+    assert vic["market_value_exports"][0] is None
+
+
+@pytest.mark.asyncio
+async def test_flows_without_prices_have_null_market_value(monkeypatch: pytest.MonkeyPatch, topology: None) -> None:
+    interval = datetime(2026, 6, 22, 9, 55)
+
+    async def _execute(client, query: str, params=None):  # noqa: ANN001, ANN202
+        if "interconnector_intervals" in query:
+            return [(interval, "VIC1", "SA1", 22.0)]
+        return [(interval, "VIC1", 500.0, 250.0, 0.5), (interval, "SA1", 100.0, 10.0, 0.1)]
+
+    monkeypatch.setattr(market_summary, "execute_async", _execute)
+
+    result = await market_summary._compute_flows_for_range(interval, interval)
+
+    assert result is not None
+    assert result["market_value_imports"].null_count() == result.height
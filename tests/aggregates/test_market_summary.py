@@ -0,0 +1,87 @@
+"""Tests for the market_summary aggregate runs."""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from opennem.aggregates import market_summary
+from opennem.core import interconnector_topology
+from opennem.core.interconnector_topology import NEM_DEFAULT_TOPOLOGY
+
+NOW = datetime(2026, 6, 22, 10, 0)
+
+
+@pytest.fixture
+def written(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """The steps of a run in the order they happen, with postgres and clickhouse stubbed out"""
+    steps: list[str] = []
+
+    async def _noop(*args, **kwargs) -> None:  # noqa: ANN002, ANN003
+        return None
+
+    async def _records(session, start, end) -> list:  # noqa: ANN001
+        return [("row",)]
+
+    async def _prepare(records: list) -> pl.DataFrame:
+        return pl.DataFrame({"interval": [NOW], "network_id": ["NEM"]})
+
+    async def _insert(table: str, frame: pl.DataFrame) -> None:
+        steps.append(f"insert:{table}")
+
+    async def _publish(table: str) -> dict:
+        steps.append(f"publish:{table}")
+        return {}
+
+    @asynccontextmanager
+    async def _session():  # noqa: ANN202
+        yield None
+
+    monkeypatch.setattr(market_summary, "get_last_completed_interval_for_network", lambda network: NOW)
+    monkeypatch.setattr(market_summary, "run_interconnector_intervals_to_now", _noop)
+    monkeypatch.setattr(market_summary, "process_interconnector_intervals", _noop)
+    monkeypatch.setattr(market_summary, "get_write_session", _session)
+    monkeypatch.setattr(market_summary, "_get_market_summary_data", _records)
+    monkeypatch.setattr(market_summary, "_prepare_market_summary_data", _prepare)
+    monkeypatch.setattr(market_summary, "_ensure_clickhouse_schema", lambda: None)
+    monkeypatch.setattr(market_summary, "insert_frame_async", _insert)
+    monkeypatch.setattr(market_summary, "record_dirty_days_async", _noop)
+    monkeypatch.setattr(market_summary, "publish_data_version", _publish)
+
+    return steps
+
+
+@pytest.mark.asyncio
+async def test_scheduled_run_publishes_data_version(written: list[str]) -> None:
+    # the nem interval check task runs this every interval
+    await market_summary.run_market_summary_aggregate_for_last_intervals(num_intervals=12)
+
+    assert written == ["insert:market_summary", "publish:market_summary"]
+
+
+@pytest.mark.asyncio
+async def test_backlog_publishes_data_version_once(written: list[str]) -> None:
+    await market_summary.process_market_summary_backlog(None, datetime(2026, 6, 1), datetime(2026, 6, 15))
+
+    assert written == ["insert:market_summary", "insert:market_summary", "publish:market_summary"]
+
+
+@pytest.mark.asyncio
+async def test_flows_read_the_latest_versions_without_final(monkeypatch: pytest.MonkeyPatch) -> None:
+    queries: list[str] = []
+
+    async def _execute(client, query: str, params=None):  # noqa: ANN001, ANN202
+        queries.append(query)
+        return []
+
+    monkeypatch.setattr(interconnector_topology, "get_network_topology", lambda network_code: NEM_DEFAULT_TOPOLOGY)
+    monkeypatch.setattr(market_summary, "execute_async", _execute)
+
+    assert await market_summary._compute_flows_for_range(NOW, NOW) is None
+
+    assert len(queries) == 2
+    assert all("FINAL" not in query for query in queries)
+    assert all("argMax(tuple(energy), version)" in query for query in queries)
+    # fueltech is filtered on after the dedup, so a superseded version of a unit can't match
+    assert "WHERE unit_fueltech_id NOT IN ('battery_charging')" in queries[1]
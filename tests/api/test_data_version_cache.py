@@ -0,0 +1,105 @@
+"""The v4 data/market response cache is keyed on the data version the aggregates publish,
+so live responses are replaced when new intervals land and settled ones stay cached.
+"""
+
+from datetime import datetime
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+import opennem.api.cache as api_cache
+from opennem.api.cache import data_version_cache
+from opennem.api.queries import QueryType
+
+
+@pytest.fixture
+def settled(monkeypatch) -> dict[str, datetime | None]:
+    """The published data version, changed by tests as new intervals 'land'"""
+    state: dict[str, datetime | None] = {"latest": datetime(2026, 6, 22, 9, 45)}
+
+    async def _settled(client, network, query_type):  # noqa: ANN001, ANN202
+        return state["latest"]
+
+    monkeypatch.setattr(api_cache, "get_settled_interval", _settled)
+    return state
+
+
+@pytest.fixture
+def api(request) -> tuple[TestClient, list[Any]]:
+    # the in memory backend's store is shared, so keep each test's keys apart
+    FastAPICache.init(InMemoryBackend(), prefix=request.node.name)
+    calls: list[Any] = []
+    app = FastAPI()
+
+    @app.get("/network/{network_code}")
+    @data_version_cache(QueryType.DATA)
+    async def _endpoint(network_code: str, date_end: datetime | None = None) -> dict:
+        calls.append(date_end)
+        return {"n": len(calls)}
+
+    yield TestClient(app), calls
+    FastAPICache.reset()
+
+
+def test_live_response_is_replaced_when_new_data_lands(api, settled) -> None:
+    client, calls = api
+
+    first = client.get("/network/NEM")
+    assert client.get("/network/NEM").json() == first.json()
+    assert len(calls) == 1
+    # clients are only told to hold it briefly
+    assert first.headers["cache-control"] == "max-age=300"
+
+    settled["latest"] = datetime(2026, 6, 22, 9, 50)
+
+    assert client.get("/network/NEM").json() == {"n": 2}
+
+
+def test_settled_response_survives_new_data(api, settled) -> None:
+    client, calls = api
+
+    client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00"})
+    settled["latest"] = datetime(2026, 6, 22, 9, 50)
+    client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00"})
+
+    assert len(calls) == 1
+
+    # a range running past the settled data is keyed on the version
+    client.get("/network/NEM", params={"date_end": "2026-06-22T10:00:00"})
+    settled["latest"] = datetime(2026, 6, 22, 9, 55)
+    client.get("/network/NEM", params={"date_end": "2026-06-22T10:00:00"})
+
+    assert len(calls) == 3
+
+
+def test_networks_are_cached_separately(api, settled) -> None:
+    client, calls = api
+
+    client.get("/network/NEM")
+    client.get("/network/WEM")
+
+    assert len(calls) == 2
+
+
+def test_tz_aware_date_end_is_keyed_in_network_time(api, settled) -> None:
+    client, calls = api
+
+    # 09:00 network time, within the settled data
+    response = client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00+10:00"})
+    assert response.status_code == 200
+
+    settled["latest"] = datetime(2026, 6, 22, 9, 50)
+    client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00+10:00"})
+
+    assert len(calls) == 1
+
+    # 09:00 UTC is 19:00 network time, past the settled data
+    client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00+00:00"})
+    settled["latest"] = datetime(2026, 6, 22, 9, 55)
+    client.get("/network/NEM", params={"date_end": "2026-06-22T09:00:00+00:00"})
+
+    assert len(calls) == 3
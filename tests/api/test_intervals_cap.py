@@ -16,6 +16,16 @@ from opennem.api.queries import QueryType
 from opennem.schema.network import NetworkNEM
 
 
+@pytest.fixture(autouse=True)
+def _no_data_version(monkeypatch):
+    """No data version published, so the latest interval is read from ClickHouse"""
+
+    async def _unpublished(table, network_codes):  # noqa: ANN001, ANN202
+        return None
+
+    monkeypatch.setattr(intervals, "get_data_version", _unpublished)
+
+
 @pytest.fixture(autouse=True)
 def _clear_cache():
     intervals._latest_interval_cache.clear()
@@ -94,7 +104,34 @@ async def test_caps_unconditionally_even_on_bleeding_edge_window(monkeypatch):
 
 
 @pytest.mark.asyncio
-async def test_result_is_cached_within_ttl(monkeypatch):
+async def test_published_data_version_spares_clickhouse(monkeypatch):
+    latest = datetime(2026, 6, 22, 9, 45)
+    calls = {"n": 0}
+
+    async def _published(table, network_codes):  # noqa: ANN001, ANN202
+        assert table == "unit_intervals"
+        assert "NEM" in network_codes
+        return latest
+
+    async def _counting(client, query, params):  # noqa: ANN001, ANN202
+        calls["n"] += 1
+        return [[None]]
+
+    monkeypatch.setattr(intervals, "get_data_version", _published)
+    monkeypatch.setattr(intervals, "execute_async", _counting)
+
+    capped = await cap_date_end_to_settled_interval(
+        client=object(),
+        network=NetworkNEM,
+        query_type=QueryType.DATA,
+        date_end=datetime(2026, 6, 22, 9, 55),
+    )
+    assert capped == latest
+    assert calls["n"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unpublished_latest_interval_is_held_briefly(monkeypatch):
     latest = datetime(2026, 6, 22, 9, 45)
     calls = {"n": 0}
 
@@ -103,13 +140,8 @@ async def test_result_is_cached_within_ttl(monkeypatch):
         return [[latest]]
 
     monkeypatch.setattr(intervals, "execute_async", _counting)
-    kwargs = {
-        "client": object(),
-        "network": NetworkNEM,
-        "query_type": QueryType.DATA,
-        "date_end": datetime(2026, 6, 22, 9, 55),
-    }
-
-    await cap_date_end_to_settled_interval(**kwargs)
-    await cap_date_end_to_settled_interval(**kwargs)
-    assert calls["n"] == 1  # second call served from the TTL cache
+
+    for _ in range(3):
+        assert await intervals.get_settled_interval(object(), NetworkNEM, QueryType.DATA) == latest
+
+    assert calls["n"] == 1
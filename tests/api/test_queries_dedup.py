@@ -0,0 +1,75 @@
+"""Serving queries dedup ReplacingMergeTree versions with argMax rather than reading FINAL."""
+
+from datetime import datetime
+
+from opennem.api.data.schema import DataMetric
+from opennem.api.queries import QueryType, get_timeseries_query
+from opennem.core.grouping import PrimaryGrouping, SecondaryGrouping
+from opennem.core.metric import Metric
+from opennem.core.time_interval import Interval
+from opennem.schema.network import NetworkNEM
+
+
+def _query(query_type: QueryType, metrics: list, **kwargs) -> str:
+    sql, _, _ = get_timeseries_query(
+        query_type=query_type,
+        network=NetworkNEM,
+        metrics=metrics,
+        interval=Interval.DAY,
+        date_start=datetime(2025, 1, 1),
+        date_end=datetime(2025, 2, 1),
+        **kwargs,
+    )
+    return sql
+
+
+def test_data_query_dedups_by_version_without_final() -> None:
+    sql = _query(QueryType.DATA, [DataMetric.POWER, DataMetric.ENERGY], use_final=False)
+
+    assert "FINAL" not in sql
+    assert "GROUP BY interval, network_id, network_region, facility_code, unit_code" in sql
+    assert "argMax(tuple(generated), version).1 AS generated" in sql
+    assert "argMax(tuple(energy), version).1 AS energy" in sql
+    # only the columns the metrics read are deduped
+    assert "emissions" not in sql
+    assert "FROM deduped" in sql
+
+
+def test_market_query_dedups_by_version_without_final() -> None:
+    sql = _query(QueryType.MARKET, [Metric.PRICE, Metric.RENEWABLE_PROPORTION], use_final=False)
+
+    assert "FINAL" not in sql
+    assert "GROUP BY interval, network_id, network_region\n" in sql
+    assert "argMax(tuple(price), version).1 AS price" in sql
+    assert "argMax(tuple(generation_renewable), version).1 AS generation_renewable" in sql
+    assert "argMax(tuple(demand_gross), version).1 AS demand_gross" in sql
+    assert "generation_renewable_with_storage" not in sql
+
+
+def test_value_filters_apply_after_dedup() -> None:
+    """A filter on fueltech must match the latest version of a row, not a superseded one"""
+    sql = _query(
+        QueryType.DATA,
+        [DataMetric.ENERGY],
+        primary_grouping=PrimaryGrouping.NETWORK_REGION,
+        secondary_groupings=[SecondaryGrouping.FUELTECH_GROUP],
+        network_region="NSW1",
+        fueltech=["coal_black"],
+        use_final=False,
+    )
+
+    deduped, inner_agg = sql.split("inner_agg AS (")
+
+    assert "network_region = %(network_region)s" in deduped
+    assert "fueltech_id in %(fueltech)s" not in deduped
+    assert "argMax(tuple(fueltech_id), version).1 AS fueltech_id" in deduped
+    assert "argMax(tuple(fueltech_group_id), version).1 AS fueltech_group_id" in deduped
+    assert "WHERE fueltech_id in %(fueltech)s" in inner_agg
+
+
+def test_use_final_reads_final() -> None:
+    sql = _query(QueryType.DATA, [DataMetric.ENERGY], fueltech=["coal_black"], use_final=True)
+
+    assert "FROM unit_intervals FINAL" in sql
+    assert "argMax" not in sql
+    assert "fueltech_id in %(fueltech)s" in sql
@@ -0,0 +1,133 @@
+"""Tests for single-flight coalescing of API time series queries."""
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from opennem import settings
+from opennem.api import singleflight
+
+
+class _FakeRedis:
+    """The handful of commands the single flight layer uses, held in a dict"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    async def set(self, key: str, value: str | bytes, nx: bool = False, px: int | None = None) -> bool | None:
+        if nx and key in self.data:
+            return None
+
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.data)
+
+    async def delete(self, key: str) -> int:
+        return int(self.data.pop(key, None) is not None)
+
+
+@pytest.fixture
+def executions(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Queries run on ClickHouse, each taking a little while and returning one row"""
+    calls: list[str] = []
+
+    async def _execute(query: str, params: dict | None) -> list:
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return [(datetime(2025, 1, 1, 0, 5), date(2025, 1, 1), "NEM", 1.5, None)]
+
+    monkeypatch.setattr(singleflight, "_execute", _execute)
+    monkeypatch.setattr(singleflight, "_redis_retry_at", 0.0)
+    return calls
+
+
+def test_query_key_ignores_whitespace_and_param_order() -> None:
+    a = singleflight.query_key("SELECT a\n  FROM t WHERE x = %(x)s", {"x": 1, "y": (1, 2)})
+    b = singleflight.query_key("SELECT a FROM t   WHERE x = %(x)s", {"y": (1, 2), "x": 1})
+
+    assert a == b
+    assert a != singleflight.query_key("SELECT a FROM t WHERE x = %(x)s", {"x": 2, "y": (1, 2)})
+
+
+def test_rows_round_trip() -> None:
+    rows = [(datetime(2025, 1, 1, 0, 5), date(2025, 1, 1), "NEM", 1.5, None, 3)]
+
+    assert singleflight.decode_rows(singleflight.encode_rows(rows)) == rows
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_queries_run_once(monkeypatch: pytest.MonkeyPatch, executions: list[str]) -> None:
+    monkeypatch.setattr(settings, "api_single_flight_redis", False)
+
+    results = await asyncio.gather(*(singleflight.execute_single_flight(None, "SELECT 1", {"n": 1}) for _ in range(5)))
+    other = await singleflight.execute_single_flight(None, "SELECT 2", {"n": 1})
+
+    assert executions == ["SELECT 1", "SELECT 2"]
+    assert all(result == results[0] for result in results)
+    assert other == results[0]
+    assert singleflight._in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_followers_read_the_leaders_rows_from_redis(monkeypatch: pytest.MonkeyPatch, executions: list[str]) -> None:
+    redis = _FakeRedis()
+    monkeypatch.setattr(singleflight, "_get_redis", lambda: redis)
+
+    key = singleflight.query_key("SELECT 1", None)
+    lock_key = f"{singleflight._KEY_PREFIX}lock:{key}"
+
+    # another worker holds the lock and publishes its rows a little later
+    await redis.set(lock_key, "other")
+
+    async def _other_worker() -> None:
+        await asyncio.sleep(0.1)
+        await redis.set(f"{singleflight._KEY_PREFIX}result:{key}", singleflight.encode_rows([(1, "a")]))
+        await redis.delete(lock_key)
+
+    publish = asyncio.create_task(_other_worker())
+    result = await singleflight.execute_single_flight(None, "SELECT 1")
+    await publish
+
+    assert result == [(1, "a")]
+    assert executions == []
+
+
+@pytest.mark.asyncio
+async def test_followers_run_the_query_if_the_leader_fails(monkeypatch: pytest.MonkeyPatch, executions: list[str]) -> None:
+    redis = _FakeRedis()
+    monkeypatch.setattr(singleflight, "_get_redis", lambda: redis)
+
+    lock_key = f"{singleflight._KEY_PREFIX}lock:{singleflight.query_key('SELECT 1', None)}"
+    await redis.set(lock_key, "other")
+
+    async def _other_worker_fails() -> None:
+        await asyncio.sleep(0.1)
+        await redis.delete(lock_key)
+
+    release = asyncio.create_task(_other_worker_fails())
+    result = await singleflight.execute_single_flight(None, "SELECT 1")
+    await release
+
+    assert executions == ["SELECT 1"]
+    assert result[0][2] == "NEM"
+    # this worker took no lock of its own so has nothing to release
+    assert lock_key not in redis.data
+
+
+@pytest.mark.asyncio
+async def test_leader_publishes_rows_and_releases_lock(monkeypatch: pytest.MonkeyPatch, executions: list[str]) -> None:
+    redis = _FakeRedis()
+    monkeypatch.setattr(singleflight, "_get_redis", lambda: redis)
+
+    rows = await singleflight.execute_single_flight(None, "SELECT 1")
+    key = singleflight.query_key("SELECT 1", None)
+
+    assert executions == ["SELECT 1"]
+    assert singleflight.decode_rows(redis.data[f"{singleflight._KEY_PREFIX}result:{key}"]) == rows
+    assert f"{singleflight._KEY_PREFIX}lock:{key}" not in redis.data
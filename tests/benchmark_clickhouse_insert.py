@@ -0,0 +1,186 @@
+"""
+Benchmark writing a backlog chunk of unit_intervals into ClickHouse native protocol blocks.
+
+Compares the previous path (frame -> python tuple per row -> RowOrientedBlock) against the
+columnar insert used by insert_frame (frame -> numpy array per column -> ColumnOrientedBlock).
+Blocks are serialised exactly as clickhouse_driver sends them, into memory rather than a
+server. Reports rows/second and the peak memory allocated per chunk.
+
+    uv run pytest tests/benchmark_clickhouse_insert.py --benchmark-only
+"""
+
+import io
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from clickhouse_driver import defines
+from clickhouse_driver.block import ColumnOrientedBlock, RowOrientedBlock
+from clickhouse_driver.bufferedreader import BufferedSocketReader
+from clickhouse_driver.bufferedwriter import BufferedSocketWriter
+from clickhouse_driver.connection import ServerInfo
+from clickhouse_driver.context import Context
+from clickhouse_driver.numpy.helpers import column_chunks
+from clickhouse_driver.streams.native import BlockInputStream, BlockOutputStream
+from clickhouse_driver.util.helpers import chunks
+
+from opennem.aggregates.unit_intervals import _prepare_unit_interval_data
+from opennem.db.clickhouse.client import _frame_column_to_numpy
+
+# the batch size the unit_intervals backlog streams per insert
+CHUNK_ROWS = 200_000
+
+UNIT_INTERVALS_COLUMNS = [
+    ("interval", "DateTime64(3)"),
+    ("network_id", "String"),
+    ("network_region", "String"),
+    ("facility_code", "String"),
+    ("unit_code", "String"),
+    ("status_id", "String"),
+    ("fueltech_id", "String"),
+    ("fueltech_group_id", "String"),
+    ("renewable", "Bool"),
+    ("generated", "Nullable(Float64)"),
+    ("energy", "Nullable(Float64)"),
+    ("energy_storage", "Nullable(Float64)"),
+    ("emissions", "Nullable(Float64)"),
+    ("emission_factor", "Nullable(Float64)"),
+    ("market_value", "Nullable(Float64)"),
+    ("version", "UInt64"),
+]
+
+
+def generate_unit_interval_records(num_rows: int = CHUNK_ROWS, seed: int = 1) -> list[tuple]:
+    """Rows as _get_unit_interval_data reads them from Postgres, with some null energy columns"""
+    rng = np.random.default_rng(seed)
+    num_units = 500
+    start = datetime(2024, 1, 1)
+    generated = rng.uniform(-100, 500, num_rows).round(4)
+    energy_storage = np.where(generated < 0, generated / 12, np.nan)
+
+    return [
+        (
+            start + timedelta(minutes=5 * (i // num_units)),
+            "NEM",
+            f"REGION{i % 5}",
+            f"FAC{i % num_units // 2}",
+            f"DUID{i % num_units}",
+            "operating",
+            "coal_black",
+            "coal",
+            False,
+            float(generated[i]),
+            float(generated[i]) / 12,
+            None if np.isnan(energy_storage[i]) else float(energy_storage[i]),
+            float(generated[i]) * 0.9,
+            0.9,
+            float(generated[i]) * 80,
+        )
+        for i in range(num_rows)
+    ]
+
+
+def _context(use_numpy: bool) -> Context:
+    context = Context()
+    context.server_info = ServerInfo(
+        "ClickHouse", 24, 8, 1, defines.CLIENT_REVISION, "UTC", "clickhouse", defines.CLIENT_REVISION
+    )
+    context.settings = {}
+    context.client_settings = {
+        "use_numpy": use_numpy,
+        "insert_block_size": defines.DEFAULT_INSERT_BLOCK_SIZE,
+        "strings_as_bytes": False,
+        "strings_encoding": defines.STRINGS_ENCODING,
+    }
+    return context
+
+
+class _MemorySocket:
+    """Collects what the driver's socket writer would send to the server, and plays it back"""
+
+    def __init__(self, data: bytes = b"") -> None:
+        self.buffer = io.BytesIO(data)
+
+    def sendall(self, data: bytes) -> None:
+        self.buffer.write(data)
+
+    def recv_into(self, buffer: memoryview, nbytes: int = 0) -> int:
+        return self.buffer.readinto(memoryview(buffer)[: nbytes or len(buffer)])
+
+
+def _write_blocks(context: Context, block_cls: type, slicer: Callable, data: list) -> bytes:
+    """Serialise data the way Client.send_data does for an INSERT"""
+    sock = _MemorySocket()
+    stream = BlockOutputStream(BufferedSocketWriter(sock, 1048576), context)
+
+    for chunk in slicer(data, context.client_settings["insert_block_size"]):
+        stream.write(block_cls(UNIT_INTERVALS_COLUMNS, chunk))
+
+    return sock.buffer.getvalue()
+
+
+ROW_CONTEXT = _context(use_numpy=False)
+NUMPY_CONTEXT = _context(use_numpy=True)
+
+
+def insert_rows(records: list[tuple]) -> bytes:
+    """The previous insert: prepared frame materialised as python tuples"""
+    rows = _prepare_unit_interval_data(records).rows()
+    return _write_blocks(ROW_CONTEXT, RowOrientedBlock, chunks, rows)
+
+
+def insert_columnar(records: list[tuple]) -> bytes:
+    """insert_frame: prepared frame handed over as a numpy array per column"""
+    frame = _prepare_unit_interval_data(records)
+    return _write_blocks(
+        NUMPY_CONTEXT, ColumnOrientedBlock, column_chunks, [_frame_column_to_numpy(s) for s in frame.get_columns()]
+    )
+
+
+def _peak_memory(insert: Callable[[list[tuple]], bytes], records: list[tuple]) -> int:
+    tracemalloc.start()
+    try:
+        insert(records)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+test_records = generate_unit_interval_records()
+
+
+def _read_blocks(data: bytes, num_rows: int) -> list[tuple]:
+    """Decode serialised blocks the way the server would see them"""
+    stream = BlockInputStream(BufferedSocketReader(_MemorySocket(data), 1048576), ROW_CONTEXT)
+    rows: list[tuple] = []
+
+    while len(rows) < num_rows:
+        rows.extend(stream.read().get_rows())
+
+    return rows
+
+
+def test_columnar_insert_writes_same_rows() -> None:
+    """Null floats are written with a different placeholder behind the null map, so compare decoded rows"""
+    records = test_records[:5000]
+
+    rows = _read_blocks(insert_rows(records), len(records))
+
+    assert len(rows) == len(records)
+    assert _read_blocks(insert_columnar(records), len(records)) == rows
+
+
+@pytest.mark.benchmark(group="clickhouse_insert", min_rounds=3)
+def test_benchmark_insert_rows(benchmark) -> None:
+    benchmark(insert_rows, test_records)
+    benchmark.extra_info["rows_per_second"] = len(test_records) / benchmark.stats.stats.mean
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(insert_rows, test_records) / 1024**2
+
+
+@pytest.mark.benchmark(group="clickhouse_insert", min_rounds=3)
+def test_benchmark_insert_columnar(benchmark) -> None:
+    benchmark(insert_columnar, test_records)
+    benchmark.extra_info["rows_per_second"] = len(test_records) / benchmark.stats.stats.mean
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(insert_columnar, test_records) / 1024**2
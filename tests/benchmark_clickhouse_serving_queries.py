@@ -0,0 +1,109 @@
+"""
+Benchmark the /v4/data/network and /v4/market/network time series queries against ClickHouse,
+reading the base tables with FINAL against the argMax(col, version) dedup get_timeseries_query
+builds with use_final=False.
+
+Runs against the ClickHouse at settings.clickhouse_url over the last week of data it holds and
+is skipped if it can't be reached. Reports the latency of each.
+
+    uv run pytest tests/benchmark_clickhouse_serving_queries.py --benchmark-only
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.api.data.schema import DataMetric
+from opennem.api.queries import QueryType, get_timeseries_query
+from opennem.core.grouping import PrimaryGrouping, SecondaryGrouping
+from opennem.core.metric import Metric
+from opennem.core.time_interval import Interval
+from opennem.db.clickhouse import get_clickhouse_client
+from opennem.schema.network import NetworkNEM
+
+QUERY_WINDOW = timedelta(days=7)
+
+
+@pytest.fixture(scope="module")
+def clickhouse():
+    try:
+        client = get_clickhouse_client()
+        client.execute("SELECT 1")
+    except Exception as e:
+        pytest.skip(f"ClickHouse not available: {e}")
+
+    return client
+
+
+@pytest.fixture(scope="module")
+def date_end(clickhouse) -> datetime:
+    result = clickhouse.execute(
+        "SELECT max(interval) FROM unit_intervals WHERE network_id = 'NEM' AND interval > now() - INTERVAL 30 DAY"
+    )
+
+    if not result or result[0][0] is None or result[0][0].year < 2000:
+        pytest.skip("No recent NEM unit_intervals to query")
+
+    return result[0][0]
+
+
+def _data_network_query(date_end: datetime, use_final: bool) -> tuple[str, dict, list[str]]:
+    """/v4/data/network/NEM?metrics=power,energy&primary_grouping=network_region&secondary_grouping=fueltech_group"""
+    return get_timeseries_query(
+        query_type=QueryType.DATA,
+        network=NetworkNEM,
+        metrics=[DataMetric.POWER, DataMetric.ENERGY],
+        interval=Interval.INTERVAL,
+        date_start=date_end - QUERY_WINDOW,
+        date_end=date_end,
+        primary_grouping=PrimaryGrouping.NETWORK_REGION,
+        secondary_groupings=[SecondaryGrouping.FUELTECH_GROUP],
+        use_final=use_final,
+    )
+
+
+def _market_network_query(date_end: datetime, use_final: bool) -> tuple[str, dict, list[str]]:
+    """/v4/market/network/NEM?metrics=price,demand,renewable_proportion&primary_grouping=network_region"""
+    return get_timeseries_query(
+        query_type=QueryType.MARKET,
+        network=NetworkNEM,
+        metrics=[Metric.PRICE, Metric.DEMAND, Metric.RENEWABLE_PROPORTION],
+        interval=Interval.INTERVAL,
+        date_start=date_end - QUERY_WINDOW,
+        date_end=date_end,
+        primary_grouping=PrimaryGrouping.NETWORK_REGION,
+        use_final=use_final,
+    )
+
+
+def _run(client, query: tuple[str, dict, list[str]]) -> list[tuple]:
+    sql, params, _ = query
+    return client.execute(sql, params)
+
+
+@pytest.mark.parametrize("build_query", [_data_network_query, _market_network_query])
+def test_dedup_matches_final(clickhouse, date_end, build_query) -> None:
+    final_rows = _run(clickhouse, build_query(date_end, use_final=True))
+    dedup_rows = _run(clickhouse, build_query(date_end, use_final=False))
+
+    assert final_rows
+    assert len(dedup_rows) == len(final_rows)
+
+    # floats can be summed in a different order and round() differently in the last place
+    for dedup_row, final_row in zip(dedup_rows, final_rows, strict=True):
+        assert [v for v in dedup_row if not isinstance(v, float)] == [v for v in final_row if not isinstance(v, float)]
+        assert [v for v in dedup_row if isinstance(v, float)] == pytest.approx(
+            [v for v in final_row if isinstance(v, float)], rel=1e-9, abs=1e-5
+        )
+
+
+@pytest.mark.benchmark(group="serving_data_network", min_rounds=5)
+@pytest.mark.parametrize("use_final", [True, False], ids=["final", "argmax"])
+def test_benchmark_data_network(benchmark, clickhouse, date_end, use_final: bool) -> None:
+    benchmark(_run, clickhouse, _data_network_query(date_end, use_final))
+
+
+@pytest.mark.benchmark(group="serving_market_network", min_rounds=5)
+@pytest.mark.parametrize("use_final", [True, False], ids=["final", "argmax"])
+def test_benchmark_market_network(benchmark, clickhouse, date_end, use_final: bool) -> None:
+    benchmark(_run, clickhouse, _market_network_query(date_end, use_final))
@@ -0,0 +1,110 @@
+"""
+Benchmark the trapezoidal energy engine over a synthetic month of NEM facility scada (every 5
+minute interval for a few hundred facilities).
+
+Compares the chunk recompute used for backlogs against a row-wise reference of the previous
+LAG() based UPDATE, and times the incremental ingest path one interval at a time against the
+previous interval cache. Reports rows/second for each.
+
+    uv run pytest tests/benchmark_energy_engine.py --benchmark-only
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opennem.core.energy_engine import calculate_interval_energy, get_previous_interval_cache
+from opennem.core.networks import NetworkNEM
+from opennem.workers.energy import calculate_energy_updates
+
+NUM_FACILITIES = 400
+MONTH_START = datetime(2024, 1, 1)
+MONTH_END = datetime(2024, 1, 31)
+
+
+def generate_nem_month_scada(num_facilities: int = NUM_FACILITIES, seed: int = 1) -> pl.DataFrame:
+    """A month of facility_scada as read out by the energy recompute with point estimate energies"""
+    rng = np.random.default_rng(seed)
+    intervals = pl.datetime_range(MONTH_START, MONTH_END, interval="5m", eager=True)
+    num_rows = len(intervals) * num_facilities
+    generated = rng.uniform(-100, 300, num_rows)
+
+    return pl.DataFrame(
+        {
+            "network_id": "NEM",
+            "facility_code": np.tile([f"DUID{i}" for i in range(num_facilities)], len(intervals)),
+            "interval": intervals.gather(np.repeat(np.arange(len(intervals)), num_facilities)),
+            "is_forecast": False,
+            "generated": generated,
+            "energy": generated / 12,
+            "energy_quality_flag": pl.Series([0] * num_rows, dtype=pl.Int16),
+        }
+    )
+
+
+def calculate_energy_rowwise(scada: pl.DataFrame) -> dict[tuple[str, str, datetime], float]:
+    """Row-wise equivalent of the previous LAG() UPDATE"""
+    previous: dict[tuple[str, str], float] = {}
+    energy = {}
+
+    for network_id, facility_code, interval, generated in (
+        scada.sort("interval").select("network_id", "facility_code", "interval", "generated").iter_rows()
+    ):
+        key = (network_id, facility_code)
+
+        if key in previous:
+            energy[(network_id, facility_code, interval)] = (generated + previous[key]) / 2 / 12
+
+        previous[key] = generated
+
+    return energy
+
+
+test_nem_month_scada = generate_nem_month_scada()
+
+
+def test_energy_engine_matches_rowwise() -> None:
+    scada = test_nem_month_scada.filter(pl.col("interval") < MONTH_START + timedelta(days=1))
+    rowwise = calculate_energy_rowwise(scada)
+    updates = calculate_energy_updates(scada, {"NEM": 5}, MONTH_START, MONTH_END)
+
+    assert len(updates) == len(rowwise)
+
+    for network_id, facility_code, interval, _, energy in updates.iter_rows():
+        assert energy == pytest.approx(rowwise[(network_id, facility_code, interval)])
+
+
+@pytest.mark.benchmark(group="energy_engine", min_rounds=3)
+def test_benchmark_energy_rowwise(benchmark) -> None:
+    energy = benchmark(calculate_energy_rowwise, test_nem_month_scada)
+    benchmark.extra_info["rows_per_second"] = len(energy) / benchmark.stats.stats.mean
+
+
+@pytest.mark.benchmark(group="energy_engine", min_rounds=3)
+def test_benchmark_energy_recompute(benchmark) -> None:
+    updates = benchmark(calculate_energy_updates, test_nem_month_scada, {"NEM": 5}, MONTH_START, MONTH_END)
+    benchmark.extra_info["rows_per_second"] = len(updates) / benchmark.stats.stats.mean
+
+
+def _ingest_intervals(frames: list[pl.DataFrame]) -> int:
+    cache = get_previous_interval_cache()
+    cache.clear()
+    cache.update(frames[0])
+
+    async def _ingest() -> int:
+        return sum([len(await calculate_interval_energy(frame, network=NetworkNEM)) for frame in frames[1:]])
+
+    return asyncio.run(_ingest())
+
+
+@pytest.mark.benchmark(group="energy_engine_ingest", min_rounds=3)
+def test_benchmark_energy_ingest_per_interval(benchmark) -> None:
+    """Each dispatch interval of a day ingested on its own as the live crawlers do"""
+    day = test_nem_month_scada.filter(pl.col("interval") < MONTH_START + timedelta(days=1)).drop("is_forecast")
+    frames = day.partition_by("interval", maintain_order=True)
+
+    rows = benchmark(_ingest_intervals, frames)
+    benchmark.extra_info["rows_per_second"] = rows / benchmark.stats.stats.mean
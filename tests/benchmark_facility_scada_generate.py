@@ -1,106 +1,145 @@
-import csv
-from pathlib import Path
+"""
+Benchmark generate_facility_scada against the previous row-wise pandas implementation.
+
+Runs over a synthetic full NEM day of unit scada (every 5 minute interval for a few
+hundred duids, including bidirectional batteries and historic aliased duids) and reports
+rows/second for both implementations.
+
+    uv run pytest tests/benchmark_facility_scada_generate.py --benchmark-only
+"""
+
+import asyncio
+import random
+from collections.abc import Hashable
+from datetime import datetime, timedelta
 from typing import Any
+from unittest.mock import AsyncMock, patch
 
+import pandas as pd
 import pytest
 
-from opennem.controllers.nem import generate_facility_scada, unit_scada_generate_facility_scada
-from opennem.core.downloader import file_opener
-from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
-from opennem.schema.network import NetworkWEM
+from opennem.controllers.nem import FACILITY_SCADA_COLUMN_NAMES, generate_facility_scada
+from opennem.core.battery import HISTORIC_UNIT_ALIASES, BatteryUnitMap, _generate_manual_battery_unit_map
+from opennem.core.networks import NetworkNEM
+from opennem.schema.network import NetworkSchema
 
-RECORDS_PATH = Path("data/wem/facility-scada-2020-10.csv")
-NEM_FILE_PATH = Path("data/NEM_FACILITY_SCADA_DAY.zip")
+BATTERY_UNIT_MAP = _generate_manual_battery_unit_map()
 
 
-def load_nem_scada_records() -> dict[str, Any]:
-    csv_content = file_opener(NEM_FILE_PATH).decode("utf-8")
+def generate_nem_day_records(num_duids: int = 500, seed: int = 1) -> list[dict[str, Any]]:
+    """A day of dispatch_unit_scada records as the mms parser emits them (all strings)"""
+    rng = random.Random(seed)
+    duids = [f"DUID{i}" for i in range(num_duids)] + list(BATTERY_UNIT_MAP.keys()) + list(HISTORIC_UNIT_ALIASES.keys())
+    start = datetime(2024, 1, 1, 0, 5)
+    records = []
 
-    ts = parse_aemo_mms_csv(csv_content)
+    for interval_number in range(288):
+        settlementdate = (start + timedelta(minutes=5 * interval_number)).strftime("%Y/%m/%d %H:%M:%S")
 
-    if not ts:
-        raise Exception("no table set")
+        for duid in duids:
+            records.append(
+                {
+                    "settlementdate": settlementdate,
+                    "duid": duid,
+                    "scadavalue": f"{rng.uniform(-100, 300):.5f}",
+                    "lastchanged": settlementdate,
+                }
+            )
 
-    return ts.get_table("unit_scada").records
+    # a re-issued record to exercise the primary key dedupe
+    records.append({**records[0], "scadavalue": "42.0"})
 
+    return records
 
-def load_wem_scada_records(limit: int | None = None, intentional_duplicate: bool = False) -> dict[str, Any]:
-    records = []
 
-    fieldnames = [
-        "Trading Date",
-        "Interval Number",
-        "Trading Interval",
-        "Participant Code",
-        "Facility Code",
-        "Energy Generated (MWh)",
-        "EOI Quantity (MW)",
-        "Extracted At",
-    ]
-    with RECORDS_PATH.open() as fh:
-        csvreader = csv.DictReader(fh, fieldnames=fieldnames)
-        for record in csvreader:
-            if record["Trading Date"] == "Trading Date":
-                continue
-
-            records.append(record)
-
-            if limit and len(records) > limit:
-                break
-
-    if intentional_duplicate:
-        records.append(records[0])
+def generate_facility_scada_rowwise(
+    records: list[dict[str, Any]],
+    battery_unit_map: dict[str, BatteryUnitMap],
+    network: NetworkSchema = NetworkNEM,
+    interval_field: str = "settlementdate",
+    facility_code_field: str = "duid",
+    power_field: str = "scadavalue",
+) -> list[dict[Hashable, Any]]:
+    """The previous implementation using row-wise df.apply for battery splitting and aliases"""
+    df = pd.DataFrame().from_records(records)
+    df["energy"] = None
+    df["energy_storage"] = None
+    df = df.rename(columns={interval_field: "interval", power_field: "generated", facility_code_field: "facility_code"})
+    df["network_id"] = network.code
+    df["is_forecast"] = False
+    df["eoi_quantity"] = None
+    df["energy_quality_flag"] = 0
+    df.interval = pd.to_datetime(df.interval)
+    df.generated = pd.to_numeric(df.generated)
+    df["generated"] = df["generated"].fillna(0)
+    df = df[FACILITY_SCADA_COLUMN_NAMES]
 
-    return records
+    battery_copies = df.loc[df.apply(lambda row: row["facility_code"] in battery_unit_map, axis=1)].copy()
+    battery_copies["battery_copy"] = True
+    df["battery_copy"] = False
+
+    if len(battery_copies) > 0:
+        df = pd.concat([df, battery_copies], ignore_index=True)
+
+    def map_battery_code(row):
+        if row["facility_code"] in battery_unit_map:
+            battery_map = battery_unit_map[row["facility_code"]]
+            return battery_map.charge_unit if row["generated"] < 0 else battery_map.discharge_unit
+        return row["facility_code"]
+
+    def map_battery_generation(row):
+        for _, battery_map in battery_unit_map.items():
+            if row["facility_code"] == battery_map.charge_unit:
+                return abs(row["generated"])
+        return row["generated"]
+
+    battery_copy_mask = df["battery_copy"]
+    df.loc[battery_copy_mask, "facility_code"] = df.loc[battery_copy_mask].apply(map_battery_code, axis=1)
+    df.loc[battery_copy_mask, "generated"] = df.loc[battery_copy_mask].apply(map_battery_generation, axis=1)
+    df = df.drop(columns=["battery_copy"])
+
+    alias_copies = df.loc[df.apply(lambda row: row["facility_code"] in HISTORIC_UNIT_ALIASES, axis=1)].copy()
+
+    if len(alias_copies) > 0:
+        alias_copies["facility_code"] = alias_copies.apply(lambda row: HISTORIC_UNIT_ALIASES[row["facility_code"]], axis=1)
+        df = pd.concat([df, alias_copies], ignore_index=True)
+
+    df["energy"] = df.generated / (60 / network.interval_size)
+    df.set_index(["interval", "network_id", "facility_code", "is_forecast"], inplace=True)
+    df = df[~df.index.duplicated(keep="last")]
+
+    return df.reset_index(inplace=False)[FACILITY_SCADA_COLUMN_NAMES].to_dict("records")
+
+
+def generate_facility_scada_columnar(records: list[dict[str, Any]]) -> list[dict[Hashable, Any]]:
+    with patch("opennem.controllers.nem.get_battery_unit_map", new_callable=AsyncMock) as mock_get_map:
+        mock_get_map.return_value = BATTERY_UNIT_MAP
+        return asyncio.run(generate_facility_scada(records))
+
+
+test_nem_day_records = generate_nem_day_records()
+
+
+def test_generate_facility_scada_matches_rowwise() -> None:
+    rowwise = generate_facility_scada_rowwise(test_nem_day_records, BATTERY_UNIT_MAP)
+    columnar = generate_facility_scada_columnar(test_nem_day_records)
+
+    assert len(rowwise) == len(columnar)
+
+    for a, b in zip(rowwise, columnar, strict=True):
+        assert a["interval"] == b["interval"]
+        assert a["facility_code"] == b["facility_code"]
+        assert a["generated"] == pytest.approx(b["generated"])
+        assert a["energy"] == pytest.approx(b["energy"])
+
+
+@pytest.mark.benchmark(group="facility_scada_generate", min_rounds=3)
+def test_benchmark_generate_facility_scada_rowwise(benchmark) -> None:
+    records = benchmark(generate_facility_scada_rowwise, test_nem_day_records, BATTERY_UNIT_MAP)
+    benchmark.extra_info["rows_per_second"] = len(records) / benchmark.stats.stats.mean
 
 
-test_wem_scada_records = load_wem_scada_records(1000)
-test_all_wem_scada_records = load_wem_scada_records()
-test_all_wem_scada_records_with_duplicates = load_wem_scada_records(intentional_duplicate=True)
-
-test_nem_large = load_nem_scada_records()
-
-
-@pytest.mark.benchmark(
-    group="facility_scada_parser",
-    min_rounds=50,
-)
-@pytest.mark.parametrize(
-    "records,primary_key_track",
-    [
-        (test_all_wem_scada_records, False),
-        (test_all_wem_scada_records, True),
-    ],
-)
-def test_benchmark_generate_facility_scada_base(benchmark, records, primary_key_track):
-    benchmark(
-        unit_scada_generate_facility_scada,
-        records,
-        network=NetworkWEM,
-        interval_field="Trading Date",
-        facility_code_field="Facility Code",
-        energy_field="Energy Generated (MWh)",
-        power_field="EOI Quantity (MW)",
-        # groupby_filter=groupby_filter,
-        primary_key_track=primary_key_track,
-    )
-
-
-@pytest.mark.benchmark(
-    group="facility_scada_parser",
-    min_rounds=50,
-)
-@pytest.mark.parametrize(
-    "records",
-    [(test_all_wem_scada_records), (test_all_wem_scada_records_with_duplicates), (test_nem_large)],
-)
-def test_benchmark_generate_facility_scada_optimized(benchmark, records):
-    benchmark(
-        generate_facility_scada,
-        records,
-        network=NetworkWEM,
-        interval_field="Trading Date",
-        facility_code_field="Facility Code",
-        energy_field="Energy Generated (MWh)",
-        power_field="EOI Quantity (MW)",
-    )
+@pytest.mark.benchmark(group="facility_scada_generate", min_rounds=3)
+def test_benchmark_generate_facility_scada_columnar(benchmark) -> None:
+    records = benchmark(generate_facility_scada_columnar, test_nem_day_records)
+    benchmark.extra_info["rows_per_second"] = len(records) / benchmark.stats.stats.mean
@@ -0,0 +1,126 @@
+"""
+Benchmark the v4 flow solver with the PEC loop in the topology: the consumption-mix solve over a
+year of 5 minute NEM intervals, the size of a market_summary backfill, and the flow market value
+over a month, the size of a market_summary chunk.
+
+Flows, generation and prices are synthetic.
+
+    uv run pytest tests/benchmark_flow_solver_v4.py --benchmark-only
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opennem.core.flow_solver_v4 import solve_flow_emissions_consumption_mix, solve_flow_emissions_simple, solve_flows_v4
+from opennem.core.interconnector_topology import NEM_PEC_TOPOLOGY
+
+INTERVALS_PER_MONTH = 30 * 288
+INTERVALS_PER_YEAR = 365 * 288
+
+
+def _synthetic_intervals(num_intervals: int) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """Interconnector flows, regional generation and regional prices for num_intervals 5 minute intervals"""
+    rng = np.random.default_rng(575)
+    intervals = pl.datetime_range(
+        datetime(2024, 1, 1), datetime(2024, 1, 1) + timedelta(minutes=5 * (num_intervals - 1)), "5m", eager=True
+    )
+    regions = NEM_PEC_TOPOLOGY.regions
+    flows = [flow for flow in NEM_PEC_TOPOLOGY.flows if flow[0] < flow[1]]
+
+    region_intervals = intervals.gather(np.repeat(np.arange(num_intervals), len(regions)))
+    region_codes = np.tile(regions, num_intervals)
+
+    energy = rng.uniform(50, 800, num_intervals * len(regions))
+    region_df = pl.DataFrame(
+        {
+            "interval": region_intervals,
+            "network_region": region_codes,
+            "energy": energy,
+            "emissions": energy * rng.uniform(0.05, 0.9, energy.size),
+        }
+    ).with_columns((pl.col("emissions") / pl.col("energy")).alias("emissions_intensity"))
+
+    interconnector_df = pl.DataFrame(
+        {
+            "interval": intervals.gather(np.repeat(np.arange(num_intervals), len(flows))),
+            "interconnector_region_from": np.tile([f for f, _ in flows], num_intervals),
+            "interconnector_region_to": np.tile([t for _, t in flows], num_intervals),
+            "energy": rng.uniform(-60, 60, num_intervals * len(flows)),
+        }
+    )
+
+    price_df = pl.DataFrame(
+        {
+            "interval": region_intervals,
+            "network_region": region_codes,
+            "price": rng.uniform(-50, 300, num_intervals * len(regions)),
+        }
+    )
+
+    return interconnector_df, region_df, price_df
+
+
+@pytest.fixture(scope="module")
+def month_of_intervals() -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    return _synthetic_intervals(INTERVALS_PER_MONTH)
+
+
+@pytest.fixture(scope="module")
+def year_of_intervals() -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    return _synthetic_intervals(INTERVALS_PER_YEAR)
+
+
+@pytest.mark.benchmark(group="flow_solver_v4", min_rounds=3)
+def test_benchmark_consumption_mix_year(benchmark, year_of_intervals) -> None:
+    interconnector_df, region_df, _ = year_of_intervals
+
+    result = benchmark.pedantic(
+        solve_flow_emissions_consumption_mix, args=(NEM_PEC_TOPOLOGY, interconnector_df, region_df), rounds=3
+    )
+
+    assert result.height == INTERVALS_PER_YEAR * NEM_PEC_TOPOLOGY.num_regions
+    assert (result["emissions_imports"] >= 0).all()
+
+
+@pytest.mark.benchmark(group="flow_solver_v4", min_rounds=3)
+def test_benchmark_simple_year(benchmark, year_of_intervals) -> None:
+    """The simple method market_summary used for being fast enough, for comparison"""
+    interconnector_df, region_df, _ = year_of_intervals
+
+    result = benchmark.pedantic(solve_flow_emissions_simple, args=(NEM_PEC_TOPOLOGY, interconnector_df, region_df), rounds=3)
+
+    assert not result.is_empty()
+
+
+@pytest.mark.benchmark(group="flow_solver_v4_market_value", min_rounds=5)
+def test_benchmark_flows_with_market_value_month(benchmark, month_of_intervals) -> None:
+    """What _compute_flows_for_range solves for a month of market_summary"""
+    interconnector_df, region_df, price_df = month_of_intervals
+
+    result = benchmark.pedantic(
+        solve_flows_v4,
+        args=(NEM_PEC_TOPOLOGY, interconnector_df, region_df),
+        kwargs={"use_consumption_mix": True, "region_price_df": price_df},
+        rounds=5,
+    )
+
+    assert result.height == INTERVALS_PER_MONTH * NEM_PEC_TOPOLOGY.num_regions
+    assert result["market_value_imports"].null_count() == 0
+
+
+@pytest.mark.benchmark(group="flow_solver_v4_market_value", min_rounds=5)
+def test_benchmark_flows_without_market_value_month(benchmark, month_of_intervals) -> None:
+    """The same month without prices, for the cost of the market value"""
+    interconnector_df, region_df, _ = month_of_intervals
+
+    result = benchmark.pedantic(
+        solve_flows_v4,
+        args=(NEM_PEC_TOPOLOGY, interconnector_df, region_df),
+        kwargs={"use_consumption_mix": True},
+        rounds=5,
+    )
+
+    assert result.height == INTERVALS_PER_MONTH * NEM_PEC_TOPOLOGY.num_regions
@@ -0,0 +1,80 @@
+"""
+Benchmark the incremental milestone check's comparison of an interval's aggregated rows
+against the milestone state, the part of task_update_milestones that runs in Python.
+
+The rows and the state are synthetic, sized like the NEM: every grouping of the interval
+metrics and a state of a few thousand record_ids.
+
+    uv run pytest tests/benchmark_milestone_incremental.py --benchmark-only
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opennem.recordreactor.incremental import _filter_candidate_rows, _with_record_ids
+from opennem.recordreactor.schema import MilestonePeriod
+from opennem.schema.network import NetworkNEM
+
+INTERVAL = datetime(2026, 10, 18, 10, 0)
+REGIONS = ["NSW1", "QLD1", "SA1", "TAS1", "VIC1"]
+FUELTECHS = ["coal", "gas", "solar", "wind", "hydro", "bioenergy", "distillate", "battery_charging", "battery_discharging"]
+
+
+def _interval_rows() -> pl.DataFrame:
+    """An interval's rows for every metric and grouping, as query_period_grouping_sets returns them"""
+    rows: list[tuple] = []
+
+    for metric in ["power", "price", "demand", "renewable_proportion"]:
+        keys: list[tuple[str, str | None, str | None, bool | None]] = [("network", None, None, None)]
+        keys += [("region", region, None, None) for region in REGIONS]
+
+        if metric == "power":
+            keys += [("fueltech", None, fueltech, None) for fueltech in FUELTECHS]
+            keys += [("region_fueltech", region, fueltech, None) for region in REGIONS for fueltech in FUELTECHS]
+            keys += [("renewable", None, None, renewable) for renewable in (True, False)]
+            keys += [("region_renewable", region, None, renewable) for region in REGIONS for renewable in (True, False)]
+
+        rows += [(INTERVAL, grouping, region, fueltech, renewable, 1, metric) for grouping, region, fueltech, renewable in keys]
+
+    rng = np.random.default_rng(575)
+
+    return pl.DataFrame(
+        rows,
+        orient="row",
+        schema={
+            "time_bucket": pl.Datetime("us"),
+            "grouping": pl.String,
+            "network_region": pl.String,
+            "fueltech_group_id": pl.String,
+            "renewable": pl.Boolean,
+            "interval_count": pl.Int64,
+            "metric": pl.String,
+        },
+    ).with_columns(pl.Series("value", rng.uniform(100, 10000, len(rows))))
+
+
+@pytest.fixture(scope="module")
+def state_frame() -> pl.DataFrame:
+    """The steady state: the interval's records held at values its rows don't break, from the
+    previous interval, alongside a few thousand other record_ids"""
+    record_ids = _with_record_ids(_interval_rows(), NetworkNEM, MilestonePeriod.interval).select("record_id", "aggregate")
+    others = pl.DataFrame({"record_id": [f"au.nem.other.{i}.day.high" for i in range(5000)], "aggregate": "high"})
+
+    return pl.concat([record_ids, others]).select(
+        "record_id",
+        pl.when(pl.col("aggregate") == "high").then(1e9).otherwise(1.0).alias("prev_value"),
+        pl.lit(INTERVAL - timedelta(minutes=5)).cast(pl.Datetime("us")).alias("prev_interval"),
+    )
+
+
+@pytest.mark.benchmark(group="milestone_incremental", min_rounds=20)
+def test_benchmark_filter_interval_candidates(benchmark, state_frame) -> None:
+    rows = _interval_rows()
+
+    result = benchmark(_filter_candidate_rows, rows, NetworkNEM, MilestonePeriod.interval, state_frame)
+
+    # nothing breaks a record, so nothing is built into records
+    assert result.is_empty()
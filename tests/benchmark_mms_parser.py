@@ -1,28 +1,140 @@
+"""
+Benchmark the streaming columnar MMS parser against the previous dict-per-row parser.
+
+Reports throughput (rows/s) through pytest-benchmark and the peak RSS of each parser,
+measured in a fresh spawned process so the two runs don't share a high water mark.
+
+    uv run pytest tests/benchmark_mms_parser.py --benchmark-only -s
+"""
+
+import csv
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Any
+from zipfile import ZipFile
 
 import pytest
 
 from opennem.core.downloader import file_opener
-from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
+from opennem.core.normalizers import normalize_duid
+from opennem.core.parsers.aemo.mms import parse_aemo_file, parse_aemo_mms_csv
 
 NEM_FILE_PATH = Path("data/NEM_FACILITY_SCADA_DAY.zip")
 
+pytestmark = pytest.mark.skipif(not NEM_FILE_PATH.is_file(), reason=f"benchmark data {NEM_FILE_PATH} not found")
+
+
+def parse_rowwise(content: str) -> dict[str, list[dict[str, Any]]]:
+    """The previous parser: splitlines, a dict per D row and per-field duid normalisation"""
+    tables: dict[str, list[dict[str, Any]]] = {}
+    fieldnames: list[str] = []
+    current: list[dict[str, Any]] | None = None
+
+    for row in csv.reader(content.splitlines()):
+        if not row:
+            continue
+
+        match row[0].strip().upper():
+            case "I":
+                fieldnames = [i.lower() for i in row[4:]]
+                current = tables.setdefault(f"{row[1]}_{row[2]}".lower(), [])
+            case "D":
+                if current is None or len(row[4:]) != len(fieldnames):
+                    continue
+
+                record = dict(zip(fieldnames, row[4:], strict=True))
+
+                for field, fieldvalue in record.items():
+                    if field == "duid":
+                        record[field] = normalize_duid(fieldvalue)
 
-def load_nem_scada_records() -> dict[str, Any]:
-    csv_content = file_opener(NEM_FILE_PATH).decode("utf-8")
+                current.append(record)
 
-    ts = parse_aemo_mms_csv(csv_content)
+    return tables
 
-    if not ts:
+
+def load_nem_scada_records_rowwise() -> int:
+    tables = parse_rowwise(file_opener(NEM_FILE_PATH).decode("utf-8"))
+    return len(tables["dispatch_unit_scada"])
+
+
+def load_nem_scada_records_streaming() -> int:
+    ts = parse_aemo_file(str(NEM_FILE_PATH))
+
+    table = ts.get_table("unit_scada")
+
+    if not table:
         raise Exception("no table set")
 
-    return ts.get_table("unit_scada").records
+    return table.num_records
+
 
+def load_nem_scada_records_streaming_records() -> int:
+    """Streaming parse plus materialising the record dicts the controllers read"""
+    with ZipFile(NEM_FILE_PATH) as zf, zf.open(zf.namelist()[0]) as fh:
+        ts = parse_aemo_mms_csv(fh)
 
-@pytest.mark.benchmark(
-    group="load_nem_scada_records",
-    min_rounds=1,
+    table = ts.get_table("unit_scada")
+
+    if not table:
+        raise Exception("no table set")
+
+    return len(table.records)
+
+
+def _peak_rss_kb() -> int:
+    """Peak RSS of this process in KB. VmHWM is reset on exec so isn't inherited from the
+    benchmark process that spawned us like ru_maxrss is"""
+    status = Path("/proc/self/status")
+
+    if status.is_file():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_and_measure(func_name: str) -> tuple[int, float, int]:
+    func = globals()[func_name]
+    start = time.perf_counter()
+    rows = func()
+    elapsed = time.perf_counter() - start
+
+    return rows, elapsed, _peak_rss_kb()
+
+
+def measure_in_subprocess(func_name: str) -> tuple[int, float, int]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_run_and_measure, func_name).result()
+
+
+@pytest.mark.benchmark(group="load_nem_scada_records", min_rounds=1)
+@pytest.mark.parametrize(
+    "loader",
+    [load_nem_scada_records_rowwise, load_nem_scada_records_streaming, load_nem_scada_records_streaming_records],
 )
-def test_benchmark_generate_facility_scada_base(benchmark) -> None:
-    benchmark(load_nem_scada_records)
+def test_benchmark_mms_parser_throughput(benchmark, loader) -> None:
+    rows = benchmark(loader)
+    benchmark.extra_info["rows"] = rows
+    benchmark.extra_info["rows_per_second"] = rows / benchmark.stats.stats.mean
+
+
+def test_benchmark_mms_parser_peak_rss() -> None:
+    results = {
+        name: measure_in_subprocess(name)
+        for name in (
+            "load_nem_scada_records_rowwise",
+            "load_nem_scada_records_streaming",
+            "load_nem_scada_records_streaming_records",
+        )
+    }
+
+    for name, (rows, elapsed, peak_rss_kb) in results.items():
+        print(f"{name:<45} {rows:>10} rows {rows / elapsed:>12,.0f} rows/s peak rss {peak_rss_kb / 1024:>8,.0f} MB")
+
+    assert results["load_nem_scada_records_streaming"][0] == results["load_nem_scada_records_rowwise"][0]
+    assert results["load_nem_scada_records_streaming"][2] < results["load_nem_scada_records_rowwise"][2]
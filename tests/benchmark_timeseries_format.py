@@ -0,0 +1,96 @@
+"""
+Benchmark formatting a year of 5 minute power by fueltech, the largest response the v4 data
+endpoint builds, from the raw ClickHouse rows into the response dicts.
+
+Rows are synthetic: every fueltech for every interval of a year, with a few interior gaps to
+fill and nulls.
+
+    uv run pytest tests/benchmark_timeseries_format.py --benchmark-only
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from opennem.api.timeseries import format_timeseries_response, format_timeseries_rows
+from opennem.core.grouping import PrimaryGrouping, SecondaryGrouping
+from opennem.core.metric import Metric
+from opennem.core.time_interval import Interval
+
+FUELTECHS = [
+    "battery_charging",
+    "battery_discharging",
+    "bioenergy_biomass",
+    "coal_black",
+    "coal_brown",
+    "distillate",
+    "gas_ccgt",
+    "gas_ocgt",
+    "gas_recip",
+    "gas_steam",
+    "hydro",
+    "pumps",
+    "solar_rooftop",
+    "solar_utility",
+    "wind",
+]
+
+COLUMN_NAMES = ["interval", "fueltech", "power"]
+
+INTERVALS_PER_YEAR = 365 * 288
+
+
+@pytest.fixture(scope="module")
+def rows() -> list[tuple]:
+    rng = random.Random(615)
+    start = datetime(2024, 1, 1)
+    step = timedelta(minutes=5)
+    rows = []
+
+    for i in range(INTERVALS_PER_YEAR):
+        interval = start + step * i
+
+        for fueltech in FUELTECHS:
+            # the odd missing interval inside a series, and the odd null
+            if rng.random() < 0.001:
+                continue
+
+            rows.append((interval, fueltech, None if rng.random() < 0.001 else rng.random() * 1000))
+
+    return rows
+
+
+def _check(response: list[dict]) -> None:
+    [power] = response
+    assert len(power["results"]) == len(FUELTECHS)
+    assert all(len(series["data"]) == INTERVALS_PER_YEAR for series in power["results"])
+
+
+_FORMAT_ARGS = {
+    "network": "NEM",
+    "metrics": [Metric.POWER],
+    "interval": Interval.INTERVAL,
+    "primary_grouping": PrimaryGrouping.NETWORK,
+    "secondary_groupings": [SecondaryGrouping.FUELTECH],
+}
+
+
+@pytest.mark.benchmark(group="timeseries_format", min_rounds=3)
+def test_benchmark_format_timeseries_rows(benchmark, rows) -> None:
+    response = benchmark.pedantic(
+        format_timeseries_rows, kwargs={**_FORMAT_ARGS, "column_names": COLUMN_NAMES, "rows": rows}, rounds=3
+    )
+    _check(response)
+
+
+@pytest.mark.benchmark(group="timeseries_format", min_rounds=3)
+def test_benchmark_format_timeseries_response_from_dicts(benchmark, rows) -> None:
+    """The router's previous path, a dict per row"""
+
+    def _format() -> list[dict]:
+        results = [dict(zip(COLUMN_NAMES, row, strict=True)) for row in rows]
+        return format_timeseries_response(**_FORMAT_ARGS, results=results)
+
+    response = benchmark.pedantic(_format, rounds=3)
+    _check(response)
@@ -0,0 +1,118 @@
+"""The NEMWeb archive cache serves repeat downloads of a listing entry from disk, keys on the
+listing modified date and size so a republished file is fetched again, and evicts the least
+recently used files once it is over its size bound."""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from opennem.core import archive_cache
+from opennem.core.archive_cache import ArchiveCache, cached_download
+from opennem.core.parsers.dirlisting import DirlistingEntry
+
+
+def _entry(name: str, modified_date: datetime = datetime(2024, 1, 7), file_size: int = 1000) -> DirlistingEntry:
+    return DirlistingEntry(
+        filename=name,
+        link=f"https://nemweb.com.au/Reports/ARCHIVE/TradingIS_Reports/{name}",
+        modified_date=modified_date,
+        file_size=file_size,
+    )
+
+
+class _Fetcher:
+    def __init__(self, content: bytes = b"archive") -> None:
+        self.content = content
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        return self.content
+
+
+@pytest.mark.asyncio
+async def test_archive_cache_hit_and_miss(tmp_path: Path) -> None:
+    cache = ArchiveCache(cache_dir=tmp_path, max_bytes=1024)
+    entry = _entry("PUBLIC_TRADINGIS_20231231_20240106.zip")
+    fetch = _Fetcher()
+
+    assert await cache.get_or_fetch(entry, fetch) == b"archive"
+    assert await cache.get_or_fetch(entry, fetch) == b"archive"
+
+    assert fetch.calls == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert cache.usage() == (1, len(b"archive"))
+
+
+@pytest.mark.asyncio
+async def test_archive_cache_keys_on_listing_version(tmp_path: Path) -> None:
+    cache = ArchiveCache(cache_dir=tmp_path, max_bytes=1024)
+    fetch = _Fetcher()
+    name = "PUBLIC_TRADINGIS_20231231_20240106.zip"
+
+    await cache.get_or_fetch(_entry(name), fetch)
+    await cache.get_or_fetch(_entry(name, modified_date=datetime(2024, 1, 8)), fetch)
+    await cache.get_or_fetch(_entry(name, file_size=2000), fetch)
+
+    assert fetch.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_archive_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = ArchiveCache(cache_dir=tmp_path, max_bytes=30)
+    entries = [_entry(f"PUBLIC_TRADINGIS_{i}.zip") for i in range(3)]
+
+    for age, entry in enumerate(entries):
+        await cache.get_or_fetch(entry, _Fetcher(b"x" * 10))
+        path = cache._path(cache.key_for_entry(entry))
+        os.utime(path, (1_000_000 + age, 1_000_000 + age))
+
+    # reading the first entry makes the second the least recently used
+    assert cache.get(cache.key_for_entry(entries[0])) is not None
+
+    cache.max_bytes = 25
+    cache.prune()
+
+    assert cache.usage() == (2, 20)
+    assert cache.get(cache.key_for_entry(entries[1])) is None
+
+    assert cache.prune(max_bytes=0) == (2, 20)
+    assert cache.usage() == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_cached_download_requires_entry(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(archive_cache, "_archive_cache", ArchiveCache(cache_dir=tmp_path, max_bytes=1024))
+    fetch = _Fetcher()
+    entry = _entry("PUBLIC_TRADINGIS_20231231_20240106.zip")
+
+    # no listing entry to key on - always fetched
+    await cached_download(entry.link, fetch)
+    await cached_download(entry.link, fetch)
+    assert fetch.calls == 2
+
+    await cached_download(entry.link, fetch, entry=entry)
+    await cached_download(entry.link, fetch, entry=entry)
+    assert fetch.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_download_skips_current_files(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(archive_cache, "_archive_cache", ArchiveCache(cache_dir=tmp_path, max_bytes=1024))
+    fetch = _Fetcher()
+    name = "PUBLIC_TRADINGIS_202401071000_0000000412345678.zip"
+    entry = DirlistingEntry(
+        filename=name,
+        link=f"https://nemweb.com.au/Reports/Current/TradingIS_Reports/{name}",
+        modified_date=datetime(2024, 1, 7, 10, 0),
+        file_size=1000,
+    )
+
+    # Current/ files are rolled over, so they're always fetched and never take cache space
+    await cached_download(entry.link, fetch, entry=entry)
+    await cached_download(entry.link, fetch, entry=entry)
+
+    assert fetch.calls == 2
+    assert archive_cache._archive_cache.usage() == (0, 0)
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from opennem.core import energy_engine
+from opennem.core.energy_engine import PreviousIntervalCache, calculate_interval_energy, calculate_trapezoidal_energy
+from opennem.core.networks import NetworkNEM
+from opennem.workers.energy import calculate_energy_updates
+
+START = datetime(2024, 1, 1, 0, 5)
+
+
+def _scada(rows: list[tuple[str, int, float]]) -> pl.DataFrame:
+    """Frame of (facility_code, interval number, generated) as generate_facility_scada_frame emits"""
+    return pl.DataFrame(
+        [("NEM", code, START + timedelta(minutes=5 * n), generated, generated / 12, 0) for code, n, generated in rows],
+        schema={
+            "network_id": pl.String,
+            "facility_code": pl.String,
+            "interval": pl.Datetime("us"),
+            "generated": pl.Float64,
+            "energy": pl.Float64,
+            "energy_quality_flag": pl.Int32,
+        },
+        orient="row",
+    )
+
+
+def test_trapezoidal_energy_from_previous_interval() -> None:
+    frame = _scada([("A", 1, 120.0), ("B", 0, 60.0), ("A", 0, 60.0), ("B", 1, 0.0)])
+
+    result = calculate_trapezoidal_energy(frame, interval_size=5)
+
+    # row order is kept
+    assert result.get_column("facility_code").to_list() == ["A", "B", "A", "B"]
+    assert result.get_column("energy").to_list() == pytest.approx([7.5, 5.0, 5.0, 2.5])
+    assert result.get_column("energy_quality_flag").to_list() == [2, 0, 0, 2]
+
+
+def test_trapezoidal_energy_requires_contiguous_interval() -> None:
+    frame = _scada([("A", 0, 60.0), ("A", 2, 120.0)])
+
+    result = calculate_trapezoidal_energy(frame, interval_size=5)
+
+    # the gap leaves the point estimate in place
+    assert result.get_column("energy").to_list() == pytest.approx([5.0, 10.0])
+    assert result.get_column("energy_quality_flag").to_list() == [0, 0]
+
+
+def test_trapezoidal_energy_from_previous_frame() -> None:
+    frame = _scada([("A", 1, 120.0)])
+    previous = _scada([("A", 0, 60.0)]).select("network_id", "facility_code", "interval", "generated")
+
+    result = calculate_trapezoidal_energy(frame, interval_size=5, previous=previous)
+
+    assert result.get_column("energy").to_list() == pytest.approx([7.5])
+    assert result.get_column("energy_quality_flag").to_list() == [2]
+
+
+def test_previous_interval_cache_keeps_latest() -> None:
+    cache = PreviousIntervalCache()
+    cache.update(_scada([("A", 1, 120.0), ("A", 0, 60.0)]))
+    cache.update(_scada([("A", 0, 30.0)]))
+
+    assert cache.get_frame([("NEM", "A")]).row(0) == ("NEM", "A", START + timedelta(minutes=5), 120.0)
+    assert cache.missing({("NEM", "A"): START + timedelta(minutes=10), ("NEM", "B"): START}, interval_size=5) == {
+        ("NEM", "B"): START - timedelta(minutes=5)
+    }
+
+
+@pytest.mark.asyncio
+async def test_calculate_interval_energy_primes_cold_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    fetched = []
+
+    async def _fetch_previous_intervals(network_id: str, facility_codes: list[str], intervals: list[datetime]) -> pl.DataFrame:
+        fetched.append((facility_codes, intervals))
+        return _scada([("A", 0, 60.0)]).select("network_id", "facility_code", "interval", "generated")
+
+    monkeypatch.setattr(energy_engine, "_previous_interval_cache", PreviousIntervalCache())
+    monkeypatch.setattr(energy_engine, "_fetch_previous_intervals", _fetch_previous_intervals)
+
+    first = await calculate_interval_energy(_scada([("A", 1, 120.0)]), network=NetworkNEM)
+    second = await calculate_interval_energy(_scada([("A", 2, 0.0)]), network=NetworkNEM)
+
+    assert first.get_column("energy").to_list() == pytest.approx([7.5])
+    assert second.get_column("energy").to_list() == pytest.approx([5.0])
+    assert second.get_column("energy_quality_flag").to_list() == [2]
+
+    # only the cold first interval reads from the database
+    assert fetched == [(["A"], [START])]
+
+
+def test_calculate_energy_updates_only_changed_rows() -> None:
+    scada = _scada([("A", 0, 60.0), ("A", 1, 120.0), ("A", 2, 0.0), ("B", 0, 60.0), ("B", 1, 60.0)]).with_columns(
+        pl.lit(False).alias("is_forecast"), pl.col("energy_quality_flag").cast(pl.Int16)
+    )
+    # interval 1 was calculated at ingest for both, interval 2 of A still has the point estimate
+    scada = scada.with_columns(
+        pl.when((pl.col("facility_code") == "A") & (pl.col("interval") == START + timedelta(minutes=5)))
+        .then(pl.lit(7.5))
+        .otherwise(pl.col("energy"))
+        .alias("energy"),
+        pl.when(pl.col("interval") == START + timedelta(minutes=5))
+        .then(pl.lit(2, dtype=pl.Int16))
+        .otherwise(pl.col("energy_quality_flag"))
+        .alias("energy_quality_flag"),
+    )
+
+    updates = calculate_energy_updates(scada, {"NEM": 5}, START + timedelta(minutes=5), START + timedelta(minutes=10))
+
+    assert sorted((code, interval, energy) for _, code, interval, _, energy in updates.iter_rows()) == [
+        ("A", START + timedelta(minutes=10), pytest.approx(5.0)),
+    ]
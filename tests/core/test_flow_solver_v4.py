@@ -181,6 +181,62 @@ class TestConsumptionMixEmissions:
         for col in ["energy_imports", "energy_exports", "emissions_imports", "emissions_exports"]:
             assert (result[col] >= 0).all(), f"{col} has negative values"
 
+    def test_batch_matches_each_interval_solved_alone(self):
+        """All intervals are solved in one stacked call, each must come out as if solved on its own."""
+        second = datetime.fromisoformat("2023-01-01T00:05:00")
+        interconnectors = pl.concat(
+            [
+                _interconnector_df(),
+                _interconnector_df().with_columns(pl.lit(second).alias("interval"), -pl.col("energy") / 2),
+            ]
+        )
+        regions = pl.concat([_region_emissions_df(), _region_emissions_df().with_columns(pl.lit(second).alias("interval"))])
+
+        batched = solve_flow_emissions_consumption_mix(NEM_DEFAULT_TOPOLOGY, interconnectors, regions)
+
+        for interval in (TEST_INTERVAL, second):
+            alone = solve_flow_emissions_consumption_mix(
+                NEM_DEFAULT_TOPOLOGY,
+                interconnectors.filter(pl.col("interval") == interval),
+                regions.filter(pl.col("interval") == interval),
+            )
+            batch = batched.filter(pl.col("interval") == interval)
+            assert batch["network_region"].to_list() == alone["network_region"].to_list()
+            for col in ["energy_imports", "energy_exports", "emissions_imports", "emissions_exports"]:
+                assert batch[col].to_list() == pytest.approx(alone[col].to_list())
+
+    def test_singular_interval_falls_back(self):
+        """A region with no generation and no flows makes its interval singular, neighbouring intervals are unaffected."""
+        second = datetime.fromisoformat("2023-01-01T00:05:00")
+        isolated_sa = _interconnector_df().with_columns(
+            pl.lit(second).alias("interval"),
+            pl.when(pl.col("interconnector_region_to") == "SA1").then(0.0).otherwise(pl.col("energy")).alias("energy"),
+        )
+        no_sa_generation = _region_emissions_df().with_columns(
+            pl.lit(second).alias("interval"),
+            *(
+                pl.when(pl.col("network_region") == "SA1").then(0.0).otherwise(pl.col(c)).alias(c)
+                for c in ["energy", "emissions", "emissions_intensity"]
+            ),
+        )
+
+        result = solve_flow_emissions_consumption_mix(
+            NEM_DEFAULT_TOPOLOGY,
+            pl.concat([_interconnector_df(), isolated_sa]),
+            pl.concat([_region_emissions_df(), no_sa_generation]),
+        )
+
+        for col in ["energy_imports", "energy_exports", "emissions_imports", "emissions_exports"]:
+            assert result[col].is_finite().all(), f"{col} has non-finite values"
+            assert (result[col] >= 0).all(), f"{col} has negative values"
+
+        sa = result.filter(pl.col("network_region") == "SA1")
+        assert sa["emissions_imports"].to_list() == pytest.approx([12.8, 0.0], abs=0.2)
+
+        # NSW1 imports in the singular interval are still at the consumption-mix intensities
+        nsw = result.filter((pl.col("network_region") == "NSW1") & (pl.col("interval") == second))
+        assert nsw["emissions_imports"][0] == pytest.approx(55 * 0.65 + 27.5 * 180.55 / 311, abs=0.2)
+
 
 class TestPECTopology:
     """Test with Project EnergyConnect topology (NSW1<->SA1 loop)."""
@@ -249,6 +305,72 @@ class TestSolveFlowsV4:
         assert result.is_empty()
 
 
+def _region_price_df() -> pl.DataFrame:
+    """Regional prices for test interval, $/MWh."""
+    return pl.DataFrame(
+        {
+            "interval": [TEST_INTERVAL] * 5,
+            "network_region": ["QLD1", "NSW1", "VIC1", "SA1", "TAS1"],
+            "price": [100.0, 120.0, 80.0, 150.0, 60.0],
+        }
+    )
+
+
+class TestMarketValue:
+    """Imports are valued at the importing region's price, exports at the exporting region's."""
+
+    @pytest.mark.parametrize("use_consumption_mix", [False, True])
+    def test_market_value_at_regional_price(self, use_consumption_mix):
+        result = solve_flows_v4(
+            NEM_DEFAULT_TOPOLOGY,
+            _interconnector_df(),
+            _region_emissions_df(),
+            use_consumption_mix=use_consumption_mix,
+            region_price_df=_region_price_df(),
+        )
+
+        # NSW1 imports 82.5 at 120
+        nsw = result.filter(pl.col("network_region") == "NSW1")
+        assert nsw["market_value_imports"][0] == pytest.approx(9900.0)
+        assert nsw["market_value_exports"][0] == pytest.approx(0.0)
+
+        # VIC1 imports 11 and exports 49.5 at 80
+        vic = result.filter(pl.col("network_region") == "VIC1")
+        assert vic["market_value_imports"][0] == pytest.approx(880.0)
+        assert vic["market_value_exports"][0] == pytest.approx(3960.0)
+
+    def test_no_prices_no_market_value_columns(self):
+        result = solve_flows_v4(NEM_DEFAULT_TOPOLOGY, _interconnector_df(), _region_emissions_df())
+        assert "market_value_imports" not in result.columns
+
+    def test_half_hourly_price_carried_forward(self):
+        """Pre-2009 trading prices are half hourly, they cover the 5 minute intervals after them."""
+        later = datetime.fromisoformat("2023-01-01T00:25:00")
+        too_late = datetime.fromisoformat("2023-01-01T00:35:00")
+        flows = pl.concat(
+            [_interconnector_df().with_columns(pl.lit(interval).alias("interval")) for interval in (later, too_late)]
+        )
+        regions = pl.concat(
+            [_region_emissions_df().with_columns(pl.lit(interval).alias("interval")) for interval in (later, too_late)]
+        )
+
+        result = solve_flows_v4(NEM_DEFAULT_TOPOLOGY, flows, regions, region_price_df=_region_price_df())
+
+        nsw = result.filter(pl.col("network_region") == "NSW1")
+        assert nsw["market_value_imports"].to_list() == [pytest.approx(9900.0), None]
+
+    def test_missing_price_is_null(self):
+        prices = _region_price_df().with_columns(
+            pl.when(pl.col("network_region") == "SA1").then(None).otherwise(pl.col("price")).alias("price")
+        )
+
+        result = solve_flows_v4(NEM_DEFAULT_TOPOLOGY, _interconnector_df(), _region_emissions_df(), region_price_df=prices)
+
+        sa = result.filter(pl.col("network_region") == "SA1")
+        assert sa["market_value_imports"][0] is None
+        assert result.filter(pl.col("network_region") != "SA1")["market_value_imports"].null_count() == 0
+
+
 class TestZeroEdgeCases:
     def test_zero_energy_region(self):
         """Region with zero generation should have zero emissions intensity."""
@@ -0,0 +1,175 @@
+"""The crawl pipeline runs stages concurrently with bounded queues between them - a slow item
+only holds up its own worker and a fast stage is held back when the next stage falls behind."""
+
+import asyncio
+import io
+from datetime import datetime
+from zipfile import ZipFile
+
+import pytest
+
+from opennem.controllers.schema import ControllerReturn
+from opennem.core.crawlers.pipeline import PipelineStage, run_pipeline
+from opennem.core.crawlers.schema import CrawlerDefinition, CrawlerPriority
+from opennem.core.parsers.aemo.filenames import AEMOMMSFilename
+from opennem.core.parsers.dirlisting import DirlistingEntry
+from opennem.crawlers import nemweb
+from opennem.crawlers.nemweb import process_nemweb_entries, run_nemweb_aemo_crawl
+
+MMS_CONTENT = b"""C,NEMP.WORLD,DISPATCH,AEMO,PUBLIC,2024/01/01,00:00:00,0,DISPATCH,0
+I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE,LASTCHANGED
+D,DISPATCH,UNIT_SCADA,1,"2024/01/01 00:05:00",BAYSW1,600,"2024/01/01 00:05:00"
+D,DISPATCH,UNIT_SCADA,1,"2024/01/01 00:05:00",ER01,400,"2024/01/01 00:05:00"
+C,END OF REPORT,4
+"""
+
+
+async def _passthrough(item: int) -> int:
+    await asyncio.sleep(0)
+    return item
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_all_items_through_stages() -> None:
+    async def _double(item: int) -> int:
+        return item * 2
+
+    result = await run_pipeline(
+        range(20),
+        stages=[PipelineStage(name="a", func=_passthrough, concurrency=3), PipelineStage(name="b", func=_double, concurrency=2)],
+    )
+
+    assert sorted(result.results) == [i * 2 for i in range(20)]
+    assert [stage.processed for stage in result.stages] == [20, 20]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_drops_failed_items() -> None:
+    async def _fail_odd(item: int) -> int | None:
+        if item % 2:
+            raise Exception("odd")
+        return item
+
+    async def _drop_four(item: int) -> int | None:
+        return None if item == 4 else item
+
+    result = await run_pipeline(
+        range(10),
+        stages=[PipelineStage(name="a", func=_fail_odd, concurrency=2), PipelineStage(name="b", func=_drop_four, concurrency=2)],
+    )
+
+    assert sorted(result.results) == [0, 2, 6, 8]
+    assert result.stages[0].errors == 5
+    assert result.stages[0].dropped == 5
+    assert result.stages[1].dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_slow_item_does_not_stall_other_workers() -> None:
+    release_slow = asyncio.Event()
+    completed: list[int] = []
+
+    async def _download(item: int) -> int:
+        if item == 0:
+            await release_slow.wait()
+        return item
+
+    async def _persist(item: int) -> int:
+        completed.append(item)
+
+        # every other item has made it through while item 0 is still downloading
+        if len(completed) == 9:
+            release_slow.set()
+
+        return item
+
+    result = await run_pipeline(
+        range(10),
+        stages=[PipelineStage(name="download", func=_download, concurrency=3), PipelineStage(name="persist", func=_persist)],
+    )
+
+    assert completed[-1] == 0
+    assert len(result.results) == 10
+
+
+@pytest.mark.asyncio
+async def test_pipeline_backpressure_bounds_in_flight_items() -> None:
+    release_persist = asyncio.Event()
+    downloaded: list[int] = []
+
+    async def _download(item: int) -> int:
+        downloaded.append(item)
+        return item
+
+    async def _persist(item: int) -> int:
+        await release_persist.wait()
+        return item
+
+    pipeline = asyncio.create_task(
+        run_pipeline(
+            range(100),
+            stages=[PipelineStage(name="download", func=_download, concurrency=2), PipelineStage(name="persist", func=_persist)],
+            queue_size=2,
+        )
+    )
+
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+    # one item in persist, two queued for persist and one blocked in each download worker
+    assert len(downloaded) <= 5
+
+    release_persist.set()
+    result = await pipeline
+
+    assert len(result.results) == 100
+    assert result.stages[0].blocked_time > 0
+
+
+def _entry(minute: int) -> DirlistingEntry:
+    filename = f"PUBLIC_DISPATCHSCADA_2024010100{minute:02d}_0000000000000000.zip"
+
+    return DirlistingEntry(
+        filename=filename,
+        link=f"https://nemweb.com.au/Reports/Current/Dispatch_SCADA/{filename}",
+        modified_date=datetime(2024, 1, 1, 0, minute),
+        aemo_interval_date=AEMOMMSFilename(filename="DISPATCHSCADA", date=datetime(2024, 1, 1, 0, minute)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_nemweb_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    zip_content = io.BytesIO()
+
+    with ZipFile(zip_content, "w") as zf:
+        zf.writestr("PUBLIC_DISPATCHSCADA.CSV", MMS_CONTENT)
+
+    async def _url_fetch(url: str, entry: DirlistingEntry | None = None) -> bytes:
+        if url.endswith("0010_0000000000000000.zip"):
+            raise Exception("HTTP Error 404: not found")
+        return zip_content.getvalue()
+
+    async def _store_aemo_tableset(table_set) -> ControllerReturn:  # noqa: ANN001
+        table = table_set.get_table("unit_scada")
+        return ControllerReturn(inserted_records=table.num_records, processed_records=table.num_records)
+
+    recorded: list = []
+
+    async def _set_crawler_history(crawler_name, histories):  # noqa: ANN001, ANN202
+        recorded.extend(histories)
+
+    monkeypatch.setattr(nemweb, "url_fetch", _url_fetch)
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store_aemo_tableset)
+    monkeypatch.setattr(nemweb, "set_crawler_history", _set_crawler_history)
+
+    crawler = CrawlerDefinition(name="au.nemweb.dispatch_scada", priority=CrawlerPriority.high, processor=run_nemweb_aemo_crawl)
+    entries = [_entry(minute) for minute in (5, 10, 15)]
+
+    result = await process_nemweb_entries(crawler=crawler, entries=entries, max_date=datetime(2024, 1, 1, 0, 15))
+
+    assert len(result.results) == 2
+    assert sum(i.inserted_records for i in result.results) == 4
+    assert result.stages[0].dropped == 1
+
+    # the 404 has long rolled off CURRENT so is aged out with an empty history entry
+    assert sorted((i.interval.minute, i.records) for i in recorded) == [(5, 2), (10, 0), (15, 2)]
@@ -1,9 +1,15 @@
-"""Tests for the ClickHouse serving-path query settings applied by execute_async."""
+"""Tests for the ClickHouse serving-path query settings applied by execute_async and the insert helpers.
+
+The async helpers run on the ClickHouse pools, whose connections come from _make_client.
+"""
 
 import asyncio
 import threading
 import time
+from datetime import datetime
 
+import numpy as np
+import polars as pl
 import pytest
 
 from opennem import settings
@@ -20,11 +26,21 @@ class _FakeClient:
         self.calls.append({"query": query, "params": params, "kwargs": kwargs})
         return []
 
+    def disconnect(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _close_pools():
+    ch_client.close_clickhouse_pools()
+    yield
+    ch_client.close_clickhouse_pools()
+
 
 @pytest.fixture
 def fake_client(monkeypatch: pytest.MonkeyPatch) -> _FakeClient:
     fake = _FakeClient()
-    monkeypatch.setattr(ch_client, "get_clickhouse_client", lambda *a, **k: fake)
+    monkeypatch.setattr(ch_client, "_make_client", lambda *a, **k: fake)
     return fake
 
 
@@ -91,7 +107,10 @@ async def test_insert_async_runs_off_event_loop(monkeypatch: pytest.MonkeyPatch)
             time.sleep(0.2)
             return []
 
-    monkeypatch.setattr(ch_client, "get_clickhouse_client", lambda *a, **k: _BlockingClient())
+        def disconnect(self) -> None:
+            pass
+
+    monkeypatch.setattr(ch_client, "_make_client", lambda *a, **k: _BlockingClient())
 
     ticks = 0
 
@@ -107,3 +126,35 @@ async def test_insert_async_runs_off_event_loop(monkeypatch: pytest.MonkeyPatch)
     assert ticks == 10
     # and the blocking call did not run on the event loop thread
     assert exec_thread and exec_thread[0] != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_insert_frame_async_sends_columns(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Frames go to the driver as one numpy array per column on a use_numpy client."""
+    fake = _FakeClient()
+    created: list[bool] = []
+
+    def _make_client(timeout: int = 10, use_numpy: bool = False) -> _FakeClient:
+        created.append(use_numpy)
+        return fake
+
+    monkeypatch.setattr(ch_client, "_make_client", _make_client)
+
+    frame = pl.DataFrame({"interval": [datetime(2024, 1, 1), datetime(2024, 1, 1, 0, 5)], "generated": [1.5, None]})
+
+    await ch_client.insert_frame_async("unit_intervals", frame)
+
+    call = fake.calls[-1]
+    assert created == [True]
+    assert call["query"] == "INSERT INTO unit_intervals (interval, generated) VALUES"
+    assert call["kwargs"] == {"columnar": True}
+    assert call["params"][0].dtype == np.dtype("datetime64[us]")
+    # the driver only writes None as NULL into Nullable(Float64), NaN would be stored as a value
+    assert call["params"][1].tolist() == [1.5, None]
+
+
+def test_insert_frame_skips_empty_frame() -> None:
+    fake = _FakeClient()
+
+    assert ch_client.insert_frame(fake, "unit_intervals", pl.DataFrame({"generated": []}, schema={"generated": pl.Float64})) == 0
+    assert fake.calls == []
@@ -0,0 +1,55 @@
+"""Tests for the aggregate data versions published to Redis."""
+
+from datetime import datetime
+
+import pytest
+
+from opennem.db.clickhouse import data_version
+from opennem.db.clickhouse.data_version import get_data_version, publish_data_version
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[str, bytes]] = {}
+
+    async def hset(self, key: str, mapping: dict[str, str]) -> int:
+        self.hashes.setdefault(key, {}).update({k: v.encode() for k, v in mapping.items()})
+        return len(mapping)
+
+    async def hmget(self, key: str, fields: list[str]) -> list[bytes | None]:
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> _FakeRedis:
+    fake = _FakeRedis()
+    monkeypatch.setattr(data_version, "get_redis", lambda: fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_publish_and_read_data_version(monkeypatch: pytest.MonkeyPatch, redis: _FakeRedis) -> None:
+    async def _latest(client, query, params=None):  # noqa: ANN001, ANN202
+        assert "GROUP BY network_id" in query
+        return [("NEM", datetime(2026, 6, 22, 9, 45)), ("WEM", datetime(2026, 6, 21, 8, 0)), ("WEMDE", None)]
+
+    monkeypatch.setattr(data_version, "execute_async", _latest)
+
+    versions = await publish_data_version("unit_intervals")
+
+    assert versions == {"NEM": datetime(2026, 6, 22, 9, 45), "WEM": datetime(2026, 6, 21, 8, 0)}
+    assert await get_data_version("unit_intervals", ["NEM"]) == datetime(2026, 6, 22, 9, 45)
+    # a network made up of several network codes is at its latest one
+    assert await get_data_version("unit_intervals", ["WEM", "WEMDE", "NEM"]) == datetime(2026, 6, 22, 9, 45)
+    assert await get_data_version("market_summary", ["NEM"]) is None
+
+
+@pytest.mark.asyncio
+async def test_publish_failure_is_not_raised(monkeypatch: pytest.MonkeyPatch, redis: _FakeRedis) -> None:
+    async def _boom(client, query, params=None):  # noqa: ANN001, ANN202
+        raise Exception("clickhouse down")
+
+    monkeypatch.setattr(data_version, "execute_async", _boom)
+
+    assert await publish_data_version("market_summary") == {}
+    assert redis.hashes == {}
@@ -0,0 +1,72 @@
+"""Tests for the aggregate dirty days log."""
+
+from datetime import date, datetime
+
+import polars as pl
+
+from opennem.db.clickhouse import dirty_log
+from opennem.db.clickhouse.dirty_log import dirty_days_from_frame, get_dirty_days, record_dirty_days
+
+
+class _FakeClient:
+    def __init__(self, result: list | None = None, error: Exception | None = None) -> None:
+        self.result = result or []
+        self.error = error
+        self.calls: list[tuple[str, object]] = []
+
+    def execute(self, query, params=None, **kwargs):  # noqa: ANN001, ANN003
+        if self.error:
+            raise self.error
+        self.calls.append((query, params))
+        return self.result
+
+
+def _frame() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "interval": [datetime(2024, 3, 1, 23, 55), datetime(2024, 3, 2, 0, 0), datetime(2024, 3, 2, 0, 5)],
+            "network_id": ["NEM", "NEM", "NEM"],
+            "generated": [1.0, 2.0, 3.0],
+        }
+    )
+
+
+def test_dirty_days_from_frame() -> None:
+    assert dirty_days_from_frame(_frame(), "unit_intervals").rows() == [
+        ("unit_intervals", "NEM", date(2024, 3, 1)),
+        ("unit_intervals", "NEM", date(2024, 3, 2)),
+    ]
+
+
+def test_record_dirty_days_does_not_raise(monkeypatch) -> None:  # noqa: ANN001
+    inserted = []
+    monkeypatch.setattr(dirty_log, "insert_frame", lambda client, table, frame: inserted.append((table, len(frame))))
+
+    assert record_dirty_days(_FakeClient(), "unit_intervals", _frame()) == 2
+    assert inserted == [("aggregate_dirty_days", 2)]
+
+    def _fail(client, table, frame):  # noqa: ANN001, ANN202
+        raise Exception("Table opennem.aggregate_dirty_days doesn't exist")
+
+    monkeypatch.setattr(dirty_log, "insert_frame", _fail)
+
+    # the aggregate write already went in, a missing log entry is only logged
+    assert record_dirty_days(_FakeClient(), "unit_intervals", _frame()) == 0
+
+
+def test_get_dirty_days_overlaps_watermark() -> None:
+    client = _FakeClient(result=[("unit_intervals", date(2024, 3, 1)), ("unit_intervals", date(2024, 3, 2))])
+
+    dirty_days = get_dirty_days(client, since=datetime(2024, 3, 2, 0, 10), until=datetime(2024, 3, 2, 0, 15))
+
+    assert dirty_days == {"unit_intervals": {date(2024, 3, 1), date(2024, 3, 2)}}
+    assert client.calls[0][1] == {"until": datetime(2024, 3, 2, 0, 15), "since": datetime(2024, 3, 2, 0, 9)}
+
+
+def test_get_dirty_days_of_networks() -> None:
+    client = _FakeClient(result=[("unit_intervals", date(2024, 3, 1))])
+
+    get_dirty_days(client, since=None, until=datetime(2024, 3, 2, 0, 15), network_ids=["NEM", "AEMO_ROOFTOP"])
+
+    assert "network_id IN %(network_ids)s" in client.calls[0][0]
+    assert client.calls[0][1] == {"until": datetime(2024, 3, 2, 0, 15), "network_ids": ("NEM", "AEMO_ROOFTOP")}
@@ -0,0 +1,171 @@
+"""Tests for refreshing ClickHouse materialized views by partition replacement and from the dirty days log."""
+
+from datetime import date, datetime
+
+import pytest
+
+from opennem import settings
+from opennem.db.clickhouse import materialized_views
+from opennem.db.clickhouse.views import FUELTECH_INTERVALS_DAILY_VIEW, FUELTECH_INTERVALS_VIEW, MARKET_SUMMARY_MONTHLY_VIEW
+
+
+class _FakeClient:
+    """Records queries and answers the handful of lookups the refresh makes."""
+
+    def __init__(
+        self,
+        partition_key: str = "toYYYYMM(date)",
+        source_max: list[datetime] | None = None,
+        partitions: tuple[str, ...] = ("202402", "202403"),
+    ) -> None:
+        self.partition_key = partition_key
+        self.source_max = source_max or [datetime(2024, 3, 2, 10, 0), datetime(2024, 3, 2, 10, 0)]
+        self.partitions = partitions
+        self.queries: list[tuple[str, dict | None]] = []
+
+    def execute(self, query, params=None, **kwargs):  # noqa: ANN001, ANN003
+        query = " ".join(query.split())
+        self.queries.append((query, params))
+
+        if query.startswith("SELECT partition_key"):
+            return [(self.partition_key,)]
+        if query.startswith("SELECT max("):
+            return [(self.source_max.pop(0),)]
+        if query.startswith("SELECT DISTINCT _partition_id"):
+            return [(partition,) for partition in self.partitions]
+        if query.startswith("SELECT count()"):
+            return [(10,)]
+        return []
+
+
+def _refresh(monkeypatch: pytest.MonkeyPatch, client: _FakeClient) -> None:
+    monkeypatch.setattr(materialized_views, "get_clickhouse_client", lambda *a, **k: client)
+    materialized_views.backfill_materialized_view(
+        FUELTECH_INTERVALS_DAILY_VIEW, start_date=datetime(2024, 2, 28), end_date=datetime(2024, 3, 2)
+    )
+
+
+def test_refresh_replaces_partitions_without_mutation(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _FakeClient()
+    _refresh(monkeypatch, client)
+
+    queries = [query for query, _ in client.queries]
+    staging = next(q for q in queries if q.startswith("CREATE TABLE")).split()[2]
+
+    assert staging.startswith("fueltech_intervals_daily_mv_staging_")
+    assert not any("DELETE" in q for q in queries)
+    # re-aggregated into staging, not the view
+    assert any(q.startswith(f"INSERT INTO {staging} SELECT toDate(interval)") for q in queries)
+    # the rest of the affected partitions carried over from the view
+    _, params = next((q, p) for q, p in client.queries if q.startswith(f"INSERT INTO {staging} SELECT * FROM"))
+    assert params["partitions"] == ("202402", "202403")
+    assert (params["start"], params["end"]) == (date(2024, 2, 28), date(2024, 3, 2))
+    assert [p for q, p in client.queries if "REPLACE PARTITION" in q] == [{"partition": "202402"}, {"partition": "202403"}]
+    assert f"DROP TABLE IF EXISTS {staging}" in queries
+    # source didn't move while staging was built so there is nothing to catch up
+    assert not any(q.startswith("INSERT INTO fueltech_intervals_daily_mv SELECT") for q in queries)
+
+
+def test_refresh_catches_up_source_written_during_build(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _FakeClient(source_max=[datetime(2024, 3, 2, 10, 0), datetime(2024, 3, 2, 10, 5)])
+    _refresh(monkeypatch, client)
+
+    catch_up = [p for q, p in client.queries if q.startswith("INSERT INTO fueltech_intervals_daily_mv SELECT")]
+
+    # the whole day is re-aggregated so the partial day doesn't lose on completeness version
+    assert catch_up == [{"start": datetime(2024, 3, 2), "end": datetime(2024, 3, 2, 23, 59, 59)}]
+
+
+def test_refresh_interval_view_replaces_only_the_dirty_day(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _FakeClient(partition_key="toYYYYMMDD(interval)", partitions=("20240302",))
+    monkeypatch.setattr(materialized_views, "get_clickhouse_client", lambda *a, **k: client)
+
+    materialized_views.backfill_materialized_view(
+        FUELTECH_INTERVALS_VIEW, start_date=datetime(2024, 3, 2), end_date=datetime(2024, 3, 2)
+    )
+
+    # the day is its own partition, the rest of the month isn't copied through staging
+    _, params = next((q, p) for q, p in client.queries if " SELECT * FROM fueltech_intervals_mv FINAL" in q)
+    assert params["partitions"] == ("20240302",)
+    assert [p for q, p in client.queries if "REPLACE PARTITION" in q] == [{"partition": "20240302"}]
+
+
+def test_refresh_falls_back_to_delete_when_unpartitioned(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _FakeClient(partition_key="")
+    _refresh(monkeypatch, client)
+
+    queries = [query for query, _ in client.queries]
+
+    assert any(q.startswith("ALTER TABLE fueltech_intervals_daily_mv DELETE") for q in queries)
+    assert not any("REPLACE PARTITION" in q for q in queries)
+    assert any(q.startswith("DROP TABLE IF EXISTS fueltech_intervals_daily_mv_staging_") for q in queries)
+
+
+def test_refresh_delete_mode_setting(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "clickhouse_mv_refresh_replace_partitions", False)
+    client = _FakeClient()
+    _refresh(monkeypatch, client)
+
+    queries = [query for query, _ in client.queries]
+
+    assert any(q.startswith("ALTER TABLE fueltech_intervals_daily_mv DELETE") for q in queries)
+    assert not any(q.startswith("CREATE TABLE") for q in queries)
+
+
+def test_dirty_day_ranges() -> None:
+    days = {date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1), date(2024, 3, 5)}
+
+    assert materialized_views._dirty_day_ranges(FUELTECH_INTERVALS_DAILY_VIEW, days) == [
+        (datetime(2024, 2, 28), datetime(2024, 3, 1)),
+        (datetime(2024, 3, 5), datetime(2024, 3, 5)),
+    ]
+    # monthly views refresh whole months
+    assert materialized_views._dirty_day_ranges(MARKET_SUMMARY_MONTHLY_VIEW, days) == [
+        (datetime(2024, 2, 1), datetime(2024, 3, 31)),
+    ]
+
+
+def test_refresh_dirty_materialized_views(monkeypatch: pytest.MonkeyPatch) -> None:
+    refreshed: list[tuple[str, datetime, datetime]] = []
+    watermarks: list[datetime] = []
+    refreshed_to = datetime(2024, 3, 5, 12, 0)
+
+    class _NowClient:
+        def execute(self, query, params=None, **kwargs):  # noqa: ANN001, ANN003
+            return [(refreshed_to,)]
+
+    monkeypatch.setattr(materialized_views, "get_clickhouse_client", lambda *a, **k: _NowClient())
+    monkeypatch.setattr(materialized_views, "get_dirty_days_watermark", lambda client, consumer: datetime(2024, 3, 5, 11, 55))
+    monkeypatch.setattr(
+        materialized_views,
+        "get_dirty_days",
+        lambda client, since, until: {"market_summary": {date(2024, 3, 5)}} if until == refreshed_to else {},
+    )
+    monkeypatch.setattr(materialized_views, "set_dirty_days_watermark", lambda client, consumer, to: watermarks.append(to))
+
+    def _backfill(view, start_date, end_date, raise_errors):  # noqa: ANN001, ANN202
+        refreshed.append((view.name, start_date, end_date))
+        return 1
+
+    monkeypatch.setattr(materialized_views, "backfill_materialized_view", _backfill)
+
+    results = materialized_views.refresh_dirty_materialized_views()
+
+    # only the market summary views, the unit_intervals ones had no writes
+    assert refreshed == [
+        ("market_summary_daily_mv", datetime(2024, 3, 5), datetime(2024, 3, 5)),
+        ("market_summary_monthly_mv", datetime(2024, 3, 1), datetime(2024, 3, 31)),
+    ]
+    assert results == {"market_summary_daily_mv": 1, "market_summary_monthly_mv": 1}
+    assert watermarks == [refreshed_to]
+
+    # a failed refresh leaves the watermark for the next run to retry
+    def _fail(view, start_date, end_date, raise_errors):  # noqa: ANN001, ANN202
+        raise Exception("Too many parts")
+
+    monkeypatch.setattr(materialized_views, "backfill_materialized_view", _fail)
+
+    with pytest.raises(Exception, match="Too many parts"):
+        materialized_views.refresh_dirty_materialized_views()
+
+    assert watermarks == [refreshed_to]
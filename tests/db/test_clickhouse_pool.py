@@ -0,0 +1,169 @@
+"""Tests for the async ClickHouse connection pools."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from opennem.db.clickhouse import client as ch_client
+from opennem.db.clickhouse.pool import ClickHousePool, ClickHousePoolKind, ClickHouseQueryCancelled, ClickHouseRequestClient
+
+
+class _FakeClient:
+    """Blocks in execute() until released or killed, like a long running query"""
+
+    def __init__(self, ping: bool | None = True) -> None:
+        self.connection = SimpleNamespace(ping=lambda: ping)
+        self.killed = threading.Event()
+        self.disconnected = False
+
+    def execute(self, query: str, query_id: str | None = None) -> list:
+        if self.killed.wait(timeout=0.05 if query == "fast" else 5):
+            raise Exception("Query was cancelled")
+
+        return [(1,)]
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+
+
+class _Clients:
+    def __init__(self, ping: bool | None = True) -> None:
+        self.ping = ping
+        self.created: list[_FakeClient] = []
+        self.killed: list[str] = []
+
+    def connect(self) -> _FakeClient:
+        client = _FakeClient(ping=self.ping)
+        self.created.append(client)
+        return client
+
+    def kill_query(self, query_id: str) -> None:
+        self.killed.append(query_id)
+
+        for client in self.created:
+            client.killed.set()
+
+
+def _pool(clients: _Clients, max_size: int = 2, idle_timeout: float = 300, health_check_interval: float = 30) -> ClickHousePool:
+    return ClickHousePool(
+        kind=ClickHousePoolKind.query,
+        connect=clients.connect,  # type: ignore[arg-type]
+        max_size=max_size,
+        idle_timeout=idle_timeout,
+        health_check_interval=health_check_interval,
+        kill_query=clients.kill_query,
+    )
+
+
+@pytest.mark.asyncio
+async def test_pool_bounds_connections_and_reuses_them() -> None:
+    clients = _Clients()
+    pool = _pool(clients, max_size=2)
+    running = 0
+    max_running = 0
+
+    def _query(client: _FakeClient) -> list:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        time.sleep(0.02)
+        running -= 1
+        return client.execute("fast")
+
+    results = await asyncio.gather(*(pool.run(_query) for _ in range(6)))
+
+    assert results == [[(1,)]] * 6
+    assert max_running == 2
+    assert len(clients.created) == 2
+    assert pool.size == 2
+    assert pool.idle == 2
+
+    pool.close()
+
+    assert all(client.disconnected for client in clients.created)
+
+
+@pytest.mark.asyncio
+async def test_prune_closes_idle_and_dead_connections() -> None:
+    clients = _Clients(ping=False)
+    pool = _pool(clients, max_size=3)
+
+    await asyncio.gather(*(pool.run(lambda c: c.execute("fast")) for _ in range(2)))
+    assert pool.idle == 2
+
+    pool.health_check_interval = 0
+    await pool.prune()
+
+    # pinging the dead connections dropped them
+    assert pool.size == 0
+    assert all(client.disconnected for client in clients.created)
+
+    clients.ping = True
+    pool.idle_timeout = 0
+    await pool.run(lambda c: c.execute("fast"))
+    await asyncio.sleep(0.01)
+    await pool.prune()
+
+    assert pool.size == 0
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_query_is_killed_on_the_server() -> None:
+    clients = _Clients()
+    pool = _pool(clients)
+
+    task = asyncio.create_task(pool.run(lambda c: c.execute("slow"), query_id="q1"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert clients.killed == ["q1"]
+    # the connection went back to the pool once the killed query returned
+    assert pool.idle == 1
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_request_client_cancels_query_on_disconnect() -> None:
+    clients = _Clients()
+    pool = _pool(clients)
+    disconnected = False
+
+    async def _is_disconnected() -> bool:
+        return disconnected
+
+    request_client = ClickHouseRequestClient(pool=pool, is_disconnected=_is_disconnected)
+
+    assert await request_client.run(lambda c: c.execute("fast"), query_id="q1") == [(1,)]
+
+    task = asyncio.create_task(request_client.run(lambda c: c.execute("slow"), query_id="q2"))
+    await asyncio.sleep(0.05)
+    disconnected = True
+
+    with pytest.raises(ClickHouseQueryCancelled):
+        await task
+
+    assert clients.killed == ["q2"]
+    pool.close()
+
+
+def test_pools_are_created_per_event_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ch_client, "_make_client", lambda *a, **k: _FakeClient())
+
+    async def _get_pool() -> ClickHousePool:
+        return ch_client.get_clickhouse_pool(ClickHousePoolKind.query)
+
+    first = asyncio.run(_get_pool())
+    second = asyncio.run(_get_pool())
+
+    assert first is not second
+    assert first.closed
+    assert not second.closed
+
+    ch_client.close_clickhouse_pools()
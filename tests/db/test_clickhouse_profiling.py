@@ -0,0 +1,148 @@
+"""Tests for the ClickHouse query profiling hook on execute_async and insert_async."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from opennem import settings
+from opennem.db.clickhouse import client as ch_client
+from opennem.db.clickhouse import profiling
+from opennem.db.clickhouse.profiling import (
+    MEMORY_LIMIT_EXCEEDED,
+    get_fingerprint_stats,
+    get_slowest_queries,
+    normalize_query,
+    query_fingerprint,
+)
+
+
+class _ServerException(Exception):
+    def __init__(self, message: str, code: int) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class _FakeClient:
+    """Returns rows and reports progress through last_query like the driver"""
+
+    def __init__(self, rows: list | None = None, rows_read: int = 0, bytes_read: int = 0, error: Exception | None = None):
+        self.rows = rows or []
+        self.error = error
+        self.last_query = SimpleNamespace(progress=SimpleNamespace(rows=rows_read, bytes=bytes_read))
+        self.calls: list[dict] = []
+
+    def execute(self, query, params=None, **kwargs):  # noqa: ANN001, ANN003
+        self.calls.append({"query": query, "params": params, "kwargs": kwargs})
+
+        if self.error:
+            raise self.error
+
+        return self.rows
+
+    def disconnect(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _reset_profiles():
+    profiling.reset_query_profiles()
+    ch_client.close_clickhouse_pools()
+    yield
+    profiling.reset_query_profiles()
+    ch_client.close_clickhouse_pools()
+
+
+def _use_client(monkeypatch: pytest.MonkeyPatch, fake: _FakeClient) -> None:
+    """Pool connections for the async helpers come from _make_client"""
+    monkeypatch.setattr(ch_client, "_make_client", lambda *a, **k: fake)
+
+
+def test_fingerprint_ignores_literals_and_whitespace() -> None:
+    a = "SELECT max(interval) FROM unit_intervals WHERE network_id = 'NEM' AND interval > now() - INTERVAL 2 DAY"
+    b = "SELECT max(interval)\n    FROM unit_intervals\n    WHERE network_id = 'WEM' AND interval > now() - INTERVAL 7 DAY"
+
+    assert query_fingerprint(a) == query_fingerprint(b)
+    assert normalize_query("SELECT * FROM t WHERE x IN (1, 2, 3)") == "SELECT * FROM t WHERE x IN (?)"
+    assert query_fingerprint(a) != query_fingerprint(a.replace("unit_intervals", "market_summary"))
+
+
+@pytest.mark.asyncio
+async def test_execute_async_records_profile(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeClient(rows=[(1,), (2,)], rows_read=1000, bytes_read=8000)
+    _use_client(monkeypatch, fake)
+
+    await ch_client.execute_async(fake, "SELECT a FROM t WHERE b = %(b)s", {"b": 1})
+
+    [profile] = get_slowest_queries()
+
+    assert fake.calls[-1]["kwargs"]["query_id"] == profile.query_id
+    assert profile.kind == "select"
+    assert profile.rows == 2
+    assert profile.rows_read == 1000
+    assert profile.bytes_read == 8000
+    assert profile.error is None
+
+
+@pytest.mark.asyncio
+async def test_insert_async_records_profile(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeClient(rows=3)  # type: ignore[arg-type]
+    _use_client(monkeypatch, fake)
+
+    await ch_client.insert_async("INSERT INTO t VALUES", [(1,), (2,), (3,)])
+
+    [stats] = get_fingerprint_stats()
+
+    assert stats.kind == "insert"
+    assert stats.count == 1
+    assert get_slowest_queries()[0].rows == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_limit_errors_are_counted_per_fingerprint(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeClient(error=_ServerException("Memory limit (for query) exceeded", MEMORY_LIMIT_EXCEEDED))
+    _use_client(monkeypatch, fake)
+
+    for network in ["NEM", "WEM"]:
+        with pytest.raises(_ServerException):
+            await ch_client.execute_async(fake, f"SELECT * FROM unit_intervals WHERE network_id = '{network}'")
+
+    [stats] = get_fingerprint_stats()
+
+    assert stats.count == 2
+    assert stats.errors == 2
+    assert stats.memory_limit_errors == 2
+    assert get_slowest_queries()[0].error_code == MEMORY_LIMIT_EXCEEDED
+
+
+def test_slowest_queries_are_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "clickhouse_profile_slowest_size", 3)
+
+    for elapsed in [0.5, 3.0, 0.1, 2.0, 1.0]:
+        profiling.record_query_profile(
+            profiling.QueryProfile(
+                query_id=str(elapsed),
+                fingerprint="abc",
+                kind="select",
+                query="SELECT 1",
+                started_at=profiling.datetime.now(),
+                elapsed=elapsed,
+            )
+        )
+
+    assert [p.elapsed for p in get_slowest_queries()] == [3.0, 2.0, 1.0]
+
+    [stats] = get_fingerprint_stats()
+
+    assert stats.count == 5
+    assert stats.max_elapsed == 3.0
+    assert stats.avg_elapsed == pytest.approx(6.6 / 5)
+
+
+@pytest.mark.asyncio
+async def test_profiling_can_be_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "clickhouse_profile_queries", False)
+    fake = _FakeClient(rows=[(1,)])
+    _use_client(monkeypatch, fake)
+
+    assert await ch_client.execute_async(fake, "SELECT 1") == [(1,)]
+    assert get_slowest_queries() == []
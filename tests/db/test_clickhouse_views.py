@@ -1,6 +1,8 @@
 """Tests for ClickHouse materialized view definitions."""
 
 from opennem.db.clickhouse.views import (
+    CLICKHOUSE_MATERIALIZED_VIEWS,
+    FUELTECH_INTERVALS_VIEW,
     RENEWABLE_INTERVALS_DAILY_VIEW,
     RENEWABLE_INTERVALS_VIEW,
 )
@@ -17,3 +19,16 @@ def test_renewable_mvs_exclude_storage_fueltechs() -> None:
         for sql in (view.schema, view.backfill_query):
             for fueltech in _STORAGE_FUELTECHS:
                 assert f"'{fueltech}'" in sql, f"{view.name} must exclude '{fueltech}' storage fueltech"
+
+
+def test_materialized_views_are_partitioned() -> None:
+    """Refreshes swap partitions in with REPLACE PARTITION, which needs a partition key on the view storage."""
+    for view in CLICKHOUSE_MATERIALIZED_VIEWS.values():
+        assert "PARTITION BY" in view.schema, f"{view.name} must be partitioned"
+        assert f"INSERT INTO {view.name}\n" in view.backfill_query, f"{view.name} backfill must insert into the view"
+
+
+def test_interval_views_are_partitioned_by_day() -> None:
+    """A dirty days refresh of the 5 minute views swaps in only the changed days"""
+    for view in (FUELTECH_INTERVALS_VIEW, RENEWABLE_INTERVALS_VIEW):
+        assert "PARTITION BY toYYYYMMDD(interval)" in view.schema, f"{view.name} must be partitioned by day"
@@ -0,0 +1,117 @@
+"""Tests for the per-workload connection pools and their metrics."""
+
+import asyncio
+
+import pytest
+
+from opennem.db import get_workload_engine, pool
+from opennem.db.pool import DBWorkload, acquire_connection, db_workload, get_db_workload, with_db_workload
+
+
+class _FakePool:
+    """Stand-in for an asyncpg pool with a fixed number of connections."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._connections = asyncio.Semaphore(max_size)
+        self.in_use = 0
+
+    async def acquire(self, timeout: float | None = None) -> object:
+        await self._connections.acquire()
+        self.in_use += 1
+        return object()
+
+    async def release(self, conn: object) -> None:
+        self.in_use -= 1
+        self._connections.release()
+
+    def get_size(self) -> int:
+        return self._max_size
+
+    def get_idle_size(self) -> int:
+        return self._max_size - self.in_use
+
+    def get_max_size(self) -> int:
+        return self._max_size
+
+
+@pytest.fixture
+def fake_pools(monkeypatch: pytest.MonkeyPatch) -> dict[DBWorkload, _FakePool]:
+    created: dict[DBWorkload, _FakePool] = {}
+
+    async def _create_pool(**kwargs) -> _FakePool:
+        return _FakePool(kwargs["max_size"])
+
+    monkeypatch.setattr(pool.asyncpg, "create_pool", _create_pool)
+    monkeypatch.setattr(pool, "_asyncpg_pools", created)
+    monkeypatch.setattr(pool, "_asyncpg_pool_locks", {})
+    monkeypatch.setattr(pool, "_asyncpg_pool_metrics", {})
+
+    return created
+
+
+def test_db_workload_context() -> None:
+    assert get_db_workload() == DBWorkload.live
+
+    with db_workload(DBWorkload.backfill):
+        assert get_db_workload() == DBWorkload.backfill
+
+    assert get_db_workload() == DBWorkload.live
+
+
+@pytest.mark.asyncio
+async def test_with_db_workload_decorator() -> None:
+    @with_db_workload(DBWorkload.backfill)
+    async def _task() -> DBWorkload:
+        # tasks spawned from the decorated function inherit the workload
+        return await asyncio.create_task(asyncio.sleep(0, result=get_db_workload()))
+
+    assert await _task() == DBWorkload.backfill
+    assert get_db_workload() == DBWorkload.live
+
+
+def test_workload_engines_are_separate() -> None:
+    live_engine = get_workload_engine(DBWorkload.live)
+    backfill_engine = get_workload_engine(DBWorkload.backfill)
+
+    assert live_engine is not backfill_engine
+    assert backfill_engine is get_workload_engine(DBWorkload.backfill)
+
+    with db_workload(DBWorkload.backfill):
+        assert get_workload_engine() is backfill_engine
+
+
+@pytest.mark.asyncio
+async def test_backfill_does_not_starve_live(fake_pools: dict[DBWorkload, _FakePool]) -> None:
+    backfill_holding = asyncio.Event()
+    release_backfill = asyncio.Event()
+
+    async def _backfill_insert() -> None:
+        async with acquire_connection(DBWorkload.backfill):
+            backfill_holding.set()
+            await release_backfill.wait()
+
+    with db_workload(DBWorkload.backfill):
+        backfill_tasks = [asyncio.create_task(_backfill_insert()) for _ in range(5)]
+
+    await backfill_holding.wait()
+
+    # backfill has saturated its own pool, the live workload still gets a connection straight away
+    async with asyncio.timeout(1), acquire_connection():
+        pass
+
+    metrics = pool.get_pool_metrics()
+
+    assert metrics["asyncpg_backfill"]["checked_out"] == fake_pools[DBWorkload.backfill].get_max_size()
+    assert metrics["asyncpg_backfill"]["waiting"] == 5 - metrics["asyncpg_backfill"]["checked_out"]
+    assert metrics["asyncpg_live"]["acquired"] == 1
+    assert metrics["asyncpg_live"]["checked_out"] == 0
+
+    release_backfill.set()
+    await asyncio.gather(*backfill_tasks)
+
+    metrics = pool.get_pool_metrics()
+
+    assert metrics["asyncpg_backfill"]["acquired"] == 5
+    assert metrics["asyncpg_backfill"]["waiting"] == 0
+    assert metrics["asyncpg_backfill"]["wait_time_max"] >= 0
@@ -1,4 +1,18 @@
-from opennem.core.parsers.aemo.mms import parse_aemo_mms_csv
+import io
+import pickle
+from zipfile import ZipFile
+
+import polars as pl
+import pytest
+
+from opennem.core.parsers.aemo.mms import (
+    AEMOTableSchema,
+    AEMOTableSet,
+    iter_aemo_mms_batches,
+    parse_aemo_content,
+    parse_aemo_content_buffers,
+    parse_aemo_mms_csv,
+)
 
 
 def test_parse_aemo_mms_dispatch_scada(aemo_nemweb_dispatch_scada: str) -> None:
@@ -24,3 +38,162 @@ def test_parse_aemo_mms_dispatch_scada(aemo_nemweb_dispatch_scada: str) -> None:
         raise Exception("Invalid record")
 
     # assert record.settlementdate, "Record has settlement date"  # type: ignore
+
+
+MMS_SCADA_CONTENT = """C,NEMP.WORLD,DISPATCHSCADA,AEMO,PUBLIC,2021/09/02,12:50:13,0000000348376188,,0000000348376182
+I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE,LASTCHANGED
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",ADPBA1G,0,"2021/09/02 12:50:08"
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00", adpbA1l ,,"2021/09/02 12:50:08"
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",BROKEN,1
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 12:55:00",BARCSF1,"1,5","2021/09/02 12:50:08"
+I,DISPATCH,PRICE,1,SETTLEMENTDATE,REGIONID,RRP
+D,DISPATCH,PRICE,1,"2021/09/02 12:55:00",NSW1,50.2
+I,DISPATCH,UNIT_SCADA,1,SETTLEMENTDATE,DUID,SCADAVALUE,LASTCHANGED
+D,DISPATCH,UNIT_SCADA,1,"2021/09/02 13:00:00",BASTYAN,3,"2021/09/02 12:55:08"
+C,"END OF REPORT",11
+"""
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 100_000])
+@pytest.mark.parametrize("block_size", [64, 1024 * 1024])
+def test_parse_aemo_mms_csv_batches(batch_size: int, block_size: int) -> None:
+    r = parse_aemo_mms_csv(MMS_SCADA_CONTENT, batch_size=batch_size, block_size=block_size)
+
+    assert r.table_names == ["dispatch_unit_scada", "dispatch_price"]
+
+    table = r.get_table("unit_scada")
+    assert table, "Has table"
+
+    # malformed row is skipped and repeated section is merged
+    assert [i["duid"] for i in table.records] == ["ADPBA1G", "ADPBA1L", "BARCSF1", "BASTYAN"]
+    assert table.records[1] == {
+        "settlementdate": "2021/09/02 12:55:00",
+        "duid": "ADPBA1L",
+        "scadavalue": "",
+        "lastchanged": "2021/09/02 12:50:08",
+    }
+    assert table.records[2]["scadavalue"] == "1,5"
+
+
+def test_parse_aemo_mms_csv_binary_stream() -> None:
+    r = parse_aemo_mms_csv(io.BytesIO(MMS_SCADA_CONTENT.encode("utf-8")), values_only=True)
+
+    table = r.get_table("dispatch_price")
+    assert table, "Has table"
+    assert table.records == [["2021/09/02 12:55:00", "NSW1", "50.2"]]
+
+
+def test_iter_aemo_mms_batches_columnar() -> None:
+    batches = list(iter_aemo_mms_batches(MMS_SCADA_CONTENT, batch_size=2))
+
+    assert [(t.full_name, b.height) for t, b in batches] == [
+        ("dispatch_unit_scada", 2),
+        ("dispatch_unit_scada", 1),
+        ("dispatch_price", 1),
+        ("dispatch_unit_scada", 1),
+    ]
+    assert all(isinstance(b, pl.DataFrame) for _, b in batches)
+    assert batches[0][1].columns == ["settlementdate", "duid", "scadavalue", "lastchanged"]
+
+
+def test_parse_aemo_mms_csv_namespace_filter() -> None:
+    r = parse_aemo_mms_csv(MMS_SCADA_CONTENT, namespace_filter=["trading"])
+
+    assert not r.tables
+
+
+def test_aemo_table_set_merges_repeated_sections() -> None:
+    sections = []
+
+    for i in range(50):
+        sections.append("I,DISPATCH,PRICE,1,SETTLEMENTDATE,REGIONID,RRP")
+        sections.append(f'D,DISPATCH,PRICE,1,"2021/09/02 12:55:00",NSW1,{i}')
+        sections.append("I,DISPATCH,REGIONSUM,1,SETTLEMENTDATE,REGIONID,TOTALDEMAND")
+        sections.append(f'D,DISPATCH,REGIONSUM,1,"2021/09/02 12:55:00",NSW1,{i}')
+
+    r = parse_aemo_mms_csv("\n".join(sections))
+
+    assert r.table_names == ["dispatch_price", "dispatch_regionsum"]
+
+    table = r.get_table("price")
+    assert table, "Has table"
+    assert table.num_records == 50
+    assert [i["rrp"] for i in table.records] == [str(i) for i in range(50)]
+
+
+def test_aemo_table_set_lookup() -> None:
+    price = AEMOTableSchema(name="price", namespace="dispatch", fieldnames=["regionid"])
+    trading_price = AEMOTableSchema(name="price", namespace="trading", fieldnames=["regionid"])
+
+    table_set = AEMOTableSet(tables=[price])
+
+    assert table_set.has_table("dispatch_price")
+    assert table_set.get_table("price") is price
+
+    table_set.add_table(trading_price)
+
+    assert table_set.get_table("dispatch_price") is price
+    assert table_set.get_table("trading_price") is trading_price
+    # short name lookup resolves to the last table added
+    assert table_set.get_table("price") is trading_price
+    assert not table_set.has_table("unit_scada")
+    assert table_set.get_table("unit_scada") is None
+
+
+def test_aemo_table_set_lookup_follows_direct_changes() -> None:
+    price = AEMOTableSchema(name="price", namespace="dispatch", fieldnames=["regionid"])
+    regionsum = AEMOTableSchema(name="regionsum", namespace="dispatch", fieldnames=["regionid"])
+    scada = AEMOTableSchema(name="unit_scada", namespace="dispatch", fieldnames=["duid"])
+
+    table_set = AEMOTableSet(tables=[price])
+    assert table_set.get_table("dispatch_price") is price
+
+    # replaced in place at the same length
+    table_set.tables[0] = regionsum
+
+    assert table_set.get_table("dispatch_price") is None
+    assert table_set.get_table("dispatch_regionsum") is regionsum
+
+    # assigned a new list of the same length
+    table_set.tables = [scada]
+
+    assert table_set.get_table("dispatch_regionsum") is None
+    assert table_set.get_table("dispatch_unit_scada") is scada
+
+
+def test_parse_aemo_content_zip() -> None:
+    nested = io.BytesIO()
+
+    with ZipFile(nested, "w") as zf:
+        zf.writestr("PUBLIC_DISPATCHSCADA_2.CSV", MMS_SCADA_CONTENT)
+
+    content = io.BytesIO()
+
+    with ZipFile(content, "w") as zf:
+        zf.writestr("PUBLIC_DISPATCHSCADA_1.CSV", MMS_SCADA_CONTENT)
+        zf.writestr("PUBLIC_DISPATCHSCADA_2.zip", nested.getvalue())
+
+    r = parse_aemo_content(content.getvalue(), url="https://nemweb.com.au/PUBLIC_DISPATCHSCADA.zip")
+
+    table = r.get_table("unit_scada")
+    assert table, "Has table"
+    assert table.num_records == 8
+    assert table.url_source == "https://nemweb.com.au/PUBLIC_DISPATCHSCADA.zip"
+    assert parse_aemo_content(MMS_SCADA_CONTENT.encode("utf-8")).table_names == ["dispatch_unit_scada", "dispatch_price"]
+
+
+@pytest.mark.parametrize("values_only", [True, False])
+def test_aemo_table_set_buffers_roundtrip(values_only: bool) -> None:
+    buffers = parse_aemo_content_buffers(MMS_SCADA_CONTENT.encode("utf-8"), values_only=values_only)
+
+    # buffers are what cross the process boundary
+    r = AEMOTableSet.from_buffers(pickle.loads(pickle.dumps(buffers)))
+    expected = parse_aemo_mms_csv(MMS_SCADA_CONTENT, values_only=values_only)
+
+    assert r.table_names == expected.table_names
+
+    for table in expected.tables:
+        roundtrip = r.get_table(table.full_name)
+        assert roundtrip, "Has table"
+        assert roundtrip.fieldnames == table.fieldnames
+        assert roundtrip.records == table.records
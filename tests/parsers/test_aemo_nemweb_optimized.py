@@ -0,0 +1,151 @@
+"""parse_aemo_url_optimized streams the parts of a multi-file archive into the parser across the
+process pool and gets columnar table buffers back rather than pickled rows. Nothing is extracted
+to disk."""
+
+import asyncio
+import io
+from zipfile import ZipFile
+
+import pytest
+
+from opennem import settings
+from opennem.controllers.schema import ControllerReturn
+from opennem.core.parsers.aemo import nemweb
+from opennem.core.parsers.aemo.mms import AEMOTableSet
+from opennem.core.parsers.dirlisting import DirlistingEntry
+
+TRADING_CONTENT = """C,NEMP.WORLD,TRADINGIS,AEMO,PUBLIC,2024/01/01,00:00:00,0,TRADINGIS,0
+I,TRADING,PRICE,3,SETTLEMENTDATE,RUNNO,REGIONID,RRP
+D,TRADING,PRICE,3,"2024/01/01 00:{minute:02d}:00",1,NSW1,{price}
+D,TRADING,PRICE,3,"2024/01/01 00:{minute:02d}:00",1,QLD1,{price}
+C,"END OF REPORT",4
+"""
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    content = io.BytesIO()
+
+    with ZipFile(content, "w") as zf:
+        for name, member in members.items():
+            zf.writestr(name, member)
+
+    return content.getvalue()
+
+
+@pytest.fixture
+def archive_parts(monkeypatch: pytest.MonkeyPatch) -> list[bool]:
+    """A weekly style archive of nested zips plus a csv at the top level. Returns the nested
+    flag of every part sent to the process pool"""
+    archive = _zip(
+        {
+            "PUBLIC_TRADINGIS_202401010005.zip": _zip(
+                {"PUBLIC_TRADINGIS_202401010005.CSV": TRADING_CONTENT.format(minute=5, price=50).encode()}
+            ),
+            "PUBLIC_TRADINGIS_202401010010.zip": _zip(
+                {"PUBLIC_TRADINGIS_202401010010.CSV": TRADING_CONTENT.format(minute=10, price=100).encode()}
+            ),
+            "PUBLIC_TRADINGIS_202401010015.CSV": TRADING_CONTENT.format(minute=15, price=150).encode(),
+            "README.txt": b"not a csv",
+        }
+    )
+    parts: list[bool] = []
+
+    async def _download_zip(url: str, entry: DirlistingEntry | None = None) -> bytes:
+        return archive
+
+    async def _run_in_process(func, content, url, values_only, nested):  # noqa: ANN001, ANN202
+        parts.append(nested)
+        return func(content, url, values_only, nested)
+
+    monkeypatch.setattr(nemweb, "download_zip", _download_zip)
+    monkeypatch.setattr(nemweb, "run_in_process", _run_in_process)
+
+    return parts
+
+
+@pytest.mark.asyncio
+async def test_parse_aemo_url_optimized_table_set(archive_parts: list[bool]) -> None:
+    table_set = await nemweb.parse_aemo_url_optimized("https://nemweb.com.au/PUBLIC_TRADINGIS.zip", persist_to_db=False)
+
+    assert isinstance(table_set, AEMOTableSet)
+
+    table = table_set.get_table("trading_price")
+    assert table, "Has table"
+    assert sorted(i["rrp"] for i in table.records) == ["100", "100", "150", "150", "50", "50"]
+
+    # each nested zip is its own part, top level csvs are parsed without descending again
+    assert sorted(archive_parts) == [False, True, True]
+
+
+@pytest.mark.asyncio
+async def test_parse_aemo_url_optimized_bounds_parts_in_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    archive = _zip(
+        {
+            f"PUBLIC_TRADINGIS_20240101{minute:04d}.zip": _zip(
+                {f"PUBLIC_TRADINGIS_20240101{minute:04d}.CSV": TRADING_CONTENT.format(minute=minute, price=50).encode()}
+            )
+            for minute in range(0, 60, 5)
+        }
+    )
+    in_flight = {"now": 0, "max": 0}
+
+    async def _download_zip(url: str, entry: DirlistingEntry | None = None) -> bytes:
+        return archive
+
+    async def _run_in_process(func, content, url, values_only, nested):  # noqa: ANN001, ANN202
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return func(content, url, values_only, nested)
+
+    async def _store_aemo_tableset(table_set: AEMOTableSet) -> ControllerReturn:
+        return ControllerReturn(inserted_records=2)
+
+    monkeypatch.setattr(nemweb, "download_zip", _download_zip)
+    monkeypatch.setattr(nemweb, "run_in_process", _run_in_process)
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store_aemo_tableset)
+    monkeypatch.setattr(settings, "parse_process_workers", 3)
+
+    cr = await nemweb.parse_aemo_url_optimized("https://nemweb.com.au/PUBLIC_TRADINGIS.zip")
+
+    assert isinstance(cr, ControllerReturn)
+    assert cr.inserted_records == 24
+    assert in_flight["max"] == 3
+
+
+@pytest.mark.asyncio
+async def test_parse_aemo_url_optimized_persists_each_file(monkeypatch: pytest.MonkeyPatch, archive_parts: list[bool]) -> None:
+    stored: list[int] = []
+
+    async def _store_aemo_tableset(table_set: AEMOTableSet) -> ControllerReturn:
+        table = table_set.get_table("trading_price")
+        assert table, "Has table"
+        stored.append(table.num_records)
+        return ControllerReturn(inserted_records=table.num_records)
+
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store_aemo_tableset)
+
+    cr = await nemweb.parse_aemo_url_optimized("https://nemweb.com.au/PUBLIC_TRADINGIS.zip")
+
+    assert isinstance(cr, ControllerReturn)
+    assert stored == [2, 2, 2]
+    assert cr.inserted_records == 6
+
+
+@pytest.mark.asyncio
+async def test_parse_aemo_url_optimized_bulk_persists_once(monkeypatch: pytest.MonkeyPatch, archive_parts: list[bool]) -> None:
+    stored: list[int] = []
+
+    async def _store_aemo_tableset(table_set: AEMOTableSet) -> ControllerReturn:
+        table = table_set.get_table("trading_price")
+        assert table, "Has table"
+        stored.append(table.num_records)
+        return ControllerReturn(inserted_records=table.num_records)
+
+    monkeypatch.setattr(nemweb, "store_aemo_tableset", _store_aemo_tableset)
+
+    cr = await nemweb.parse_aemo_url_optimized_bulk("https://nemweb.com.au/PUBLIC_TRADINGIS.zip")
+
+    assert isinstance(cr, ControllerReturn)
+    assert stored == [6]
@@ -0,0 +1,123 @@
+"""Tests for the milestone backlog's single scan of each source table with GROUPING SETS.
+
+ClickHouse is faked with a client that returns fixed rows from execute_iter, and persistence
+records what it's given.
+"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from opennem.recordreactor import backlog
+from opennem.recordreactor.backlog import _analyze_milestone_records, _get_source_groupings, run_milestone_analysis
+from opennem.recordreactor.schema import MilestonePeriod, MilestoneType
+from opennem.schema.network import NetworkNEM, NetworkWEM
+
+DAY = datetime(2026, 10, 17)
+
+
+def _row(grouping_id: int, *keys: str | bool) -> tuple:
+    return (DAY, grouping_id, *keys, 150000.0, 288, 5.0, "high", "day", uuid.uuid4(), None)
+
+
+class _FakeClient:
+    """Returns a record for some of the grouping sets of each source table"""
+
+    def __init__(self) -> None:
+        self.queries: list[str] = []
+        self.disconnected = False
+
+    def execute_iter(self, query: str, settings: dict | None = None):  # noqa: ANN201
+        self.queries.append(query)
+
+        # grouping() has a bit for each key not in the set, the first key highest
+        if "fueltech_intervals_mv" in query:
+            return iter([_row(3, "", ""), _row(1, "NSW1", ""), _row(0, "NSW1", "coal")])
+
+        if "renewable_intervals_mv" in query:
+            return iter([_row(2, "", True), _row(0, "NSW1", False)])
+
+        return iter([_row(0)])
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+
+
+def test_groupings_are_split_by_source_table() -> None:
+    energy = _get_source_groupings(MilestoneType.energy, MilestonePeriod.day, backlog._GROUPING_CONFIGS)
+    assert [[g.name for g in groupings] for groupings in energy] == [
+        ["network", "region", "fueltech", "region_fueltech"],
+        ["renewable", "region_renewable"],
+    ]
+
+    demand = _get_source_groupings(MilestoneType.demand, MilestonePeriod.day, backlog._GROUPING_CONFIGS)
+    assert [[g.name for g in groupings] for groupings in demand] == [["network", "region"]]
+
+    assert _get_source_groupings(MilestoneType.price, MilestonePeriod.day, backlog._GROUPING_CONFIGS) == []
+    assert _get_source_groupings(MilestoneType.power, MilestonePeriod.day, backlog._GROUPING_CONFIGS) == []
+
+
+def test_one_query_covers_every_grouping_of_a_source_table() -> None:
+    client = _FakeClient()
+    groupings = _get_source_groupings(MilestoneType.energy, MilestonePeriod.day, backlog._GROUPING_CONFIGS)[0]
+
+    batches = list(_analyze_milestone_records(client, NetworkNEM, MilestonePeriod.day, MilestoneType.energy, groupings))
+
+    assert len(client.queries) == 1
+    query = client.queries[0]
+
+    assert "GROUPING SETS ((time_bucket), (time_bucket, network_region), (time_bucket, fueltech_group_id)" in query
+    assert "PARTITION BY grouping_id, network_region, fueltech_group_id" in query
+
+    # each record carries only its grouping's fields
+    records = [record for batch in batches for record in batch]
+    assert [{k for k in ("network_region", "fueltech_group_id") if k in r} for r in records] == [
+        set(),
+        {"network_region"},
+        {"network_region", "fueltech_group_id"},
+    ]
+
+
+def test_wem_skips_region_groupings() -> None:
+    client = _FakeClient()
+    groupings = _get_source_groupings(MilestoneType.demand, MilestonePeriod.day, backlog._GROUPING_CONFIGS)[0]
+
+    list(_analyze_milestone_records(client, NetworkWEM, MilestonePeriod.day, MilestoneType.demand, groupings))
+
+    assert "GROUP BY GROUPING SETS ((time_bucket))" in client.queries[0]
+    assert "network_region" not in client.queries[0]
+
+
+def test_records_are_streamed_in_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(backlog, "_STREAM_BATCH_SIZE", 2)
+    groupings = _get_source_groupings(MilestoneType.energy, MilestonePeriod.day, backlog._GROUPING_CONFIGS)[0]
+
+    batches = list(_analyze_milestone_records(_FakeClient(), NetworkNEM, MilestonePeriod.day, MilestoneType.energy, groupings))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_analysis_persists_each_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = _FakeClient()
+    persisted: list[list] = []
+
+    async def _persist(milestones: list) -> list:
+        persisted.append(milestones)
+        return []
+
+    monkeypatch.setattr(backlog, "new_clickhouse_client", lambda: client)
+    monkeypatch.setattr(backlog, "check_and_persist_milestones_chunked", _persist)
+    monkeypatch.setattr(backlog, "_STREAM_BATCH_SIZE", 2)
+
+    await run_milestone_analysis(networks=[NetworkNEM], metrics=[MilestoneType.energy], periods=[MilestonePeriod.day])
+
+    # a scan of fueltech_intervals_mv and one of renewable_intervals_mv, rather than one per grouping
+    assert len(client.queries) == 2
+    assert client.disconnected
+
+    # the fueltech scan streams two batches, the renewable scan one
+    assert [len(milestones) for milestones in persisted] == [2, 1, 2]
+    assert persisted[0][0].record_id == "au.nem.energy.day.high"
+    assert persisted[2][0].record_id == "au.nem.renewables.energy.day.high"
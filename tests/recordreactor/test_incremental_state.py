@@ -0,0 +1,462 @@
+"""Tests for the milestone state store and the incremental check that reads it.
+
+Redis, the database and ClickHouse are faked: the state store is a dict, the database
+state is a fixed set of records and ClickHouse returns grouping sets rows for the period.
+"""
+
+import uuid
+from datetime import date, datetime, timedelta
+
+import polars as pl
+import pytest
+
+from opennem import settings
+from opennem.recordreactor import incremental, queries_incremental, state
+from opennem.recordreactor.incremental import _filter_candidate_rows, run_incremental_milestone_check
+from opennem.recordreactor.metric_registry import get_metric_registry
+from opennem.recordreactor.queries_incremental import get_grouping_id, get_grouping_sets_queries
+from opennem.recordreactor.schema import (
+    MilestoneAggregate,
+    MilestoneFueltechGrouping,
+    MilestonePeriod,
+    MilestoneRecordOutputSchema,
+    MilestoneRecordSchema,
+    MilestoneType,
+)
+from opennem.recordreactor.unit import get_milestone_unit
+from opennem.schema.network import NetworkNEM
+
+INTERVAL = datetime(2026, 10, 18, 10, 0)
+
+
+class _FakePipeline:
+    def __init__(self, redis: "_FakeRedis") -> None:
+        self.redis = redis
+        self.commands: list[tuple] = []
+
+    async def __aenter__(self) -> "_FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> bool:
+        return False
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self) -> list:
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class _FakeRedis:
+    """The handful of commands the state store uses, held in dicts"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.ttls: dict[str, int] = {}
+        self.hgetall_calls = 0
+
+    def expire_all(self) -> None:
+        for key in self.ttls:
+            self.data.pop(key, None)
+            self.hashes.pop(key, None)
+
+        self.ttls.clear()
+
+    async def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: int, ex: int | None = None) -> bool:
+        self.data[key] = str(value).encode()
+
+        if ex:
+            self.ttls[key] = ex
+
+        return True
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        self.ttls[key] = seconds
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(self.data.get(key, b"0")) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        for key in keys:
+            self.ttls.pop(key, None)
+
+        return sum((self.data.pop(k, None) or self.hashes.pop(k, None)) is not None for k in keys)
+
+    async def hset(self, key: str, mapping: dict[str, bytes]) -> int:
+        self.hashes.setdefault(key, {}).update({k.encode(): v for k, v in mapping.items()})
+        return len(mapping)
+
+    async def hgetall(self, key: str) -> dict[bytes, bytes]:
+        self.hgetall_calls += 1
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction: bool = True) -> _FakePipeline:
+        return _FakePipeline(self)
+
+
+def _state_record(
+    record_id: str, value: float, interval: datetime = INTERVAL - timedelta(hours=1)
+) -> MilestoneRecordOutputSchema:
+    return MilestoneRecordOutputSchema(
+        record_id=record_id,
+        interval=interval,
+        instance_id=uuid.uuid4(),
+        aggregate=record_id.rsplit(".", 1)[1],
+        metric="power",
+        period="interval",
+        significance=5,
+        value=value,
+        value_unit="MW",
+        network_id="NEM",
+    )
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> _FakeRedis:
+    fake = _FakeRedis()
+    monkeypatch.setattr(state, "get_redis", lambda: fake)
+    monkeypatch.setattr(state, "_CURRENT_MILESTONE_STATE", None)
+    monkeypatch.setattr(state, "_CURRENT_MILESTONE_STATE_VERSION", None)
+    monkeypatch.setattr(state, "_CURRENT_MILESTONE_STATE_FRAME", None)
+    return fake
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch) -> dict:
+    """The latest milestone per record_id in the database, and how often it was loaded"""
+    db: dict = {
+        "loads": 0,
+        "state": {
+            "au.nem.power.interval.high": _state_record("au.nem.power.interval.high", 30000),
+            "au.nem.power.interval.low": _state_record("au.nem.power.interval.low", 15000),
+        },
+    }
+
+    async def _load() -> dict[str, MilestoneRecordOutputSchema]:
+        db["loads"] += 1
+        return dict(db["state"])
+
+    monkeypatch.setattr(state, "get_current_milestone_state_from_database", _load)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_state_is_seeded_once_and_read_from_the_store(redis: _FakeRedis, database: dict) -> None:
+    first = await state.get_current_milestone_state()
+
+    assert first.keys() == database["state"].keys()
+    assert database["loads"] == 1
+    assert len(redis.hashes[state.MILESTONE_STATE_KEY]) == 2
+
+    # steady state: the version hasn't moved so the local copy is used
+    assert await state.get_current_milestone_state() is first
+    assert redis.hgetall_calls == 0
+
+    # another process writes - reload from the store, not the database
+    await redis.hset(
+        state.MILESTONE_STATE_KEY,
+        mapping={"au.nem.power.interval.high": state._encode_state_record(_state_record("au.nem.power.interval.high", 31000))},
+    )
+    await redis.incr(state.MILESTONE_STATE_VERSION_KEY)
+
+    reloaded = await state.get_current_milestone_state()
+
+    assert reloaded["au.nem.power.interval.high"].value == 31000
+    assert redis.hgetall_calls == 1
+    assert database["loads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_publish_keeps_the_latest_record_and_the_local_copy_current(redis: _FakeRedis, database: dict) -> None:
+    await state.get_current_milestone_state()
+
+    newer = _state_record("au.nem.power.interval.high", 32000, interval=INTERVAL)
+    # an older record filled in by a reconciliation
+    older = _state_record("au.nem.power.interval.low", 14000, interval=INTERVAL - timedelta(days=60))
+
+    await state.publish_milestone_state([newer, older])
+
+    current = await state.get_current_milestone_state()
+
+    assert current["au.nem.power.interval.high"].value == 32000
+    assert current["au.nem.power.interval.low"].value == 15000
+    # the version moved by this process's own write, so nothing was reloaded
+    assert redis.hgetall_calls == 0
+    assert state.get_current_milestone_state_frame().filter(pl.col("record_id") == "au.nem.power.interval.high")[
+        "prev_value"
+    ].to_list() == [32000]
+
+
+@pytest.mark.asyncio
+async def test_expired_store_is_reseeded_from_the_database(redis: _FakeRedis, database: dict) -> None:
+    await state.get_current_milestone_state()
+
+    assert redis.ttls == {
+        state.MILESTONE_STATE_KEY: settings.milestone_state_ttl,
+        state.MILESTONE_STATE_VERSION_KEY: settings.milestone_state_ttl,
+    }
+
+    # a milestone written straight to the database, bypassing the store
+    database["state"]["au.nem.power.interval.high"] = _state_record("au.nem.power.interval.high", 33000)
+    assert (await state.get_current_milestone_state())["au.nem.power.interval.high"].value == 30000
+
+    redis.expire_all()
+
+    assert (await state.get_current_milestone_state())["au.nem.power.interval.high"].value == 33000
+    assert database["loads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_publish_to_an_expired_store_drops_the_partial_state(redis: _FakeRedis, database: dict) -> None:
+    await state.get_current_milestone_state()
+    redis.expire_all()
+
+    await state.publish_milestone_state([_state_record("au.nem.power.interval.high", 32000, interval=INTERVAL)])
+
+    assert state.MILESTONE_STATE_KEY not in redis.hashes
+    assert state.MILESTONE_STATE_VERSION_KEY not in redis.data
+
+    # the next read reseeds everything, not just the published record
+    assert (await state.get_current_milestone_state()).keys() == database["state"].keys()
+    assert database["loads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_state_falls_back_to_the_database_without_redis(monkeypatch: pytest.MonkeyPatch, database: dict) -> None:
+    class _Unavailable:
+        async def get(self, key: str) -> None:
+            raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(state, "get_redis", lambda: _Unavailable())
+    monkeypatch.setattr(state, "_CURRENT_MILESTONE_STATE", None)
+    monkeypatch.setattr(state, "_CURRENT_MILESTONE_STATE_VERSION", None)
+
+    assert (await state.get_current_milestone_state()).keys() == database["state"].keys()
+
+
+def _rows(values: dict[tuple[str, str | None, str | None], float], metric: str = "power") -> pl.DataFrame:
+    """Aggregated rows for the interval, keyed by (grouping, network_region, fueltech_group_id)"""
+    return pl.DataFrame(
+        {
+            "time_bucket": [INTERVAL] * len(values),
+            "grouping": [g for g, _, _ in values],
+            "network_region": [r for _, r, _ in values],
+            "fueltech_group_id": [f for _, _, f in values],
+            "renewable": [None] * len(values),
+            "interval_count": [1] * len(values),
+            "metric": [metric] * len(values),
+            "value": list(values.values()),
+        },
+        schema={
+            "time_bucket": pl.Datetime("us"),
+            "grouping": pl.String,
+            "network_region": pl.String,
+            "fueltech_group_id": pl.String,
+            "renewable": pl.Boolean,
+            "interval_count": pl.Int64,
+            "metric": pl.String,
+            "value": pl.Float64,
+        },
+    )
+
+
+def test_candidate_record_ids_match_the_schema() -> None:
+    rows = pl.concat(
+        [
+            _rows({("network", None, None): 25000, ("region_fueltech", "NSW1", "solar"): 4000}),
+            _rows({("region", "SA1", None): 1500}, metric=MilestoneType.demand.value),
+            _rows({("network", None, None): 45}, metric=MilestoneType.proportion.value),
+        ]
+    )
+    empty_state = pl.DataFrame(schema={"record_id": pl.String, "prev_value": pl.Float64, "prev_interval": pl.Datetime("us")})
+
+    # every row is new against an empty state, so the high of each is kept
+    candidates = _filter_candidate_rows(rows, NetworkNEM, MilestonePeriod.interval, empty_state)
+    assert candidates.height == 4
+
+    expected = [
+        MilestoneRecordSchema(
+            interval=INTERVAL,
+            aggregate=MilestoneAggregate.high,
+            metric=metric,
+            period=MilestonePeriod.interval,
+            network=NetworkNEM,
+            unit=get_milestone_unit(metric),
+            network_region=region,
+            fueltech=fueltech,
+            value=1,
+        ).record_id
+        for metric, region, fueltech in [
+            (MilestoneType.power, None, None),
+            (MilestoneType.power, "NSW1", MilestoneFueltechGrouping.solar),
+            (MilestoneType.power, "SA1", MilestoneFueltechGrouping.demand),
+            (MilestoneType.proportion, None, None),
+        ]
+    ]
+    state_frame = pl.DataFrame(
+        {"record_id": expected, "prev_value": [1e9] * 4, "prev_interval": [INTERVAL - timedelta(days=1)] * 4},
+        schema={"record_id": pl.String, "prev_value": pl.Float64, "prev_interval": pl.Datetime("us")},
+    )
+
+    # a state none of the highs can beat leaves the lows, which have no state yet
+    remaining = _filter_candidate_rows(rows, NetworkNEM, MilestonePeriod.interval, state_frame)
+    assert remaining.height == 4
+
+    lows = [record_id.replace(".high", ".low") for record_id in expected]
+    state_frame = pl.concat(
+        [state_frame, state_frame.with_columns(pl.Series("record_id", lows), pl.lit(0.5).alias("prev_value"))]
+    )
+
+    assert _filter_candidate_rows(rows, NetworkNEM, MilestonePeriod.interval, state_frame).is_empty()
+
+
+def test_candidates_skip_unknown_fueltechs_and_old_intervals() -> None:
+    rows = _rows({("fueltech", None, "battery"): 900, ("network", None, None): 29999.6})
+    state_frame = pl.DataFrame(
+        {
+            "record_id": ["au.nem.power.interval.high", "au.nem.power.interval.low"],
+            "prev_value": [30000.0, 10.0],
+            "prev_interval": [INTERVAL, INTERVAL - timedelta(days=1)],
+        }
+    )
+
+    # battery isn't a milestone fueltech, and the high was already set at this interval
+    assert _filter_candidate_rows(rows, NetworkNEM, MilestonePeriod.interval, state_frame).is_empty()
+
+
+@pytest.fixture
+def clickhouse(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Queries run on ClickHouse. Each source table returns a network row per metric."""
+    queries: list[str] = []
+
+    async def _execute(client, query: str, params=None):  # noqa: ANN001, ANN202
+        queries.append(query)
+
+        bucket = INTERVAL if "toDateTime(interval)" in query else datetime(2026, 10, 17)
+        source = next(q for q in get_grouping_sets_queries(NetworkNEM, MilestonePeriod.interval) if q.source_table in query)
+        metrics = [m for m in get_metric_registry() if f"as value_{m.metric.value}" in query]
+
+        # the table's first grouping set with its keys left at their defaults, the values beat
+        # the power high and everything else is new
+        grouping = source.groupings[0]
+        keys = [False if f == "renewable" else "" for f in source.key_fields]
+
+        return [(bucket, get_grouping_id(grouping, source.key_fields), *keys, 1, *[35000.0] * len(metrics))]
+
+    monkeypatch.setattr(queries_incremental, "execute_async", _execute)
+    monkeypatch.setattr(queries_incremental, "get_clickhouse_client", lambda: None)
+    return queries
+
+
+@pytest.fixture
+def dirty_log(monkeypatch: pytest.MonkeyPatch) -> dict:
+    """The materialized view refresh watermark and the (marked_at, day) writes of the dirty days log"""
+    log: dict = {"refreshed_to": datetime(2026, 10, 18, 10, 1), "written": []}
+
+    async def _refreshed_to() -> datetime:
+        return log["refreshed_to"]
+
+    async def _dirty_days(network, since: datetime, until: datetime) -> set[date]:  # noqa: ANN001
+        return {day for marked_at, day in log["written"] if since < marked_at <= until}
+
+    monkeypatch.setattr(incremental, "_get_views_refreshed_to", _refreshed_to)
+    monkeypatch.setattr(incremental, "_get_refreshed_dirty_days", _dirty_days)
+    monkeypatch.setattr(incremental, "_SETTLED_PERIODS", {})
+    return log
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_queries_each_source_table_once(
+    monkeypatch: pytest.MonkeyPatch, redis: _FakeRedis, database: dict, clickhouse: list[str], dirty_log: dict
+) -> None:
+    persisted: list[MilestoneRecordSchema] = []
+
+    async def _persist(milestones: list[MilestoneRecordSchema]) -> list:
+        persisted.extend(milestones)
+        return []
+
+    monkeypatch.setattr(incremental, "check_and_persist_milestones_chunked", _persist)
+    monkeypatch.setattr(incremental, "get_last_completed_interval_for_network", lambda network: INTERVAL + timedelta(minutes=5))
+
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    # a query per source table per period, not per metric and grouping
+    assert len(clickhouse) == sum(len(get_grouping_sets_queries(NetworkNEM, p)) for p in incremental._DEFAULT_PERIODS)
+
+    power_high = [r for r in persisted if r.record_id == "au.nem.power.interval.high"]
+    assert len(power_high) == 1
+    assert power_high[0].previous_instance_id == database["state"]["au.nem.power.interval.high"].instance_id
+
+    # the power low isn't broken by 35000
+    assert not any(r.record_id == "au.nem.power.interval.low" for r in persisted)
+
+    # the next run only queries the interval, the completed periods above it have settled
+    clickhouse.clear()
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    assert len(clickhouse) == len(get_grouping_sets_queries(NetworkNEM, MilestonePeriod.interval))
+    assert database["loads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_late_data_rechecks_a_settled_period(
+    monkeypatch: pytest.MonkeyPatch, redis: _FakeRedis, database: dict, clickhouse: list[str], dirty_log: dict
+) -> None:
+    async def _persist(milestones: list[MilestoneRecordSchema]) -> list:
+        return []
+
+    monkeypatch.setattr(incremental, "check_and_persist_milestones_chunked", _persist)
+    monkeypatch.setattr(incremental, "get_last_completed_interval_for_network", lambda network: INTERVAL + timedelta(minutes=5))
+
+    interval_queries = len(get_grouping_sets_queries(NetworkNEM, MilestonePeriod.interval))
+    day_queries = len(get_grouping_sets_queries(NetworkNEM, MilestonePeriod.day))
+
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    # yesterday's data arrives hours after the day ended, the views haven't refreshed it yet
+    dirty_log["written"].append((datetime(2026, 10, 18, 10, 3), date(2026, 10, 17)))
+    clickhouse.clear()
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    assert len(clickhouse) == interval_queries
+
+    # once the refresh has taken it in, the day is checked again, the month and above aren't
+    # (the last completed month is September)
+    dirty_log["refreshed_to"] = datetime(2026, 10, 18, 10, 6)
+    clickhouse.clear()
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    assert len(clickhouse) == interval_queries + day_queries
+
+    # and settles again
+    dirty_log["refreshed_to"] = datetime(2026, 10, 18, 10, 11)
+    clickhouse.clear()
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    assert len(clickhouse) == interval_queries
+
+
+@pytest.mark.asyncio
+async def test_periods_dont_settle_without_the_refresh_watermark(
+    monkeypatch: pytest.MonkeyPatch, redis: _FakeRedis, database: dict, clickhouse: list[str], dirty_log: dict
+) -> None:
+    async def _persist(milestones: list[MilestoneRecordSchema]) -> list:
+        return []
+
+    monkeypatch.setattr(incremental, "check_and_persist_milestones_chunked", _persist)
+    monkeypatch.setattr(incremental, "get_last_completed_interval_for_network", lambda network: INTERVAL + timedelta(minutes=5))
+    dirty_log["refreshed_to"] = None
+
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+    clickhouse.clear()
+    await run_incremental_milestone_check(networks=[NetworkNEM], alert_slack=False)
+
+    # writes can't be tracked, so every completed period is checked every run
+    assert len(clickhouse) == sum(len(get_grouping_sets_queries(NetworkNEM, p)) for p in incremental._DEFAULT_PERIODS)
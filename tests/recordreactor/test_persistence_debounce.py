@@ -74,12 +74,16 @@ class _FakeWriteSessionCtx:
 
 @pytest.fixture
 def mock_db(monkeypatch):
-    """Mock the milestone state (empty) and the write session (no-op)."""
+    """Mock the milestone state (empty), its publishing and the write session (no-op)."""
 
     async def _empty_state():
         return {}
 
+    async def _publish(milestones):
+        return None
+
     monkeypatch.setattr(persistence_mod, "get_current_milestone_state", _empty_state)
+    monkeypatch.setattr(persistence_mod, "publish_milestone_state", _publish)
     monkeypatch.setattr(persistence_mod, "get_write_session", lambda: _FakeWriteSessionCtx())
 
 
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from opennem.db import bulk_insert_csv
+from opennem.db.bulk_insert_csv import bulkinsert_mms_items, cast_frame_to_table_types, cast_records_to_table_types
+from opennem.db.models.opennem import FacilityScada
+
+FACILITY_SCADA_COLUMN_TYPES = {
+    "interval": "timestamp without time zone",
+    "network_id": "text",
+    "facility_code": "text",
+    "generated": "numeric",
+    "is_forecast": "boolean",
+    "energy": "numeric",
+    "energy_storage": "numeric",
+    "energy_quality_flag": "smallint",
+}
+
+RECORDS = [
+    {
+        "interval": "2024-01-01T00:05:00",
+        "network_id": "NEM",
+        "facility_code": "BAYSW1",
+        "generated": "600.5",
+        "is_forecast": "false",
+        "energy": 50.0,
+        "energy_storage": "",
+        "energy_quality_flag": 0,
+    },
+    {
+        "interval": "2024-01-01T00:10:00",
+        "network_id": "NEM",
+        "facility_code": "LVES1",
+        "generated": "-20",
+        "is_forecast": "t",
+        "energy": None,
+        "energy_storage": "10.25",
+        "energy_quality_flag": 2,
+    },
+]
+
+
+def test_cast_records_to_table_types() -> None:
+    rows = cast_records_to_table_types(RECORDS, FACILITY_SCADA_COLUMN_TYPES)
+
+    assert rows[0] == (datetime(2024, 1, 1, 0, 5), "NEM", "BAYSW1", 600.5, False, 50.0, None, 0)
+    assert rows[1] == (datetime(2024, 1, 1, 0, 10), "NEM", "LVES1", -20.0, True, None, 10.25, 2)
+
+
+def test_cast_frame_matches_records() -> None:
+    frame = pl.DataFrame(RECORDS)
+
+    rows = list(cast_frame_to_table_types(frame, FACILITY_SCADA_COLUMN_TYPES).iter_rows())
+
+    assert rows == cast_records_to_table_types(RECORDS, FACILITY_SCADA_COLUMN_TYPES)
+
+
+def test_cast_frame_typed_columns_and_missing() -> None:
+    frame = pl.DataFrame(
+        {
+            "energy": [1.5],
+            "facility_code": ["BAYSW1"],
+            "interval": [datetime(2024, 1, 1, 0, 5)],
+            "is_forecast": [False],
+            "generated": [18.0],
+        }
+    )
+
+    cast = cast_frame_to_table_types(frame, FACILITY_SCADA_COLUMN_TYPES)
+
+    assert cast.columns == list(FACILITY_SCADA_COLUMN_TYPES.keys())
+    assert cast.row(0) == (datetime(2024, 1, 1, 0, 5), None, "BAYSW1", 18.0, False, 1.5, None, None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("as_frame", [True, False])
+async def test_bulkinsert_mms_items_chunks(monkeypatch: pytest.MonkeyPatch, as_frame: bool) -> None:
+    chunks: list[int] = []
+
+    async def _inner(table, records, update_fields=None) -> int:
+        chunks.append(len(records))
+        return len(records)
+
+    monkeypatch.setattr(bulk_insert_csv, "_bulkinsert_mms_items_inner", _inner)
+
+    records = RECORDS * 5
+    inserted = await bulkinsert_mms_items(FacilityScada, pl.DataFrame(records) if as_frame else records, chunk_size=4)
+
+    assert inserted == 10
+    assert chunks == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_bulkinsert_mms_items_empty() -> None:
+    assert await bulkinsert_mms_items(FacilityScada, pl.DataFrame()) == 0
+    assert await bulkinsert_mms_items(FacilityScada, []) == 0
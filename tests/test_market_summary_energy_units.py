@@ -33,7 +33,7 @@ IDX_RENEWABLE_WITH_STORAGE_ENERGY = 22
 def no_flows(monkeypatch):
     """Flows come from ClickHouse and are irrelevant here — null them out."""
 
-    async def _no_flows(start_time, end_time):
+    async def _no_flows(start_time, end_time, region_price_df=None):
         return None
 
     monkeypatch.setattr(market_summary_mod, "_compute_flows_for_range", _no_flows)
@@ -42,7 +42,7 @@ def no_flows(monkeypatch):
 async def _prepare(records: list[tuple[Any, ...]]) -> list[tuple[Any, ...]]:
     """Run the aggregation. The declared return tuple is narrower than the 30 columns actually
     selected, so the rows are widened here rather than indexed against a stale annotation."""
-    return list(await market_summary_mod._prepare_market_summary_data(records))  # type: ignore[arg-type]
+    return (await market_summary_mod._prepare_market_summary_data(records)).rows()  # type: ignore[arg-type]
 
 
 def _record(network_id: str) -> tuple[Any, ...]:
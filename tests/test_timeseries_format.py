@@ -0,0 +1,52 @@
+"""The columnar timeseries formatter groups, labels and orders series as the endpoints return them."""
+
+from datetime import datetime
+
+from opennem.api.timeseries import format_timeseries_response, format_timeseries_rows
+from opennem.core.grouping import PrimaryGrouping, SecondaryGrouping
+from opennem.core.metric import Metric
+from opennem.core.time_interval import Interval
+
+COLUMN_NAMES = ["interval", "network_region", "renewable", "power", "energy"]
+
+ROWS = [
+    (datetime(2024, 1, 1, 0, 5), "NSW1", True, 2.0, None),
+    (datetime(2024, 1, 1, 0, 0), "QLD1", False, 3.0, 0.25),
+    (datetime(2024, 1, 1, 0, 0), "NSW1", True, 1.0, 0.1),
+    (datetime(2024, 1, 1, 0, 5), "QLD1", False, 4, 0.3),
+]
+
+FORMAT_ARGS = {
+    "network": "NEM",
+    "metrics": [Metric.POWER, Metric.ENERGY],
+    "interval": Interval.INTERVAL,
+    "primary_grouping": PrimaryGrouping.NETWORK_REGION,
+    "secondary_groupings": [SecondaryGrouping.RENEWABLE],
+}
+
+
+def test_rows_are_grouped_in_order_of_first_appearance():
+    power, energy = format_timeseries_rows(**FORMAT_ARGS, column_names=COLUMN_NAMES, rows=ROWS)
+
+    assert [r["name"] for r in power["results"]] == ["power_NSW1|True", "power_QLD1|False"]
+    assert power["results"][0]["columns"] == {"region": "NSW1", "renewable": True}
+    assert power["results"][0]["data"] == [["2024-01-01T00:00:00+10:00", 1.0], ["2024-01-01T00:05:00+10:00", 2.0]]
+    assert power["results"][1]["data"] == [["2024-01-01T00:00:00+10:00", 3.0], ["2024-01-01T00:05:00+10:00", 4.0]]
+    assert energy["results"][0]["data"] == [["2024-01-01T00:00:00+10:00", 0.1], ["2024-01-01T00:05:00+10:00", None]]
+
+    assert power["date_start"] == "2024-01-01T00:00:00+10:00"
+    assert power["date_end"] == "2024-01-01T00:05:00+10:00"
+    assert power["groupings"] == ["network_region", "renewable"]
+    assert power["network_timezone_offset"] == "+10:00"
+
+
+def test_rows_and_dicts_format_the_same():
+    results = [dict(zip(COLUMN_NAMES, row, strict=True)) for row in ROWS]
+
+    assert format_timeseries_response(**FORMAT_ARGS, results=results) == format_timeseries_rows(
+        **FORMAT_ARGS, column_names=COLUMN_NAMES, rows=ROWS
+    )
+
+
+def test_no_rows_formats_no_series():
+    assert format_timeseries_rows(**FORMAT_ARGS, column_names=COLUMN_NAMES, rows=[]) == []
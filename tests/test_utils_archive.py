@@ -0,0 +1,35 @@
+import io
+from zipfile import ZipFile
+
+from opennem.utils.archive import iter_zip_member_streams
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    content = io.BytesIO()
+
+    with ZipFile(content, "w") as zf:
+        for name, member in members.items():
+            zf.writestr(name, member)
+
+    return content.getvalue()
+
+
+ARCHIVE = _zip(
+    {
+        "A.CSV": b"a\n",
+        "B.zip": _zip({"B1.CSV": b"b1\n", "B2.zip": _zip({"B2.CSV": b"b2\n"})}),
+        "C.txt": b"c\n",
+    }
+)
+
+
+def test_iter_zip_member_streams_nested() -> None:
+    members = [(name, fh.read()) for name, fh in iter_zip_member_streams(ARCHIVE)]
+
+    assert members == [("A.CSV", b"a\n"), ("B1.CSV", b"b1\n"), ("B2.CSV", b"b2\n")]
+
+
+def test_iter_zip_member_streams_not_nested() -> None:
+    members = [name for name, _ in iter_zip_member_streams(io.BytesIO(ARCHIVE), suffixes=(".csv", ".txt"), nested=False)]
+
+    assert members == ["A.CSV", "C.txt"]